@@ -0,0 +1,119 @@
+"""
+Compares the allocations of the ways of extracting Takeout entries: a dictionary per entry converted with
+convert_to_arrays, a namedtuple record per entry, and typed column builders (the path the pipeline uses).
+
+Examples:
+    python benchmarks/bench_extraction.py --sizes 100000 1000000
+    python benchmarks/bench_extraction.py --sizes 500000 --sources watch --output extraction.json
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_munger import SOURCES, ensure_dataset
+from self_stats.munger.input_output import read_json_file
+from self_stats.munger.parse_and_process import (extract_search_columns, extract_search_information, extract_search_records,
+                                                 extract_watch_columns, extract_watch_information, extract_watch_records)
+from self_stats.munger.process_dates import convert_to_arrays
+
+PATHS: Dict[str, Dict[str, Callable[[List[Dict[str, Any]], List[str]], Any]]] = {
+    'search': {
+        'dicts': lambda entries, mappings: convert_to_arrays(extract_search_information(entries), mappings),
+        'records': lambda entries, mappings: extract_search_records(entries),
+        'columns': extract_search_columns,
+    },
+    'watch': {
+        'dicts': lambda entries, mappings: convert_to_arrays(extract_watch_information(entries), mappings),
+        'records': lambda entries, mappings: extract_watch_records(entries),
+        'columns': extract_watch_columns,
+    },
+}
+
+def collections() -> List[int]:
+    """
+    Number of garbage collections run so far in each generation.
+    """
+    return [generation['collections'] for generation in gc.get_stats()]
+
+def measure(func: Callable, entries: List[Dict[str, Any]], mappings: List[str], repeat: int) -> Dict[str, float]:
+    """
+    Runs one extraction path and records its fastest wall time and the garbage collections it triggered, which
+    grow with the number of container objects allocated, then its peak of allocated memory in a traced run.
+    """
+    timings, runs = [], []
+    for _ in range(repeat):
+        gc.collect()
+        before = collections()
+        start = time.perf_counter()
+        result = func(entries, mappings)
+        timings.append(time.perf_counter() - start)
+        runs.append([after - before for before, after in zip(before, collections())])
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = func(entries, mappings)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    fewest = min(runs)
+    return {'wall_s': min(timings), 'peak_mb': peak / 2**20, 'gc_collections': sum(fewest), 'gc_full_collections': fewest[-1]}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compare the allocations of the entry extraction paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000], help='Number of entries per source.')
+    parser.add_argument('--sources', nargs='+', choices=sorted(SOURCES), default=sorted(SOURCES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions, the fastest run is kept.')
+    parser.add_argument('--data-dir', type=Path, help='Where to keep generated inputs, defaults to a temporary directory.')
+    parser.add_argument('--output', type=Path, help='Write results to this JSON file.')
+    args = parser.parse_args(argv)
+
+    temporary = None if args.data_dir else tempfile.TemporaryDirectory()
+    data_dir = args.data_dir or Path(temporary.name)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    print(f"{'source':<8}{'size':>10}  {'path':<9}{'wall':>9}{'peak':>12}{'gc runs':>9}{'full gc':>9}")
+    for size in args.sizes:
+        for source in args.sources:
+            file_name, mappings = SOURCES[source]
+            entries = read_json_file(ensure_dataset(data_dir, source, size, args.seed) / file_name)
+            for path, func in PATHS[source].items():
+                record = {'source': source, 'size': size, 'path': path, **measure(func, entries, list(mappings), args.repeat)}
+                results.append(record)
+                print(f"{source:<8}{size:>10}  {path:<9}{record['wall_s']:>7.3f} s{record['peak_mb']:>9.1f} MB"
+                      f"{record['gc_collections']:>9}{record['gc_full_collections']:>9}")
+
+    if args.output:
+        report = {
+            'meta': {
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'seed': args.seed,
+                'repeat': args.repeat,
+            },
+            'results': results,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f'\nResults saved to {args.output}')
+    if temporary:
+        temporary.cleanup()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
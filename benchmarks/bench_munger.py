@@ -0,0 +1,196 @@
+"""
+Benchmarks every munger stage on synthetic Takeout data.
+
+Examples:
+    python benchmarks/bench_munger.py --sizes 10000 100000 --output bench.json
+    python benchmarks/bench_munger.py --sizes 100000 --memory --compare bench.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from self_stats.munger import synthetic_data
+from self_stats.munger.input_output import save_to_csv, write_arrays_to_excel
+from self_stats.munger.process_dates import trim_date
+from self_stats.munger.parse_and_process import main as parse_and_process
+from self_stats.munger.add_date_columns import main as add_date_columns
+from self_stats.munger.impute_time_data import main as imputer
+from self_stats.munger.content_analysis import main as content_analysis
+from self_stats.munger.aggregate_data import main as aggregate_by_day
+from self_stats.munger.aggregate_data import remove_unique_entries, aggregate_activity_by_day
+from self_stats.munger.segment_activity import main as segment_activity
+
+SOURCES = {
+    'search': ('MyActivity.json', ['Date', 'Query_Text', 'Latitude', 'Longitude']),
+    'watch': ('watch-history.json', ['Date', 'Video_Title', 'Channel_Title', 'Video_URL']),
+}
+
+METADATA_COLUMNS = ['Activity_Window_Start_Date', 'Activity_Window_Start_Index', 'Activity_Window_End_Index',
+                    'Activity_Window_Duration', 'Actions_per_Activity_Window', 'Approximate_Actions_per_Minute']
+
+def measure(func: Callable, *args: Any, trace_memory: bool = False) -> Tuple[Any, Dict[str, float]]:
+    """
+    Runs a function once and measures wall time, CPU time and optionally the tracemalloc peak.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    result = func(*args)
+    stats = {'wall_s': time.perf_counter() - wall_start, 'cpu_s': time.process_time() - cpu_start}
+    if trace_memory:
+        stats['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, stats
+
+def ensure_dataset(data_dir: Path, source: str, size: int, seed: int) -> Path:
+    """
+    Generates (or reuses) a synthetic input file for one source and size.
+    """
+    directory = data_dir / f'{source}_{size}_s{seed}'
+    file_name = SOURCES[source][0]
+    if not (directory / file_name).exists():
+        synthetic_data.main(directory,
+                            search_size=size if source == 'search' else 0,
+                            watch_size=size if source == 'watch' else 0,
+                            seed=seed)
+    return directory
+
+def row_count(data: Any) -> Optional[int]:
+    """
+    Number of rows of a columnar tuple, or None when it cannot be determined.
+    """
+    if isinstance(data, tuple) and data and hasattr(data[0], '__len__'):
+        return len(data[0])
+    return None
+
+def run_pipeline(directory: Path, source: str, trace_memory: bool, skip: List[str]) -> List[Dict[str, Any]]:
+    """
+    Runs the munger stages in the same order as munger_main and records one measurement per stage.
+    """
+    file_name, base_mappings = SOURCES[source]
+    mappings = list(base_mappings)
+    out_dir = directory / 'bench_output'
+    out_dir.mkdir(exist_ok=True)
+    records = []
+
+    def stage(name: str, func: Callable, *args: Any, rows_in: Optional[int] = None) -> Any:
+        if name in skip:
+            records.append({'stage': name, 'skipped': True})
+            return None
+        result, stats = measure(func, *args, trace_memory=trace_memory)
+        records.append({'stage': name, 'rows_in': rows_in, 'rows_out': row_count(result), **stats})
+        return result
+
+    extracted = stage('parse_and_process', parse_and_process, directory, directory / file_name, mappings)
+    n_rows = row_count(extracted)
+    stage('segment_activity', segment_activity, extracted, mappings, rows_in=n_rows)
+    trimmed = stage('trim_date', trim_date, extracted, mappings, rows_in=n_rows)
+    mappings.extend(['Day_of_the_Week', 'Hour_of_the_Day', 'Date_Only'])
+    dated = stage('add_date_columns', add_date_columns, trimmed, rows_in=row_count(trimmed))
+    mappings.extend(['Search_Duration'] if source == 'search' else ['Video_Duration', 'Short_Form_Video'])
+    imputed, metadata = stage('imputer', imputer, dated, mappings, rows_in=row_count(dated))
+
+    analysed = stage('content_analysis', content_analysis, imputed, mappings, rows_in=row_count(imputed))
+    tokens_per_date = analysed[1] if analysed else (np.array([], dtype=object), np.array([], dtype=object))
+    keywords = stage('remove_unique_entries', remove_unique_entries, tokens_per_date, rows_in=row_count(tokens_per_date))
+    activity = stage('aggregate_activity_by_day', aggregate_activity_by_day, metadata, METADATA_COLUMNS, rows_in=row_count(metadata))
+    aggregated = stage('aggregate_by_day', aggregate_by_day, imputed, mappings, rows_in=row_count(imputed))
+
+    stage('save_to_csv', save_to_csv, imputed, out_dir / 'processed.csv', mappings, rows_in=row_count(imputed))
+    sheets = [aggregated, activity] + ([keywords] if keywords is not None else [])
+    column_names = [[f'Column_{i}' for i in range(len(sheet))] for sheet in sheets]
+    stage('write_arrays_to_excel', write_arrays_to_excel, sheets, column_names, [f'Sheet_{i}' for i in range(len(sheets))],
+          out_dir / 'aggregated.xlsx', rows_in=row_count(aggregated))
+    return records
+
+def compare(results: List[Dict[str, Any]], baseline_path: Path, tolerance: float) -> int:
+    """
+    Compares wall times against a previous results file and prints regressions.
+
+    Returns:
+        int: Number of stages slower than the baseline by more than the tolerance.
+    """
+    baseline = json.loads(baseline_path.read_text())['results']
+    previous = {(r['source'], r['size'], r['stage']): r for r in baseline if not r.get('skipped')}
+    regressions = 0
+    print(f"\n{'source':<8}{'size':>10}  {'stage':<28}{'before':>10}{'after':>10}{'ratio':>8}")
+    for record in results:
+        key = (record['source'], record['size'], record['stage'])
+        if record.get('skipped') or key not in previous:
+            continue
+        before, after = previous[key]['wall_s'], record['wall_s']
+        ratio = after / before if before else float('inf')
+        flag = '  REGRESSION' if ratio > 1 + tolerance else ''
+        regressions += bool(flag)
+        print(f"{key[0]:<8}{key[1]:>10}  {key[2]:<28}{before:>10.3f}{after:>10.3f}{ratio:>8.2f}{flag}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the munger stages on synthetic Takeout data.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000], help='Number of entries per source.')
+    parser.add_argument('--sources', nargs='+', choices=sorted(SOURCES), default=sorted(SOURCES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='Timing repetitions, the fastest run is kept.')
+    parser.add_argument('--memory', action='store_true', help='Run an extra pass with tracemalloc to record peak memory.')
+    parser.add_argument('--skip', nargs='*', default=[], help='Stages to skip, e.g. content_analysis.')
+    parser.add_argument('--data-dir', type=Path, help='Where to keep generated inputs, defaults to a temporary directory.')
+    parser.add_argument('--output', type=Path, help='Write results to this JSON file.')
+    parser.add_argument('--compare', type=Path, help='Previous results JSON to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown before flagging a regression.')
+    args = parser.parse_args(argv)
+
+    temporary = None if args.data_dir else tempfile.TemporaryDirectory()
+    data_dir = args.data_dir or Path(temporary.name)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for size in args.sizes:
+        for source in args.sources:
+            directory = ensure_dataset(data_dir, source, size, args.seed)
+            runs = [run_pipeline(directory, source, False, args.skip) for _ in range(args.repeat)]
+            fastest = [min(stage_runs, key=lambda r: r.get('wall_s', 0)) for stage_runs in zip(*runs)]
+            if args.memory:
+                peaks = run_pipeline(directory, source, True, args.skip)
+                for record, traced in zip(fastest, peaks):
+                    if 'peak_mb' in traced:
+                        record['peak_mb'] = traced['peak_mb']
+            for record in fastest:
+                record.update(source=source, size=size)
+                results.append(record)
+                if not record.get('skipped'):
+                    peak = f"{record['peak_mb']:>9.1f} MB" if 'peak_mb' in record else ''
+                    print(f"{source:<8}{size:>10}  {record['stage']:<28}{record['wall_s']:>9.3f} s{peak}")
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f'\nResults saved to {args.output}')
+
+    regressions = compare(results, args.compare, args.tolerance) if args.compare else 0
+    if temporary:
+        temporary.cleanup()
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Measures start-up time of the self_stats entry points and which heavy dependencies they import.
+
+Examples:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --output startup.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+HEAVY_MODULES = ['pandas', 'spacy', 'ruptures', 'tldextract', 'scipy']
+
+# Each scenario is a snippet run in a fresh interpreter; it prints the heavy modules it ended up importing
+SCENARIOS: Dict[str, str] = {
+    'import_entry_point': 'import self_stats.__main__',
+    'help': 'import sys; sys.argv = ["self_stats", "--help"]\n'
+            'import self_stats.__main__ as entry\n'
+            'try:\n    entry.main()\nexcept SystemExit:\n    pass',
+    'file_detection': 'from self_stats.munger.input_output import get_file_presence_flags\n'
+                      'get_file_presence_flags({directory!r})',
+    'processing_without_keywords': 'import self_stats.munger.munger_main',
+    'keyword_stack': 'from self_stats.munger.content_analysis import get_domain_extractor\n'
+                     'import spacy\nget_domain_extractor()',
+}
+
+REPORT_SNIPPET = '\nimport sys, json\nprint(json.dumps([m for m in {heavy!r} if m in sys.modules]))'
+
+def run_scenario(code: str, runs: int) -> Dict[str, object]:
+    """
+    Runs a snippet in fresh interpreters and returns its timings and the heavy modules it imported.
+    """
+    timings = []
+    imported: List[str] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-c', code + REPORT_SNIPPET.format(heavy=HEAVY_MODULES)],
+                                   cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        timings.append(time.perf_counter() - start)
+        imported = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {
+        'median_s': round(statistics.median(timings), 4),
+        'min_s': round(min(timings), 4),
+        'heavy_modules': imported,
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Measure self_stats start-up time.')
+    parser.add_argument('--runs', type=int, default=5, help='Number of fresh interpreters per scenario.')
+    parser.add_argument('--output', type=Path, help='Write results to this JSON file.')
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = run_scenario('pass', args.runs)
+        print(f"{'scenario':<30}{'median s':>10}{'over python':>13}  heavy modules")
+        for name, code in SCENARIOS.items():
+            result = run_scenario(code.format(directory=directory), args.runs)
+            result['over_interpreter_s'] = round(result['median_s'] - baseline['median_s'], 4)
+            results[name] = result
+            print(f"{name:<30}{result['median_s']:>10.3f}{result['over_interpreter_s']:>13.3f}  {', '.join(result['heavy_modules']) or '-'}")
+
+    if args.output:
+        args.output.write_text(json.dumps({'python': sys.version.split()[0], 'interpreter_s': baseline['median_s'], 'results': results}, indent=2))
+        print(f'\nResults saved to {args.output}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+import argparse
+import glob
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Exit codes, so scheduled jobs can tell a failed run from a misconfigured one
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+SOURCES = ('search', 'watch')
+# Copies of munger_main.OPTIONAL_STAGES and STAGE_VERSIONS, which are not imported here to keep start-up light;
+# tests/test_cli.py checks that they match
+OPTIONAL_STAGES = ('segment_activity', 'geo_binning', 'video_views', 'content_analysis', 'keyword_trends', 'inverted_index', 'aggregate', 'timeline')
+CACHED_STAGES = ('parse_and_process', 'segment_activity', 'trim_date', 'add_date_columns', 'imputer', 'geo_binning',
+                 'video_views', 'content_analysis', 'keyword_trends', 'inverted_index', 'aggregate')
+
+def expand_directories(patterns: List[str]) -> Tuple[List[Path], List[str]]:
+    """
+    Expands directory arguments, which may be plain paths or glob patterns, into existing directories.
+
+    Args:
+        patterns (List[str]): Directory paths or glob patterns as given on the command line.
+
+    Returns:
+        Tuple[List[Path], List[str]]: The unique directories in argument order, and an error message per
+        argument that did not resolve to any directory.
+    """
+    directories: List[Path] = []
+    errors = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        found = [Path(match) for match in matches if Path(match).is_dir()]
+        if not found:
+            errors.append(f"No directory matches '{pattern}'.")
+        for directory in found:
+            if directory not in directories:
+                directories.append(directory)
+    return directories, errors
+
+def add_processing_options(parser: argparse.ArgumentParser, inherit_defaults: bool = False) -> None:
+    """
+    Adds the options shared by the interactive mode and the process command.
+
+    The top-level parser holds the defaults. The process command adds the options with inherit_defaults, so
+    that it only sets the ones given after the command: its own defaults would replace the values given before
+    it, as in `self_stats --no-keywords process DIR`.
+    """
+    def default(value: Any) -> Any:
+        return argparse.SUPPRESS if inherit_defaults else value
+
+    parser.add_argument('--parse-workers', type=int, default=default(1), metavar='N',
+                        help='Number of processes used to parse very large input files (default: 1).')
+    parser.add_argument('--instrument', action='store_true', default=default(False),
+                        help='Record time, memory and row counts of every stage and save a run report.')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=default(None),
+                        help='Profile every stage with the chosen profiler (implies --instrument).')
+    parser.add_argument('--no-keywords', dest='keywords', action='store_false', default=default(True),
+                        help='Skip keyword and visited sites analysis (spaCy is not loaded).')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', default=default(True),
+                        help='Run every stage even if its inputs are unchanged, and do not save stage artifacts.')
+    parser.add_argument('--rerun', action='append', choices=CACHED_STAGES, default=default([]), metavar='STAGE',
+                        help='Run a stage again from the cached outputs of the stages before it, e.g. --rerun aggregate. '
+                             'Later stages run again too. May be given several times.')
+    parser.add_argument('--out-of-core', action='store_true', default=default(False),
+                        help='Process exports larger than memory in chunks spilled to disk (no stage caching).')
+    parser.add_argument('--chunk-size', type=int, default=default(50_000), metavar='N',
+                        help='Entries held in memory at a time with --out-of-core (default: 50000).')
+    parser.add_argument('--approximate-counts', type=float, default=default(None), metavar='EPSILON',
+                        help='Count keywords, channels and sites in fixed memory, overcounting by at most EPSILON times '
+                             'the number of values counted (e.g. 0.0001). Saves the most frequent values and the sketches.')
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the argument parser with its process, aggregate and serve subcommands.
+    """
+    parser = argparse.ArgumentParser(
+        prog='self_stats',
+        description='Process Google Takeout search and watch history. '
+                    'Without a command, asks for a single directory to process.')
+    parser.add_argument('--parallel', action='store_true',
+                        help='Process search and watch history at the same time in separate processes.')
+    add_processing_options(parser)
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+
+    process = subparsers.add_parser('process', help='Process one or more Takeout directories.',
+                                    description='Process one or more Takeout directories without prompting.')
+    process.add_argument('directories', nargs='+', metavar='DIR',
+                         help='Directories holding Takeout files. Glob patterns such as "exports/*" are expanded.')
+    process.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                         help='Number of worker processes shared by all directories and sources (default: 1).')
+    process.add_argument('--sources', nargs='+', choices=SOURCES, default=list(SOURCES),
+                         help='Sources to process when present (default: all).')
+    process.add_argument('--skip-stage', dest='skip_stages', action='append', choices=OPTIONAL_STAGES, default=[],
+                         help='Skip an optional stage. May be given several times.')
+    process.add_argument('-q', '--quiet', action='store_true', help='Only print the summary.')
+    add_processing_options(process, inherit_defaults=True)
+
+    aggregate = subparsers.add_parser('aggregate', help='Re-run the aggregation from previously processed data.',
+                                      description='Rebuild the aggregated CSV and Excel outputs from the full data '
+                                                  'of a previous process run, without re-parsing the Takeout files.')
+    aggregate.add_argument('directories', nargs='+', metavar='DIR',
+                           help='Previously processed directories. Glob patterns are expanded.')
+    aggregate.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                           help='Number of worker processes (default: 1).')
+    aggregate.add_argument('--sources', nargs='+', choices=SOURCES, default=list(SOURCES),
+                           help='Sources to aggregate when processed data exists (default: all).')
+    # Defaults are left to the top-level parser, as in add_processing_options
+    aggregate.add_argument('--instrument', action='store_true', default=argparse.SUPPRESS, help='Save and print a run report.')
+    aggregate.add_argument('--approximate-counts', type=float, default=argparse.SUPPRESS, metavar='EPSILON',
+                           help='Count keywords, channels and sites in fixed memory, merged with the sketches saved by '
+                                'an earlier run with the same EPSILON.')
+    aggregate.add_argument('-q', '--quiet', action='store_true', help='Only print the summary.')
+
+    serve = subparsers.add_parser('serve', help='Serve the output files of a processed directory over HTTP.')
+    serve.add_argument('directory', metavar='DIR', help='Processed directory; its output folder is served.')
+    serve.add_argument('--host', default='127.0.0.1', help='Address to bind to (default: 127.0.0.1).')
+    serve.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000).')
+    return parser
+
+def print_summary(results: List[Dict[str, Any]]) -> None:
+    """
+    Prints one line per job with its status and duration, followed by the totals.
+    """
+    if not results:
+        return
+    width = max(len(result['directory']) for result in results)
+    print(f"\n{'directory':<{width}}  {'source':<8}{'status':<9}{'seconds':>9}")
+    for result in sorted(results, key=lambda result: (result['directory'], result['source'])):
+        status = 'ok' if result['success'] else 'FAILED'
+        seconds = '-' if result.get('seconds') is None else f"{result['seconds']:.2f}"
+        print(f"{result['directory']:<{width}}  {result['source']:<8}{status:<9}{seconds:>9}")
+    failed = sum(not result['success'] for result in results)
+    print(f"\n{len(results)} job(s): {len(results) - failed} succeeded, {failed} failed.\n")
+
+def failed_result(directory: Path, source: str, message: str) -> Dict[str, Any]:
+    """
+    Builds a failed job result for a directory that could not be run.
+    """
+    return {'directory': str(directory), 'source': source, 'success': False, 'seconds': None, 'output': message}
+
+def collect_jobs(directories: List[Path], sources: List[str], action: str) -> Tuple[List[Tuple[str, Path, Path, List[str]]], List[Dict[str, Any]]]:
+    """
+    Builds the jobs of every directory and a failed result for each directory with nothing to run.
+
+    Args:
+        directories (List[Path]): Directories to run.
+        sources (List[str]): Sources to include.
+        action (str): 'process' looks for Takeout files, 'aggregate' for the full data of a previous run.
+
+    Returns:
+        Tuple[List[Tuple[str, Path, Path, List[str]]], List[Dict[str, Any]]]: The jobs and the failed results.
+    """
+    from self_stats.munger.input_output import get_file_presence_flags
+    from self_stats.munger.munger_main import get_output_paths
+    from self_stats.munger.run_sources import SOURCE_FILES, get_source_jobs
+
+    jobs = []
+    failures = []
+    for directory in directories:
+        if action == 'aggregate':
+            directory_jobs = [(source, directory, get_output_paths(directory, source)['processed'], list(SOURCE_FILES[source][1]))
+                              for source in sources if get_output_paths(directory, source)['processed'].exists()]
+            missing = 'No processed data found; run the process command first.'
+        else:
+            directory_jobs = [job for job in get_source_jobs(directory, get_file_presence_flags(directory)) if job[0] in sources]
+            missing = 'No Takeout files found.'
+        if not directory_jobs:
+            print(f"{directory}: {missing}")
+            failures.append(failed_result(directory, '-', missing))
+        jobs.extend(directory_jobs)
+    return jobs, failures
+
+def run_batch(args: argparse.Namespace, action: str) -> int:
+    """
+    Runs the process or aggregate command over every directory given on the command line.
+
+    Returns:
+        int: EXIT_OK when every job succeeded, EXIT_FAILED when any failed, EXIT_USAGE when there was nothing to run.
+    """
+    directories, errors = expand_directories(args.directories)
+    for error in errors:
+        print(error, file=sys.stderr)
+    if not directories:
+        return EXIT_USAGE
+
+    from self_stats.munger.run_sources import run_jobs, run_timelines
+    jobs, results = collect_jobs(directories, args.sources, action)
+    if not jobs:
+        print_summary(results)
+        return EXIT_USAGE
+
+    if action == 'aggregate':
+        options: Dict[str, Any] = {'instrument': args.instrument, 'approximate_counts': args.approximate_counts}
+    else:
+        options = {'parse_workers': args.parse_workers, 'instrument': args.instrument, 'profiler': args.profile,
+                   'keywords': args.keywords, 'skip_stages': tuple(args.skip_stages), 'cache': args.cache,
+                   'rerun': tuple(args.rerun), 'out_of_core': args.out_of_core, 'chunk_size': args.chunk_size,
+                   'approximate_counts': args.approximate_counts}
+    if not args.quiet:
+        print(f"Running {len(jobs)} job(s) from {len(directories)} director{'y' if len(directories) == 1 else 'ies'} with {max(args.jobs, 1)} worker(s)...\n")
+    results.extend(run_jobs(jobs, workers=args.jobs, quiet=args.quiet, action=action, **options))
+    # The unified timeline of a directory is built once all of its sources are processed; it is not a job of its own
+    timelines = run_timelines(jobs, results, quiet=args.quiet) if action == 'process' and 'timeline' not in args.skip_stages else []
+
+    for result in results + timelines:
+        if not result['success'] and args.quiet and result['output']:
+            print(f"================  {result['source']} history log ({result['directory']})  ================", file=sys.stderr)
+            print(result['output'], file=sys.stderr)
+    print_summary(results)
+    for timeline in timelines:
+        if not timeline['success']:
+            print(f"{timeline['directory']}: unified timeline failed.")
+    return EXIT_FAILED if errors or not all(result['success'] for result in results + timelines) else EXIT_OK
+
+def serve(args: argparse.Namespace) -> int:
+    """
+    Serves the output folder of a processed directory over HTTP until interrupted.
+    """
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    output_dir = Path(args.directory) / 'output'
+    if not output_dir.is_dir():
+        print(f"No output folder in '{args.directory}'; run the process command first.", file=sys.stderr)
+        return EXIT_USAGE
+    handler = partial(SimpleHTTPRequestHandler, directory=str(output_dir))
+    with ThreadingHTTPServer((args.host, args.port), handler) as server:
+        print(f"Serving {output_dir} at http://{args.host}:{server.server_address[1]}/ (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return EXIT_OK
+
+def interactive(args: argparse.Namespace) -> int:
+    """
+    Prompts for a single directory and processes it, as the original entry point did.
+    """
+    # Imported here so that --help and argument errors never load the processing stack
+    from self_stats.munger.input_output import get_file_presence_flags
+    from self_stats.munger.run_sources import get_source_jobs, run_sources, run_timeline
+
+    directory: str = input("Enter the directory path where your input data is held: ")
+    print(f"\nInitializing from directory: /{directory}\n")
+
+    # Using pathlib to construct the path
+    dir_path = Path(directory)
+
+    file_flags: dict = get_file_presence_flags(dir_path)
+
+    # Search history is processed first, then watch history, unless running in parallel
+    jobs = get_source_jobs(dir_path, file_flags)
+    results = run_sources(jobs, parallel=args.parallel, parse_workers=args.parse_workers,
+                          instrument=args.instrument, profiler=args.profile, keywords=args.keywords,
+                          cache=args.cache, rerun=tuple(args.rerun), out_of_core=args.out_of_core,
+                          chunk_size=args.chunk_size, approximate_counts=args.approximate_counts)
+    if len(results) > 1 and all(results.values()):
+        results['timeline'] = run_timeline(dir_path, [job[0] for job in jobs], capture=False)['success']
+
+    print(f"\n\n\n***********  All file processing completed!  ******************\n")
+    print(f"***********  Run through visualization instructions here  ************\n\n\n")
+    return EXIT_OK if all(results.values()) else EXIT_FAILED
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command line entry point.
+
+    Args:
+        argv (Optional[List[str]]): Arguments to parse, defaults to sys.argv.
+
+    Returns:
+        int: The process exit code.
+    """
+    args = build_parser().parse_args(argv)
+    if args.command == 'process':
+        return run_batch(args, 'process')
+    if args.command == 'aggregate':
+        return run_batch(args, 'aggregate')
+    if args.command == 'serve':
+        return serve(args)
+    return interactive(args)
@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
-from typing import Tuple, List
+from typing import Tuple, List, Optional
+
+from self_stats.munger.sketches import CountMinSketch, HeavyHitters
 
 def create_dataframe(datetime_array: np.ndarray, categorical_array: np.ndarray) -> pd.DataFrame:
     """
@@ -82,13 +84,19 @@ def prepare_output(date_series: pd.Series, counts: np.ndarray, weekday: pd.Serie
     date_strings = date_series.index.strftime('%Y-%m-%d').astype(str)
     return (date_strings, counts, weekday)
 
-def remove_unique_entries(data_tuple):
+def remove_unique_entries(data_tuple, sketch: Optional[CountMinSketch | HeavyHitters] = None, saved: Optional[HeavyHitters] = None):
     """
     Removes entries from both arrays in the tuple where the entry in the second array is unique.
     
     Parameters:
     - data_tuple (tuple): A tuple of two arrays. First array holds datetime information,
                           and the second array holds keywords.
+    - sketch (Optional[CountMinSketch | HeavyHitters]): Count the keywords approximately in this fixed-size
+      sketch (on top of what it already counted) instead of exactly. Sketches only overcount, so every
+      frequent keyword is kept, along with the rare ones whose estimate exceeds their count.
+    - saved (Optional[HeavyHitters]): The sketch saved by an earlier run, merged into sketch (a HeavyHitters) so
+      that only the rows added since are counted. If the rows dated up to its latest are not as many as it
+      counted, they changed since and every row is counted instead.
     
     Returns:
     - tuple: A tuple of two arrays with unique entries removed.
@@ -98,15 +106,30 @@ def remove_unique_entries(data_tuple):
 
     datetime_array = np.array(datetime_array)
     keyword_array = np.array(keyword_array)
-    
-    # Find all unique values and their counts in the keyword array
-    unique_keywords, counts = np.unique(keyword_array, return_counts=True)
-    
-    # Filter out keywords that occur less than  3 times
-    non_unique_keywords = unique_keywords[counts > 2]
-    
-    # Create a mask that is True for indices where the keyword is not unique
-    mask = np.isin(keyword_array, non_unique_keywords)
+
+    # Entries without a value (e.g. removed videos with no channel) cannot be counted
+    if keyword_array.dtype == object:
+        present = keyword_array != None
+        datetime_array = datetime_array[present]
+        keyword_array = keyword_array[present]
+    
+    if sketch is not None:
+        counted = saved.counted_rows(datetime_array) if saved is not None else None
+        if counted is not None and counted.sum() == saved.total:
+            sketch.merge(saved)
+            sketch.update(keyword_array[~counted])
+        else:
+            sketch.update(keyword_array)
+        mask = sketch.estimate(keyword_array) > 2
+    else:
+        # Find all unique values and their counts in the keyword array
+        unique_keywords, counts = np.unique(keyword_array, return_counts=True)
+
+        # Filter out keywords that occur less than  3 times
+        non_unique_keywords = unique_keywords[counts > 2]
+
+        # Create a mask that is True for indices where the keyword is not unique
+        mask = np.isin(keyword_array, non_unique_keywords)
     
     # Filter both arrays using the mask
     filtered_datetime_array = datetime_array[mask]
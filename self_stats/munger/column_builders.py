@@ -0,0 +1,162 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from self_stats.munger.process_dates import parse_timestamps
+
+# Column types of the data extracted from each source. Channels and video URLs repeat across views, so each of
+# their values is stored once; free text is kept as plain strings.
+SEARCH_SCHEMA = {
+    'Date': 'datetime',
+    'Query_Text': 'string',
+    'Latitude': 'float',
+    'Longitude': 'float',
+}
+WATCH_SCHEMA = {
+    'Date': 'datetime',
+    'Video_Title': 'string',
+    'Channel_Title': 'category',
+    'Video_URL': 'category',
+}
+
+# Entries read into a ColumnTable at a time by fill_entries
+FILL_BATCH_SIZE = 4096
+
+# Row objects for callers that need one object per entry: namedtuples have no per-instance __dict__, so a record
+# costs a single tuple rather than a dictionary of its fields
+SearchRecord = namedtuple('SearchRecord', list(SEARCH_SCHEMA))
+WatchRecord = namedtuple('WatchRecord', list(WATCH_SCHEMA))
+
+class ColumnBuilder(ABC):
+    """
+    A column of a fixed number of rows and a single type, allocated up front and filled in place.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+    @abstractmethod
+    def fill(self, values: Sequence[Any], start: int = 0) -> None:
+        """
+        Writes values into the rows starting at start.
+        """
+
+    @abstractmethod
+    def finish(self) -> np.ndarray:
+        """
+        Returns the column as the array passed between stages.
+        """
+
+class FloatColumn(ColumnBuilder):
+    """
+    float64 column, NaN where there is no value.
+    """
+
+    def __init__(self, size: int) -> None:
+        super().__init__(size)
+        self.values = np.full(size, np.nan)
+
+    def fill(self, values: Sequence[Any], start: int = 0) -> None:
+        # None becomes NaN
+        self.values[start:start + len(values)] = np.asarray(values, dtype=float)
+
+    def finish(self) -> np.ndarray:
+        return self.values
+
+class DatetimeColumn(ColumnBuilder):
+    """
+    datetime64[us] column in UTC, NaT where there is no value or it cannot be parsed.
+    """
+
+    def __init__(self, size: int) -> None:
+        super().__init__(size)
+        self.values = np.full(size, np.datetime64('NaT'), dtype='datetime64[us]')
+
+    def fill(self, values: Sequence[Any], start: int = 0) -> None:
+        """
+        Writes ISO 8601 timestamp strings, see process_dates.parse_timestamps.
+        """
+        self.values[start:start + len(values)] = parse_timestamps(values)
+
+    def finish(self) -> np.ndarray:
+        return self.values
+
+class StringColumn(ColumnBuilder):
+    """
+    Object column of strings, None where there is no value.
+    """
+
+    def __init__(self, size: int) -> None:
+        super().__init__(size)
+        self.values = np.full(size, None, dtype=object)
+
+    def fill(self, values: Sequence[Any], start: int = 0) -> None:
+        self.values[start:start + len(values)] = values
+
+    def finish(self) -> np.ndarray:
+        return self.values
+
+class CategoryColumn(StringColumn):
+    """
+    Object column of strings that repeat across rows, None where there is no value. Every row of a value holds
+    the string object of its first appearance, so a value is stored once however many rows repeat it.
+    """
+
+    def __init__(self, size: int) -> None:
+        super().__init__(size)
+        self.lookup: Dict[str, str] = {}
+
+    def fill(self, values: Sequence[Any], start: int = 0) -> None:
+        lookup = self.lookup
+        # setdefault keeps the first string object of each value
+        self.values[start:start + len(values)] = [None if value is None else lookup.setdefault(value, value) for value in values]
+
+COLUMN_BUILDERS = {
+    'float': FloatColumn,
+    'datetime': DatetimeColumn,
+    'string': StringColumn,
+    'category': CategoryColumn,
+}
+
+class ColumnTable:
+    """
+    The column builders of one schema, all sized for the same number of rows.
+    """
+
+    def __init__(self, schema: Dict[str, str], size: int) -> None:
+        self.schema = schema
+        self.size = size
+        self.builders = {name: COLUMN_BUILDERS[kind](size) for name, kind in schema.items()}
+
+    def __getitem__(self, name: str) -> ColumnBuilder:
+        return self.builders[name]
+
+    def fill(self, columns: Dict[str, Sequence[Any]], start: int = 0) -> None:
+        """
+        Writes several columns at once, keyed by name.
+        """
+        for name, values in columns.items():
+            self.builders[name].fill(values, start)
+
+    def fill_entries(self, entries: Sequence[Any], fields: Callable[[Sequence[Any]], Dict[str, Sequence[Any]]],
+                     batch_size: int = FILL_BATCH_SIZE) -> None:
+        """
+        Reads entries into the columns one batch at a time: fields turns a batch into the values of each column,
+        so only the values of one batch are ever held as Python lists.
+        """
+        for start in range(0, len(entries), batch_size):
+            self.fill(fields(entries[start:start + batch_size]), start)
+
+    def finish(self, mappings: Iterable[str]) -> Tuple[np.ndarray, ...]:
+        """
+        Returns the columns named by mappings, in that order.
+
+        Raises:
+            ValueError: If a name is not a column of the schema.
+        """
+        mappings: List[str] = list(mappings)
+        unknown = [name for name in mappings if name not in self.builders]
+        if unknown:
+            raise ValueError(f"Columns {unknown} are not extracted. Available columns are {list(self.schema)}.")
+        return tuple(self.builders[name].finish() for name in mappings)
@@ -1,9 +1,7 @@
 import numpy as np
 import re
 from urllib.parse import urlparse
-import tldextract
-from typing import Any, List, Tuple
-import spacy
+from typing import Any, Dict, List, Tuple
 from datetime import datetime
 
 ################# Search Queries #################
@@ -121,6 +119,20 @@ def extract_visited_sites(data: np.ndarray, dates: np.ndarray) -> Tuple[np.ndarr
     sites = np.char.replace(first_filter, "\"Visited ", "", count=1)
     return sites, filtered_dates
 
+# tldextract is slow to import and may refresh its suffix list, so it is only imported
+# once site extraction actually runs.
+_domain_extractor = None
+
+def get_domain_extractor() -> Any:
+    """
+    Returns a shared tldextract extractor, importing tldextract on first use.
+    """
+    global _domain_extractor
+    if _domain_extractor is None:
+        import tldextract
+        _domain_extractor = tldextract.TLDExtract()
+    return _domain_extractor
+
 def extract_homepage_from_url(url):
     """
     Extracts the homepage name from a given URL, using urlparse and tldextract for accurate domain extraction.
@@ -132,7 +144,7 @@ def extract_homepage_from_url(url):
         str: The homepage name including the top-level domain, but without the scheme or 'www.' prefix.
     """
     # Using tldextract to get more accurate domain extraction
-    extracted = tldextract.extract(url)
+    extracted = get_domain_extractor()(url)
     domain = f"{extracted.domain}.{extracted.suffix}"
     return domain
 
@@ -195,30 +207,51 @@ def compile_homepage_names(texts: np.ndarray, dates: np.ndarray) -> np.ndarray:
 
 ################# Main Function #################
 
-def main(arr_data: Tuple[np.ndarray, ...], mappings: List[str]) -> Tuple[np.ndarray, ...]:
-    nlp = spacy.load("en_core_web_sm")
+# spaCy models already loaded in this process, keyed by model name
+_nlp_models: Dict[str, Any] = {}
+
+def load_nlp(model_name: str = "en_core_web_sm") -> Any:
+    """
+    Loads a spaCy model once per process and returns the cached instance on later calls.
+    spaCy itself is only imported here, so runs without keyword analysis never pay for it.
+
+    Args:
+        model_name (str): Name of the installed spaCy model.
+
+    Returns:
+        Any: The loaded spaCy language pipeline.
+    """
+    if model_name not in _nlp_models:
+        import spacy
+        _nlp_models[model_name] = spacy.load(model_name)
+    return _nlp_models[model_name]
+
+def main(arr_data: Tuple[np.ndarray, ...], mappings: List[str], return_rows: bool = False) -> Tuple[np.ndarray, ...]:
+    nlp = load_nlp()
 
     search = True if mappings[1] == 'Query_Text' else False
     text_array = arr_data[1].astype(str)
     date_array = arr_data[0]
+    # Texts are extracted along with their row numbers, which give both their dates and their rows in the inverted index
+    row_array = np.arange(len(text_array))
 
     if search:
         visited_sites, paired_dates_with_sites = extract_visited_sites(text_array, date_array)
         trimed_sites, paired_dates_with_sites_trimmed = compile_homepage_names(visited_sites, paired_dates_with_sites)
 
-        search_queries, paired_dates_with_text = extract_search_queries(text_array, date_array)
-        tokens_list, paired_dates_with_text_tokens = process_texts(search_queries, paired_dates_with_text, nlp)
-
-        tokens_list_split, pair_dates_with_text_split = propagate_dates(paired_dates_with_text_tokens, tokens_list)
-        
-        return (paired_dates_with_sites_trimmed, trimed_sites), (pair_dates_with_text_split, tokens_list_split)
+        search_queries, paired_rows_with_text = extract_search_queries(text_array, row_array)
     else:
-        visited_sites = None
-        paired_dates_with_sites = None
+        trimed_sites = None
+        paired_dates_with_sites_trimmed = None
+
+        search_queries, paired_rows_with_text = extract_video_titles(text_array, row_array)
+
+    tokens_list, paired_rows_with_text_tokens = process_texts(search_queries, paired_rows_with_text, nlp)
+    paired_dates_with_text_tokens = date_array[np.array(paired_rows_with_text_tokens, dtype=np.intp)]
 
-        search_queries, paired_dates_with_text = extract_video_titles(text_array, date_array)
-        tokens_list, paired_dates_with_text_tokens = process_texts(search_queries, paired_dates_with_text, nlp)
+    tokens_list_split, pair_dates_with_text_split = propagate_dates(paired_dates_with_text_tokens, tokens_list)
 
-        tokens_list_split, pair_dates_with_text_split = propagate_dates(paired_dates_with_text_tokens, tokens_list)
-        
-        return (paired_dates_with_sites, visited_sites), (pair_dates_with_text_split, tokens_list_split)
+    if return_rows:
+        _, pair_rows_with_text_split = propagate_dates(paired_rows_with_text_tokens, tokens_list)
+        return (paired_dates_with_sites_trimmed, trimed_sites), (pair_dates_with_text_split, tokens_list_split), (pair_rows_with_text_split.astype(np.int64),)
+    return (paired_dates_with_sites_trimmed, trimed_sites), (pair_dates_with_text_split, tokens_list_split)
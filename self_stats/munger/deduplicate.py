@@ -0,0 +1,148 @@
+import heapq
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from self_stats.munger.sketches import hash_strings
+
+# Fields identifying a Takeout entry: the same event exported twice has the same time, title and URL
+DEDUP_FIELDS = ('time', 'title', 'titleUrl')
+
+_OLDEST = datetime.min.replace(tzinfo=timezone.utc)
+
+def entry_hashes(entries: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """
+    Hashes the (time, title, URL) of each entry into 8 bytes.
+
+    Args:
+        entries (Sequence[Dict[str, Any]]): Raw Takeout entries.
+
+    Returns:
+        np.ndarray: uint64 hash of each entry.
+    """
+    return hash_strings('\x1f'.join(str(entry.get(field, '')) for field in DEDUP_FIELDS) for entry in entries)
+
+def entry_time(entry: Dict[str, Any]) -> datetime:
+    """
+    Returns the timestamp of a raw entry for ordering, with entries without a valid time sorting last.
+    """
+    try:
+        return datetime.fromisoformat(entry['time'].replace('Z', '+00:00'))
+    except (KeyError, AttributeError, ValueError):
+        return _OLDEST
+
+def merge_entry_streams(streams: Sequence[Iterable[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """
+    Merges several newest-first streams of entries (e.g. overlapping exports) into one newest-first stream.
+
+    Only the head of each stream is held in memory. A single stream is passed through untouched.
+
+    Args:
+        streams (Sequence[Iterable[Dict[str, Any]]]): Entry streams, each ordered newest first as exported.
+
+    Returns:
+        Iterator[Dict[str, Any]]: The entries of every stream, newest first.
+    """
+    if len(streams) == 1:
+        return iter(streams[0])
+    return heapq.merge(*streams, key=entry_time, reverse=True)
+
+class HashIndex:
+    """
+    Index of the 8-byte hashes of every entry already ingested, used to drop duplicate entries.
+
+    The hashes are kept as a few sorted runs whose sizes more than double from the newest to the oldest. A batch
+    of new hashes becomes a run of its own, merged into the run before it only once it is at least half as large,
+    so a batch is checked with one binary search per run (at most log2 of the number of batches) and
+    every hash is merged O(log N) times, instead of the whole index being copied for each batch.
+
+    The index is saved next to the outputs along with the fingerprints of the inputs it holds (inputs) and a
+    description of the output it was built with (meta), so that a later run over the same inputs plus new ones
+    only reads, hashes and checks the entries of the new ones, see parse_and_process.main.
+    """
+
+    def __init__(self, hashes: Optional[np.ndarray] = None, inputs: Sequence[str] = (), meta: Optional[Dict[str, Any]] = None) -> None:
+        self.runs: List[np.ndarray] = [np.unique(np.asarray(hashes, dtype=np.uint64))] if hashes is not None else []
+        self.inputs = list(inputs)
+        self.meta = dict(meta or {})
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self.runs)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['HashIndex']:
+        """
+        Loads a saved index, or returns None if the file is missing or unreadable.
+        """
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                meta = json.loads(arrays['meta'].tobytes().decode('utf-8'))
+                return cls(arrays['hashes'], arrays['inputs'].tolist(), meta)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, path: Path) -> None:
+        """
+        Saves the index, replacing the previous file only once the new one is fully written.
+        """
+        temporary_path = Path(path).with_name(Path(path).name + '.tmp')
+        with open(temporary_path, 'wb') as file:
+            np.savez(file, hashes=self.hashes, inputs=np.array(self.inputs, dtype=str),
+                     meta=np.frombuffer(json.dumps(self.meta).encode('utf-8'), dtype=np.uint8))
+        os.replace(temporary_path, path)
+
+    @property
+    def hashes(self) -> np.ndarray:
+        """
+        All hashes of the index in one sorted array, merging its runs.
+        """
+        if len(self.runs) != 1:
+            self.runs = [np.sort(np.concatenate(self.runs), kind='stable') if self.runs else np.array([], dtype=np.uint64)]
+        return self.runs[0]
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Returns a mask of the hashes already in the index.
+        """
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            positions = np.searchsorted(run, hashes)
+            in_run = positions < len(run)
+            in_run[in_run] = run[positions[in_run]] == hashes[in_run]
+            found |= in_run
+        return found
+
+    def add(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Adds a batch of hashes and returns a mask of those that were new: not in the index and not repeated
+        earlier in the batch.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        new = ~self.contains(hashes)
+        _, first = np.unique(hashes, return_index=True)
+        first_occurrence = np.zeros(len(hashes), dtype=bool)
+        first_occurrence[first] = True
+        new &= first_occurrence
+
+        if new.any():
+            self.runs.append(np.sort(hashes[new]))
+        # The stable sort of two sorted runs laid end to end is a single linear merge
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            newest = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate((self.runs[-1], newest)), kind='stable')
+        self.dropped += int(len(hashes) - new.sum())
+        return new
+
+    def deduplicate(self, batches: Iterable[List[Dict[str, Any]]]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Filters a stream of entry batches, dropping every entry already seen. The count of dropped entries is
+        kept in self.dropped.
+        """
+        for batch in batches:
+            new = self.add(entry_hashes(batch))
+            yield batch if new.all() else [entry for entry, keep in zip(batch, new.tolist()) if keep]
@@ -0,0 +1,191 @@
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+GEOHASH_ALPHABET = np.frombuffer(b'0123456789bcdefghjkmnpqrstuvwxyz', dtype=np.uint8)
+
+# Roughly 156 km, 4.9 km and 153 m wide cells: country, city and neighbourhood level views
+DEFAULT_PRECISIONS = (3, 5, 7)
+
+GEO_CELL_COLUMNS = ['Date', 'Precision', 'Geohash', 'Count', 'Center_Latitude', 'Center_Longitude']
+
+def _bit_split(precision: int) -> Tuple[int, int]:
+    """
+    Returns the number of longitude and latitude bits of a geohash with the given number of characters.
+    """
+    if not 1 <= precision <= 12:
+        raise ValueError(f"Geohash precision must be between 1 and 12, got {precision}.")
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+def quantize(values: np.ndarray, low: float, high: float, bits: int) -> np.ndarray:
+    """
+    Maps values in [low, high] to integer cell indices in [0, 2**bits).
+    """
+    scaled = np.floor((values - low) / (high - low) * (1 << bits))
+    return np.clip(scaled, 0, (1 << bits) - 1).astype(np.uint64)
+
+def encode_cells(latitudes: np.ndarray, longitudes: np.ndarray, precision: int) -> np.ndarray:
+    """
+    Computes the integer geohash of every coordinate, with longitude and latitude bits interleaved.
+
+    Args:
+        latitudes (np.ndarray): Latitudes in degrees, without NaN.
+        longitudes (np.ndarray): Longitudes in degrees, without NaN.
+        precision (int): Number of geohash characters (5 bits each).
+
+    Returns:
+        np.ndarray: uint64 cell codes; coordinates in the same cell share a code, and a cell's code
+        shifted right by 5 bits is the code of its parent cell.
+    """
+    lon_bits, lat_bits = _bit_split(precision)
+    lon_index = quantize(longitudes, -180.0, 180.0, lon_bits)
+    lat_index = quantize(latitudes, -90.0, 90.0, lat_bits)
+
+    codes = np.zeros(len(lon_index), dtype=np.uint64)
+    # Geohash bits alternate longitude, latitude, ... starting with the most significant longitude bit
+    for i in range(lon_bits + lat_bits):
+        if i % 2 == 0:
+            bit = (lon_index >> np.uint64(lon_bits - 1 - i // 2)) & np.uint64(1)
+        else:
+            bit = (lat_index >> np.uint64(lat_bits - 1 - i // 2)) & np.uint64(1)
+        codes = (codes << np.uint64(1)) | bit
+    return codes
+
+def cells_to_geohash(codes: np.ndarray, precision: int) -> np.ndarray:
+    """
+    Converts integer cell codes into geohash strings.
+    """
+    characters = np.empty((len(codes), precision), dtype=np.uint8)
+    for position in range(precision):
+        shift = np.uint64(5 * (precision - 1 - position))
+        characters[:, position] = GEOHASH_ALPHABET[((codes >> shift) & np.uint64(31)).astype(np.intp)]
+    return characters.view(f'S{precision}').ravel().astype(str)
+
+def cell_centers(codes: np.ndarray, precision: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the latitude and longitude of the centre of each cell.
+    """
+    lon_bits, lat_bits = _bit_split(precision)
+    lon_index = np.zeros(len(codes), dtype=np.uint64)
+    lat_index = np.zeros(len(codes), dtype=np.uint64)
+    for i in range(lon_bits + lat_bits):
+        bit = (codes >> np.uint64(lon_bits + lat_bits - 1 - i)) & np.uint64(1)
+        if i % 2 == 0:
+            lon_index = (lon_index << np.uint64(1)) | bit
+        else:
+            lat_index = (lat_index << np.uint64(1)) | bit
+    latitudes = -90.0 + (lat_index.astype(float) + 0.5) * 180.0 / (1 << lat_bits)
+    longitudes = -180.0 + (lon_index.astype(float) + 0.5) * 360.0 / (1 << lon_bits)
+    return latitudes, longitudes
+
+def encode_geohash(latitudes: np.ndarray, longitudes: np.ndarray, precision: int) -> np.ndarray:
+    """
+    Encodes coordinates as geohash strings of the given precision.
+
+    Args:
+        latitudes (np.ndarray): Latitudes in degrees, without NaN.
+        longitudes (np.ndarray): Longitudes in degrees, without NaN.
+        precision (int): Number of geohash characters.
+
+    Returns:
+        np.ndarray: Geohash strings.
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    return cells_to_geohash(encode_cells(latitudes, longitudes, precision), precision)
+
+def count_cells_per_day(days: np.ndarray, codes: np.ndarray, weights: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Counts rows per (day, cell) pair with one sort instead of a dictionary of counters.
+
+    Args:
+        days (np.ndarray): Day of each row as int64 day numbers.
+        codes (np.ndarray): Cell code of each row.
+        weights (Optional[np.ndarray]): Count carried by each row, e.g. to merge partial counts of several chunks.
+            Defaults to one per row.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Day, cell code and count of each pair, sorted by day then cell.
+    """
+    if len(days) == 0:
+        return days[:0], codes[:0], np.array([], dtype=np.int64)
+    order = np.lexsort((codes, days))
+    days, codes = days[order], codes[order]
+    starts = np.flatnonzero(np.concatenate(([True], (days[1:] != days[:-1]) | (codes[1:] != codes[:-1]))))
+    if weights is None:
+        counts = np.diff(np.append(starts, len(days)))
+    else:
+        counts = np.add.reduceat(np.asarray(weights, dtype=np.int64)[order], starts)
+    return days[starts], codes[starts], counts
+
+def cell_table(cell_days: np.ndarray, codes: np.ndarray, counts: np.ndarray, precision: int) -> Tuple[np.ndarray, ...]:
+    """
+    Formats the per-day cell counts of one precision as the columns named by GEO_CELL_COLUMNS.
+    """
+    center_latitudes, center_longitudes = cell_centers(codes, precision)
+    return (
+        np.datetime_as_string(cell_days.astype('datetime64[D]'), unit='D'),
+        np.full(len(codes), precision, dtype=np.int64),
+        cells_to_geohash(codes, precision),
+        counts,
+        np.round(center_latitudes, 6),
+        np.round(center_longitudes, 6),
+    )
+
+def concatenate_tables(tables: List[Tuple[np.ndarray, ...]]) -> Tuple[np.ndarray, ...]:
+    """
+    Stacks the cell tables of several precisions into one table.
+    """
+    if not tables:
+        return tuple(np.array([], dtype=object) for _ in GEO_CELL_COLUMNS)
+    return tuple(np.concatenate(columns) for columns in zip(*tables))
+
+def valid_coordinates(dates: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Drops rows without coordinates and returns the day number, latitude and longitude of the others.
+    """
+    latitudes = np.array(latitudes, dtype=float)
+    longitudes = np.array(longitudes, dtype=float)
+    valid = ~(np.isnan(latitudes) | np.isnan(longitudes))
+    days = np.array(dates[valid], dtype='datetime64[D]').astype(np.int64)
+    return days, latitudes[valid], longitudes[valid]
+
+def bin_coordinates(dates: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray,
+                    precisions: Sequence[int] = DEFAULT_PRECISIONS) -> Tuple[np.ndarray, ...]:
+    """
+    Bins coordinates into geohash cells at several precisions, with a count per cell per day.
+
+    Args:
+        dates (np.ndarray): Datetime of each row.
+        latitudes (np.ndarray): Latitude of each row, NaN or None where unknown.
+        longitudes (np.ndarray): Longitude of each row, NaN or None where unknown.
+        precisions (Sequence[int]): Geohash lengths to bin at.
+
+    Returns:
+        Tuple[np.ndarray, ...]: Columns named by GEO_CELL_COLUMNS: day ('YYYY-MM-DD'), precision, geohash,
+        count and the centre of the cell.
+    """
+    days, latitudes, longitudes = valid_coordinates(dates, latitudes, longitudes)
+
+    tables: List[Tuple[np.ndarray, ...]] = []
+    for precision in precisions:
+        cell_days, codes, counts = count_cells_per_day(days, encode_cells(latitudes, longitudes, precision))
+        tables.append(cell_table(cell_days, codes, counts, precision))
+    return concatenate_tables(tables)
+
+def main(arr_data: Tuple[np.ndarray, ...], mappings: List[str], precisions: Sequence[int] = DEFAULT_PRECISIONS) -> Tuple[np.ndarray, ...]:
+    """
+    Builds the geohash cell table of a dataset with Latitude and Longitude columns.
+
+    Args:
+        arr_data (Tuple[np.ndarray, ...]): Input data tuple, each ndarray representing a column.
+        mappings (List[str]): List indicating what each column represents.
+        precisions (Sequence[int]): Geohash lengths to bin at.
+
+    Returns:
+        Tuple[np.ndarray, ...]: Columns named by GEO_CELL_COLUMNS, empty if the data has no coordinates.
+    """
+    if 'Latitude' not in mappings or 'Longitude' not in mappings:
+        return tuple(np.array([], dtype=object) for _ in GEO_CELL_COLUMNS)
+    return bin_coordinates(arr_data[mappings.index('Date')], arr_data[mappings.index('Latitude')],
+                           arr_data[mappings.index('Longitude')], precisions)
@@ -1,12 +1,19 @@
 import csv
+import io
 import json
+import os
+import tarfile
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 import numpy as np
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 from pathlib import Path
 from typing import List
-import pandas as pd
 
 def create_output_directories(directories: List[Path]) -> None:
     """
@@ -33,20 +40,281 @@ def create_output_directories(directories: List[Path]) -> None:
         print("\n")  # Add a newline for better formatting at the end
 
 
+# Takeout is downloaded as .zip or .tgz archives, split into several parts for large exports
+ARCHIVE_SUFFIXES = ('.zip', '.tgz', '.tar.gz')
+
+def is_archive(path: Path) -> bool:
+    """
+    Returns whether a path names a Takeout archive file.
+    """
+    return Path(path).name.lower().endswith(ARCHIVE_SUFFIXES) and Path(path).is_file()
+
+def list_archives(directory: Path) -> List[Path]:
+    """
+    Lists the archives in a directory, in name order (for Takeout, the order of export date and part number).
+    """
+    return sorted(path for path in Path(directory).iterdir() if is_archive(path))
+
+# Tar archives kept open by open_tar, keyed by process, path, modification time and size; least recently used first
+TAR_CACHE_SIZE = 4
+_open_tars: 'OrderedDict[Tuple[int, Path, int, int], tarfile.TarFile]' = OrderedDict()
+# Archive listings kept by list_archive_members
+ARCHIVE_LISTING_CACHE_SIZE = 32
+
+def open_tar(archive: Path) -> tarfile.TarFile:
+    """
+    Returns the open .tar(.gz) archive shared by the listing and the reading of its members.
+
+    Compressed tar archives have no index. Their member headers are read as they are needed and kept on the open
+    archive: a listing reads it to the end once, and a member is read by decompressing the archive up to it. An
+    archive that changed is opened again. Only the TAR_CACHE_SIZE most recently used archives are kept; members
+    still being read keep theirs open until they are closed.
+
+    A forked worker process inherits the archives of its parent along with their file offsets, which the two
+    processes would then move under each other, so each process opens its own and drops those of its parent.
+    """
+    stat = Path(archive).stat()
+    process = os.getpid()
+    key = (process, Path(archive).resolve(), stat.st_mtime_ns, stat.st_size)
+    tar = _open_tars.get(key)
+    if tar is not None:
+        _open_tars.move_to_end(key)
+        return tar
+    for inherited in [cached for cached in _open_tars if cached[0] != process]:
+        del _open_tars[inherited]
+    tar = tarfile.open(key[1], 'r:*')
+    _open_tars[key] = tar
+    if len(_open_tars) > TAR_CACHE_SIZE:
+        _open_tars.popitem(last=False)
+    return tar
+
+@lru_cache(maxsize=ARCHIVE_LISTING_CACHE_SIZE)
+def _archive_members(archive: Path, modified: int, size: int) -> Tuple[str, ...]:
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zipped:
+            return tuple(info.filename for info in zipped.infolist() if not info.is_dir())
+    return tuple(member.name for member in open_tar(archive) if member.isfile())
+
+def list_archive_members(archive: Path) -> Tuple[str, ...]:
+    """
+    Lists the regular files inside a .zip or .tar(.gz) archive. Listings are cached until the archive changes.
+    """
+    stat = Path(archive).stat()
+    return _archive_members(Path(archive).resolve(), stat.st_mtime_ns, stat.st_size)
+
+def split_archive_path(path: Path) -> Optional[Tuple[Path, str]]:
+    """
+    Splits a path that points inside an archive, e.g. takeout-001.zip/Takeout/YouTube/history/watch-history.json,
+    into the archive and the member name.
+
+    Returns:
+        Optional[Tuple[Path, str]]: The archive and member, or None for a plain file path.
+    """
+    path = Path(path)
+    for archive in path.parents:
+        if archive.name.lower().endswith(ARCHIVE_SUFFIXES) and archive.is_file():
+            return archive, path.relative_to(archive).as_posix()
+    return None
+
+def find_input_file(directory: Path, file_name: str) -> Optional[Path]:
+    """
+    Locates a Takeout file in a directory, either extracted or still inside one of the directory's archives.
+
+    An extracted file takes precedence. Otherwise the archives are searched for a member with that file name;
+    when several archives hold one (e.g. two exports of the same account), the last in name order is used,
+    which for Takeout's timestamped archive names is the most recent export.
+
+    Args:
+        directory (Path): Directory holding the extracted files or the archives.
+        file_name (str): File name to look for, e.g. 'watch-history.json'.
+
+    Returns:
+        Optional[Path]: The file path, a path inside an archive (see split_archive_path), or None if not found.
+    """
+    found = find_input_files(directory, file_name)
+    return found[-1] if found else None
+
+def find_input_files(directory: Path, file_name: str) -> List[Path]:
+    """
+    Locates every copy of a Takeout file in a directory, e.g. the watch history of each of several overlapping
+    exports of the same account.
+
+    An extracted file takes precedence over the archives, as in find_input_file. Otherwise the member found in
+    each archive is returned, in archive name order.
+
+    Args:
+        directory (Path): Directory holding the extracted files or the archives.
+        file_name (str): File name to look for, e.g. 'watch-history.json'.
+
+    Returns:
+        List[Path]: The file paths or paths inside archives, empty if not found.
+    """
+    path = Path(directory) / file_name
+    if path.exists():
+        return [path]
+    found = []
+    for archive in list_archives(directory):
+        members = [member for member in list_archive_members(archive) if member.rsplit('/', 1)[-1] == file_name]
+        if members:
+            found.append(archive / min(members, key=len))
+    return found
+
+def as_input_files(input_files: Path | Sequence[Path]) -> List[Path]:
+    """
+    Returns the input of a pipeline run, a single file or a list of copies from overlapping exports, as a list.
+    """
+    if isinstance(input_files, (str, Path)):
+        return [Path(input_files)]
+    return [Path(path) for path in input_files]
+
+@contextmanager
+def open_input_file(file_path: Path, binary: bool = False) -> Iterator[IO]:
+    """
+    Opens an input file for reading, streaming it straight out of its archive when the path points inside one.
+
+    Args:
+        file_path (Path): A file path, or a path inside an archive as returned by find_input_file.
+        binary (bool): Open in binary mode instead of UTF-8 text.
+
+    Yields:
+        IO: The open file.
+
+    Raises:
+        FileNotFoundError: If the archive has no such member.
+    """
+    split = split_archive_path(file_path)
+    if split is None:
+        with open(file_path, 'rb' if binary else 'r', **({} if binary else {'encoding': 'utf-8'})) as file:
+            yield file
+        return
+
+    archive, member = split
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zipped:
+            try:
+                stream = zipped.open(member)
+            except KeyError:
+                raise FileNotFoundError(f"No member {member} in {archive}.") from None
+            with stream:
+                yield stream if binary else io.TextIOWrapper(stream, encoding='utf-8')
+        return
+
+    # Headers not listed yet are read up to the member, which is then read on from there
+    tar = open_tar(archive)
+    for info in tar:
+        if info.name == member and info.isfile():
+            with tar.extractfile(info) as stream:
+                yield stream if binary else io.TextIOWrapper(stream, encoding='utf-8')
+            return
+    raise FileNotFoundError(f"No member {member} in {archive}.")
+
+def describe_input_file(file_path: Path) -> str:
+    """
+    Returns a cheap identifier of an archive member's content, so that it can be fingerprinted without
+    decompressing it. Zip members are described by the size, CRC and modification time in the archive's
+    central directory. Compressed tar archives have no directory to read them from, so their members are
+    described by the archive's own size and modification time. Returns an empty string for plain files.
+    """
+    split = split_archive_path(file_path)
+    if split is None:
+        return ''
+    archive, member = split
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zipped:
+            info = zipped.getinfo(member)
+            return f"zip:{member}:{info.file_size}:{info.CRC}:{info.date_time}"
+    stat = archive.stat()
+    return f"tar:{member}:{stat.st_size}:{stat.st_mtime_ns}"
+
 def read_json_file(file_path: Path) -> List[Dict[str, Any]]:
     """
     Loads JSON data from a specified file.
 
     Args:
-        file_path (str): The path to the JSON file.
+        file_path (str): The path to the JSON file, which may point inside a Takeout archive.
 
     Returns:
         List[Dict[str, Any]]: A list of dictionaries containing JSON data.
     """
-    with open(file_path, 'r') as file:
+    with open_input_file(file_path) as file:
         return json.load(file)
 
-def save_to_csv(data: Tuple[np.ndarray, ...], filepath: str | Path, mappings: List[str]) -> None:
+def iter_json_array(file: Any, buffer_size: int = 2**20) -> Iterator[Any]:
+    """
+    Yields the elements of a top-level JSON array one at a time, without loading the whole document.
+
+    The file is read in blocks and each element is decoded as soon as it is complete, so memory use is
+    bounded by the block size and the largest single element rather than the size of the file.
+
+    Args:
+        file (Any): Path of the JSON file (which may point inside a Takeout archive), or a text file object
+            opened for reading.
+        buffer_size (int): Number of characters read at a time.
+
+    Yields:
+        Any: Each element of the array, decoded as by json.load.
+
+    Raises:
+        ValueError: If the document is not a JSON array or is truncated.
+    """
+    if isinstance(file, (str, Path)):
+        with open_input_file(file) as handle:
+            yield from iter_json_array(handle, buffer_size)
+        return
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        block = file.read(buffer_size)
+        buffer = buffer[position:] + block
+        position = 0
+        eof = not block
+        return not eof
+
+    def skip_whitespace() -> str:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not fill():
+                return ''
+
+    fill()
+    if buffer.startswith('\ufeff'):
+        position = 1
+    if skip_whitespace() != '[':
+        raise ValueError("Expected a JSON array.")
+    position += 1
+    if skip_whitespace() == ']':
+        return
+    while True:
+        skip_whitespace()
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+                # A number at the end of the buffer may continue in the next block
+                if end < len(buffer) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Truncated or malformed JSON array.")
+            fill()
+        position = end
+        yield element
+        separator = skip_whitespace()
+        position += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError("Truncated or malformed JSON array.")
+
+def save_to_csv(data: Tuple[np.ndarray, ...], filepath: str | Path, mappings: List[str], append: bool = False) -> None:
     """
     Saves extracted data to a CSV file using writerows for better performance.
     
@@ -54,11 +322,15 @@ def save_to_csv(data: Tuple[np.ndarray, ...], filepath: str | Path, mappings: Li
     - data (Tuple[np.ndarray, ...]): Tuple where each element is a NumPy array representing a column of data.
     - filepath (str): Path to save the CSV file.
     - mappings (List[str]): List of column names for the CSV file.
+    - append (bool): Append the rows to an existing file written with the same mappings, without a header.
     """
 
-    with open(filepath, mode='w', newline='', encoding='utf-8') as file:
+    with open(filepath, mode='a' if append else 'w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
-        writer.writerow(mappings)
+        if not append:
+            writer.writerow(mappings)
+        if not len(data) or not len(data[0]):
+            return
         
         # Combine the column arrays into a single 2D array
         combined_data = np.column_stack(data)
@@ -66,6 +338,62 @@ def save_to_csv(data: Tuple[np.ndarray, ...], filepath: str | Path, mappings: Li
         # Write the rows to the CSV file
         writer.writerows(combined_data)
 
+# Bytes read at a time when looking for the rows at the end of a CSV file
+CSV_READ_BLOCK = 1 << 16
+
+def truncate_csv(filepath: str | Path, rows: int) -> None:
+    """
+    Removes the last rows of a CSV file written by save_to_csv, reading the file backwards from its end so that
+    the cost depends on the number of rows removed, not on the length of the file.
+
+    Args:
+    - filepath (str): Path of the CSV file, whose values hold no line breaks.
+    - rows (int): Number of rows to remove from the end.
+
+    Raises:
+    - ValueError: If the file has fewer rows, not counting the header.
+    """
+    if rows <= 0:
+        return
+    with open(filepath, mode='r+b') as file:
+        position = file.seek(0, os.SEEK_END)
+        # The file ends with the line break of its last row, so the kept part ends after the rows + 1-th one from the end
+        remaining = rows + 1
+        while position > 0:
+            block_start = max(position - CSV_READ_BLOCK, 0)
+            file.seek(block_start)
+            block = file.read(position - block_start)
+            breaks = block.count(b'\n')
+            if breaks >= remaining:
+                end = len(block)
+                for _ in range(remaining):
+                    end = block.rindex(b'\n', 0, end)
+                file.truncate(block_start + end + 1)
+                return
+            remaining -= breaks
+            position = block_start
+    raise ValueError(f"{filepath} has fewer than {rows} rows to remove.")
+
+def read_csv_columns(filepath: str | Path) -> Tuple[List[str], Tuple[np.ndarray, ...]]:
+    """
+    Reads a CSV file written by save_to_csv back into columns.
+
+    Args:
+    - filepath (str): Path of the CSV file.
+
+    Returns:
+    - Tuple[List[str], Tuple[np.ndarray, ...]]: The header and one object array of strings per column.
+    """
+    with open(filepath, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        rows = list(reader)
+
+    columns = [np.empty(len(rows), dtype=object) for _ in header]
+    for index, column in enumerate(zip(*rows)):
+        columns[index][:] = column
+    return header, tuple(columns)
+
 def ensure_directory_exists(directory: Path) -> None:
     """Ensure that the specified directory exists.
     
@@ -81,6 +409,8 @@ def ensure_directory_exists(directory: Path) -> None:
 
 def get_file_presence_flags(directory: Path) -> Dict[str, bool]:
     """Check for the presence of specific files in a given directory and return their presence as flags.
+
+    Files still inside the directory's Takeout archives count as present, see find_input_file.
     
     Args:
         directory (str): The directory in which to check for files.
@@ -89,17 +419,90 @@ def get_file_presence_flags(directory: Path) -> Dict[str, bool]:
         Dict[str, bool]: A dictionary with boolean flags for each file type detected.
     """
     ensure_directory_exists(directory)
-    path = Path(directory)
     return {
-        'watch_history_present': (path / 'watch-history.json').exists(),
-        'my_activity_present': (path / 'MyActivity.json').exists()
+        'watch_history_present': find_input_file(directory, 'watch-history.json') is not None,
+        'my_activity_present': find_input_file(directory, 'MyActivity.json') is not None
     }
 
+# Header style of DataFrame.to_excel
+EXCEL_HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+EXCEL_DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+EXCEL_DATE_FORMAT = 'YYYY-MM-DD'
+
+def excel_cell(value: Any) -> Tuple[Any, Optional[str]]:
+    """
+    Returns a value and its number format as DataFrame.to_excel writes them: missing values become blanks,
+    infinities text, and dates and datetimes get pandas' default formats.
+    """
+    import pandas as pd
+
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return '', None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value), None
+    if isinstance(value, (int, np.integer)):
+        return int(value), None
+    if isinstance(value, (float, np.floating)):
+        return (float(value), None) if np.isfinite(value) else ('inf' if value > 0 else '-inf', None)
+    if isinstance(value, datetime):
+        return value, EXCEL_DATETIME_FORMAT
+    if isinstance(value, date):
+        return value, EXCEL_DATE_FORMAT
+    if isinstance(value, timedelta):
+        return value.total_seconds() / 86400, '0'
+    return str(value), None
+
+def iter_row_blocks(columns: Sequence[Any], chunk_size: int, pad: bool = False) -> Iterator[Tuple[int, List[Any]]]:
+    """
+    Yields the first row and the slices of every column for each block of chunk_size rows.
+
+    Columns are anything with a length that can be sliced into arrays, such as arrays or columns read from
+    disk on demand. Columns must have the same length unless pad is set, in which case the blocks run to the
+    longest column and the slices of shorter columns may be short or empty.
+    """
+    lengths = [len(column) for column in columns]
+    if not pad and len(set(lengths)) > 1:
+        raise ValueError(f"Columns of a sheet must have the same length, got {sorted(set(lengths))}.")
+    rows = max(lengths, default=0)
+    for start in range(0, rows, chunk_size):
+        yield start, [column[start:start + chunk_size] for column in columns]
+
+def write_frame_rows(worksheet: Any, frame: Any, first_row: int, formats: Dict[Optional[str], Any]) -> None:
+    """
+    Writes the rows of a DataFrame to a worksheet in row order, as required by xlsxwriter's constant_memory mode.
+    """
+    for row, values in enumerate(zip(*(frame.iloc[:, col] for col in range(frame.shape[1]))), start=first_row):
+        for col, value in enumerate(values):
+            value, number_format = excel_cell(value)
+            worksheet.write(row, col, value, formats.get(number_format))
+
+@contextmanager
+def streaming_workbook(filename: Path) -> Iterator[Tuple[Any, Dict[Optional[str], Any]]]:
+    """
+    Opens an xlsxwriter workbook that flushes every row to disk once the next one is started, with the
+    header and number formats DataFrame.to_excel uses.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(str(filename), {'constant_memory': True})
+    formats = {'header': workbook.add_format(EXCEL_HEADER_FORMAT)}
+    formats.update({number_format: workbook.add_format({'num_format': number_format})
+                    for number_format in (EXCEL_DATETIME_FORMAT, EXCEL_DATE_FORMAT, '0')})
+    try:
+        yield workbook, formats
+    finally:
+        workbook.close()
+
+def write_excel_header(worksheet: Any, column_names: Sequence[str], formats: Dict[Optional[str], Any]) -> None:
+    for col, name in enumerate(column_names):
+        worksheet.write(0, col, name, formats['header'])
+
 def write_arrays_to_excel(
     array_lists: List[List[np.ndarray]], 
     column_name_lists: List[List[str]], 
     sheet_names: List[str], 
-    filename: Path
+    filename: Path,
+    chunk_size: Optional[int] = None
 ) -> None:
     """
     Writes multiple lists of arrays to an Excel file, each on a different sheet with specified column names.
@@ -109,7 +512,21 @@ def write_arrays_to_excel(
     - column_name_lists (list of list of str): Names for the columns corresponding to each array in array_lists.
     - sheet_names (list of str): Names for each sheet.
     - filename (str): The filename for the output Excel file.
+    - chunk_size (int, optional): Write the sheets chunk_size rows at a time, holding only one block of rows in
+      memory. The arrays may then be any columns iter_row_blocks accepts.
     """
+    import pandas as pd
+
+    if chunk_size is not None:
+        with streaming_workbook(filename) as (workbook, formats):
+            for arrays, col_names, sheet_name in zip(array_lists, column_name_lists, sheet_names):
+                worksheet = workbook.add_worksheet(sheet_name)
+                write_excel_header(worksheet, col_names, formats)
+                for start, block in iter_row_blocks(arrays, chunk_size):
+                    df = pd.DataFrame({col_name: arr for arr, col_name in zip(block, col_names)})
+                    write_frame_rows(worksheet, df, start + 1, formats)
+        return
+
     # Create a Pandas Excel writer using XlsxWriter as the engine
     with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
         # Iterate over each list of arrays, column names list, and sheet name
@@ -119,11 +536,34 @@ def write_arrays_to_excel(
             # Write the DataFrame to a named sheet in the Excel file
             df.to_excel(writer, sheet_name=sheet_name, index=False)
 
+def collated_frame(arrays: Sequence[np.ndarray], column_name_lists: List[str], column_types: List[str], length: int) -> Any:
+    """
+    Pads the arrays as strings to a common length and converts each column back to its type in column_types.
+    """
+    import pandas as pd
+
+    data = {f'Column_{i}': np.pad(arr.astype(str), (0, length - len(arr)), mode='constant', constant_values='') for i, arr in enumerate(arrays)}
+    df = pd.DataFrame(data)
+    df.columns = column_name_lists
+
+    # Convert columns to specified types
+    for i, col_type in enumerate(column_types):
+        if col_type == 'date':
+            df[column_name_lists[i]] = pd.to_datetime(df[column_name_lists[i]], errors='coerce').dt.date
+        elif col_type == 'float':
+            df[column_name_lists[i]] = pd.to_numeric(df[column_name_lists[i]], errors='coerce')
+        # elif col_type == 'date_hour':
+        #     df[column_name_lists[i]] = pd.to_datetime(df[column_name_lists[i]], format='%H').dt.time
+        elif col_type == 'date_time':
+            df[column_name_lists[i]] = pd.to_datetime(df[column_name_lists[i]], errors='coerce')
+    return df
+
 def write_arrays_to_single_excel(
     combined_tuple: Tuple[np.ndarray, ...], 
     column_name_lists: List[str], 
     column_types: List[str],
-    filename: Path
+    filename: Path,
+    chunk_size: Optional[int] = None
 ) -> None:
     """
     Writes multiple arrays to an Excel file, each on a different sheet with specified column names.
@@ -132,30 +572,24 @@ def write_arrays_to_single_excel(
     - combined_tuple (Tuple of np.array): A tuple of arrays.
     - column_name_lists (list of str): Names for the columns corresponding to each array.
     - filename (str): The filename for the output Excel file.
+    - chunk_size (int, optional): Write chunk_size rows at a time, as in write_arrays_to_excel.
     """
+    import pandas as pd
+
+    if chunk_size is not None:
+        with streaming_workbook(filename) as (workbook, formats):
+            worksheet = workbook.add_worksheet('_')
+            write_excel_header(worksheet, column_name_lists, formats)
+            for start, block in iter_row_blocks(combined_tuple, chunk_size, pad=True):
+                length = max(len(arr) for arr in block)
+                write_frame_rows(worksheet, collated_frame(block, column_name_lists, column_types, length), start + 1, formats)
+        return
+
     # Create a Pandas Excel writer using XlsxWriter as the engine
-    converted_arrays = []
-    for arr in combined_tuple:
-        converted_arrays.append(arr.astype(str))
     with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
         max_length = max(len(arr) for arr in combined_tuple)
-        data = {f'Column_{i}': np.pad(arr, (0, max_length - len(arr)), mode='constant', constant_values='') for i, arr in enumerate(converted_arrays)}
-        df = pd.DataFrame(data)
-        df.columns = column_name_lists
-
-        # Convert columns to specified types
-        for i, col_type in enumerate(column_types):
-            if col_type == 'date':
-                df[column_name_lists[i]] = pd.to_datetime(df[column_name_lists[i]], errors='coerce').dt.date
-            elif col_type == 'float':
-                df[column_name_lists[i]] = pd.to_numeric(df[column_name_lists[i]], errors='coerce')
-            # elif col_type == 'date_hour':
-            #     df[column_name_lists[i]] = pd.to_datetime(df[column_name_lists[i]], format='%H').dt.time
-            elif col_type == 'date_time':
-                df[column_name_lists[i]] = pd.to_datetime(df[column_name_lists[i]], errors='coerce')
-        
+        df = collated_frame(combined_tuple, column_name_lists, column_types, max_length)
         df.to_excel(writer, sheet_name='_', index=False)
 
 
 
-
@@ -0,0 +1,164 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Returns the peak resident set size of the current process in megabytes, if the platform reports it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def count_rows(data: Any) -> Optional[int]:
+    """
+    Returns the number of rows of a columnar tuple (the length of its first column), or None if unknown.
+    """
+    if isinstance(data, tuple) and data and hasattr(data[0], '__len__'):
+        return len(data[0])
+    return None
+
+class RunReport:
+    """
+    Collects per-stage measurements of a munger run: wall time, CPU time, peak memory and rows in/out.
+
+    Stages are measured with the stage() context manager. When tracing is enabled, tracemalloc is used
+    to record the peak Python/NumPy allocation of each stage, and an optional profiler (cProfile or
+    pyinstrument) can be attached to every stage.
+    """
+
+    def __init__(self, data_source: str, trace_memory: bool = False, profiler: Optional[str] = None, profile_dir: Optional[Path] = None) -> None:
+        if profiler is not None and profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler '{profiler}'. Expected one of {PROFILERS}.")
+        self.data_source = data_source
+        self.trace_memory = trace_memory
+        self.profiler = profiler
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.stages: List[Dict[str, Any]] = []
+        self.started = datetime.now()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._started_tracemalloc = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def _start_profiler(self) -> Any:
+        if self.profiler == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.profiler == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError as error:
+                raise ImportError("pyinstrument is not installed. Install it with 'pip install pyinstrument'.") from error
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        return None
+
+    def _stop_profiler(self, profiler: Any, stage_name: str) -> Optional[str]:
+        if profiler is None:
+            return None
+        profile_dir = self.profile_dir or Path('.')
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        if self.profiler == 'cprofile':
+            profiler.disable()
+            path = profile_dir / f'{self.data_source.upper()}_{stage_name}.prof'
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            path = profile_dir / f'{self.data_source.upper()}_{stage_name}.html'
+            path.write_text(profiler.output_html(), encoding='utf-8')
+        return str(path)
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Measures the enclosed block as one stage. Set record['rows_out'] inside the block to report output rows.
+
+        Args:
+            name (str): Stage name.
+            rows_in (Optional[int]): Number of input rows.
+
+        Yields:
+            Dict[str, Any]: The stage record, completed when the block exits.
+        """
+        record: Dict[str, Any] = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        profiler = self._start_profiler()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+            if self.trace_memory:
+                record['traced_peak_mb'] = round((tracemalloc.get_traced_memory()[1] - traced_before) / 2**20, 2)
+            record['peak_rss_mb'] = peak_rss_mb()
+            record['profile'] = self._stop_profiler(profiler, name)
+            self.stages.append(record)
+
+    def close(self) -> None:
+        """
+        Stops memory tracing if this report started it.
+        """
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the report as a JSON-serialisable dictionary.
+        """
+        return {
+            'data_source': self.data_source,
+            'started': self.started.isoformat(timespec='seconds'),
+            'total_wall_s': round(time.perf_counter() - self._start_wall, 4),
+            'total_cpu_s': round(time.process_time() - self._start_cpu, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'trace_memory': self.trace_memory,
+            'profiler': self.profiler,
+            'stages': self.stages,
+        }
+
+    def save_json(self, file_path: Path) -> None:
+        """
+        Writes the report to a JSON file.
+        """
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def print_summary(self) -> None:
+        """
+        Prints a table with one line per stage.
+        """
+        report = self.to_dict()
+        memory_header = f"{'traced MB':>11}" if self.trace_memory else ''
+        print(f"\n{'stage':<28}{'wall s':>9}{'cpu s':>9}{memory_header}{'rss MB':>9}{'rows in':>11}{'rows out':>11}")
+        for record in self.stages:
+            memory = f"{record['traced_peak_mb']:>11.1f}" if self.trace_memory else ''
+            rss = f"{record['peak_rss_mb']:>9.0f}" if record['peak_rss_mb'] is not None else f"{'-':>9}"
+            rows_in = '-' if record['rows_in'] is None else record['rows_in']
+            rows_out = '-' if record['rows_out'] is None else record['rows_out']
+            name = f"{record['stage']} (cached)" if record.get('cached') else record['stage']
+            print(f"{name:<28}{record['wall_s']:>9.3f}{record['cpu_s']:>9.3f}{memory}{rss}{rows_in:>11}{rows_out:>11}")
+        print(f"{'total':<28}{report['total_wall_s']:>9.3f}{report['total_cpu_s']:>9.3f}\n")
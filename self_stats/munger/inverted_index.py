@@ -0,0 +1,238 @@
+import numpy as np
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+def encode_varints(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes non-negative integers as variable-length bytes, 7 bits per byte with the high bit set on every
+    byte but the last of a value, so small values such as the gaps between sorted row ids take one byte.
+
+    Args:
+        values (np.ndarray): Non-negative integers.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The uint8 encoding and the number of bytes of each value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+        lengths += remaining > 0
+        remaining >>= np.uint64(7)
+    starts = np.cumsum(lengths) - lengths
+    encoded = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for position in range(int(lengths.max()) if len(values) else 0):
+        present = lengths > position
+        chunk = (values[present] >> np.uint64(7 * position)) & np.uint64(0x7F)
+        more = (lengths[present] > position + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[present] + position] = (chunk | more).astype(np.uint8)
+    return encoded, lengths
+
+def decode_varints(encoded: np.ndarray) -> np.ndarray:
+    """
+    Decodes the bytes written by encode_varints.
+
+    Returns:
+        np.ndarray: The uint64 values.
+    """
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    if not len(encoded):
+        return np.array([], dtype=np.uint64)
+    ends = np.flatnonzero(encoded < 0x80)
+    if len(ends) == len(encoded):
+        return encoded.astype(np.uint64)
+    starts = np.r_[0, ends[:-1] + 1]
+    lengths = ends - starts + 1
+    values = (encoded[starts] & 0x7F).astype(np.uint64)
+    # Most gaps fit in one byte, so each further byte position only touches the few longer values
+    for position in range(1, int(lengths.max())):
+        longer = np.flatnonzero(lengths > position)
+        values[longer] |= (encoded[starts[longer] + position] & 0x7F).astype(np.uint64) << np.uint64(7 * position)
+    return values
+
+def to_datetime64(value: Optional[str | date | datetime | np.datetime64], end: bool = False) -> Optional[np.datetime64]:
+    """
+    Converts a date range bound to datetime64[s]. A bare date as the end of a range includes that whole day.
+    """
+    if value is None:
+        return None
+    is_day = isinstance(value, date) and not isinstance(value, datetime) or (isinstance(value, str) and len(value) == 10)
+    bound = np.datetime64(value, 's')
+    return bound + np.timedelta64(1, 'D') - np.timedelta64(1, 's') if end and is_day else bound
+
+class InvertedIndex:
+    """
+    Maps every keyword to the rows of the processed data whose query or video title contains it.
+
+    The posting list of each keyword is its sorted row ids stored as variable-length gaps (see encode_varints),
+    typically one byte per occurrence, all in one byte buffer; postings[offsets[i]:offsets[i + 1]] is the list
+    of tokens[i]. Keywords are sorted, so finding one is a binary search, and the date of every row is kept so
+    that results can be restricted to a date range.
+    """
+
+    def __init__(self, tokens: np.ndarray, offsets: np.ndarray, postings: np.ndarray, document_counts: np.ndarray, row_dates: np.ndarray) -> None:
+        self.tokens = np.asarray(tokens, dtype=str)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.postings = np.asarray(postings, dtype=np.uint8)
+        self.document_counts = np.asarray(document_counts, dtype=np.int64)
+        self.row_dates = np.asarray(row_dates, dtype='datetime64[s]')
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @classmethod
+    def build(cls, rows: np.ndarray, tokens: np.ndarray, row_dates: np.ndarray) -> 'InvertedIndex':
+        """
+        Builds the index from (row, keyword) pairs, e.g. the keywords of content_analysis with their rows.
+
+        Args:
+            rows (np.ndarray): Row of the processed data each keyword comes from.
+            tokens (np.ndarray): Keywords.
+            row_dates (np.ndarray): Date of every row of the processed data.
+
+        Returns:
+            InvertedIndex: The index.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        vocabulary, token_ids = np.unique(np.asarray(tokens, dtype=str), return_inverse=True)
+        width = int(rows.max()) + 1 if len(rows) else 1
+        keys = np.unique(token_ids.astype(np.int64) * width + rows)
+        token_ids, rows = keys // width, keys % width
+
+        first = np.r_[True, token_ids[1:] != token_ids[:-1]] if len(keys) else np.array([], dtype=bool)
+        gaps = np.where(first, rows, rows - np.r_[0, rows[:-1]])
+        postings, lengths = encode_varints(gaps)
+        byte_counts = np.bincount(token_ids, weights=lengths, minlength=len(vocabulary)).astype(np.int64)
+        offsets = np.r_[0, np.cumsum(byte_counts)]
+        document_counts = np.bincount(token_ids, minlength=len(vocabulary))
+        return cls(vocabulary, offsets, postings, document_counts, np.asarray(row_dates).astype('datetime64[s]'))
+
+    @classmethod
+    def merge(cls, indexes: Sequence['InvertedIndex']) -> 'InvertedIndex':
+        """
+        Combines the indexes of consecutive parts of the processed data, e.g. one per chunk, whose row ids
+        already count from the start of the whole data.
+        """
+        pairs = [index.pairs() for index in indexes]
+        row_dates = np.concatenate([index.row_dates for index in indexes]) if indexes else np.array([], dtype='datetime64[s]')
+        if not pairs:
+            return cls.build(np.array([], dtype=np.int64), np.array([], dtype=str), row_dates)
+        return cls.build(np.concatenate([rows for rows, _ in pairs]), np.concatenate([tokens for _, tokens in pairs]), row_dates)
+
+    def pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decodes every posting list at once.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The row and keyword of every posting, by keyword then row.
+        """
+        totals = np.cumsum(decode_varints(self.postings)).astype(np.int64)
+        # Each list starts with an absolute row id, so the running total is reset at every list
+        list_starts = np.r_[0, np.cumsum(self.document_counts)[:-1]].astype(np.int64) if len(self.tokens) else np.array([], dtype=np.int64)
+        bases = np.r_[0, totals][list_starts]
+        rows = totals - np.repeat(bases, self.document_counts)
+        return rows, np.repeat(self.tokens, self.document_counts)
+
+    def arrays(self) -> Tuple[np.ndarray, ...]:
+        """
+        Returns the arrays of the index as a tuple, as stored by the stage cache.
+        """
+        return self.tokens, self.offsets, self.postings, self.document_counts, self.row_dates
+
+    def save(self, path: Path) -> None:
+        """
+        Saves the index as an .npz file of plain arrays, loadable without pickling.
+        """
+        np.savez(path, tokens=self.tokens, offsets=self.offsets, postings=self.postings,
+                 document_counts=self.document_counts, row_dates=self.row_dates)
+
+    @classmethod
+    def load(cls, path: Path) -> 'InvertedIndex':
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(arrays['tokens'], arrays['offsets'], arrays['postings'], arrays['document_counts'], arrays['row_dates'])
+
+    def token_id(self, token: str) -> Optional[int]:
+        """
+        Returns the position of a keyword in the index, or None if it never occurs.
+        """
+        position = int(np.searchsorted(self.tokens, token))
+        return position if position < len(self.tokens) and self.tokens[position] == token else None
+
+    def rows_of(self, token_id: int) -> np.ndarray:
+        """
+        Decodes the posting list of the keyword at a position.
+        """
+        return np.cumsum(decode_varints(self.postings[self.offsets[token_id]:self.offsets[token_id + 1]])).astype(np.int64)
+
+    def postings_of(self, token: str) -> np.ndarray:
+        """
+        Returns the sorted rows containing a keyword.
+        """
+        token_id = self.token_id(token.lower())
+        return self.rows_of(token_id) if token_id is not None else np.array([], dtype=np.int64)
+
+    def search(self, terms: str | Sequence[str], mode: str = 'and', start: Optional[str | date | datetime] = None,
+               end: Optional[str | date | datetime] = None) -> np.ndarray:
+        """
+        Finds the rows of the processed data containing the terms.
+
+        Args:
+            terms (str | Sequence[str]): A keyword, several keywords separated by spaces, or a list of keywords.
+                Matching ignores case.
+            mode (str): 'and' for rows containing every term, 'or' for rows containing any of them.
+            start (Optional[str | date | datetime]): Earliest date or time of the rows returned.
+            end (Optional[str | date | datetime]): Latest date or time; a date includes the whole day.
+
+        Returns:
+            np.ndarray: Matching row ids, in the order of the processed data.
+        """
+        if mode not in ('and', 'or'):
+            raise ValueError(f"Search mode must be 'and' or 'or', got {mode!r}.")
+        terms = terms.split() if isinstance(terms, str) else list(terms)
+        lists = [self.postings_of(term) for term in terms]
+        if not lists:
+            return np.array([], dtype=np.int64)
+        if mode == 'and':
+            # Intersecting the shortest lists first keeps every intermediate result small
+            lists.sort(key=len)
+            rows = lists[0]
+            for other in lists[1:]:
+                if not len(other):
+                    return other
+                # Both lists are sorted, so each row of the shorter list is looked up with a binary search
+                positions = np.minimum(np.searchsorted(other, rows), len(other) - 1)
+                rows = rows[other[positions] == rows]
+        else:
+            rows = np.unique(np.concatenate(lists))
+
+        start, end = to_datetime64(start), to_datetime64(end, end=True)
+        if start is not None or end is not None:
+            dates = self.row_dates[rows]
+            keep = np.ones(len(rows), dtype=bool)
+            if start is not None:
+                keep &= dates >= start
+            if end is not None:
+                keep &= dates <= end
+            rows = rows[keep]
+        return rows
+
+    def dates_of(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Returns the date and time of each row, e.g. to answer when a keyword was searched for or watched.
+        """
+        return self.row_dates[rows]
+
+def main(imputed_data: Tuple[np.ndarray, ...], token_rows: np.ndarray, tokens: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Builds the inverted index of the processed data from the keywords of content_analysis.
+
+    Args:
+        imputed_data (Tuple[np.ndarray, ...]): Processed data columns, the first being the dates.
+        token_rows (np.ndarray): Row of each keyword, as returned by content_analysis with return_rows.
+        tokens (np.ndarray): Keywords.
+
+    Returns:
+        Tuple[np.ndarray, ...]: The arrays of the index, see InvertedIndex.arrays.
+    """
+    return InvertedIndex.build(token_rows, tokens, imputed_data[0]).arrays()
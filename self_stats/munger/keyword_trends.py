@@ -0,0 +1,294 @@
+import numpy as np
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+PERIODS = ('day', 'week', 'month')
+
+TOP_KEYWORD_COLUMNS = ['Period_Type', 'Period_Start', 'Rank', 'Keyword', 'Count', 'Weight']
+KEYWORD_TREND_COLUMNS = ['Period_Type', 'Period_Start', 'Direction', 'Rank', 'Keyword', 'Count', 'Previous_Count', 'Log2_Change']
+
+def period_ordinals(days: np.ndarray, period: str) -> np.ndarray:
+    """
+    Numbers the calendar periods holding each day, such that consecutive periods have consecutive numbers.
+
+    Args:
+        days (np.ndarray): datetime64[D] days.
+        period (str): 'day', 'week' (starting on Monday) or 'month'.
+
+    Returns:
+        np.ndarray: int64 period numbers.
+    """
+    ordinals = days.astype('datetime64[D]').astype(np.int64)
+    if period == 'day':
+        return ordinals
+    if period == 'week':
+        # 1970-01-01 was a Thursday, so Monday-based weeks start 3 days before the epoch
+        return (ordinals + 3) // 7
+    if period == 'month':
+        return days.astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f"Period must be one of {PERIODS}, got {period!r}.")
+
+def period_starts(ordinals: np.ndarray, period: str) -> np.ndarray:
+    """
+    Returns the first day of each period numbered by period_ordinals.
+    """
+    if period == 'day':
+        return ordinals.astype('datetime64[D]')
+    if period == 'week':
+        return (ordinals * 7 - 3).astype('datetime64[D]')
+    return ordinals.astype('datetime64[M]').astype('datetime64[D]')
+
+def sum_by_key(rows: np.ndarray, columns: np.ndarray, counts: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Adds up the counts of duplicate (row, column) pairs, returning them sorted by row then column.
+    """
+    keys, inverse = np.unique(rows * width + columns, return_inverse=True)
+    return keys // width, keys % width, np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int64)
+
+def tfidf(rows: np.ndarray, columns: np.ndarray, counts: np.ndarray, n_columns: int) -> np.ndarray:
+    """
+    Weighs sparse counts by TF-IDF, treating each row (a day or a period) as a document.
+
+    The term frequency is the share of the row's tokens, and the smoothed inverse document frequency is
+    log((1 + n) / (1 + df)) + 1 over the n rows present.
+
+    Args:
+        rows (np.ndarray): Row index of each count, grouped by row.
+        columns (np.ndarray): Column (token) index of each count.
+        counts (np.ndarray): Counts.
+        n_columns (int): Number of tokens.
+
+    Returns:
+        np.ndarray: float64 weight of each count.
+    """
+    if not len(counts):
+        return np.array([], dtype=np.float64)
+    row_ids, inverse = np.unique(rows, return_inverse=True)
+    row_totals = np.bincount(inverse, weights=counts)
+    document_frequency = np.bincount(columns, minlength=n_columns)
+    idf = np.log((1 + len(row_ids)) / (1 + document_frequency)) + 1
+    return counts / row_totals[inverse] * idf[columns]
+
+def rank_within(groups: np.ndarray, scores: np.ndarray, ties: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Orders items by group, then by descending score, then by the tie breaker, and ranks them from 1 within each group.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The ordering indices and the rank of each ordered item.
+    """
+    order = np.lexsort((ties, -scores, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]) if len(order) else np.array([], dtype=np.intp)
+    sizes = np.diff(np.r_[starts, len(order)])
+    return order, np.arange(len(order)) - np.repeat(starts, sizes) + 1
+
+class KeywordMatrix:
+    """
+    Sparse day × token count matrix of the keyword stream, in compressed sparse row form: the counts of day i
+    are counts[indptr[i]:indptr[i + 1]], for the tokens at indices[indptr[i]:indptr[i + 1]].
+
+    Only the days and tokens that occur are stored, with tokens in sorted order, so the matrix is proportional
+    to the number of distinct (day, token) pairs instead of the number of keyword occurrences.
+    """
+
+    def __init__(self, days: np.ndarray, tokens: np.ndarray, indptr: np.ndarray, indices: np.ndarray, counts: np.ndarray) -> None:
+        self.days = np.asarray(days, dtype='datetime64[D]')
+        self.tokens = np.asarray(tokens, dtype=object)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.days), len(self.tokens)
+
+    @classmethod
+    def from_pairs(cls, dates: np.ndarray, tokens: np.ndarray) -> 'KeywordMatrix':
+        """
+        Counts (date, token) pairs, e.g. the keywords of content_analysis, per calendar day.
+
+        Args:
+            dates (np.ndarray): Date or datetime of each token.
+            tokens (np.ndarray): Tokens.
+
+        Returns:
+            KeywordMatrix: The day × token counts.
+        """
+        if not len(tokens):
+            return cls.empty()
+        day_values = np.asarray(dates).astype('datetime64[D]')
+        days, day_index = np.unique(day_values, return_inverse=True)
+        vocabulary, token_index = np.unique(np.asarray(tokens, dtype=str), return_inverse=True)
+        return cls.from_coordinates(days, vocabulary.astype(object), day_index, token_index, np.ones(len(token_index), dtype=np.int64))
+
+    @classmethod
+    def from_coordinates(cls, days: np.ndarray, tokens: np.ndarray, rows: np.ndarray, columns: np.ndarray, counts: np.ndarray) -> 'KeywordMatrix':
+        """
+        Builds a matrix from (row, column, count) triples over the given days and tokens, adding up duplicates.
+        """
+        rows, columns, counts = sum_by_key(rows.astype(np.int64), columns.astype(np.int64), counts, max(len(tokens), 1))
+        indptr = np.searchsorted(rows, np.arange(len(days) + 1))
+        return cls(days, tokens, indptr, columns, counts)
+
+    @classmethod
+    def empty(cls) -> 'KeywordMatrix':
+        return cls(np.array([], dtype='datetime64[D]'), np.array([], dtype=object), np.zeros(1, dtype=np.int64),
+                   np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+
+    @classmethod
+    def merge(cls, matrices: Sequence['KeywordMatrix']) -> 'KeywordMatrix':
+        """
+        Adds up matrices built from different parts of a keyword stream, e.g. one per chunk.
+        """
+        matrices = [matrix for matrix in matrices if len(matrix.counts)]
+        if not matrices:
+            return cls.empty()
+        days, day_index = np.unique(np.concatenate([matrix.days for matrix in matrices]), return_inverse=True)
+        tokens, token_index = np.unique(np.concatenate([matrix.tokens for matrix in matrices]).astype(str), return_inverse=True)
+        rows, columns = [], []
+        day_offset = token_offset = 0
+        for matrix in matrices:
+            day_map = day_index[day_offset:day_offset + len(matrix.days)]
+            token_map = token_index[token_offset:token_offset + len(matrix.tokens)]
+            rows.append(day_map[matrix.rows()])
+            columns.append(token_map[matrix.indices])
+            day_offset += len(matrix.days)
+            token_offset += len(matrix.tokens)
+        return cls.from_coordinates(days, tokens.astype(object), np.concatenate(rows), np.concatenate(columns),
+                                    np.concatenate([matrix.counts for matrix in matrices]))
+
+    def rows(self) -> np.ndarray:
+        """
+        Returns the row (day) index of every stored count.
+        """
+        return np.repeat(np.arange(len(self.days)), np.diff(self.indptr))
+
+    def columns(self) -> Tuple[np.ndarray, ...]:
+        """
+        Returns the arrays of the matrix as a tuple, as stored by the stage cache.
+        """
+        return self.days, self.tokens, self.indptr, self.indices, self.counts
+
+    def save(self, path: Path) -> None:
+        """
+        Saves the matrix as a compressed .npz file of plain arrays, loadable without pickling.
+        """
+        np.savez_compressed(path, days=self.days, tokens=self.tokens.astype(str), indptr=self.indptr,
+                            indices=self.indices, counts=self.counts)
+
+    @classmethod
+    def load(cls, path: Path) -> 'KeywordMatrix':
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(arrays['days'], arrays['tokens'].astype(object), arrays['indptr'], arrays['indices'], arrays['counts'])
+
+    def totals(self) -> np.ndarray:
+        """
+        Returns the total count of every token.
+        """
+        return np.bincount(self.indices, weights=self.counts, minlength=len(self.tokens)).astype(np.int64)
+
+    def by_period(self, period: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Adds up the counts per calendar period.
+
+        Args:
+            period (str): 'day', 'week' or 'month'.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Period number (see period_ordinals), token index and count
+            of every non-zero entry, sorted by period then token.
+        """
+        ordinals = period_ordinals(self.days, period)[self.rows()]
+        if period == 'day':
+            return ordinals, self.indices, self.counts
+        return sum_by_key(ordinals, self.indices, self.counts, max(len(self.tokens), 1))
+
+    def top_k(self, period: str = 'day', k: int = 10, by: str = 'count') -> Tuple[np.ndarray, ...]:
+        """
+        Returns the k most frequent keywords of every period.
+
+        Args:
+            period (str): 'day', 'week' or 'month'.
+            k (int): Number of keywords kept per period.
+            by (str): 'count' to rank by count, or 'tfidf' to rank by TF-IDF weight, which favours keywords
+                particular to the period over those frequent throughout.
+
+        Returns:
+            Tuple[np.ndarray, ...]: Columns named by TOP_KEYWORD_COLUMNS, ties broken alphabetically.
+        """
+        if by not in ('count', 'tfidf'):
+            raise ValueError(f"Keywords are ranked by 'count' or 'tfidf', got {by!r}.")
+        ordinals, columns, counts = self.by_period(period)
+        weights = tfidf(ordinals, columns, counts, len(self.tokens))
+        order, ranks = rank_within(ordinals, weights if by == 'tfidf' else counts, columns)
+        order, ranks = order[ranks <= k], ranks[ranks <= k]
+        return (np.full(len(order), period, dtype=object), period_starts(ordinals[order], period).astype(object),
+                ranks, self.tokens[columns[order]], counts[order], np.round(weights[order], 6))
+
+    def trends(self, period: str = 'week', k: int = 10) -> Tuple[np.ndarray, ...]:
+        """
+        Compares every period with the one before it and returns the k fastest rising and falling keywords.
+
+        The change of a keyword is log2((count + 1) / (previous count + 1)), computed for all periods and
+        keywords at once by aligning each period's counts with those of the period shifted forward by one.
+
+        Args:
+            period (str): 'day', 'week' or 'month'.
+            k (int): Number of rising and of falling keywords kept per period.
+
+        Returns:
+            Tuple[np.ndarray, ...]: Columns named by KEYWORD_TREND_COLUMNS. The first period, which has nothing to
+            compare with, is left out.
+        """
+        ordinals, columns, counts = self.by_period(period)
+        if not len(counts):
+            return tuple(np.array([], dtype=object) for _ in KEYWORD_TREND_COLUMNS)
+        width = max(len(self.tokens), 1)
+        # Each count is the current count of its own period and the previous count of the next period
+        keys = np.concatenate((ordinals * width + columns, (ordinals + 1) * width + columns))
+        keys, inverse = np.unique(keys, return_inverse=True)
+        current = np.bincount(inverse[:len(counts)], weights=counts, minlength=len(keys)).astype(np.int64)
+        previous = np.bincount(inverse[len(counts):], weights=counts, minlength=len(keys)).astype(np.int64)
+        trend_periods, trend_columns = keys // width, keys % width
+        inside = (trend_periods > ordinals[0]) & (trend_periods <= ordinals[-1])
+        change = np.log2((current + 1) / (previous + 1))
+
+        tables = []
+        for code, (selected, scores) in enumerate(((inside & (change > 0), change), (inside & (change < 0), -change))):
+            indices = np.flatnonzero(selected)
+            order, ranks = rank_within(trend_periods[indices], scores[indices], trend_columns[indices])
+            tables.append((indices[order[ranks <= k]], ranks[ranks <= k], np.full(int(np.sum(ranks <= k)), code)))
+        indices, ranks, codes = (np.concatenate(columns) for columns in zip(*tables))
+        order = np.lexsort((ranks, codes, trend_periods[indices]))
+        indices, ranks, codes = indices[order], ranks[order], codes[order]
+        return (np.full(len(indices), period, dtype=object), period_starts(trend_periods[indices], period).astype(object),
+                np.array(['rising', 'falling'], dtype=object)[codes], ranks, self.tokens[trend_columns[indices]],
+                current[indices], previous[indices], np.round(change[indices], 6))
+
+def concatenate_tables(tables: List[Tuple[np.ndarray, ...]]) -> Tuple[np.ndarray, ...]:
+    return tuple(np.concatenate(columns) for columns in zip(*tables))
+
+def keyword_tables(matrix: KeywordMatrix, k: int = 10, periods: Sequence[str] = PERIODS) -> Tuple[Tuple[np.ndarray, ...], Tuple[np.ndarray, ...]]:
+    """
+    Builds the top keywords and keyword trends tables of every period type.
+
+    Returns:
+        Tuple[Tuple[np.ndarray, ...], Tuple[np.ndarray, ...]]: Columns named by TOP_KEYWORD_COLUMNS and by
+        KEYWORD_TREND_COLUMNS.
+    """
+    top = concatenate_tables([matrix.top_k(period, k) for period in periods])
+    # Day to day changes are mostly noise, so trends start at weekly resolution
+    trends = concatenate_tables([matrix.trends(period, k) for period in periods if period != 'day'])
+    return top, trends
+
+def main(tokens_per_date: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, ...]:
+    """
+    Builds the day × token keyword matrix from the (date, keyword) pairs of content_analysis.
+
+    Args:
+        tokens_per_date (Tuple[np.ndarray, np.ndarray]): Date and keyword columns.
+
+    Returns:
+        Tuple[np.ndarray, ...]: The arrays of the matrix, see KeywordMatrix.columns.
+    """
+    return KeywordMatrix.from_pairs(*tokens_per_date).columns()
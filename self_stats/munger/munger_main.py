@@ -1,11 +1,10 @@
 from pathlib import Path
-from typing import List
-import pandas as pd
-from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 import numpy as np
+from datetime import datetime
 from itertools import chain
 
-from self_stats.munger.input_output import create_output_directories, save_to_csv, write_arrays_to_excel, write_arrays_to_single_excel
+from self_stats.munger.input_output import as_input_files, create_output_directories, read_csv_columns, save_to_csv, write_arrays_to_excel, write_arrays_to_single_excel
 from self_stats.munger.process_dates import trim_date
 from self_stats.munger.parse_and_process import main as parse_and_process
 from self_stats.munger.add_date_columns import main as add_date_columns
@@ -14,38 +13,241 @@ from self_stats.munger.content_analysis import main as content_analysis
 from self_stats.munger.aggregate_data import main as aggregate_by_day
 from self_stats.munger.aggregate_data import remove_unique_entries
 from self_stats.munger.aggregate_data import aggregate_activity_by_day
+from self_stats.munger.segment_activity import main as segment_activity
+from self_stats.munger.geo_binning import GEO_CELL_COLUMNS
+from self_stats.munger.geo_binning import main as geo_binning
+from self_stats.munger.keyword_trends import KEYWORD_TREND_COLUMNS, TOP_KEYWORD_COLUMNS, KeywordMatrix, keyword_tables
+from self_stats.munger.keyword_trends import main as keyword_trends
+from self_stats.munger.inverted_index import InvertedIndex
+from self_stats.munger.inverted_index import main as inverted_index
+from self_stats.munger.video_views import REPEAT_VIEW_COLUMNS, RepeatViews
+from self_stats.munger.video_views import main as video_views
+from self_stats.munger.window_stats import main as window_stats
+from self_stats.munger.instrumentation import RunReport, count_rows
+from self_stats.munger.stage_cache import StageCache, fingerprint_file
+from self_stats.munger.deduplicate import HashIndex
+from self_stats.munger.parallel_parse import DEFAULT_CHUNK_SIZE
+from self_stats.munger.sketches import HEAVY_HITTER_COLUMNS, HeavyHitters, heavy_hitter_table, load_sketches, save_sketches
+
+METADATA_COLUMNS = ['Activity_Window_Start_Date', 'Activity_Window_Start_Index', 'Activity_Window_End_Index', 'Activity_Window_Duration', 'Actions_per_Activity_Window', 'Approximate_Actions_per_Minute']
+SEGMENT_COLUMNS = ['Segment_Start', 'Segment_End', 'Segment_Days', 'Mean_Daily_Rate']
+
+# Stages that can be skipped without breaking the processed outputs. 'timeline' merges the processed data of
+# every source, so it is run by the command line once all of them are done rather than by main
+OPTIONAL_STAGES = ('segment_activity', 'geo_binning', 'video_views', 'content_analysis', 'keyword_trends', 'inverted_index', 'aggregate', 'timeline')
+
+# Stage graph: the upstream stages each cached stage reads from
+STAGE_INPUTS = {
+    'parse_and_process': (),
+    'segment_activity': ('parse_and_process',),
+    'trim_date': ('parse_and_process',),
+    'add_date_columns': ('trim_date',),
+    'imputer': ('add_date_columns',),
+    'geo_binning': ('imputer',),
+    'video_views': ('imputer',),
+    'content_analysis': ('imputer',),
+    'keyword_trends': ('content_analysis',),
+    'inverted_index': ('imputer', 'content_analysis'),
+    'aggregate': ('imputer', 'content_analysis', 'segment_activity'),
+}
 
-def main(directory: Path, input_file_name: Path, mappings: List[str]) -> None:
+# Bump a stage's version whenever its logic changes, so that its cached output and everything downstream is rebuilt
+STAGE_VERSIONS = {
+    'parse_and_process': 4,
+    'segment_activity': 1,
+    'trim_date': 1,
+    'add_date_columns': 1,
+    'imputer': 1,
+    'geo_binning': 1,
+    'video_views': 1,
+    'content_analysis': 2,
+    'keyword_trends': 1,
+    'inverted_index': 1,
+    'aggregate': 3,
+}
 
+def get_data_source(mappings: List[str]) -> str:
+    """
+    Returns 'search' or 'watch' depending on the column mappings.
+    """
     if mappings[1] == 'Query_Text':
-        data_source = 'search'
+        return 'search'
     elif mappings[1] == 'Video_Title':
-        data_source = 'watch'
+        return 'watch'
+    raise ValueError(f"Cannot determine the data source from mappings {mappings}.")
+
+def get_output_paths(directory: Path, data_source: str) -> Dict[str, Path]:
+    """
+    Builds the paths of every output file of a data source.
+
+    Args:
+        directory (Path): Directory holding the input files.
+        data_source (str): 'search' or 'watch'.
+
+    Returns:
+        Dict[str, Path]: Output paths keyed by a short name.
+    """
+    outer_path = directory / 'output'
+    path = outer_path / 'full_data'
+    agg_dir = outer_path / 'aggregated_data'
+    prefix = data_source.upper()
+    return {
+        'outer': outer_path,
+        'full_data': path,
+        'aggregated': agg_dir,
+        'raw': path / f'{prefix}_raw.csv',
+        'processed': path / f'{prefix}_processed.csv',
+        'metadata': path / f'{prefix}_metadata.csv',
+        'visited_sites': path / f'{prefix}_visited_sites.csv',
+        'keywords': path / f'{prefix}_keywords.csv',
+        'segments': path / f'{prefix}_segments.csv',
+        'inverted_index': path / f'{prefix}_inverted_index.npz',
+        'dedup_index': path / f'{prefix}_dedup_index.npz',
+        'agg': agg_dir / f'{prefix}.xlsx',
+        'single_agg': agg_dir / f'{prefix}_collated.xlsx',
+        'geo_cells': agg_dir / f'{prefix}_geo_cells.csv',
+        'repeat_views': agg_dir / f'{prefix}_repeat_views.csv',
+        'keyword_matrix': agg_dir / f'{prefix}_keyword_matrix.npz',
+        'top_keywords': agg_dir / f'{prefix}_top_keywords.csv',
+        'keyword_trends': agg_dir / f'{prefix}_keyword_trends.csv',
+        'heavy_hitters': agg_dir / f'{prefix}_heavy_hitters.csv',
+        'rolling_stats': agg_dir / f'{prefix}_rolling_stats.csv',
+        'weekday_baselines': agg_dir / f'{prefix}_weekday_baselines.csv',
+        'calendar_stats': agg_dir / f'{prefix}_calendar_stats.csv',
+        'daily_series': agg_dir / f'{prefix}_daily_series.npz',
+        'sketches': agg_dir / f'{prefix}_sketches.npz',
+        'report': outer_path / f'{prefix}_run_report.json',
+        'cache': outer_path / 'cache',
+        'spill': outer_path / 'spill',
+    }
+
+def load_ingested(stage_cache: StageCache, index_path: Path, fingerprints: Sequence[str],
+                  mappings: List[str]) -> Tuple[HashIndex, Optional[Tuple[np.ndarray, ...]]]:
+    """
+    Loads the dedup index saved by the latest run along with that run's parsed output, so that only the entries
+    of new input files are ingested (see parse_and_process.main).
+
+    The saved index is used only if the latest run parsed with the same version and mappings, every input it
+    holds is still given, and the parsed output it belongs to is still cached. Otherwise the run starts from an
+    empty index.
+
+    Args:
+        stage_cache (StageCache): Stage cache of the run.
+        index_path (Path): Path of <SOURCE>_dedup_index.npz.
+        fingerprints (Sequence[str]): Fingerprint of each input file of this run.
+        mappings (List[str]): Column names of the extracted data.
+
+    Returns:
+        Tuple[HashIndex, Optional[Tuple[np.ndarray, ...]]]: The index and the output of the run that built it,
+        or an empty index and None.
+    """
+    name = 'parse_and_process'
+    if not stage_cache.enabled or name in stage_cache.rerun:
+        return HashIndex(), None
+    index = HashIndex.load(index_path)
+    if (index is None or index.meta.get('stage_key') != stage_cache.previous.get(name)
+            or index.meta.get('version') != STAGE_VERSIONS[name] or index.meta.get('mappings') != list(mappings)
+            or not set(index.inputs) <= set(fingerprints)):
+        return HashIndex(), None
+    previous = stage_cache.load_latest(name)
+    if previous is None:
+        return HashIndex(), None
+    return index, previous
+
+def main(directory: Path, input_file_name: Path | Sequence[Path], mappings: List[str], parse_workers: int = 1,
+         instrument: bool = False, profiler: Optional[str] = None, keywords: bool = True,
+         skip_stages: Iterable[str] = (), cache: bool = True, rerun: Iterable[str] = (),
+         out_of_core: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE, approximate_counts: Optional[float] = None) -> None:
+    """
+    Runs the full processing pipeline for one Takeout source and writes all outputs.
+
+    Args:
+        directory (Path): Directory holding the input file; outputs are written to directory / 'output'.
+        input_file_name (Path | Sequence[Path]): Path of MyActivity.json or watch-history.json, or a list of paths
+            to merge the copies from several overlapping exports. Duplicate entries are dropped either way, see
+            deduplicate.HashIndex.
+        mappings (List[str]): Column names of the extracted data.
+        parse_workers (int): Number of processes used to parse the input file.
+        instrument (bool): Record wall time, CPU time, peak memory and rows in/out of every stage, and save
+            them as <SOURCE>_run_report.json next to the outputs with a summary printed to the console.
+        profiler (Optional[str]): 'cprofile' or 'pyinstrument' to profile every stage. Implies instrument.
+        keywords (bool): Run the keyword and visited sites analysis. When False, spaCy is never loaded and
+            the keyword columns of the aggregated outputs are left empty.
+        skip_stages (Iterable[str]): Names from OPTIONAL_STAGES to skip. Skipping 'content_analysis' is the
+            same as keywords=False; skipping 'aggregate' stops after the full data CSVs are written.
+        cache (bool): Reuse the outputs of stages whose inputs have not changed since the last run, and save the
+            output of every stage under output/cache.
+        rerun (Iterable[str]): Names from STAGE_VERSIONS to run again even if cached, e.g. ['aggregate'] to rebuild
+            only the aggregated outputs from the cached upstream stages. Stages downstream of them run again too.
+        out_of_core (bool): Process the export in chunks spilled to disk, for exports larger than memory. See
+            out_of_core.main; stage caching and parse_workers do not apply in this mode.
+        chunk_size (int): Number of entries held in memory at a time in out of core mode.
+        approximate_counts (Optional[float]): Count keywords, channels and sites in fixed-size sketches whose
+            estimates overcount by at most this fraction of all values counted (see sketches.HeavyHitters), instead
+            of exactly. The most frequent values are saved as <SOURCE>_heavy_hitters.csv along with the sketches.
+    """
+    if out_of_core:
+        # Imported here since out_of_core builds on this module
+        from self_stats.munger.out_of_core import main as out_of_core_main
+        out_of_core_main(directory, input_file_name, mappings, chunk_size, instrument=instrument, profiler=profiler,
+                         keywords=keywords, skip_stages=skip_stages, approximate_counts=approximate_counts)
+        return
+
+    skip_stages = set(skip_stages)
+    unknown_stages = skip_stages - set(OPTIONAL_STAGES)
+    if unknown_stages:
+        raise ValueError(f"Cannot skip {sorted(unknown_stages)}. Optional stages are {list(OPTIONAL_STAGES)}.")
+    unknown_stages = set(rerun) - set(STAGE_VERSIONS)
+    if unknown_stages:
+        raise ValueError(f"Cannot rerun {sorted(unknown_stages)}. Stages are {list(STAGE_VERSIONS)}.")
+    keywords = keywords and 'content_analysis' not in skip_stages
+
+    data_source = get_data_source(mappings)
 
     print("\n********************************************************************")
     print(f"*****************  Processing {data_source} history...  ********************")
     print("********************************************************************\n")
 
     # Define paths for saving output files
-    outer_path = directory / 'output'
-    path = outer_path / 'full_data'
-    agg_dir = outer_path / 'aggregated_data'
-    raw_save_path = path / f'{data_source.upper()}_raw.csv'
-    processed_save_path = path / f'{data_source.upper()}_processed.csv'
-    metadata_save_path = path / f'{data_source.upper()}_metadata.csv'
-    visited_sites_save_path = path / f'{data_source.upper()}_visited_sites.csv'
-    keywords_save_path = path / f'{data_source.upper()}_keywords.csv'
-    agg_save_path = outer_path / 'aggregated_data' / f'{data_source.upper()}.xlsx'
-    single_agg_save_path = outer_path / 'aggregated_data' / f'{data_source.upper()}_collated.xlsx'
-
-    directory_list = [outer_path, path, agg_dir]
+    paths = get_output_paths(directory, data_source)
+    outer_path = paths['outer']
+    raw_save_path = paths['raw']
+    processed_save_path = paths['processed']
+    metadata_save_path = paths['metadata']
+    visited_sites_save_path = paths['visited_sites']
+    keywords_save_path = paths['keywords']
+    segments_save_path = paths['segments']
+
+    directory_list = [outer_path, paths['full_data'], paths['aggregated']]
     create_output_directories(directory_list)
 
+    instrument = instrument or profiler is not None
+    report = RunReport(data_source, trace_memory=instrument, profiler=profiler, profile_dir=outer_path / 'profiles')
+    stage_cache = StageCache(paths['cache'], data_source.upper(), enabled=cache, rerun=rerun)
+
+    def run_stage(name: str, func, params: Optional[dict] = None):
+        return stage_cache.run(name, STAGE_VERSIONS[name], func, STAGE_INPUTS[name], params)
+
     print("Extracting data from input file...\n")
 
-    extracted_data = parse_and_process(directory, input_file_name, mappings)
+    with report.stage('parse_and_process') as stage:
+        input_files = as_input_files(input_file_name)
+        fingerprints = [fingerprint_file(path) if cache else str(path) for path in input_files]
+        source_params = {'input': fingerprints, 'mappings': list(mappings)}
+        index, previous = load_ingested(stage_cache, paths['dedup_index'], fingerprints, mappings)
+        extracted_data = run_stage('parse_and_process', lambda: parse_and_process(directory, input_files, mappings, workers=parse_workers,
+                                                                                  index=index, previous=previous, fingerprints=fingerprints),
+                                  source_params)
+        if not stage_cache.hits['parse_and_process']:
+            index.meta = {'stage_key': stage_cache.keys['parse_and_process'], 'version': STAGE_VERSIONS['parse_and_process'],
+                          'mappings': list(mappings)}
+            index.save(paths['dedup_index'])
+        stage['rows_out'] = count_rows(extracted_data)
+        stage['cached'] = stage_cache.hits['parse_and_process']
 
-    save_to_csv(extracted_data, raw_save_path, mappings)
+    if not stage_cache.is_reused(['parse_and_process'], [raw_save_path]):
+        with report.stage('save_raw_csv', rows_in=count_rows(extracted_data)):
+            save_to_csv(extracted_data, raw_save_path, mappings)
     print(f"Search data extraction complete.\nResults saved to {raw_save_path}'.\n")
     
     ############################################################
@@ -73,65 +275,307 @@ def main(directory: Path, input_file_name: Path, mappings: List[str]) -> None:
     # create_output_directories(directory_list)    
     ############################################################
 
+    if 'segment_activity' not in skip_stages:
+        print("Segmenting daily activity...")
+
+        with report.stage('segment_activity', rows_in=count_rows(extracted_data)) as stage:
+            segments = run_stage('segment_activity', lambda: segment_activity(extracted_data, mappings))
+            stage['rows_out'] = count_rows(segments)
+            stage['cached'] = stage_cache.hits['segment_activity']
+        if not stage_cache.is_reused(['segment_activity'], [segments_save_path]):
+            save_to_csv(segments, segments_save_path, SEGMENT_COLUMNS)
+        print(f"Activity segments saved to {segments_save_path}.\n")
+    else:
+        segments = tuple(np.array([], dtype=object) for _ in SEGMENT_COLUMNS)
+
     print("Cleaning data...")
     
-    arr_data_trimmed = trim_date(extracted_data, mappings)
+    with report.stage('trim_date', rows_in=count_rows(extracted_data)) as stage:
+        arr_data_trimmed = run_stage('trim_date', lambda: trim_date(extracted_data, mappings))
+        stage['rows_out'] = count_rows(arr_data_trimmed)
+        stage['cached'] = stage_cache.hits['trim_date']
     mappings.extend(['Day_of_the_Week', 'Hour_of_the_Day', 'Date_Only'])
-    arr_data_dated = add_date_columns(arr_data_trimmed)
+    with report.stage('add_date_columns', rows_in=count_rows(arr_data_trimmed)) as stage:
+        arr_data_dated = run_stage('add_date_columns', lambda: add_date_columns(arr_data_trimmed))
+        stage['rows_out'] = count_rows(arr_data_dated)
+        stage['cached'] = stage_cache.hits['add_date_columns']
 
     if data_source == 'search':
         mappings.extend(['Search_Duration'])
     if data_source == 'watch':
         mappings.extend(['Video_Duration', 'Short_Form_Video'])
-    imputed_data, metadata = imputer(arr_data_dated, mappings)
+    with report.stage('imputer', rows_in=count_rows(arr_data_dated)) as stage:
+        imputed_data, metadata = run_stage('imputer', lambda: imputer(arr_data_dated, mappings))
+        stage['rows_out'] = count_rows(imputed_data)
+        stage['cached'] = stage_cache.hits['imputer']
 
     print("Data cleaning complete.\n")
+
+    if data_source == 'search' and 'geo_binning' not in skip_stages:
+        with report.stage('geo_binning', rows_in=count_rows(imputed_data)) as stage:
+            geo_cells = run_stage('geo_binning', lambda: geo_binning(imputed_data, mappings))
+            stage['rows_out'] = count_rows(geo_cells)
+            stage['cached'] = stage_cache.hits['geo_binning']
+        if not stage_cache.is_reused(['geo_binning'], [paths['geo_cells']]):
+            save_to_csv(geo_cells, paths['geo_cells'], GEO_CELL_COLUMNS)
+        print(f"Location cells saved to {paths['geo_cells']}.\n")
+
+    if data_source == 'watch' and 'video_views' not in skip_stages:
+        with report.stage('video_views', rows_in=count_rows(imputed_data)) as stage:
+            repeat_views = RepeatViews(*run_stage('video_views', lambda: video_views(imputed_data, mappings)))
+            stage['rows_out'] = len(repeat_views)
+            stage['cached'] = stage_cache.hits['video_views']
+        if not stage_cache.is_reused(['video_views'], [paths['repeat_views']]):
+            save_to_csv(repeat_views.table(), paths['repeat_views'], REPEAT_VIEW_COLUMNS)
+        print(f"Repeat views saved to {paths['repeat_views']}.\n")
     
-    print("Executing keyword analysis. This may take a moment...\n")
+    if keywords:
+        print("Executing keyword analysis. This may take a moment...\n")
 
-    visited_sites, tokens_per_date = content_analysis(imputed_data, mappings)
+        with report.stage('content_analysis', rows_in=count_rows(imputed_data)) as stage:
+            visited_sites, tokens_per_date, (token_rows,) = run_stage('content_analysis', lambda: content_analysis(imputed_data, mappings, return_rows=True),
+                                                                      {'model': 'en_core_web_sm'})
+            stage['rows_out'] = count_rows(tokens_per_date)
+            stage['cached'] = stage_cache.hits['content_analysis']
 
-    print("Keyword analysis complete.\n")
+        print("Keyword analysis complete.\n")
 
-    save_to_csv(imputed_data, processed_save_path, mappings)
-    print(f"Processed data table results saved to {processed_save_path}.\n")
+        if 'keyword_trends' not in skip_stages:
+            with report.stage('keyword_trends', rows_in=count_rows(tokens_per_date)) as stage:
+                matrix = KeywordMatrix(*run_stage('keyword_trends', lambda: keyword_trends(tokens_per_date)))
+                stage['rows_out'] = len(matrix.counts)
+                stage['cached'] = stage_cache.hits['keyword_trends']
+            if not stage_cache.is_reused(['keyword_trends'], [paths['keyword_matrix'], paths['top_keywords'], paths['keyword_trends']]):
+                save_keyword_outputs(matrix, paths)
+            print(f"Keyword matrix and trends saved to {paths['keyword_matrix']}.\n")
 
-    save_to_csv(metadata, metadata_save_path, ['Activity_Window_Start_Date', 'Activity_Window_Start_Index', 'Activity_Window_End_Index', 'Activity_Window_Duration', 'Actions_per_Activity_Window', 'Approximate_Actions_per_Minute'])
-    print(f"Metadata saved to {metadata_save_path}.\n")
-    
-    if data_source == 'search':
-        save_to_csv(visited_sites, visited_sites_save_path, ['Date', 'Visited_Sites'])
-        print(f"Visited sites saved to {visited_sites_save_path}.\n")
+        if 'inverted_index' not in skip_stages:
+            with report.stage('inverted_index', rows_in=count_rows(tokens_per_date)) as stage:
+                index = InvertedIndex(*run_stage('inverted_index', lambda: inverted_index(imputed_data, token_rows, tokens_per_date[1])))
+                stage['rows_out'] = len(index)
+                stage['cached'] = stage_cache.hits['inverted_index']
+            if not stage_cache.is_reused(['inverted_index'], [paths['inverted_index']]):
+                index.save(paths['inverted_index'])
+            print(f"Keyword index saved to {paths['inverted_index']}.\n")
+    else:
+        print("Skipping keyword analysis.\n")
+        visited_sites = (np.array([], dtype=object), np.array([], dtype=object))
+        tokens_per_date = (np.array([], dtype=object), np.array([], dtype=object))
+
+    full_data_stages = ['imputer', 'content_analysis'] if keywords else ['imputer']
+    full_data_files = [processed_save_path, metadata_save_path]
+    if keywords:
+        full_data_files.append(keywords_save_path)
+        if data_source == 'search':
+            full_data_files.append(visited_sites_save_path)
+    if stage_cache.is_reused(full_data_stages, full_data_files):
+        print(f"Processed data table results in {processed_save_path} are up to date.\n")
+    else:
+        with report.stage('save_full_data_csv', rows_in=count_rows(imputed_data)):
+            save_to_csv(imputed_data, processed_save_path, mappings)
+            print(f"Processed data table results saved to {processed_save_path}.\n")
+
+            save_to_csv(metadata, metadata_save_path, METADATA_COLUMNS)
+            print(f"Metadata saved to {metadata_save_path}.\n")
 
-    save_to_csv(tokens_per_date, keywords_save_path, ['Date', 'Keywords'])
-    print(f'Tokens per date saved to {keywords_save_path}.\n')
+            if keywords and data_source == 'search':
+                save_to_csv(visited_sites, visited_sites_save_path, ['Date', 'Visited_Sites'])
+                print(f"Visited sites saved to {visited_sites_save_path}.\n")
+
+            if keywords:
+                save_to_csv(tokens_per_date, keywords_save_path, ['Date', 'Keywords'])
+                print(f'Tokens per date saved to {keywords_save_path}.\n')
 
     ############################################################
 
+    if 'aggregate' not in skip_stages:
+        aggregate_params = {'approximate_counts': approximate_counts} if approximate_counts else None
+        aggregate_paths = [paths['agg'], paths['single_agg'], paths['rolling_stats'], paths['weekday_baselines'], paths['calendar_stats']]
+        if approximate_counts:
+            aggregate_paths.extend([paths['heavy_hitters'], paths['sketches']])
+        if stage_cache.is_current('aggregate', STAGE_VERSIONS['aggregate'], aggregate_paths, STAGE_INPUTS['aggregate'], aggregate_params):
+            print(f"Aggregated data in {paths['agg']} is up to date.\n")
+        else:
+            aggregate_outputs(data_source, imputed_data, metadata, visited_sites, tokens_per_date, segments, paths, report,
+                              approximate_counts)
+
+    stage_cache.save_manifest()
+    report.close()
+    if instrument:
+        report.save_json(paths['report'])
+        report.print_summary()
+        print(f"Run report saved to {paths['report']}\n")
+
+    print(f"\n***********  Completed {data_source} history processing!  ******************\n")
+
+def save_keyword_outputs(matrix: KeywordMatrix, paths: Dict[str, Path]) -> None:
+    """
+    Saves the keyword matrix along with its top keywords and keyword trends tables.
+
+    Args:
+        matrix (KeywordMatrix): Day × token keyword counts.
+        paths (Dict[str, Path]): Output paths as returned by get_output_paths.
+    """
+    matrix.save(paths['keyword_matrix'])
+    top_keywords, trends = keyword_tables(matrix)
+    save_to_csv(top_keywords, paths['top_keywords'], TOP_KEYWORD_COLUMNS)
+    save_to_csv(trends, paths['keyword_trends'], KEYWORD_TREND_COLUMNS)
+
+def save_window_stats(aggregated_data: Tuple[np.ndarray, ...], paths: Dict[str, Path], report: RunReport) -> None:
+    """
+    Saves the rolling, weekday baseline and calendar statistics of the daily time series, updating the daily
+    series kept from the previous run rather than rebuilding it, and rewriting only the rows of the days changed
+    since.
+
+    Args:
+        aggregated_data (Tuple[np.ndarray, ...]): Daily time series, as returned by aggregate_by_day.
+        paths (Dict[str, Path]): Output paths as returned by get_output_paths.
+        report (RunReport): Report the stage is recorded in.
+    """
+    with report.stage('window_stats', rows_in=count_rows(aggregated_data)) as stage:
+        series = window_stats(aggregated_data, paths['daily_series'],
+                              (paths['rolling_stats'], paths['weekday_baselines'], paths['calendar_stats']))
+        stage['rows_out'] = len(series)
+    print(f"Rolling and calendar statistics saved to {paths['rolling_stats']} and {paths['calendar_stats']}.\n")
+
+def new_sketches(data_source: str, approximate_counts: Optional[float]) -> Dict[str, HeavyHitters]:
+    """
+    Returns an empty sketch for each string column counted by the aggregation, or none when counting exactly.
+    """
+    if not approximate_counts:
+        return {}
+    names = ['keywords', 'channels'] if data_source == 'watch' else ['keywords', 'sites']
+    return {name: HeavyHitters(approximate_counts) for name in names}
+
+def load_saved_sketches(path: Path, data_source: str, approximate_counts: Optional[float]) -> Dict[str, HeavyHitters]:
+    """
+    Loads the sketches saved by an earlier run with the same error, which the aggregation merges with the counts of
+    the rows added since instead of counting every row again (see aggregate_data.remove_unique_entries). Returns
+    none when counting exactly, or when there are no such sketches.
+    """
+    expected = new_sketches(data_source, approximate_counts)
+    if not expected or not Path(path).exists():
+        return {}
+    try:
+        saved = load_sketches(path)
+    except (OSError, ValueError, KeyError):
+        return {}
+    settings = {name: (sketch.sketch.epsilon, sketch.sketch.delta) for name, sketch in expected.items()}
+    if {name: (sketch.sketch.epsilon, sketch.sketch.delta) for name, sketch in saved.items()} != settings:
+        return {}
+    return saved
+
+def save_heavy_hitters(sketches: Dict[str, HeavyHitters], paths: Dict[str, Path]) -> None:
+    """
+    Saves the sketches, which later runs can merge with, and the table of their most frequent values.
+    """
+    save_sketches(paths['sketches'], sketches)
+    save_to_csv(heavy_hitter_table(sketches), paths['heavy_hitters'], HEAVY_HITTER_COLUMNS)
+    print(f"Most frequent values saved to {paths['heavy_hitters']}.\n")
+
+def aggregate_outputs(
+    data_source: str,
+    imputed_data: Tuple[np.ndarray, ...],
+    metadata: Tuple[np.ndarray, ...],
+    visited_sites: Tuple[np.ndarray, np.ndarray],
+    tokens_per_date: Tuple[np.ndarray, np.ndarray],
+    segments: Tuple[np.ndarray, ...],
+    paths: Dict[str, Path],
+    report: RunReport,
+    approximate_counts: Optional[float] = None
+) -> None:
+    """
+    Aggregates processed data by day and writes the aggregated Excel workbooks.
+
+    Args:
+        data_source (str): 'search' or 'watch'.
+        imputed_data (Tuple[np.ndarray, ...]): Processed data columns.
+        metadata (Tuple[np.ndarray, ...]): Activity window metadata columns.
+        visited_sites (Tuple[np.ndarray, np.ndarray]): Dates and visited sites (search only).
+        tokens_per_date (Tuple[np.ndarray, np.ndarray]): Dates and keywords.
+        segments (Tuple[np.ndarray, ...]): Activity segments table.
+        paths (Dict[str, Path]): Output paths as returned by get_output_paths.
+        report (RunReport): Report the aggregation stages are recorded in.
+        approximate_counts (Optional[float]): Count keywords, channels and sites with sketches of this error, see main.
+    """
     print(f'\nAggregating {data_source} data by day...\n')
+    sketches = new_sketches(data_source, approximate_counts)
+    saved = load_saved_sketches(paths['sketches'], data_source, approximate_counts)
 
-    aggregate_keywords = remove_unique_entries(tokens_per_date)
+    with report.stage('remove_unique_entries', rows_in=count_rows(tokens_per_date)) as stage:
+        aggregate_keywords = remove_unique_entries(tokens_per_date, sketches.get('keywords'), saved.get('keywords'))
 
-    if data_source == 'search':
-        aggregated_sites = remove_unique_entries(visited_sites)
+        if data_source == 'search':
+            aggregated_sites = remove_unique_entries(visited_sites, sketches.get('sites'), saved.get('sites'))
+        stage['rows_out'] = count_rows(aggregate_keywords)
 
-    mappings = ['Activity_Window_Start_Date', 'Activity_Window_Start_Index', 'Activity_Window_End_Index', 'Activity_Window_Duration', 'Actions_per_Activity_Window', 'Approximate_Actions_per_Minute']
-    aggregate_activity = aggregate_activity_by_day(metadata, mappings)
+    mappings = list(METADATA_COLUMNS)
+    with report.stage('aggregate_activity_by_day', rows_in=count_rows(metadata)) as stage:
+        aggregate_activity = aggregate_activity_by_day(metadata, mappings)
+        stage['rows_out'] = count_rows(aggregate_activity)
     mappings = ['Date', 'Record_Count', 'Day_of_the_Week', 'Most_Active_Hour_of_the_Day']
     if data_source == 'watch':
         mappings.extend(['Short_Form_Ratio'])
 
-    aggregated_data = aggregate_by_day(imputed_data, mappings)
-    mappings = ['Date', 'Record_Count', 'Day_of_the_Week', 'Most_Active_Hour_of_the_Day']
+    with report.stage('aggregate_by_day', rows_in=count_rows(imputed_data)) as stage:
+        aggregated_data = aggregate_by_day(imputed_data, mappings)
+        stage['rows_out'] = count_rows(aggregated_data)
+
     if data_source == 'watch':
-        mappings.extend(['Short_Form_Ratio'])
-    
+        date_channel_array = (imputed_data[0], imputed_data[2])
+        short_form_array = (imputed_data[0], imputed_data[8])
+        with report.stage('remove_unique_channels', rows_in=count_rows(date_channel_array)) as stage:
+            aggregated_channels = remove_unique_entries(date_channel_array, sketches.get('channels'), saved.get('channels'))
+            stage['rows_out'] = count_rows(aggregated_channels)
+        write_aggregated_workbooks(data_source, aggregated_data, aggregate_activity, aggregate_keywords, aggregated_channels,
+                                   segments, paths, report, short_form_array)
+    else:
+        write_aggregated_workbooks(data_source, aggregated_data, aggregate_activity, aggregate_keywords, aggregated_sites,
+                                   segments, paths, report)
+    save_window_stats(aggregated_data, paths, report)
+    if sketches:
+        through = np.asarray(imputed_data[0], dtype='datetime64[s]').max() if len(imputed_data[0]) else None
+        for sketch in sketches.values():
+            sketch.through = through
+        save_heavy_hitters(sketches, paths)
+
+def write_aggregated_workbooks(
+    data_source: str,
+    aggregated_data: Tuple[np.ndarray, ...],
+    aggregate_activity: Tuple[np.ndarray, ...],
+    aggregate_keywords: Tuple[np.ndarray, np.ndarray],
+    aggregated_entries: Tuple[np.ndarray, np.ndarray],
+    segments: Tuple[np.ndarray, ...],
+    paths: Dict[str, Path],
+    report: RunReport,
+    short_form_array: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    chunk_size: Optional[int] = None
+) -> None:
+    """
+    Writes the aggregated and collated Excel workbooks from the daily tables.
+
+    Args:
+        data_source (str): 'search' or 'watch'.
+        aggregated_data (Tuple[np.ndarray, ...]): Daily time series, as returned by aggregate_by_day.
+        aggregate_activity (Tuple[np.ndarray, ...]): Daily activity window averages.
+        aggregate_keywords (Tuple[np.ndarray, np.ndarray]): Dates and keywords seen more than twice.
+        aggregated_entries (Tuple[np.ndarray, np.ndarray]): Dates and visited sites (search) or channels (watch)
+            seen more than twice.
+        segments (Tuple[np.ndarray, ...]): Activity segments table.
+        paths (Dict[str, Path]): Output paths as returned by get_output_paths.
+        report (RunReport): Report the write is recorded in.
+        short_form_array (Optional[Tuple[np.ndarray, np.ndarray]]): Dates and short-form labels (watch only).
+        chunk_size (Optional[int]): Write the workbooks this many rows at a time, so that the keyword, entry and
+            short-form columns can be columns read from disk (see out_of_core.SpilledColumn).
+    """
+    agg_save_path = paths['agg']
+    single_agg_save_path = paths['single_agg']
+
     def flatten(xss):
         return [x for xs in xss for x in xs]
 
-    array_lists = [aggregated_data, aggregate_activity, aggregate_keywords]
+    array_lists = [aggregated_data, aggregate_activity, aggregate_keywords, aggregated_entries]
     if data_source == 'search':
-        array_lists.append(aggregated_sites)
         sheet_names = ['Time_Series', 'Activity', 'Keywords', 'Sites']
         column_name_lists = [
             ['Date', 'Record_Count', 'Day_of_the_Week', 'Most_Active_Hour_of_the_Day'],
@@ -139,15 +583,11 @@ def main(directory: Path, input_file_name: Path, mappings: List[str]) -> None:
             ['Date_Keywords', 'Keywords'], 
             ['Date_Sites', 'Visited_Sites']]
         
-        combined_tuple = tuple(chain(aggregated_data, aggregate_activity, aggregate_keywords, aggregated_sites))
+        combined_tuple = tuple(chain(aggregated_data, aggregate_activity, aggregate_keywords, aggregated_entries))
         single_file_column_name_lists = flatten(column_name_lists)
         single_file_column_types = ['date', 'float', 'str', 'float', 'date', 'float', 'float', 'float', 'date_time', 'str', 'date_time', 'str']
 
     if data_source == 'watch':
-        date_channel_array = (imputed_data[0], imputed_data[2])
-        short_form_array = (imputed_data[0], imputed_data[8]) 
-        aggregated_channels = remove_unique_entries(date_channel_array)
-        array_lists.append(aggregated_channels)
         sheet_names = ['Time_Series', 'Activity_Windows', 'Keywords', 'Channels']
         column_name_lists = [
             ['Date', 'Record_Count', 'Day_of_the_Week', 'Most_Active_Hour_of_the_Day', 'Short_Form_Ratio'],
@@ -155,13 +595,128 @@ def main(directory: Path, input_file_name: Path, mappings: List[str]) -> None:
             ['Date_Keywords', 'Keywords'], 
             ['Date_Channel', 'Channel_Title']]
 
-        combined_tuple = tuple(chain(aggregated_data, aggregate_activity, aggregate_keywords, aggregated_channels, short_form_array))
+        combined_tuple = tuple(chain(aggregated_data, aggregate_activity, aggregate_keywords, aggregated_entries, short_form_array))
         single_file_column_name_lists = flatten(column_name_lists)
         single_file_column_name_lists.extend(['Date_Short_Form', 'Short_Form_Labels'])
         single_file_column_types = ['date', 'float', 'str', 'float', 'float', 'Date', 'float', 'float', 'float', 'date_time', 'str', 'date_time', 'str', 'date_time', 'str']
     
-    write_arrays_to_single_excel(combined_tuple, single_file_column_name_lists, single_file_column_types, single_agg_save_path)
-    write_arrays_to_excel(array_lists, column_name_lists, sheet_names, agg_save_path)
+    array_lists.append(segments)
+    sheet_names.append('Segments')
+    column_name_lists.append(SEGMENT_COLUMNS)
+
+    with report.stage('write_excel'):
+        write_arrays_to_single_excel(combined_tuple, single_file_column_name_lists, single_file_column_types, single_agg_save_path,
+                                     chunk_size=chunk_size)
+        write_arrays_to_excel(array_lists, column_name_lists, sheet_names, agg_save_path, chunk_size=chunk_size)
     print(f'Aggregated data saved to {agg_save_path}\n')
 
-    print(f"\n***********  Completed {data_source} history processing!  ******************\n")
\ No newline at end of file
+def parse_datetime_column(values: np.ndarray) -> np.ndarray:
+    """
+    Converts a column of 'YYYY-MM-DD HH:MM:SS' strings read back from CSV into datetime objects.
+    """
+    return np.array([datetime.fromisoformat(value) for value in values], dtype=object)
+
+def parse_float_column(values: np.ndarray) -> np.ndarray:
+    """
+    Converts a column of numeric strings read back from CSV into floats, empty cells becoming NaN.
+    """
+    return np.array([float(value) if value not in ('', 'None') else np.nan for value in values], dtype=float)
+
+def parse_text_column(values: np.ndarray) -> np.ndarray:
+    """
+    Restores missing values (written as empty cells) in a text column read back from CSV.
+    """
+    column = np.array(values, dtype=object)
+    column[column == ''] = None
+    return column
+
+def load_full_data(directory: Path, data_source: str) -> Tuple[Tuple[np.ndarray, ...], ...]:
+    """
+    Loads the full data CSVs of a previous run so that aggregation can be re-run without reprocessing.
+
+    Args:
+        directory (Path): Directory that was processed.
+        data_source (str): 'search' or 'watch'.
+
+    Returns:
+        Tuple[Tuple[np.ndarray, ...], ...]: imputed data, metadata, visited sites, tokens per date and segments.
+
+    Raises:
+        FileNotFoundError: If the processed data or metadata CSV is missing.
+    """
+    paths = get_output_paths(directory, data_source)
+
+    _, processed = read_csv_columns(paths['processed'])
+    imputed_data = (parse_datetime_column(processed[0]),) + tuple(parse_text_column(column) for column in processed[1:])
+
+    _, metadata_columns = read_csv_columns(paths['metadata'])
+    metadata = (parse_datetime_column(metadata_columns[0]),) + tuple(parse_float_column(column) for column in metadata_columns[1:])
+
+    def load_pairs(path: Path) -> Tuple[np.ndarray, np.ndarray]:
+        if not path.exists():
+            return np.array([], dtype=object), np.array([], dtype=object)
+        _, (dates, values) = read_csv_columns(path)
+        return parse_datetime_column(dates), values
+
+    visited_sites = load_pairs(paths['visited_sites'])
+    tokens_per_date = load_pairs(paths['keywords'])
+
+    if paths['segments'].exists():
+        _, segments = read_csv_columns(paths['segments'])
+        segments = (segments[0], segments[1], segments[2].astype(np.int64), parse_float_column(segments[3]))
+    else:
+        segments = tuple(np.array([], dtype=object) for _ in SEGMENT_COLUMNS)
+
+    return imputed_data, metadata, visited_sites, tokens_per_date, segments
+
+def load_cached_data(directory: Path, data_source: str) -> Optional[Tuple[Tuple[np.ndarray, ...], ...]]:
+    """
+    Loads the cached stage artifacts of the latest run, which keep the exact column types of the pipeline.
+
+    Args:
+        directory (Path): Directory that was processed.
+        data_source (str): 'search' or 'watch'.
+
+    Returns:
+        Optional[Tuple[Tuple[np.ndarray, ...], ...]]: The same tables as load_full_data, or None if the latest
+        run did not leave cached artifacts.
+    """
+    stage_cache = StageCache(get_output_paths(directory, data_source)['cache'], data_source.upper(), enabled=False)
+    imputed = stage_cache.load_latest('imputer')
+    if imputed is None:
+        return None
+    imputed_data, metadata = imputed
+
+    empty_pairs = (np.array([], dtype=object), np.array([], dtype=object))
+    visited_sites, tokens_per_date = (stage_cache.load_latest('content_analysis') or (empty_pairs, empty_pairs))[:2]
+    segments = stage_cache.load_latest('segment_activity') or tuple(np.array([], dtype=object) for _ in SEGMENT_COLUMNS)
+    return imputed_data, metadata, visited_sites, tokens_per_date, segments
+
+def aggregate_main(directory: Path, data_source: str, instrument: bool = False, approximate_counts: Optional[float] = None) -> None:
+    """
+    Re-runs only the aggregation stage from the cached artifacts, or the full data CSVs, of a previous run.
+
+    Args:
+        directory (Path): Directory that was processed.
+        data_source (str): 'search' or 'watch'.
+        instrument (bool): Save and print a run report of the aggregation stages.
+        approximate_counts (Optional[float]): Count keywords, channels and sites with sketches of this error, see main.
+    """
+    paths = get_output_paths(directory, data_source)
+    create_output_directories([paths['outer'], paths['aggregated']])
+    report = RunReport(data_source, trace_memory=instrument)
+
+    with report.stage('load_full_data') as stage:
+        full_data = load_cached_data(directory, data_source) or load_full_data(directory, data_source)
+        imputed_data, metadata, visited_sites, tokens_per_date, segments = full_data
+        stage['rows_out'] = count_rows(imputed_data)
+
+    aggregate_outputs(data_source, imputed_data, metadata, visited_sites, tokens_per_date, segments, paths, report,
+                      approximate_counts)
+
+    report.close()
+    if instrument:
+        report.save_json(paths['report'])
+        report.print_summary()
+
+    print(f"\n***********  Completed {data_source} aggregation!  ******************\n")
@@ -0,0 +1,726 @@
+import shutil
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from self_stats.munger.input_output import as_input_files, create_output_directories, iter_json_array, save_to_csv
+from self_stats.munger.deduplicate import HashIndex, merge_entry_streams
+from self_stats.munger.parse_and_process import extract_search_columns, extract_watch_columns
+from self_stats.munger.process_dates import clean_dates_main, detect_changepoint
+from self_stats.munger.parallel_parse import DEFAULT_CHUNK_SIZE, iter_batches
+from self_stats.munger.add_date_columns import main as add_date_columns
+from self_stats.munger.impute_time_data import calculate_differences, flag_short_videos, calculate_average_counts_per_window
+from self_stats.munger.content_analysis import main as content_analysis
+from self_stats.munger.segment_activity import segment_counts
+from self_stats.munger.geo_binning import DEFAULT_PRECISIONS, GEO_CELL_COLUMNS, cell_table, concatenate_tables, count_cells_per_day, encode_cells, valid_coordinates
+from self_stats.munger.instrumentation import RunReport, count_rows
+from self_stats.munger.stage_cache import StageCache
+from self_stats.munger.keyword_trends import KeywordMatrix
+from self_stats.munger.inverted_index import InvertedIndex
+from self_stats.munger.video_views import REPEAT_VIEW_COLUMNS, RepeatViews
+from self_stats.munger.sketches import HeavyHitters
+from self_stats.munger.munger_main import METADATA_COLUMNS, OPTIONAL_STAGES, SEGMENT_COLUMNS, get_data_source, get_output_paths, load_saved_sketches, new_sketches, save_heavy_hitters, save_keyword_outputs, save_window_stats, write_aggregated_workbooks
+
+WEEKDAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], dtype=object)
+
+def column_kind(column: np.ndarray) -> str:
+    """
+    Returns how a column is stored in a ColumnSpill: 'numeric', 'datetime' or 'strings'.
+    """
+    if column.dtype.kind in 'biuf':
+        return 'numeric'
+    if column.dtype.kind == 'M' or isinstance(next((value for value in column if value is not None), None), datetime):
+        return 'datetime'
+    return 'strings'
+
+class ColumnSpill:
+    """
+    Append-only columnar store on disk whose columns are read back through memory maps.
+
+    Numeric columns are stored as one raw file each and datetimes as datetime64[us]. String columns are
+    stored as a UTF-8 data file, an int64 offsets file (row i spans offsets[i]:offsets[i + 1]) and a
+    validity file marking None. Only the rows of the slice being read are ever decoded.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+        self.directory.mkdir(parents=True)
+        self.kinds: Dict[str, str] = {}
+        self.dtypes: Dict[str, np.dtype] = {}
+        self.data_bytes: Dict[str, int] = {}
+        self.rows = 0
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def path(self, name: str, part: str) -> Path:
+        return self.directory / f'{name}.{part}'
+
+    def append(self, columns: Dict[str, np.ndarray]) -> None:
+        """
+        Appends a chunk of rows. Every chunk must have the same columns; the type of each column is fixed by the first chunk.
+        """
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"Columns of a chunk must have the same length, got {sorted(lengths)}.")
+        for name, column in columns.items():
+            column = np.asarray(column)
+            if name not in self.kinds:
+                self.kinds[name] = column_kind(column)
+                self.dtypes[name] = column.dtype if self.kinds[name] == 'numeric' else np.dtype('datetime64[us]')
+                if self.kinds[name] == 'strings':
+                    self.data_bytes[name] = 0
+                    np.zeros(1, dtype=np.int64).tofile(self.path(name, 'offsets'))
+
+            kind = self.kinds[name]
+            if kind == 'strings':
+                valid = np.array([isinstance(value, str) for value in column.tolist()], dtype=bool)
+                encoded = [value.encode('utf-8') if is_valid else b'' for value, is_valid in zip(column.tolist(), valid)]
+                offsets = self.data_bytes[name] + np.cumsum([len(value) for value in encoded], dtype=np.int64)
+                with open(self.path(name, 'values'), 'ab') as file:
+                    file.write(b''.join(encoded))
+                with open(self.path(name, 'offsets'), 'ab') as file:
+                    offsets.tofile(file)
+                with open(self.path(name, 'valid'), 'ab') as file:
+                    valid.tofile(file)
+                if len(offsets):
+                    self.data_bytes[name] = int(offsets[-1])
+            else:
+                with open(self.path(name, 'values'), 'ab') as file:
+                    np.asarray(column, dtype=self.dtypes[name]).tofile(file)
+        self.rows += lengths.pop()
+
+    def memmap(self, name: str, part: str, dtype: Any) -> np.ndarray:
+        """
+        Maps one file of a column, read-only.
+        """
+        path = self.path(name, part)
+        if not path.exists() or path.stat().st_size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def read_column(self, name: str, start: int, stop: int) -> np.ndarray:
+        """
+        Decodes rows start:stop of a column into the array type the pipeline uses.
+        """
+        kind = self.kinds[name]
+        if kind == 'numeric':
+            return np.array(self.memmap(name, 'values', self.dtypes[name])[start:stop])
+        if kind == 'datetime':
+            return self.memmap(name, 'values', self.dtypes[name])[start:stop].astype(object)
+
+        offsets = np.array(self.memmap(name, 'offsets', np.int64)[start:stop + 1])
+        valid = np.array(self.memmap(name, 'valid', bool)[start:stop])
+        data = self.memmap(name, 'values', np.uint8)[offsets[0]:offsets[-1]].tobytes()
+        offsets -= offsets[0]
+        column = np.full(len(valid), None, dtype=object)
+        rows = np.flatnonzero(valid)
+        column[rows] = [data[offsets[row]:offsets[row + 1]].decode('utf-8') for row in rows.tolist()]
+        return column
+
+    def iter_chunks(self, chunk_size: int, names: Optional[Sequence[str]] = None) -> Iterator[Tuple[np.ndarray, ...]]:
+        """
+        Yields the stored rows in order, chunk_size rows at a time, as tuples of columns.
+        """
+        names = list(names or self.kinds)
+        for start in range(0, self.rows, chunk_size):
+            stop = min(start + chunk_size, self.rows)
+            yield tuple(self.read_column(name, start, stop) for name in names)
+
+class SpilledColumn:
+    """
+    One column of a ColumnSpill that decodes only the rows it is sliced with, so that it can stand in for a
+    whole array where outputs are written block by block (see input_output.iter_row_blocks).
+    """
+
+    def __init__(self, spill: ColumnSpill, name: str) -> None:
+        self.spill = spill
+        self.name = name
+
+    def __len__(self) -> int:
+        return len(self.spill)
+
+    def __getitem__(self, rows: slice) -> np.ndarray:
+        start, stop, step = rows.indices(len(self.spill))
+        if step != 1:
+            raise ValueError("Spilled columns can only be sliced in order.")
+        if stop <= start:
+            return np.array([], dtype=object)
+        return self.spill.read_column(self.name, start, stop)
+
+class DailyCounts:
+    """
+    Running count of entries per day, enough to rebuild the daily series trim_date and segment_activity work on.
+    """
+
+    def __init__(self) -> None:
+        self.counts: Counter = Counter()
+
+    def update(self, dates: np.ndarray) -> None:
+        days, counts = np.unique(np.array(dates, dtype='datetime64[D]').astype(np.int64), return_counts=True)
+        self.counts.update(dict(zip(days.tolist(), counts.tolist())))
+
+    def series(self, include_empty: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns sorted days and their counts, as calculate_daily_counts does.
+        """
+        if not self.counts:
+            return np.array([], dtype='datetime64[D]'), np.zeros((0, 1), dtype=np.int64)
+        days = np.array(sorted(self.counts), dtype=np.int64)
+        counts = np.array([self.counts[day] for day in days.tolist()], dtype=np.int64)
+        if include_empty:
+            dense = np.zeros(days[-1] - days[0] + 1, dtype=np.int64)
+            dense[days - days[0]] = counts
+            days, counts = np.arange(days[0], days[-1] + 1), dense
+        return days.astype('datetime64[D]'), counts.reshape(-1, 1)
+
+class StreamingImputer:
+    """
+    Runs the imputer stage chunk by chunk, carrying the state that crosses chunk boundaries.
+
+    The duration of a row depends on the next row, so the last row of every chunk is held back until the
+    next chunk arrives. An activity window still open at the end of a chunk is carried over with its start
+    index and time, and closed by the first row of a later chunk that ends it.
+    """
+
+    def __init__(self, video: bool, interrupt_time: timedelta = timedelta(minutes=20)) -> None:
+        self.video = video
+        self.interrupt_time = interrupt_time
+        self.carry: Optional[Tuple[np.ndarray, ...]] = None
+        self.offset = 0
+        self.open_window: Optional[Tuple[int, datetime]] = None
+        self.last_time: Optional[datetime] = None
+
+    def update(self, chunk: Tuple[np.ndarray, ...]) -> Optional[Tuple[Tuple[np.ndarray, ...], Tuple[np.ndarray, ...]]]:
+        """
+        Adds a chunk of rows and returns the imputed rows and the activity windows that are now complete,
+        or None if no row can be emitted yet.
+        """
+        buffer = chunk if self.carry is None else tuple(np.concatenate((held, column)) for held, column in zip(self.carry, chunk))
+        if len(buffer[0]) == 0:
+            return None
+        self.carry = tuple(column[-1:] for column in buffer)
+        if len(buffer[0]) == 1:
+            return None
+        differences = calculate_differences(buffer[0], self.interrupt_time)[:-1]
+        return self.emit(tuple(column[:-1] for column in buffer), differences)
+
+    def finish(self) -> Optional[Tuple[Tuple[np.ndarray, ...], Tuple[np.ndarray, ...]]]:
+        """
+        Emits the held back last row, whose duration is unknown, and closes any open window.
+        """
+        if self.carry is None:
+            return None
+        rows, self.carry = self.carry, None
+        return self.emit(rows, np.array([None], dtype=object))
+
+    def emit(self, rows: Tuple[np.ndarray, ...], differences: np.ndarray) -> Tuple[Tuple[np.ndarray, ...], Tuple[np.ndarray, ...]]:
+        timestamps = rows[0]
+        valid = differences != None
+        count = len(valid)
+
+        # Runs of consecutive known differences, with exclusive stops
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], valid, [False])).astype(np.int8)))
+        windows = []
+        if self.open_window is not None and (len(edges) == 0 or edges[0] != 0):
+            windows.append(self.open_window + (self.offset - 1, self.last_time))
+            self.open_window = None
+        for start, stop in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+            if start == 0 and self.open_window is not None:
+                window_start, self.open_window = self.open_window, None
+            else:
+                window_start = (self.offset + start, timestamps[start])
+            if stop == count:
+                self.open_window = window_start
+            else:
+                windows.append(window_start + (self.offset + stop - 1, timestamps[stop - 1]))
+        self.offset += count
+        self.last_time = timestamps[-1]
+
+        windows = [window for window in windows if window[0] != window[2]]
+        start_indices = np.array([window[0] for window in windows], dtype=np.int64)
+        end_indices = np.array([window[2] for window in windows], dtype=np.int64)
+        start_markers = np.array([window[3] for window in windows], dtype=object)
+        durations = np.array([round((window[1] - window[3]).total_seconds() / 60, 4) for window in windows], dtype=float)
+        counts = end_indices - start_indices + 1
+        metadata = (start_markers, end_indices, start_indices, durations, counts, calculate_average_counts_per_window(durations, counts))
+
+        if self.video:
+            return (*rows, differences, flag_short_videos(differences)), metadata
+        return (*rows, differences), metadata
+
+class DailyRollup:
+    """
+    Running per-day entry counts, hour of day histograms and short-form counts for the Time_Series table.
+    """
+
+    def __init__(self) -> None:
+        self.hours: Dict[int, np.ndarray] = {}
+        self.short_form: Counter = Counter()
+        self.long_form: Counter = Counter()
+
+    def update(self, dates: np.ndarray, hours: np.ndarray, labels: Optional[np.ndarray] = None) -> None:
+        days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+        keys, counts = np.unique(days * 24 + np.asarray(hours, dtype=np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            day, hour = divmod(key, 24)
+            histogram = self.hours.get(day)
+            if histogram is None:
+                histogram = self.hours[day] = np.zeros(24, dtype=np.int64)
+            histogram[hour] += count
+        if labels is not None:
+            for counter, label in ((self.short_form, 'Short-Form'), (self.long_form, 'Long-Form')):
+                label_days, label_counts = np.unique(days[labels == label], return_counts=True)
+                counter.update(dict(zip(label_days.tolist(), label_counts.tolist())))
+
+    def table(self, video: bool) -> Tuple[np.ndarray, ...]:
+        """
+        Returns the same columns as aggregate_data.main: date, count, weekday, most active hour and, for
+        watch history, the short-form to long-form ratio.
+        """
+        days = np.array(sorted(self.hours), dtype=np.int64)
+        histograms = np.array([self.hours[day] for day in days.tolist()], dtype=np.int64).reshape(-1, 24)
+        date_strings = np.datetime_as_string(days.astype('datetime64[D]'), unit='D').astype(object)
+        # 1970-01-01 was a Thursday; argmax keeps the earliest of tied hours, like Series.mode()[0]
+        output = (date_strings, histograms.sum(axis=1), WEEKDAY_NAMES[(days + 3) % 7], histograms.argmax(axis=1))
+        if not video:
+            return output
+        short_form = np.array([self.short_form[day] for day in days.tolist()], dtype=float)
+        long_form = np.array([self.long_form[day] for day in days.tolist()], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = short_form / long_form
+        ratios[~np.isfinite(ratios) | (ratios == 0)] = np.nan
+        return output + (ratios,)
+
+class ActivityRollup:
+    """
+    Running per-day sums of the activity window metadata for the Activity table.
+
+    Sums are Kahan-compensated, as in the pandas groupby mean used by aggregate_activity_by_day, so that both
+    give the same means when windows are added in the same order.
+    """
+
+    def __init__(self) -> None:
+        self.sums: Dict[Any, np.ndarray] = {}
+        self.compensations: Dict[Any, np.ndarray] = {}
+        self.counts: Dict[Any, np.ndarray] = {}
+
+    def update(self, metadata: Tuple[np.ndarray, ...]) -> None:
+        values = np.column_stack(metadata[3:]).astype(float)
+        for day, row in zip((marker.date() for marker in metadata[0]), values):
+            if day not in self.sums:
+                self.sums[day] = np.zeros(values.shape[1])
+                self.compensations[day] = np.zeros(values.shape[1])
+                self.counts[day] = np.zeros(values.shape[1], dtype=np.int64)
+            known = ~np.isnan(row)
+            total, compensation = self.sums[day], self.compensations[day]
+            adjusted = row[known] - compensation[known]
+            updated = total[known] + adjusted
+            compensation[known] = (updated - total[known]) - adjusted
+            total[known] = updated
+            self.counts[day] += known
+
+    def table(self) -> Tuple[np.ndarray, ...]:
+        """
+        Returns the same columns as aggregate_activity_by_day: the date and the mean of every metric, ignoring NaN.
+        """
+        days = sorted(self.sums)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.array([self.sums[day] / self.counts[day] for day in days]).reshape(len(days), -1)
+        if not days:
+            means = np.zeros((0, len(METADATA_COLUMNS) - 3))
+        return (np.array(days, dtype=object),) + tuple(means[:, i] for i in range(means.shape[1]))
+
+class FrequencyFilter:
+    """
+    Counts values over a stream, then keeps only the rows whose value occurs more than twice overall,
+    as remove_unique_entries does in memory.
+
+    Values are counted exactly, in memory proportional to the number of distinct values, unless a sketch is
+    given, which counts them approximately in fixed memory. The sketch saved by an earlier run (saved) is merged
+    into it, and only the rows dated after the latest one it counted are counted, as remove_unique_entries does.
+    """
+
+    def __init__(self, sketch: Optional[HeavyHitters] = None, saved: Optional[HeavyHitters] = None) -> None:
+        self.counts: Counter = Counter()
+        self.sketch = sketch
+        self.saved = saved
+        # Rows left to the saved sketch, and the latest date of every row seen
+        self.skipped = 0
+        self.latest: Optional[np.datetime64] = None
+        self.frequent: Optional[np.ndarray] = None
+
+    def update(self, dates: np.ndarray, values: np.ndarray) -> None:
+        dates, values = np.asarray(dates), np.asarray(values)
+        if values.dtype == object:
+            present = values != None
+            dates, values = dates[present], values[present]
+        if self.sketch is not None:
+            if len(dates):
+                latest = np.asarray(dates, dtype='datetime64[s]').max()
+                self.latest = latest if self.latest is None else max(self.latest, latest)
+            if self.saved is not None:
+                counted = self.saved.counted_rows(dates)
+                self.skipped += int(counted.sum())
+                values = values[~counted]
+            self.sketch.update(values)
+            return
+        unique_values, counts = np.unique(values, return_counts=True)
+        self.counts.update(dict(zip(unique_values.tolist(), counts.tolist())))
+
+    def filter(self, dates: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the rows of a chunk whose value is frequent. Must only be called once every chunk was counted.
+        """
+        dates, values = np.asarray(dates), np.asarray(values)
+        if values.dtype == object:
+            present = values != None
+            dates, values = dates[present], values[present]
+        if self.sketch is not None:
+            mask = self.sketch.estimate(values) > 2
+            return dates[mask], values[mask]
+        if self.frequent is None:
+            self.frequent = np.array(sorted(value for value, count in self.counts.items() if count > 2), dtype=object)
+        mask = np.isin(values, self.frequent)
+        return dates[mask], values[mask]
+
+    def filter_spill(self, spill: ColumnSpill, chunk_size: int, output: Path,
+                     names: Optional[Sequence[str]] = None) -> Tuple[SpilledColumn, SpilledColumn]:
+        """
+        Filters every row of a spill, given as its date and value columns (by default its only two columns),
+        into a new spill at output. Returns the date and value columns of the kept rows.
+        """
+        names = list(names or spill.kinds)
+        if self.sketch is not None:
+            self.merge_saved(spill, chunk_size, names)
+        filtered = ColumnSpill(output)
+        for dates, values in spill.iter_chunks(chunk_size, names):
+            dates, values = self.filter(dates, values)
+            if len(dates):
+                filtered.append(dict(zip(names, (dates, values))))
+        return SpilledColumn(filtered, names[0]), SpilledColumn(filtered, names[1])
+
+    def merge_saved(self, spill: ColumnSpill, chunk_size: int, names: Sequence[str]) -> None:
+        """
+        Merges the saved sketch once every chunk was counted. If the rows left to it are not as many as it counted,
+        they changed since it was saved, and every row of the spill is counted again instead.
+        """
+        if self.saved is not None:
+            if self.skipped == self.saved.total:
+                self.sketch.merge(self.saved)
+            else:
+                self.sketch.clear()
+                for _, values in spill.iter_chunks(chunk_size, names):
+                    self.sketch.update(values)
+            self.saved = None
+        self.sketch.through = self.latest
+
+class GeoCellCounts:
+    """
+    Running per-day geohash cell counts; partial counts of each chunk are merged whenever they pile up.
+    """
+
+    def __init__(self, precisions: Sequence[int] = DEFAULT_PRECISIONS, merge_every: int = 16) -> None:
+        self.precisions = tuple(precisions)
+        self.merge_every = merge_every
+        self.partials: Dict[int, List[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = {precision: [] for precision in self.precisions}
+
+    def update(self, dates: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray) -> None:
+        days, latitudes, longitudes = valid_coordinates(dates, latitudes, longitudes)
+        for precision in self.precisions:
+            partials = self.partials[precision]
+            partials.append(count_cells_per_day(days, encode_cells(latitudes, longitudes, precision)))
+            if len(partials) >= self.merge_every:
+                partials[:] = [self.merged(precision)]
+
+    def merged(self, precision: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        days, codes, counts = (np.concatenate(columns) for columns in zip(*self.partials[precision]))
+        return count_cells_per_day(days, codes, weights=counts)
+
+    def table(self) -> Tuple[np.ndarray, ...]:
+        """
+        Returns the same columns as geo_binning.main.
+        """
+        tables = [cell_table(*self.merged(precision), precision) for precision in self.precisions if self.partials[precision]]
+        return concatenate_tables(tables) if tables else tuple(np.array([], dtype=object) for _ in GEO_CELL_COLUMNS)
+
+class KeywordCounts:
+    """
+    Running day × token keyword counts; the matrices of each chunk are merged whenever they pile up.
+    """
+
+    def __init__(self, merge_every: int = 16) -> None:
+        self.merge_every = merge_every
+        self.partials: List[KeywordMatrix] = []
+
+    def update(self, tokens_per_date: Tuple[np.ndarray, np.ndarray]) -> None:
+        self.partials.append(KeywordMatrix.from_pairs(*tokens_per_date))
+        if len(self.partials) >= self.merge_every:
+            self.partials = [self.matrix()]
+
+    def matrix(self) -> KeywordMatrix:
+        return KeywordMatrix.merge(self.partials)
+
+class IndexParts:
+    """
+    Inverted index of the processed rows written so far, built one chunk at a time; the indexes of each
+    chunk are merged whenever they pile up.
+    """
+
+    def __init__(self, merge_every: int = 16) -> None:
+        self.merge_every = merge_every
+        self.partials: List[InvertedIndex] = []
+        self.rows = 0
+
+    def update(self, dates: np.ndarray, token_rows: np.ndarray, tokens: np.ndarray) -> None:
+        """
+        Indexes the keywords of the next chunk of processed rows. Must be called for every chunk, even one
+        without keywords, so that row ids keep counting from the start of the processed data.
+        """
+        self.partials.append(InvertedIndex.build(token_rows + self.rows, tokens, dates))
+        self.rows += len(dates)
+        if len(self.partials) >= self.merge_every:
+            self.partials = [self.index()]
+
+    def index(self) -> InvertedIndex:
+        return InvertedIndex.merge(self.partials)
+
+class RepeatViewParts:
+    """
+    Running per video view counts; the chunks are consecutive in time, so their repeat view indexes merge
+    exactly, and are merged whenever they pile up.
+    """
+
+    def __init__(self, merge_every: int = 16) -> None:
+        self.merge_every = merge_every
+        self.partials: List[RepeatViews] = []
+
+    def update(self, dates: np.ndarray, urls: np.ndarray, titles: np.ndarray, channels: np.ndarray) -> None:
+        self.partials.append(RepeatViews.build(dates, urls, titles, channels))
+        if len(self.partials) >= self.merge_every:
+            self.partials = [self.repeat_views()]
+
+    def repeat_views(self) -> RepeatViews:
+        return RepeatViews.merge(self.partials)
+
+def main(directory: Path, input_file_name: Path | Sequence[Path], mappings: List[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+         instrument: bool = False, profiler: Optional[str] = None, keywords: bool = True,
+         skip_stages: Iterable[str] = (), approximate_counts: Optional[float] = None) -> None:
+    """
+    Runs the processing pipeline for one Takeout source with memory bounded by the chunk size rather than the
+    size of the export.
+
+    The input is streamed in chunk_size entries at a time and the parsed columns are spilled to memory-mapped
+    files under output/spill, dropping entries already seen (see deduplicate.HashIndex). A second pass over the spill, in file order, runs the row stages chunk by chunk
+    with their cross-chunk state carried over (activity windows, daily and hourly counts, value frequencies),
+    and a last pass spills the frequent keywords, sites and channels. The workbooks are then written a chunk of
+    rows at a time, reading those columns back from the spills. The outputs are the same files the in-memory
+    pipeline writes; only state proportional to the number of days and distinct values is kept in memory, apart
+    from the postings of the inverted index (see the 'inverted_index' stage).
+
+    Args:
+        directory (Path): Directory holding the input file; outputs are written to directory / 'output'.
+        input_file_name (Path | Sequence[Path]): Path of MyActivity.json or watch-history.json, or a list of paths
+            to merge, as in munger_main.main.
+        mappings (List[str]): Column names of the extracted data.
+        chunk_size (int): Number of entries held in memory at a time.
+        instrument (bool): Save and print a run report, as in munger_main.main.
+        profiler (Optional[str]): 'cprofile' or 'pyinstrument' to profile every stage. Implies instrument.
+        keywords (bool): Run the keyword and visited sites analysis.
+        skip_stages (Iterable[str]): Names from OPTIONAL_STAGES to skip.
+        approximate_counts (Optional[float]): Count keywords, channels and sites in fixed-size sketches of this
+            error, as in munger_main.main, so that no state grows with the number of distinct values.
+    """
+    skip_stages = set(skip_stages)
+    unknown_stages = skip_stages - set(OPTIONAL_STAGES)
+    if unknown_stages:
+        raise ValueError(f"Cannot skip {sorted(unknown_stages)}. Optional stages are {list(OPTIONAL_STAGES)}.")
+    keywords = keywords and 'content_analysis' not in skip_stages
+    data_source = get_data_source(mappings)
+    video = data_source == 'watch'
+
+    print("\n********************************************************************")
+    print(f"*****  Processing {data_source} history out of core ({chunk_size} entries per chunk)...  *****")
+    print("********************************************************************\n")
+
+    paths = get_output_paths(directory, data_source)
+    create_output_directories([paths['outer'], paths['full_data'], paths['aggregated']])
+    instrument = instrument or profiler is not None
+    report = RunReport(data_source, trace_memory=instrument, profiler=profiler, profile_dir=paths['outer'] / 'profiles')
+    # Stage artifacts of an earlier in-memory run no longer match the outputs written here
+    StageCache(paths['cache'], data_source.upper(), enabled=False).save_manifest()
+
+    spill_dir = paths['spill'] / data_source
+    parsed = ColumnSpill(spill_dir / 'parsed')
+    daily_counts = DailyCounts()
+    extractor = extract_search_columns if data_source == 'search' else extract_watch_columns
+
+    print("Extracting data from input file...\n")
+    with report.stage('parse_and_spill') as stage:
+        save_to_csv((), paths['raw'], mappings)
+        entries = merge_entry_streams([iter_json_array(path) for path in as_input_files(input_file_name)])
+        index = HashIndex()
+        for batch in index.deduplicate(iter_batches(entries, chunk_size)):
+            if not batch:
+                continue
+            arr_data = clean_dates_main(extractor(batch, mappings), mappings)
+            save_to_csv(arr_data, paths['raw'], mappings, append=True)
+            parsed.append(dict(zip(mappings, arr_data)))
+            daily_counts.update(arr_data[0])
+        stage['rows_out'] = len(parsed)
+    print(f"Dropped {index.dropped} duplicate entries.\n")
+    print(f"Search data extraction complete.\nResults saved to {paths['raw']}'.\n")
+
+    if 'segment_activity' not in skip_stages:
+        print("Segmenting daily activity...")
+        with report.stage('segment_activity') as stage:
+            segments = segment_counts(*daily_counts.series(include_empty=True))
+            stage['rows_out'] = count_rows(segments)
+        save_to_csv(segments, paths['segments'], SEGMENT_COLUMNS)
+        print(f"Activity segments saved to {paths['segments']}.\n")
+    else:
+        segments = tuple(np.array([], dtype=object) for _ in SEGMENT_COLUMNS)
+
+    print("Cleaning data...")
+    with report.stage('trim_date'):
+        # Same threshold as trim_date
+        changepoint_date = detect_changepoint(*daily_counts.series(), threshold=20)
+
+    raw_mappings = list(mappings)
+    sketches = new_sketches(data_source, approximate_counts)
+    saved = load_saved_sketches(paths['sketches'], data_source, approximate_counts)
+    mappings.extend(['Day_of_the_Week', 'Hour_of_the_Day', 'Date_Only'])
+    mappings.extend(['Video_Duration', 'Short_Form_Video'] if video else ['Search_Duration'])
+    save_to_csv((), paths['processed'], mappings)
+    save_to_csv((), paths['metadata'], METADATA_COLUMNS)
+    if keywords:
+        save_to_csv((), paths['keywords'], ['Date', 'Keywords'])
+        keyword_spill, keyword_counts = ColumnSpill(spill_dir / 'keywords'), FrequencyFilter(sketches.get('keywords'), saved.get('keywords'))
+        keyword_matrix = KeywordCounts() if 'keyword_trends' not in skip_stages else None
+        keyword_index = IndexParts() if 'inverted_index' not in skip_stages else None
+        if not video:
+            save_to_csv((), paths['visited_sites'], ['Date', 'Visited_Sites'])
+            site_spill, site_counts = ColumnSpill(spill_dir / 'sites'), FrequencyFilter(sketches.get('sites'), saved.get('sites'))
+    if video:
+        channel_spill, channel_counts = ColumnSpill(spill_dir / 'channels'), FrequencyFilter(sketches.get('channels'), saved.get('channels'))
+
+    imputer = StreamingImputer(video)
+    daily_rollup, activity_rollup = DailyRollup(), ActivityRollup()
+    geo_cells = GeoCellCounts() if data_source == 'search' and 'geo_binning' not in skip_stages else None
+    video_views = RepeatViewParts() if video and 'video_views' not in skip_stages else None
+    hour_index = mappings.index('Hour_of_the_Day')
+
+    def consume(emitted: Optional[Tuple[Tuple[np.ndarray, ...], Tuple[np.ndarray, ...]]]) -> int:
+        if emitted is None:
+            return 0
+        imputed, metadata = emitted
+        save_to_csv(imputed, paths['processed'], mappings, append=True)
+        save_to_csv(metadata, paths['metadata'], METADATA_COLUMNS, append=True)
+        daily_rollup.update(imputed[0], imputed[hour_index], imputed[-1] if video else None)
+        activity_rollup.update(metadata)
+        if geo_cells is not None:
+            geo_cells.update(imputed[0], imputed[mappings.index('Latitude')], imputed[mappings.index('Longitude')])
+        if video_views is not None:
+            video_views.update(imputed[0], imputed[mappings.index('Video_URL')], imputed[1], imputed[2])
+        if video:
+            channel_spill.append({'Date': imputed[0], 'Channel_Title': imputed[2], 'Short_Form_Video': imputed[-1]})
+            channel_counts.update(imputed[0], imputed[2])
+        if keywords:
+            visited_sites, tokens_per_date, (token_rows,) = content_analysis(imputed, mappings, return_rows=True)
+            if keyword_index is not None:
+                keyword_index.update(imputed[0], token_rows, tokens_per_date[1])
+            if len(tokens_per_date[0]):
+                save_to_csv(tokens_per_date, paths['keywords'], ['Date', 'Keywords'], append=True)
+                keyword_spill.append({'Date': tokens_per_date[0], 'Keywords': tokens_per_date[1]})
+                keyword_counts.update(*tokens_per_date)
+                if keyword_matrix is not None:
+                    keyword_matrix.update(tokens_per_date)
+            if not video and len(visited_sites[0]):
+                save_to_csv(visited_sites, paths['visited_sites'], ['Date', 'Visited_Sites'], append=True)
+                site_spill.append({'Date': visited_sites[0], 'Visited_Sites': visited_sites[1]})
+                site_counts.update(*visited_sites)
+        return len(imputed[0])
+
+    if keywords:
+        print("Executing keyword analysis along with the chunks. This may take a moment...\n")
+    with report.stage('process_chunks', rows_in=len(parsed)) as stage:
+        rows_out = 0
+        for chunk in parsed.iter_chunks(chunk_size, raw_mappings):
+            if changepoint_date is not None:
+                keep = chunk[0].astype('datetime64[D]') >= changepoint_date
+                chunk = tuple(column[keep] for column in chunk)
+            if len(chunk[0]) == 0:
+                continue
+            rows_out += consume(imputer.update(add_date_columns(chunk)))
+        rows_out += consume(imputer.finish())
+        stage['rows_out'] = rows_out
+    print("Data cleaning complete.\n")
+    print(f"Processed data table results saved to {paths['processed']}.\n")
+    print(f"Metadata saved to {paths['metadata']}.\n")
+
+    if geo_cells is not None:
+        save_to_csv(geo_cells.table(), paths['geo_cells'], GEO_CELL_COLUMNS)
+        print(f"Location cells saved to {paths['geo_cells']}.\n")
+
+    if video_views is not None:
+        with report.stage('video_views') as stage:
+            repeat_views = video_views.repeat_views()
+            stage['rows_out'] = len(repeat_views)
+            save_to_csv(repeat_views.table(), paths['repeat_views'], REPEAT_VIEW_COLUMNS)
+        print(f"Repeat views saved to {paths['repeat_views']}.\n")
+
+    if keywords and keyword_matrix is not None:
+        with report.stage('keyword_trends') as stage:
+            matrix = keyword_matrix.matrix()
+            stage['rows_out'] = len(matrix.counts)
+            save_keyword_outputs(matrix, paths)
+        print(f"Keyword matrix and trends saved to {paths['keyword_matrix']}.\n")
+    if keywords and keyword_index is not None:
+        with report.stage('inverted_index') as stage:
+            index = keyword_index.index()
+            stage['rows_out'] = len(index)
+            index.save(paths['inverted_index'])
+        print(f"Keyword index saved to {paths['inverted_index']}.\n")
+
+    if 'aggregate' not in skip_stages:
+        print(f'\nAggregating {data_source} data by day...\n')
+        empty_pairs = (np.array([], dtype=object), np.array([], dtype=object))
+        with report.stage('remove_unique_entries') as stage:
+            aggregate_keywords = (keyword_counts.filter_spill(keyword_spill, chunk_size, spill_dir / 'frequent_keywords')
+                                  if keywords else empty_pairs)
+            stage['rows_out'] = count_rows(aggregate_keywords)
+            if video:
+                aggregated_entries = channel_counts.filter_spill(channel_spill, chunk_size, spill_dir / 'frequent_channels',
+                                                                 ['Date', 'Channel_Title'])
+            elif keywords:
+                aggregated_entries = site_counts.filter_spill(site_spill, chunk_size, spill_dir / 'frequent_sites')
+            else:
+                aggregated_entries = empty_pairs
+        aggregated_data = daily_rollup.table(video)
+        aggregate_activity = activity_rollup.table()
+        short_form_array = (SpilledColumn(channel_spill, 'Date'), SpilledColumn(channel_spill, 'Short_Form_Video')) if video else None
+        # The long columns are read back from the spills one block of rows at a time
+        write_aggregated_workbooks(data_source, aggregated_data, aggregate_activity, aggregate_keywords, aggregated_entries,
+                                   segments, paths, report, short_form_array, chunk_size=chunk_size)
+        save_window_stats(aggregated_data, paths, report)
+        if sketches:
+            save_heavy_hitters(sketches, paths)
+
+    shutil.rmtree(spill_dir)
+    try:
+        # Left in place while the other source is still spilling
+        paths['spill'].rmdir()
+    except OSError:
+        pass
+    report.close()
+    if instrument:
+        report.save_json(paths['report'])
+        report.print_summary()
+        print(f"Run report saved to {paths['report']}\n")
+
+    print(f"\n***********  Completed {data_source} history processing!  ******************\n")
@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Separator used to pack a string column into a single buffer. Cleaned strings never contain it
+# because clean_string strips Unicode control characters.
+_SEPARATOR = '\x00'
+
+# Entries shared with forked workers, so chunks are sliced in the worker instead of being pickled
+_shared_entries: List[Dict[str, Any]] = []
+
+def split_into_chunks(length: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Splits a range of entries into consecutive fixed-size batches.
+
+    Args:
+        length (int): Total number of entries.
+        chunk_size (int): Maximum number of entries per batch.
+
+    Returns:
+        List[Tuple[int, int]]: (start, stop) bounds of each batch, in order.
+    """
+    return [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+
+def iter_batches(items: Iterable[Any], size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Any]]:
+    """
+    Groups a stream of entries into lists of at most size entries, without reading ahead of the current batch.
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def pack_column(column: np.ndarray) -> Tuple[str, Any]:
+    """
+    Packs a column so it can be sent between processes without pickling every element.
+
+    Numeric columns are sent as-is (a single buffer). String columns are joined into one string plus a
+    validity mask for missing entries. Columns that cannot be packed safely are sent unchanged.
+
+    Args:
+        column (np.ndarray): A column produced by an extractor.
+
+    Returns:
+        Tuple[str, Any]: A tag describing the encoding and the packed payload.
+    """
+    if column.dtype != object:
+        return 'array', column
+
+    valid = np.array([isinstance(value, str) for value in column], dtype=bool)
+    strings = column[valid].tolist()
+    if any(_SEPARATOR in value for value in strings):
+        return 'array', column
+    return 'strings', (_SEPARATOR.join(strings), len(strings), valid, column[~valid])
+
+def unpack_column(packed: Tuple[str, Any]) -> np.ndarray:
+    """
+    Rebuilds a column packed with pack_column.
+
+    Args:
+        packed (Tuple[str, Any]): A tag and payload as returned by pack_column.
+
+    Returns:
+        np.ndarray: The original column.
+    """
+    kind, payload = packed
+    if kind == 'array':
+        return payload
+
+    joined, count, valid, missing = payload
+    column = np.empty(len(valid), dtype=object)
+    column[valid] = joined.split(_SEPARATOR) if count else []
+    column[~valid] = missing
+    return column
+
+def parse_chunk(entries: List[Dict[str, Any]], extractor: Callable, mappings: List[str]) -> List[Tuple[str, Any]]:
+    """
+    Extracts one batch of entries into packed columns.
+
+    Args:
+        entries (List[Dict[str, Any]]): Raw JSON entries of the batch.
+        extractor (Callable): extract_search_columns or extract_watch_columns.
+        mappings (List[str]): Column names to extract.
+
+    Returns:
+        List[Tuple[str, Any]]: One packed column per mapping.
+    """
+    arrays = extractor(entries, mappings)
+    return [pack_column(column) for column in arrays]
+
+def parse_shared_chunk(bounds: Tuple[int, int], extractor: Callable, mappings: List[str]) -> List[Tuple[str, Any]]:
+    """
+    Parses a batch of the entries inherited from the parent process.
+    """
+    start, stop = bounds
+    return parse_chunk(_shared_entries[start:stop], extractor, mappings)
+
+def concatenate_chunks(chunks: List[Tuple[np.ndarray, ...]]) -> Tuple[np.ndarray, ...]:
+    """
+    Concatenates columnar chunks in order into full columns.
+
+    A column that is numeric in any chunk is returned as float, matching what convert_to_arrays
+    would have produced over the whole dataset for columns extracted without a schema.
+
+    Args:
+        chunks (List[Tuple[np.ndarray, ...]]): Columnar chunks, all with the same number of columns.
+
+    Returns:
+        Tuple[np.ndarray, ...]: The concatenated columns.
+    """
+    columns = []
+    for parts in zip(*chunks):
+        if any(part.dtype.kind == 'f' for part in parts):
+            columns.append(np.concatenate([part.astype(float) for part in parts]))
+        else:
+            columns.append(np.concatenate(parts))
+    return tuple(columns)
+
+def parse_entries_parallel(
+    json_data: List[Dict[str, Any]],
+    extractor: Callable,
+    mappings: List[str],
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Tuple[np.ndarray, ...]:
+    """
+    Extracts entries into columns using a pool of worker processes.
+
+    The entries are split into fixed-size batches that are processed independently. Results come back
+    in submission order, so the output rows are in the same order as the input entries.
+
+    Args:
+        json_data (List[Dict[str, Any]]): Raw JSON entries.
+        extractor (Callable): extract_search_columns or extract_watch_columns.
+        mappings (List[str]): Column names to extract.
+        workers (Optional[int]): Number of worker processes, defaults to the number of CPUs.
+        chunk_size (int): Number of entries per batch.
+
+    Returns:
+        Tuple[np.ndarray, ...]: Columns equivalent to extractor(json_data, mappings).
+    """
+    global _shared_entries
+
+    bounds = split_into_chunks(len(json_data), chunk_size)
+    workers = min(workers or os.cpu_count() or 1, len(bounds))
+    if workers <= 1:
+        return extractor(json_data, mappings)
+
+    # With fork the workers see the entries directly and only the batch bounds are sent
+    use_fork = 'fork' in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if use_fork else None)
+    n_chunks = len(bounds)
+    try:
+        if use_fork:
+            _shared_entries = json_data
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            if use_fork:
+                results = executor.map(parse_shared_chunk, bounds, [extractor] * n_chunks, [mappings] * n_chunks)
+            else:
+                batches = [json_data[start:stop] for start, stop in bounds]
+                results = executor.map(parse_chunk, batches, [extractor] * n_chunks, [mappings] * n_chunks)
+            chunks = [tuple(unpack_column(packed) for packed in packed_columns) for packed_columns in results]
+    finally:
+        _shared_entries = []
+
+    return concatenate_chunks(chunks)
@@ -1,14 +1,14 @@
+import hashlib
+from collections import OrderedDict
 import numpy as np
 import regex as re
 from datetime import datetime, timezone
 from typing import List, Any, Tuple, Pattern, Dict
 
-from collections import Counter
 from datetime import datetime
 from typing import List, Optional, Tuple
 
 import numpy as np
-import ruptures as rpt
 from numpy import ndarray
 import tzlocal  # Import tzlocal for detecting local timezone
 from zoneinfo import ZoneInfo  
@@ -83,6 +83,67 @@ def parse_iso_datetime(date_str):
     
     return date_object
 
+def parse_timestamps(values: List[Optional[str]]) -> np.ndarray:
+    """
+    Parses a whole column of ISO 8601 timestamps, e.g. '2024-04-20T05:55:07.811Z', into UTC datetime64 values.
+
+    Timestamps in UTC ('Z' suffix), as Takeout writes them, are parsed by numpy in one call; any others, such as
+    those with an explicit offset, go through parse_iso_datetime.
+
+    Args:
+        values (List[Optional[str]]): Timestamp strings, None where there is none.
+
+    Returns:
+        np.ndarray: datetime64[us] values in UTC, NaT where the timestamp is missing or cannot be parsed.
+    """
+    times = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[us]')
+    strings = [value if isinstance(value, str) else '' for value in values]
+    zulu = np.array([value.endswith('Z') for value in strings], dtype=bool)
+    try:
+        times[zulu] = np.array([value[:-1] for value, is_zulu in zip(strings, zulu) if is_zulu], dtype='datetime64[us]')
+        remaining = np.flatnonzero(~zulu)
+    except ValueError:
+        remaining = np.arange(len(strings))
+
+    for row in remaining:
+        try:
+            utc_time = parse_iso_datetime(strings[row]).astimezone(timezone.utc).replace(tzinfo=None)
+            times[row] = np.datetime64(utc_time, 'us')
+        except (ValueError, TypeError):
+            pass
+    return times
+
+def localize_timestamps(utc_times: np.ndarray, local_timezone: Optional[Any] = None) -> np.ndarray:
+    """
+    Converts UTC datetime64 values to naive local datetimes without microseconds, as get_local_naive_datetime_from_utc
+    does for one datetime.
+
+    The UTC offset is looked up once at the start and end of every day present rather than for every row; only
+    the rows of days in which the offset changes (daylight saving transitions) are looked up one by one.
+
+    Args:
+        utc_times (np.ndarray): datetime64 values in UTC, without NaT.
+        local_timezone (Optional[Any]): Timezone to convert to, defaults to the local timezone from tzlocal.
+
+    Returns:
+        np.ndarray: Object array of naive datetime objects.
+    """
+    local_timezone = local_timezone or tzlocal.get_localzone()
+    seconds = np.asarray(utc_times).astype('datetime64[s]').astype(np.int64)
+    if not len(seconds):
+        return np.array([], dtype=object)
+
+    def offset(second: int) -> int:
+        return int(datetime.fromtimestamp(second, local_timezone).utcoffset().total_seconds())
+
+    days, inverse = np.unique(seconds // 86400, return_inverse=True)
+    day_starts = np.array([offset(int(day) * 86400) for day in days], dtype=np.int64)
+    day_ends = np.array([offset(int(day) * 86400 + 86399) for day in days], dtype=np.int64)
+    offsets = day_starts[inverse]
+    for row in np.flatnonzero((day_starts != day_ends)[inverse]):
+        offsets[row] = offset(int(seconds[row]))
+    return (seconds + offsets).astype('datetime64[s]').astype(object)
+
 def parse_dates(date_array: np.ndarray) -> Tuple[np.ndarray, list]:
     """
     Parse datetime from strings in a numpy array after timezone information has been removed and adjust to desired format.
@@ -132,22 +193,136 @@ def remove_indices_from_tuple(data: Tuple[np.ndarray, ...], indices: List[int])
 
 ####### Changepoint analysis #######
 
-def calculate_daily_counts(dates: ndarray) -> Tuple[ndarray, ndarray]:
+# Detector backends selectable by name, mapped to their ruptures class. Binseg is the historical default;
+# PELT scales linearly on long series and BottomUp/Window are cheaper alternatives for very long histories.
+# ruptures itself is only imported when a detector is first fitted.
+CHANGEPOINT_DETECTORS = {
+    'binseg': 'Binseg',
+    'pelt': 'Pelt',
+    'bottomup': 'BottomUp',
+    'window': 'Window',
+}
+
+# Fitted detectors keyed by (method, model, width, fingerprint of the counts). Ruptures keeps
+# its segment costs on the fitted instance, so reusing it makes repeated predictions cheap.
+# Every detector also holds a copy of its signal, so only the most recently used ones are kept:
+# batch and pool workers live across many sources and directories.
+DETECTOR_CACHE_SIZE = 4
+_fitted_detectors: 'OrderedDict[Tuple[str, str, int, str], Any]' = OrderedDict()
+
+def fingerprint_counts(counts_array: ndarray) -> str:
+    """
+    Compute a stable fingerprint of a counts array for caching purposes.
+
+    Args:
+        counts_array (ndarray): Array of daily counts.
+
+    Returns:
+        str: Hex digest identifying the contents, shape and dtype of the array.
+    """
+    contiguous = np.ascontiguousarray(counts_array)
+    digest = hashlib.blake2b(contiguous.tobytes(), digest_size=16)
+    digest.update(f'{contiguous.shape}{contiguous.dtype}'.encode())
+    return digest.hexdigest()
+
+def calculate_daily_counts(dates: ndarray, include_empty: bool = False) -> Tuple[ndarray, ndarray]:
     """
     Count occurrences of each unique date in the provided array.
 
+    Dates are converted to integer day codes and counted with a single bincount pass. Histories
+    with a few far-off outlier dates fall back to np.unique so the bin array stays small.
+
     Args:
         dates (ndarray): Array of dates.
+        include_empty (bool): If True, return a dense daily series where days without entries have a count of 0.
 
     Returns:
         Tuple[ndarray, ndarray]: Arrays of sorted dates and their corresponding counts.
     """
-    daily_counts = Counter(dates)
-    dates_sorted = sorted(daily_counts.keys())
-    counts_array = np.array([daily_counts[date] for date in dates_sorted]).reshape(-1, 1)
-    return np.array(dates_sorted), counts_array
+    day_codes = np.asarray(dates).astype('datetime64[D]').astype(np.int64)
+    if day_codes.size == 0:
+        return np.array([], dtype='datetime64[D]'), np.zeros((0, 1), dtype=np.int64)
+
+    first_day = day_codes.min()
+    span = int(day_codes.max() - first_day) + 1
+    if include_empty:
+        unique_days = np.arange(first_day, first_day + span)
+        counts = np.bincount(day_codes - first_day, minlength=span)
+    elif span <= 4 * day_codes.size + 366:
+        all_counts = np.bincount(day_codes - first_day, minlength=span)
+        present = np.flatnonzero(all_counts)
+        unique_days = present + first_day
+        counts = all_counts[present]
+    else:
+        unique_days, counts = np.unique(day_codes, return_counts=True)
+
+    dates_sorted = unique_days.astype('datetime64[D]')
+    return dates_sorted, counts.astype(np.int64).reshape(-1, 1)
+
+def default_penalty(counts_array: ndarray) -> float:
+    """
+    BIC-style penalty for penalised changepoint searches on an l2 cost.
+
+    Args:
+        counts_array (ndarray): Array of daily counts.
+
+    Returns:
+        float: Penalty scaled by the series variance and the log of its length.
+    """
+    n = max(len(counts_array), 2)
+    variance = float(np.var(counts_array)) if len(counts_array) else 0.0
+    return 2.0 * np.log(n) * max(variance, 1.0)
+
+def fit_detector(counts_array: ndarray, method: str = 'binseg', model: str = 'l2', width: int = 100) -> Any:
+    """
+    Fit (or fetch from the cache of the DETECTOR_CACHE_SIZE most recently used) a ruptures detector on the counts array.
+
+    Args:
+        counts_array (ndarray): Array where each entry represents the count of occurrences for a specific date.
+        method (str): One of the keys of CHANGEPOINT_DETECTORS.
+        model (str): Ruptures cost model.
+        width (int): Window width, only used by the 'window' detector.
+
+    Returns:
+        Any: A fitted ruptures detector.
 
-def detect_changepoint(dates_sorted: ndarray, counts_array: ndarray, threshold: float = 0.05) -> Optional[datetime]:
+    Raises:
+        ValueError: If the method is not a known detector backend.
+    """
+    if method not in CHANGEPOINT_DETECTORS:
+        raise ValueError(f"Unknown changepoint method '{method}'. Expected one of {sorted(CHANGEPOINT_DETECTORS)}.")
+
+    if method == 'window':
+        # The window must fit inside the series, otherwise ruptures finds nothing
+        width = max(4, min(width, 2 * (len(counts_array) // 4)))
+    else:
+        width = 0
+
+    key = (method, model, width, fingerprint_counts(counts_array))
+    detector = _fitted_detectors.get(key)
+    if detector is not None:
+        _fitted_detectors.move_to_end(key)
+        return detector
+
+    import ruptures as rpt
+    detector_class = getattr(rpt, CHANGEPOINT_DETECTORS[method])
+    if method == 'window':
+        detector = detector_class(width=width, model=model)
+    else:
+        detector = detector_class(model=model)
+    detector.fit(counts_array)
+    _fitted_detectors[key] = detector
+    if len(_fitted_detectors) > DETECTOR_CACHE_SIZE:
+        _fitted_detectors.popitem(last=False)
+    return detector
+
+def clear_detector_cache() -> None:
+    """
+    Drop all cached fitted detectors.
+    """
+    _fitted_detectors.clear()
+
+def detect_changepoint(dates_sorted: ndarray, counts_array: ndarray, threshold: float = 0.05, method: str = 'binseg') -> Optional[datetime]:
     """
     Perform changepoint detection on the array of counts and assess the significance of the change.
 
@@ -155,16 +330,24 @@ def detect_changepoint(dates_sorted: ndarray, counts_array: ndarray, threshold:
         dates_sorted (ndarray): Array of sorted dates.
         counts_array (ndarray): Array where each entry represents the count of occurrences for a specific date.
         threshold (float): Significance level for determining the changepoint.
+        method (str): Detector backend, one of 'binseg', 'pelt', 'bottomup' or 'window'. PELT is penalty based,
+            so its earliest breakpoint is used as the changepoint.
 
     Returns:
         Optional[datetime]: The determined changepoint date, or None if no significant changepoint is detected.
     """
-    algo = rpt.Binseg(model='l2').fit(counts_array)
-    result = algo.predict(n_bkps=1)
+    if len(counts_array) < 2:
+        return None
+
+    algo = fit_detector(counts_array, method)
+    if method == 'pelt':
+        result = algo.predict(pen=default_penalty(counts_array))
+    else:
+        result = algo.predict(n_bkps=1)
     if result:
         changepoint_index = result[0] - 1
         # Calculate the relative change in magnitude at the changepoint
-        if changepoint_index > 0:
+        if 0 < changepoint_index < len(counts_array):
             pre_change = np.mean(counts_array[:changepoint_index])
             post_change = np.mean(counts_array[changepoint_index:])
             relative_change = abs(post_change - pre_change) / pre_change
@@ -172,7 +355,7 @@ def detect_changepoint(dates_sorted: ndarray, counts_array: ndarray, threshold:
                 return dates_sorted[changepoint_index]
     return None
 
-def trim_date(data: Tuple[ndarray, ndarray, ndarray, ndarray], mapping: List[str], threshold: float = 20) -> Tuple[ndarray, ndarray, ndarray, ndarray]:
+def trim_date(data: Tuple[ndarray, ndarray, ndarray, ndarray], mapping: List[str], threshold: float = 20, method: str = 'binseg') -> Tuple[ndarray, ndarray, ndarray, ndarray]:
     """
     Filters data based on a changepoint analysis of datetime features. If no significant changepoint is found,
     returns the original dataset.
@@ -181,6 +364,7 @@ def trim_date(data: Tuple[ndarray, ndarray, ndarray, ndarray], mapping: List[str
         data (Tuple[ndarray, ndarray, ndarray, ndarray]): Input data tuple, each ndarray representing a column.
         mapping (List[str]): List indicating what each column represents.
         threshold (float): Threshold to determine the significance of the changepoint.
+        method (str): Changepoint detector backend, see CHANGEPOINT_DETECTORS.
 
     Returns:
         Tuple[ndarray, ndarray, ndarray, ndarray]: Filtered or original data tuple.
@@ -188,9 +372,9 @@ def trim_date(data: Tuple[ndarray, ndarray, ndarray, ndarray], mapping: List[str
     date_index = mapping.index('Date')
     dates = data[date_index].astype('datetime64[D]')
     dates_sorted, counts_array = calculate_daily_counts(dates)
-    changepoint_date = detect_changepoint(dates_sorted, counts_array, threshold)
-    if changepoint_date:
-        filtered_indices = np.array([date >= changepoint_date for date in dates])
+    changepoint_date = detect_changepoint(dates_sorted, counts_array, threshold, method)
+    if changepoint_date is not None:
+        filtered_indices = dates >= changepoint_date
         return tuple(arr[filtered_indices] for arr in data)
     else:
         return data
@@ -199,7 +383,8 @@ def trim_date(data: Tuple[ndarray, ndarray, ndarray, ndarray], mapping: List[str
 
 def clean_dates_main(arr_data: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray], mappings: List[str]) -> np.ndarray:
     """
-    Main function to process data arrays for cleaning and type conversion.
+    Main function to process data arrays for cleaning and type conversion. The dates are either strings or
+    datetime64 values in UTC; rows whose date is missing or invalid are dropped.
     
     Args:
     search_texts, dates, latitudes, longitudes (np.ndarray): Arrays of data.
@@ -208,6 +393,13 @@ def clean_dates_main(arr_data: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndar
     Tuple of arrays after processing.
     """
 
+    if arr_data[0].dtype.kind == 'M':
+        # Dates already parsed to UTC by a column builder, NaT where invalid
+        valid = ~np.isnat(arr_data[0])
+        if not valid.all():
+            arr_data = tuple(column[valid] for column in arr_data)
+        return (localize_timestamps(arr_data[0]),) + arr_data[1:]
+
     dates, bad_indices = parse_dates(arr_data[0])
     arr_data = (dates,) + arr_data[1:]
     clean_arr = remove_indices_from_tuple(arr_data, bad_indices)
@@ -0,0 +1,198 @@
+import io
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext, redirect_stdout
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+from self_stats.munger.input_output import find_input_files
+from self_stats.munger.munger_main import main as munger_main
+from self_stats.munger.munger_main import aggregate_main
+
+# Input file name and column mappings for each supported Takeout source
+SOURCE_FILES: Dict[str, Tuple[str, List[str]]] = {
+    'search': ('MyActivity.json', ['Date', 'Query_Text', 'Latitude', 'Longitude']),
+    'watch': ('watch-history.json', ['Date', 'Video_Title', 'Channel_Title', 'Video_URL']),
+}
+
+def get_source_jobs(directory: Path, file_flags: Dict[str, bool]) -> List[Tuple[str, Path, Path, List[str]]]:
+    """
+    Builds the list of processing jobs for the sources present in a directory.
+
+    Args:
+        directory (Path): Directory holding the Takeout files or archives.
+        file_flags (Dict[str, bool]): Presence flags as returned by get_file_presence_flags.
+
+    Returns:
+        List[Tuple[str, Path, Path, List[str]]]: One (source name, directory, input file, mappings) job per present source.
+        The input file may point inside an archive, see find_input_file. When several archives hold a copy of it
+        (overlapping exports), the input is the list of copies, which are merged without duplicates.
+    """
+    flag_names = {'search': 'my_activity_present', 'watch': 'watch_history_present'}
+    jobs = []
+    for source, (file_name, mappings) in SOURCE_FILES.items():
+        if file_flags.get(flag_names[source]):
+            input_files = find_input_files(directory, file_name) or [directory / file_name]
+            jobs.append((source, directory, input_files[0] if len(input_files) == 1 else input_files, list(mappings)))
+    return jobs
+
+def init_worker() -> None:
+    """
+    Warms up a worker process by loading the spaCy model once, so every job run by the worker reuses it.
+    """
+    from self_stats.munger.content_analysis import load_nlp
+    try:
+        load_nlp()
+    except OSError:
+        # Missing model: let the keyword analysis stage report it when it runs
+        pass
+
+def run_job(job: Tuple[str, Path, Path, List[str]], munger_options: Dict[str, Any], capture: bool = True, action: str = 'process') -> Dict[str, Any]:
+    """
+    Runs a single source job, optionally capturing its console output.
+
+    Args:
+        job (Tuple[str, Path, Path, List[str]]): A job as built by get_source_jobs.
+        munger_options (Dict[str, Any]): Extra keyword arguments passed to munger_main (or aggregate_main).
+        capture (bool): Capture the printed output instead of streaming it to the console.
+        action (str): 'process' to run the full pipeline, 'aggregate' to re-run only the aggregation.
+
+    Returns:
+        Dict[str, Any]: The directory, source name, success flag, duration in seconds and captured output.
+    """
+    source, directory, input_file, mappings = job
+    buffer = io.StringIO()
+    success = True
+    start = time.perf_counter()
+    with redirect_stdout(buffer) if capture else nullcontext():
+        try:
+            if action == 'aggregate':
+                aggregate_main(directory, source, **munger_options)
+            else:
+                munger_main(directory, input_file, mappings, **munger_options)
+        except Exception:
+            success = False
+            traceback.print_exc(file=buffer if capture else None)
+    return {
+        'directory': str(directory),
+        'source': source,
+        'success': success,
+        'seconds': round(time.perf_counter() - start, 2),
+        'output': buffer.getvalue(),
+    }
+
+def run_timeline(directory: Path, sources: Sequence[str], capture: bool = True) -> Dict[str, Any]:
+    """
+    Builds the unified timeline of a directory from the processed data of its sources, see timeline.main.
+
+    Args:
+        directory (Path): Processed directory.
+        sources (Sequence[str]): Sources to merge.
+        capture (bool): Capture the printed output instead of streaming it to the console.
+
+    Returns:
+        Dict[str, Any]: A result as returned by run_job, with 'timeline' as the source name.
+    """
+    from self_stats.munger.timeline import main as timeline_main
+
+    buffer = io.StringIO()
+    success = True
+    start = time.perf_counter()
+    with redirect_stdout(buffer) if capture else nullcontext():
+        try:
+            timeline_main(directory, sources)
+        except Exception:
+            success = False
+            traceback.print_exc(file=buffer if capture else None)
+    return {
+        'directory': str(directory),
+        'source': 'timeline',
+        'success': success,
+        'seconds': round(time.perf_counter() - start, 2),
+        'output': buffer.getvalue(),
+    }
+
+def run_timelines(jobs: List[Tuple[str, Path, Path, List[str]]], results: List[Dict[str, Any]], quiet: bool = False) -> List[Dict[str, Any]]:
+    """
+    Builds the unified timeline of every directory where at least two sources ran and none of them failed.
+
+    Args:
+        jobs (List[Tuple[str, Path, Path, List[str]]]): The jobs that were run.
+        results (List[Dict[str, Any]]): Their results, as returned by run_jobs.
+        quiet (bool): Do not print the output of the timelines.
+
+    Returns:
+        List[Dict[str, Any]]: One result per timeline built, see run_timeline.
+    """
+    failed = {result['directory'] for result in results if not result['success']}
+    sources: Dict[Path, List[str]] = {}
+    for source, directory, _, _ in jobs:
+        sources.setdefault(directory, []).append(source)
+    return [run_timeline(directory, directory_sources, capture=quiet)
+            for directory, directory_sources in sources.items()
+            if len(directory_sources) > 1 and str(directory) not in failed]
+
+def run_jobs(jobs: List[Tuple[str, Path, Path, List[str]]], workers: int = 1, quiet: bool = False, action: str = 'process', **munger_options: Any) -> List[Dict[str, Any]]:
+    """
+    Runs jobs from any number of directories, carrying on when one of them fails.
+
+    With more than one worker the jobs run in a process pool. Each worker loads the spaCy model once
+    and reuses it for every job it picks up. The output of a job is printed as one block when it finishes.
+
+    Args:
+        jobs (List[Tuple[str, Path, Path, List[str]]]): Jobs as built by get_source_jobs.
+        workers (int): Number of worker processes, 1 to run the jobs in this process.
+        quiet (bool): Do not print the output of the jobs.
+        action (str): 'process' or 'aggregate', see run_job.
+        **munger_options (Any): Extra keyword arguments passed to munger_main.
+
+    Returns:
+        List[Dict[str, Any]]: One result per job as returned by run_job, in completion order.
+    """
+    results = []
+    if workers <= 1 or len(jobs) < 2:
+        for job in jobs:
+            results.append(run_job(job, munger_options, capture=quiet, action=action))
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=init_worker) as executor:
+        futures = [executor.submit(run_job, job, munger_options, True, action) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if not quiet:
+                print(f"================  {result['source']} history log ({result['directory']})  ================")
+                print(result['output'])
+    return results
+
+def run_sources(jobs: List[Tuple[str, Path, Path, List[str]]], parallel: bool = False, **munger_options: Any) -> Dict[str, bool]:
+    """
+    Runs the processing jobs either one after the other or concurrently in a process pool.
+
+    In parallel mode each source runs in its own worker process. Output paths never clash because
+    every file is prefixed with the source name. Worker output is buffered and printed as one block
+    when the job finishes, so the logs of the two sources never interleave.
+
+    Args:
+        jobs (List[Tuple[str, Path, Path, List[str]]]): Jobs as built by get_source_jobs.
+        parallel (bool): Whether to run the jobs concurrently.
+        **munger_options (Any): Extra keyword arguments passed to munger_main, e.g. parse_workers.
+
+    Returns:
+        Dict[str, bool]: Success flag per source name. In parallel mode a failing job has its traceback
+        printed and its flag set to False; in sequential mode exceptions propagate as before.
+    """
+    results = {}
+    if not parallel or len(jobs) < 2:
+        for source, directory, input_file, mappings in jobs:
+            munger_main(directory, input_file, mappings, **munger_options)
+            results[source] = True
+        return results
+
+    print(f"Processing {', '.join(job[0] for job in jobs)} history in parallel...\n")
+    for result in run_jobs(jobs, workers=len(jobs), **munger_options):
+        results[result['source']] = result['success']
+        if not result['success']:
+            print(f"***********  {result['source']} history processing failed!  ***********\n")
+    return results
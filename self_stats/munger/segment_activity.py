@@ -0,0 +1,110 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from self_stats.munger.process_dates import calculate_daily_counts, default_penalty, fingerprint_counts, fit_detector
+
+# Segmentation results keyed by (fingerprint of the daily counts, method, penalty), for the
+# SEGMENT_CACHE_SIZE most recently used series; pool and batch workers outlive a single source
+SEGMENT_CACHE_SIZE = 8
+_segment_cache: 'OrderedDict[Tuple[str, str, float], List[int]]' = OrderedDict()
+
+def segment_daily_counts(counts_array: np.ndarray, method: str = 'pelt', penalty: Optional[float] = None) -> List[int]:
+    """
+    Find all significant breakpoints in a daily counts series using a penalty based search.
+
+    Results are cached by a fingerprint of the counts, so repeated runs over unchanged data are free.
+
+    Args:
+        counts_array (np.ndarray): Dense daily counts, shape (n_days, 1).
+        method (str): Changepoint detector backend, see process_dates.CHANGEPOINT_DETECTORS.
+        penalty (Optional[float]): Penalty per breakpoint. Defaults to a BIC-style penalty.
+
+    Returns:
+        List[int]: Segment end indices (exclusive), the last one being the length of the series.
+    """
+    n_days = len(counts_array)
+    if n_days < 4:
+        return [n_days] if n_days else []
+
+    if penalty is None:
+        penalty = default_penalty(counts_array)
+
+    key = (fingerprint_counts(counts_array), method, float(penalty))
+    breakpoints = _segment_cache.get(key)
+    if breakpoints is None:
+        breakpoints = list(fit_detector(counts_array, method).predict(pen=penalty))
+        _segment_cache[key] = breakpoints
+        if len(_segment_cache) > SEGMENT_CACHE_SIZE:
+            _segment_cache.popitem(last=False)
+    else:
+        _segment_cache.move_to_end(key)
+    return list(breakpoints)
+
+def clear_segment_cache() -> None:
+    """
+    Drop all cached segmentation results.
+    """
+    _segment_cache.clear()
+
+def build_segments_table(dates_sorted: np.ndarray, counts_array: np.ndarray, breakpoints: List[int]) -> Tuple[np.ndarray, ...]:
+    """
+    Build a table describing each activity regime between consecutive breakpoints.
+
+    Args:
+        dates_sorted (np.ndarray): Dense array of consecutive dates (datetime64[D]).
+        counts_array (np.ndarray): Daily counts matching dates_sorted.
+        breakpoints (List[int]): Segment end indices (exclusive).
+
+    Returns:
+        Tuple[np.ndarray, ...]: Segment start dates, segment end dates (as 'YYYY-MM-DD' strings),
+        number of days in each segment and the mean daily rate of each segment.
+    """
+    ends = np.asarray(breakpoints, dtype=np.int64)
+    starts = np.concatenate(([0], ends[:-1])).astype(np.int64)
+    counts = np.asarray(counts_array, dtype=float).ravel()
+
+    # Segment sums from a single cumulative sum instead of one mean per slice
+    cumulative = np.concatenate(([0.0], np.cumsum(counts)))
+    days = ends - starts
+    mean_rates = np.round((cumulative[ends] - cumulative[starts]) / days, 3)
+
+    start_dates = np.datetime_as_string(dates_sorted[starts], unit='D')
+    end_dates = np.datetime_as_string(dates_sorted[ends - 1], unit='D')
+    return start_dates, end_dates, days, mean_rates
+
+def main(arr_data: Tuple[np.ndarray, ...], mappings: List[str], method: str = 'pelt', penalty: Optional[float] = None) -> Tuple[np.ndarray, ...]:
+    """
+    Segment the daily activity of a dataset into regimes of roughly constant rate.
+
+    Args:
+        arr_data (Tuple[np.ndarray, ...]): Input data tuple, each ndarray representing a column.
+        mappings (List[str]): List indicating what each column represents.
+        method (str): Changepoint detector backend.
+        penalty (Optional[float]): Penalty per breakpoint, defaults to a BIC-style penalty.
+
+    Returns:
+        Tuple[np.ndarray, ...]: Segments table as (start date, end date, days, mean daily rate) columns.
+    """
+    dates = arr_data[mappings.index('Date')].astype('datetime64[D]')
+    dates_sorted, counts_array = calculate_daily_counts(dates, include_empty=True)
+    return segment_counts(dates_sorted, counts_array, method, penalty)
+
+def segment_counts(dates_sorted: np.ndarray, counts_array: np.ndarray, method: str = 'pelt', penalty: Optional[float] = None) -> Tuple[np.ndarray, ...]:
+    """
+    Segments a dense daily count series, as built by calculate_daily_counts(..., include_empty=True).
+
+    Args:
+        dates_sorted (np.ndarray): Every day of the history, in order.
+        counts_array (np.ndarray): Entry count of each day, shaped (days, 1).
+        method (str): Changepoint detector backend.
+        penalty (Optional[float]): Penalty per breakpoint, defaults to a BIC-style penalty.
+
+    Returns:
+        Tuple[np.ndarray, ...]: Segments table as (start date, end date, days, mean daily rate) columns.
+    """
+    if len(dates_sorted) == 0:
+        return np.array([], dtype=str), np.array([], dtype=str), np.array([], dtype=np.int64), np.array([], dtype=float)
+
+    breakpoints = segment_daily_counts(counts_array, method, penalty)
+    return build_segments_table(dates_sorted, counts_array, breakpoints)
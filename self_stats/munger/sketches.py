@@ -0,0 +1,325 @@
+import hashlib
+import heapq
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Overcount of at most 0.01% of all counted values, with 99% probability
+DEFAULT_EPSILON = 1e-4
+DEFAULT_DELTA = 0.01
+
+HEAVY_HITTER_COLUMNS = ['Category', 'Rank', 'Value', 'Estimated_Count', 'Guaranteed_Count']
+# Values counted or estimated at a time, which bounds the working memory of a sketch whatever the number of values
+CHUNK_SIZE = 50_000
+
+def hash_strings(values: Iterable[str]) -> np.ndarray:
+    """
+    Hashes strings into 8 bytes each with blake2b, which unlike hash() is the same in every process and run.
+
+    Args:
+        values (Iterable[str]): Strings to hash.
+
+    Returns:
+        np.ndarray: uint64 hash of each string.
+    """
+    digests = b''.join(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest() for value in values)
+    return np.frombuffer(digests, dtype='<u8').astype(np.uint64)
+
+def value_chunks(values: np.ndarray, counts: Optional[np.ndarray] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Splits values into chunks of CHUNK_SIZE as they come, without adding up repeated values, ignoring None.
+
+    Args:
+        values (np.ndarray): Values, one per occurrence unless counts is given.
+        counts (Optional[np.ndarray]): Count of each value.
+
+    Yields:
+        Tuple[np.ndarray, np.ndarray]: The values of a chunk (as strings) and their int64 counts.
+    """
+    values = np.asarray(values, dtype=object)
+    counts = np.ones(len(values), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+    for start in range(0, len(values), CHUNK_SIZE):
+        chunk = values[start:start + CHUNK_SIZE]
+        present = chunk != None
+        if present.any():
+            yield chunk[present].astype(str).astype(object), counts[start:start + CHUNK_SIZE][present]
+
+class CountMinSketch:
+    """
+    Fixed-size frequency table of a stream of strings.
+
+    Each value is counted in one cell of each of depth rows of width counters, and its estimate is the smallest
+    of its cells. Estimates never undercount, and with probability 1 - delta overcount by at most epsilon times
+    the total of all counts. Sketches with the same epsilon and delta are merged by adding their tables.
+    """
+
+    def __init__(self, epsilon: float = DEFAULT_EPSILON, delta: float = DEFAULT_DELTA) -> None:
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError(f"Sketch error and failure probability must be between 0 and 1, got {epsilon} and {delta}.")
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(np.ceil(np.e / epsilon))
+        self.depth = int(np.ceil(np.log(1 / delta)))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    @property
+    def error_bound(self) -> float:
+        """
+        Largest overcount of any estimate, with probability 1 - delta.
+        """
+        return self.epsilon * self.total
+
+    def cells(self, hashes: np.ndarray) -> np.ndarray:
+        """
+        Returns the column of each hash in each row, from two halves of the hash (Kirsch-Mitzenmacher double hashing).
+        """
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low[None, :] + rows * high[None, :]) % np.uint64(self.width)).astype(np.intp)
+
+    def update(self, values: np.ndarray, counts: Optional[np.ndarray] = None) -> None:
+        """
+        Counts a batch of values, or adds the given count of each value, one chunk at a time.
+        """
+        for chunk, chunk_counts in value_chunks(values, counts):
+            self.update_chunk(chunk, chunk_counts)
+
+    def update_chunk(self, values: np.ndarray, counts: np.ndarray) -> None:
+        """
+        Adds the counts of a chunk of strings, repeated ones included, to their cells.
+        """
+        cells = self.cells(hash_strings(values))
+        for row in range(self.depth):
+            self.table[row] += np.bincount(cells[row], weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+
+    def estimate(self, values: np.ndarray) -> np.ndarray:
+        """
+        Returns the estimated count of each value (0 for None).
+        """
+        values = np.asarray(values, dtype=object)
+        estimates = np.zeros(len(values), dtype=np.int64)
+        for start in range(0, len(values), CHUNK_SIZE):
+            chunk = values[start:start + CHUNK_SIZE]
+            present = np.flatnonzero(chunk != None)
+            if len(present):
+                cells = self.cells(hash_strings(chunk[present].astype(str)))
+                estimates[start + present] = self.table[np.arange(self.depth)[:, None], cells].min(axis=0)
+        return estimates
+
+    def merge(self, other: 'CountMinSketch') -> None:
+        """
+        Adds the counts of another sketch, e.g. of another chunk, worker or run.
+        """
+        if self.table.shape != other.table.shape:
+            raise ValueError(f"Cannot merge sketches of shapes {self.table.shape} and {other.table.shape}.")
+        self.table += other.table
+        self.total += other.total
+
+class SpaceSaving:
+    """
+    The capacity most frequent values of a stream (Space-Saving algorithm).
+
+    A new value that finds every counter taken replaces the value with the smallest count and inherits that
+    count as its error. Counts never undercount, and overcount by at most total / capacity, so every value
+    more frequent than that is kept. Summaries are merged as in Agarwal et al., "Mergeable Summaries" (2012).
+
+    The heap holds one entry per counter, whose count may lag behind the counter's: increments leave it as it
+    is, and floor brings the entries it meets at the top up to date.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError(f"Space-Saving capacity must be at least 1, got {capacity}.")
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.heap: List[Tuple[int, str]] = []
+        self.total = 0
+
+    def floor(self) -> int:
+        """
+        Returns the largest count a value without a counter can have.
+        """
+        if len(self.counts) < self.capacity:
+            return 0
+        while self.heap[0][0] != self.counts[self.heap[0][1]]:
+            value = self.heap[0][1]
+            heapq.heapreplace(self.heap, (self.counts[value], value))
+        return self.heap[0][0]
+
+    def update(self, values: np.ndarray, counts: Optional[np.ndarray] = None) -> None:
+        """
+        Counts a batch of values, or adds the given count of each value, one chunk at a time.
+        """
+        for chunk, chunk_counts in value_chunks(values, counts):
+            self.update_chunk(chunk, chunk_counts)
+
+    def update_chunk(self, values: np.ndarray, counts: np.ndarray) -> None:
+        """
+        Counts a chunk of strings one occurrence at a time, in the order given.
+        """
+        tracked = self.counts
+        for value, count in zip(values.tolist(), counts.tolist()):
+            if value in tracked:
+                tracked[value] += count
+            elif len(tracked) < self.capacity:
+                tracked[value], self.errors[value] = count, 0
+                heapq.heappush(self.heap, (count, value))
+            else:
+                floor = self.floor()
+                _, evicted = heapq.heapreplace(self.heap, (floor + count, value))
+                del tracked[evicted], self.errors[evicted]
+                tracked[value], self.errors[value] = floor + count, floor
+        self.total += int(counts.sum())
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        """
+        Adds the counters of another summary. A value missing from one summary is counted as that summary's floor.
+        """
+        own_floor, other_floor = self.floor(), other.floor()
+        counts, errors = {}, {}
+        for value in self.counts.keys() | other.counts.keys():
+            counts[value] = self.counts.get(value, own_floor) + other.counts.get(value, other_floor)
+            errors[value] = self.errors.get(value, own_floor) + other.errors.get(value, other_floor)
+        kept = sorted(counts, key=lambda value: (-counts[value], value))[:self.capacity]
+        self.counts = {value: counts[value] for value in kept}
+        self.errors = {value: errors[value] for value in kept}
+        self.heap = [(count, value) for value, count in self.counts.items()]
+        heapq.heapify(self.heap)
+        self.total += other.total
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """
+        Returns the k values with the highest counts as (value, count, error), ties broken alphabetically.
+        """
+        ranked = sorted(self.counts, key=lambda value: (-self.counts[value], value))[:k]
+        return [(value, self.counts[value], self.errors[value]) for value in ranked]
+
+class HeavyHitters:
+    """
+    Approximate frequencies of a stream of strings in fixed memory: a CountMinSketch answers the count of any
+    value, and a SpaceSaving summary of matching error keeps the most frequent values themselves.
+
+    Has the update and estimate methods of CountMinSketch, so either can be passed wherever values are counted.
+    """
+
+    def __init__(self, epsilon: float = DEFAULT_EPSILON, delta: float = DEFAULT_DELTA) -> None:
+        self.sketch = CountMinSketch(epsilon, delta)
+        self.top_values = SpaceSaving(int(np.ceil(1 / epsilon)))
+        # Latest date of the rows counted, saved with the sketch so that a later run only counts the rows after it
+        self.through: Optional[np.datetime64] = None
+
+    @property
+    def total(self) -> int:
+        return self.sketch.total
+
+    def clear(self) -> None:
+        """
+        Forgets every value counted.
+        """
+        self.sketch = CountMinSketch(self.sketch.epsilon, self.sketch.delta)
+        self.top_values = SpaceSaving(self.top_values.capacity)
+        self.through = None
+
+    def counted_rows(self, dates: np.ndarray) -> np.ndarray:
+        """
+        Returns a mask of the rows dated no later than through. If this sketch was saved by an earlier run and
+        these rows are exactly as many as it counted, they are the rows it counted and only the others are new.
+        """
+        dates = np.asarray(dates, dtype='datetime64[s]')
+        if self.through is None:
+            return np.zeros(len(dates), dtype=bool)
+        return dates <= self.through
+
+    def update(self, values: np.ndarray, counts: Optional[np.ndarray] = None) -> None:
+        for chunk, chunk_counts in value_chunks(values, counts):
+            self.sketch.update_chunk(chunk, chunk_counts)
+            self.top_values.update_chunk(chunk, chunk_counts)
+
+    def estimate(self, values: np.ndarray) -> np.ndarray:
+        return self.sketch.estimate(values)
+
+    def merge(self, other: 'HeavyHitters') -> None:
+        self.sketch.merge(other.sketch)
+        self.top_values.merge(other.top_values)
+        if other.through is not None:
+            self.through = other.through if self.through is None else max(self.through, other.through)
+
+    def top(self, k: int = 100) -> Tuple[np.ndarray, ...]:
+        """
+        Returns the k most frequent values with their estimated count, the tighter of the two structures'
+        overestimates, and the count they are guaranteed to have.
+
+        Returns:
+            Tuple[np.ndarray, ...]: Value, estimated count and guaranteed count columns.
+        """
+        top = self.top_values.top(k)
+        values = np.array([value for value, _, _ in top], dtype=object)
+        counts = np.array([count for _, count, _ in top], dtype=np.int64)
+        guaranteed = np.array([count - error for _, count, error in top], dtype=np.int64)
+        return values, np.minimum(counts, self.sketch.estimate(values)), guaranteed
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """
+        Returns the state as plain arrays named with a prefix, as stored by save_sketches.
+        """
+        values = list(self.top_values.counts)
+        return {
+            f'{prefix}_settings': np.array([self.sketch.epsilon, self.sketch.delta]),
+            f'{prefix}_table': self.sketch.table,
+            f'{prefix}_totals': np.array([self.sketch.total, self.top_values.total], dtype=np.int64),
+            f'{prefix}_values': np.array(values, dtype=str),
+            f'{prefix}_counts': np.array([self.top_values.counts[value] for value in values], dtype=np.int64),
+            f'{prefix}_errors': np.array([self.top_values.errors[value] for value in values], dtype=np.int64),
+            f'{prefix}_through': np.array([self.through if self.through is not None else 'NaT'], dtype='datetime64[s]'),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], prefix: str) -> 'HeavyHitters':
+        epsilon, delta = arrays[f'{prefix}_settings'].tolist()
+        heavy_hitters = cls(epsilon, delta)
+        heavy_hitters.sketch.table = arrays[f'{prefix}_table'].copy()
+        heavy_hitters.sketch.total, heavy_hitters.top_values.total = arrays[f'{prefix}_totals'].tolist()
+        values = arrays[f'{prefix}_values'].tolist()
+        heavy_hitters.top_values.counts = dict(zip(values, arrays[f'{prefix}_counts'].tolist()))
+        heavy_hitters.top_values.errors = dict(zip(values, arrays[f'{prefix}_errors'].tolist()))
+        heavy_hitters.top_values.heap = [(count, value) for value, count in heavy_hitters.top_values.counts.items()]
+        heapq.heapify(heavy_hitters.top_values.heap)
+        through = arrays[f'{prefix}_through'][0] if f'{prefix}_through' in arrays else np.datetime64('NaT')
+        heavy_hitters.through = None if np.isnat(through) else through
+        return heavy_hitters
+
+def save_sketches(path: Path, sketches: Dict[str, HeavyHitters]) -> None:
+    """
+    Saves named sketches to one compressed .npz file, loadable without pickling.
+    """
+    arrays: Dict[str, np.ndarray] = {'names': np.array(list(sketches), dtype=str)}
+    for name, sketch in sketches.items():
+        arrays.update(sketch.arrays(name))
+    np.savez_compressed(path, **arrays)
+
+def load_sketches(path: Path) -> Dict[str, HeavyHitters]:
+    """
+    Loads the sketches saved by save_sketches, e.g. to merge them with those of a later run.
+    """
+    with np.load(path, allow_pickle=False) as arrays:
+        return {name: HeavyHitters.from_arrays(arrays, name) for name in arrays['names'].tolist()}
+
+def heavy_hitter_table(sketches: Dict[str, HeavyHitters], k: int = 100) -> Tuple[np.ndarray, ...]:
+    """
+    Builds the table of the k most frequent values of every sketch.
+
+    Returns:
+        Tuple[np.ndarray, ...]: Columns named by HEAVY_HITTER_COLUMNS.
+    """
+    tables = []
+    for name, sketch in sketches.items():
+        values, estimates, guaranteed = sketch.top(k)
+        tables.append((np.full(len(values), name, dtype=object), np.arange(1, len(values) + 1), values, estimates, guaranteed))
+    if not tables:
+        return tuple(np.array([], dtype=object) for _ in HEAVY_HITTER_COLUMNS)
+    return tuple(np.concatenate(columns) for columns in zip(*tables))
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from self_stats.munger.input_output import describe_input_file
+
+_SEPARATOR = '\x00'
+
+def fingerprint_file(file_path: Path, block_size: int = 2**20) -> str:
+    """
+    Returns a content hash of a file, used as the root key of the stage graph.
+
+    Files inside a Takeout archive are identified by the size and checksum recorded in the archive's headers
+    instead, so that they are not decompressed just to be fingerprinted.
+
+    Args:
+        file_path (Path): File to hash, or a path inside an archive.
+        block_size (int): Number of bytes read at a time.
+
+    Returns:
+        str: Hex digest of the file size and contents.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    archive_description = describe_input_file(file_path)
+    if archive_description:
+        digest.update(archive_description.encode('utf-8'))
+        return digest.hexdigest()
+    with open(file_path, 'rb') as file:
+        digest.update(str(os.fstat(file.fileno()).st_size).encode())
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _all_instances(values: np.ndarray, kind: type, exclude: Optional[type] = None) -> bool:
+    return all(value is None or (isinstance(value, kind) and not (exclude and isinstance(value, exclude))) for value in values)
+
+def encode_column(column: Any) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Encodes one column as typed NumPy arrays that can be stored without pickling.
+
+    Numeric and fixed-width string arrays are stored as they are. Object columns of naive datetimes,
+    dates or timedeltas become datetime64/timedelta64 arrays (NaT for None), and object columns of
+    strings become one UTF-8 buffer plus a validity mask. Anything else falls back to a pickled object array.
+
+    Args:
+        column (Any): A NumPy array, a list, or None.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, np.ndarray]]: A description of the encoding and the arrays to store.
+    """
+    if column is None:
+        return {'kind': 'none'}, {}
+    spec: Dict[str, Any] = {'list': not isinstance(column, np.ndarray)}
+    column = np.asarray(column) if spec['list'] else column
+
+    if column.dtype != object:
+        spec['kind'] = 'array'
+        return spec, {'values': column}
+
+    if len(column) and _all_instances(column, datetime) and all(value is None or value.tzinfo is None for value in column):
+        spec['kind'] = 'datetime'
+        return spec, {'values': column.astype('datetime64[us]')}
+    if len(column) and _all_instances(column, date, exclude=datetime):
+        spec['kind'] = 'date'
+        return spec, {'values': column.astype('datetime64[D]')}
+    if len(column) and _all_instances(column, timedelta):
+        spec['kind'] = 'timedelta'
+        return spec, {'values': column.astype('timedelta64[us]')}
+    if _all_instances(column, str):
+        valid = np.array([value is not None for value in column], dtype=bool)
+        strings = column[valid].tolist()
+        if not any(_SEPARATOR in value for value in strings):
+            spec['kind'] = 'strings'
+            spec['count'] = len(strings)
+            joined = np.frombuffer(_SEPARATOR.join(strings).encode('utf-8'), dtype=np.uint8)
+            return spec, {'values': joined, 'valid': valid}
+
+    spec['kind'] = 'object'
+    return spec, {'values': column}
+
+def decode_column(spec: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> Any:
+    """
+    Rebuilds a column encoded with encode_column.
+
+    Args:
+        spec (Dict[str, Any]): The encoding description.
+        arrays (Dict[str, np.ndarray]): The stored arrays.
+
+    Returns:
+        Any: The original column.
+    """
+    kind = spec['kind']
+    if kind == 'none':
+        return None
+    if kind in ('datetime', 'date', 'timedelta'):
+        column = arrays['values'].astype(object)
+    elif kind == 'strings':
+        valid = arrays['valid']
+        column = np.full(len(valid), None, dtype=object)
+        if spec['count']:
+            column[valid] = arrays['values'].tobytes().decode('utf-8').split(_SEPARATOR)
+    else:
+        column = arrays['values']
+    return column.tolist() if spec['list'] else column
+
+def save_artifact(file_path: Path, key: str, result: Any) -> None:
+    """
+    Saves the output of a stage, a tuple of columns or a tuple of such tuples, as a typed .npz artifact.
+
+    The file is written next to its destination first and then moved in place, so an interrupted
+    run never leaves a truncated artifact behind.
+
+    Args:
+        file_path (Path): Destination .npz file.
+        key (str): Cache key the artifact is valid for.
+        result (Any): The stage output.
+    """
+    nested = bool(result) and all(isinstance(group, tuple) for group in result)
+    groups = result if nested else (result,)
+    meta: Dict[str, Any] = {'key': key, 'nested': nested, 'groups': []}
+    arrays: Dict[str, np.ndarray] = {}
+    for i, group in enumerate(groups):
+        specs = []
+        for j, column in enumerate(group):
+            spec, parts = encode_column(column)
+            specs.append(spec)
+            for part, array in parts.items():
+                arrays[f'g{i}_c{j}_{part}'] = array
+        meta['groups'].append(specs)
+    arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+    temporary_path = file_path.with_name(file_path.name + '.tmp')
+    with open(temporary_path, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(temporary_path, file_path)
+
+def load_artifact(file_path: Path, key: Optional[str] = None) -> Optional[Any]:
+    """
+    Loads a stage output saved with save_artifact.
+
+    Args:
+        file_path (Path): The .npz artifact.
+        key (Optional[str]): Expected cache key. None accepts any key.
+
+    Returns:
+        Optional[Any]: The stage output, or None if the file is missing, unreadable or was saved for another key.
+    """
+    if not file_path.exists():
+        return None
+    try:
+        with np.load(file_path, allow_pickle=True) as stored:
+            meta = json.loads(stored['meta'].tobytes().decode('utf-8'))
+            if key is not None and meta['key'] != key:
+                return None
+            groups = []
+            for i, specs in enumerate(meta['groups']):
+                columns = []
+                for j, spec in enumerate(specs):
+                    prefix = f'g{i}_c{j}_'
+                    parts = {name[len(prefix):]: stored[name] for name in stored.files if name.startswith(prefix)}
+                    columns.append(decode_column(spec, parts))
+                groups.append(tuple(columns))
+    except (OSError, ValueError, KeyError):
+        return None
+    return tuple(groups) if meta['nested'] else groups[0]
+
+class StageCache:
+    """
+    Persists the output of each pipeline stage and reuses it when the stage's inputs have not changed.
+
+    Every stage gets a key derived from its name, its version, its parameters and the keys of the stages
+    it reads from, so a changed input file or a bumped stage version invalidates that stage and everything
+    downstream of it. Outputs are stored as typed artifacts in <cache_dir>/<PREFIX>_<stage>.npz, and the keys
+    of the latest run are recorded in <cache_dir>/<PREFIX>_manifest.json.
+    """
+
+    def __init__(self, cache_dir: Path, prefix: str, enabled: bool = True, rerun: Iterable[str] = ()) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.prefix = prefix
+        self.enabled = enabled
+        self.rerun = set(rerun)
+        self.keys: Dict[str, str] = {}
+        self.hits: Dict[str, bool] = {}
+        self.forced: set = set()
+        self.manifest_path = self.cache_dir / f'{prefix}_manifest.json'
+        self.previous = self.read_manifest(self.manifest_path)
+        if enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def read_manifest(manifest_path: Path) -> Dict[str, str]:
+        """
+        Returns the stage keys recorded by the latest run, or an empty dictionary.
+        """
+        try:
+            return json.loads(Path(manifest_path).read_text(encoding='utf-8'))['stages']
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def artifact_path(self, name: str) -> Path:
+        return self.cache_dir / f'{self.prefix}_{name}.npz'
+
+    def stage_key(self, name: str, version: int, inputs: Sequence[str] = (), params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Computes and records the key of a stage.
+
+        Args:
+            name (str): Stage name.
+            version (int): Stage version, bumped whenever the stage's logic changes.
+            inputs (Sequence[str]): Names of the upstream stages. Stages that were skipped in this run count as None.
+            params (Optional[Dict[str, Any]]): JSON-serialisable parameters that change the stage's output.
+
+        Returns:
+            str: The stage key.
+        """
+        payload = json.dumps({'stage': name, 'version': version, 'params': params or {},
+                              'inputs': [self.keys.get(upstream) for upstream in inputs]}, sort_keys=True, default=str)
+        key = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+        self.keys[name] = key
+        if name in self.rerun or any(upstream in self.forced for upstream in inputs):
+            self.forced.add(name)
+        return key
+
+    def run(self, name: str, version: int, func: Callable[[], Any], inputs: Sequence[str] = (), params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Returns the cached output of a stage, or runs the stage and caches its output.
+
+        A stage is re-run when its key changed, when it was named in rerun, or when an upstream stage was re-run
+        because of rerun.
+
+        Args:
+            name (str): Stage name.
+            version (int): Stage version.
+            func (Callable[[], Any]): Computes the stage output.
+            inputs (Sequence[str]): Names of the upstream stages.
+            params (Optional[Dict[str, Any]]): Parameters that change the stage's output.
+
+        Returns:
+            Any: The stage output.
+        """
+        key = self.stage_key(name, version, inputs, params)
+        if self.enabled and name not in self.forced:
+            cached = load_artifact(self.artifact_path(name), key)
+            if cached is not None:
+                self.hits[name] = True
+                print(f"Using cached {name} results.\n")
+                return cached
+        result = func()
+        self.hits[name] = False
+        if self.enabled:
+            save_artifact(self.artifact_path(name), key, result)
+        return result
+
+    def is_current(self, name: str, version: int, outputs: Sequence[Path], inputs: Sequence[str] = (), params: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Checks whether a stage that only writes files (such as the aggregated workbooks) can be skipped.
+
+        Args:
+            name (str): Stage name.
+            version (int): Stage version.
+            outputs (Sequence[Path]): Files the stage writes.
+            inputs (Sequence[str]): Names of the upstream stages.
+            params (Optional[Dict[str, Any]]): Parameters that change the stage's output.
+
+        Returns:
+            bool: True if the latest run completed the stage with the same key and its outputs still exist.
+        """
+        key = self.stage_key(name, version, inputs, params)
+        current = (self.enabled and name not in self.forced and self.previous.get(name) == key
+                   and all(Path(output).exists() for output in outputs))
+        self.hits[name] = current
+        return current
+
+    def is_reused(self, stages: Sequence[str], outputs: Sequence[Path] = ()) -> bool:
+        """
+        Returns True if every named stage was served from the cache, the latest run recorded the same keys
+        and every output file exists. An artifact can outlive the run that wrote the outputs on disk: an
+        uncached run leaves the artifacts in place but writes outputs for a different input.
+        """
+        return (all(self.hits.get(stage) and self.previous.get(stage) == self.keys.get(stage) for stage in stages)
+                and all(Path(output).exists() for output in outputs))
+
+    def save_manifest(self) -> None:
+        """
+        Records the keys of every stage completed in this run. Without caching, the manifest of an earlier
+        run is removed because it no longer describes the outputs on disk.
+        """
+        if not self.enabled:
+            if self.manifest_path.exists():
+                self.manifest_path.unlink()
+            return
+        completed = {name: self.keys[name] for name in self.hits}
+        manifest = {'updated': datetime.now().isoformat(timespec='seconds'), 'stages': completed}
+        self.manifest_path.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+
+    def load_latest(self, name: str) -> Optional[Any]:
+        """
+        Loads the artifact of a stage as recorded by the latest run, or None if there is none.
+        """
+        key = self.previous.get(name)
+        return load_artifact(self.artifact_path(name), key) if key else None
@@ -0,0 +1,229 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Word pool used to build query phrases, video titles and channel names
+WORDS = [
+    'python', 'numpy', 'pandas', 'weather', 'news', 'recipe', 'guitar', 'football', 'travel', 'music',
+    'coffee', 'bread', 'garden', 'tomato', 'running', 'shoes', 'laptop', 'review', 'tutorial', 'history',
+    'science', 'space', 'rocket', 'ocean', 'mountain', 'hiking', 'camera', 'lens', 'photography', 'movie',
+    'trailer', 'podcast', 'chess', 'opening', 'strategy', 'workout', 'yoga', 'pizza', 'pasta', 'salad',
+    'budget', 'stocks', 'investing', 'mortgage', 'rates', 'flight', 'hotel', 'paris', 'tokyo', 'london',
+    'piano', 'drums', 'jazz', 'concert', 'tickets', 'election', 'economy', 'climate', 'solar', 'battery',
+    'electric', 'car', 'bike', 'repair', 'kitchen', 'knife', 'sharpening', 'dog', 'training', 'cat',
+    'vet', 'doctor', 'sleep', 'meditation', 'language', 'spanish', 'french', 'grammar', 'math', 'calculus',
+    'physics', 'chemistry', 'biology', 'genetics', 'painting', 'drawing', 'anime', 'game', 'speedrun', 'minecraft',
+    'linux', 'docker', 'kubernetes', 'database', 'sql', 'regex', 'javascript', 'rust', 'compiler', 'keyboard',
+]
+
+SITES = ['wikipedia.org', 'github.com', 'stackoverflow.com', 'reddit.com', 'nytimes.com', 'bbc.co.uk',
+         'amazon.com', 'imdb.com', 'allrecipes.com', 'weather.com', 'docs.python.org', 'medium.com']
+
+DEFAULT_END = datetime(2024, 4, 20, 12, 0, tzinfo=timezone.utc)
+
+# Entries are generated in blocks so memory stays bounded even for 10M-entry histories
+_BLOCK_SIZE = 100_000
+
+def build_vocabulary(rng: np.random.Generator, size: int, min_words: int, max_words: int) -> List[str]:
+    """
+    Builds a list of distinct-ish phrases made of random words.
+
+    Args:
+        rng (np.random.Generator): Seeded random generator.
+        size (int): Number of phrases.
+        min_words (int): Minimum number of words per phrase.
+        max_words (int): Maximum number of words per phrase.
+
+    Returns:
+        List[str]: The generated phrases.
+    """
+    lengths = rng.integers(min_words, max_words + 1, size=size)
+    return [' '.join(rng.choice(WORDS, size=length)) for length in lengths]
+
+def zipf_indices(rng: np.random.Generator, size: int, n_items: int, exponent: float = 1.2) -> np.ndarray:
+    """
+    Draws item indices with a Zipf-like popularity distribution, so a few items repeat very often.
+
+    Args:
+        rng (np.random.Generator): Seeded random generator.
+        size (int): Number of indices to draw.
+        n_items (int): Number of distinct items.
+        exponent (float): Zipf exponent, higher means more repetition.
+
+    Returns:
+        np.ndarray: Indices in [0, n_items).
+    """
+    ranks = np.arange(1, n_items + 1, dtype=float)
+    weights = ranks ** -exponent
+    return rng.choice(n_items, size=size, p=weights / weights.sum())
+
+def generate_timestamps(rng: np.random.Generator, size: int, end: datetime = DEFAULT_END,
+                        session_gap_hours: float = 6.0, in_session_gap_minutes: float = 2.0,
+                        session_length: float = 12.0) -> Iterator[np.ndarray]:
+    """
+    Generates descending timestamps (newest first, like Takeout) grouped into sessions.
+
+    Entries within a session are a couple of minutes apart; sessions are separated by gaps of several hours.
+
+    Args:
+        rng (np.random.Generator): Seeded random generator.
+        size (int): Total number of timestamps.
+        end (datetime): Timestamp of the newest entry.
+        session_gap_hours (float): Mean gap between sessions in hours.
+        in_session_gap_minutes (float): Mean gap between entries of the same session in minutes.
+        session_length (float): Mean number of entries per session.
+
+    Yields:
+        np.ndarray: Blocks of datetime64[ms] timestamps in descending order.
+    """
+    current = np.datetime64(end.replace(tzinfo=None), 'ms')
+    remaining = size
+    while remaining > 0:
+        block = min(remaining, _BLOCK_SIZE)
+        gaps_ms = rng.exponential(in_session_gap_minutes * 60_000, size=block)
+        new_session = rng.random(block) < 1.0 / session_length
+        gaps_ms[new_session] = rng.exponential(session_gap_hours * 3_600_000, size=int(new_session.sum()))
+        offsets = np.cumsum(gaps_ms.astype(np.int64) + 1)
+        yield current - offsets.astype('timedelta64[ms]')
+        current = current - np.timedelta64(int(offsets[-1]), 'ms')
+        remaining -= block
+
+def format_times(timestamps: np.ndarray) -> List[str]:
+    """
+    Formats timestamps the way Takeout does, e.g. '2024-04-20T05:55:07.811Z'.
+    """
+    return [f'{value}Z' for value in np.datetime_as_string(timestamps, unit='ms')]
+
+def generate_search_entries(size: int, seed: int = 0, end: datetime = DEFAULT_END,
+                            vocabulary_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Generates synthetic MyActivity.json entries: searches, visited sites and some location infos.
+
+    Args:
+        size (int): Number of entries.
+        seed (int): Random seed, the same seed always produces the same entries.
+        end (datetime): Timestamp of the newest entry.
+        vocabulary_size (Optional[int]): Number of distinct queries, defaults to scaling with size.
+
+    Yields:
+        Dict[str, Any]: One entry per search activity, newest first.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = build_vocabulary(rng, vocabulary_size or max(50, min(size // 20, 200_000)), 1, 4)
+    for timestamps in generate_timestamps(rng, size, end):
+        block = len(timestamps)
+        queries = zipf_indices(rng, block, len(vocabulary))
+        kinds = rng.random(block)
+        sites = rng.integers(0, len(SITES), size=block)
+        has_location = rng.random(block) < 0.4
+        latitudes = np.round(40.0 + rng.normal(0, 0.05, size=block), 6)
+        longitudes = np.round(-74.0 + rng.normal(0, 0.05, size=block), 6)
+
+        for i, time in enumerate(format_times(timestamps)):
+            query = vocabulary[queries[i]]
+            if kinds[i] < 0.08:
+                title = f'Visited https://www.{SITES[sites[i]]}/{query.replace(" ", "_")}'
+            elif kinds[i] < 0.15:
+                title = f'Visited {query.title()} - {SITES[sites[i]]}'
+            else:
+                title = f'Searched for {query}'
+            entry = {'header': 'Search', 'title': title, 'time': time, 'products': ['Search']}
+            if has_location[i]:
+                entry['locationInfos'] = [{
+                    'name': 'At this general area',
+                    'url': f'https://www.google.com/maps/@?api=1&map_action=map&center={latitudes[i]},{longitudes[i]}&zoom=12',
+                    'source': 'From your places (Home)'
+                }]
+            yield entry
+
+def generate_watch_entries(size: int, seed: int = 0, end: datetime = DEFAULT_END,
+                           n_videos: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Generates synthetic watch-history.json entries with rewatches, Shorts and removed videos.
+
+    Args:
+        size (int): Number of entries.
+        seed (int): Random seed, the same seed always produces the same entries.
+        end (datetime): Timestamp of the newest entry.
+        n_videos (Optional[int]): Number of distinct videos, defaults to scaling with size.
+
+    Yields:
+        Dict[str, Any]: One entry per watched video, newest first.
+    """
+    rng = np.random.default_rng(seed + 1)
+    n_videos = n_videos or max(50, min(size // 5, 1_000_000))
+    n_channels = max(10, n_videos // 20)
+    alphabet = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'))
+    video_ids = [''.join(row) for row in rng.choice(alphabet, size=(n_videos, 11))]
+    video_titles = build_vocabulary(rng, n_videos, 2, 6)
+    video_channels = rng.integers(0, n_channels, size=n_videos)
+    video_is_short = rng.random(n_videos) < 0.2
+    channel_names = [f'{name.title()} Channel' for name in build_vocabulary(rng, n_channels, 1, 2)]
+
+    for timestamps in generate_timestamps(rng, size, end, session_gap_hours=8.0, in_session_gap_minutes=6.0):
+        block = len(timestamps)
+        videos = zipf_indices(rng, block, n_videos, exponent=1.05)
+        removed = rng.random(block) < 0.02
+
+        for i, time in enumerate(format_times(timestamps)):
+            video = videos[i]
+            if video_is_short[video]:
+                url = f'https://www.youtube.com/shorts/{video_ids[video]}'
+            else:
+                url = f'https://www.youtube.com/watch?v={video_ids[video]}'
+            entry = {'header': 'YouTube', 'title': f'Watched {video_titles[video]}', 'titleUrl': url, 'products': ['YouTube'], 'time': time}
+            if removed[i]:
+                entry['title'] = 'Watched a video that has been removed'
+                del entry['titleUrl']
+            else:
+                channel = channel_names[video_channels[video]]
+                entry['subtitles'] = [{'name': channel, 'url': f'https://www.youtube.com/channel/UC{video_channels[video]:022d}'}]
+            yield entry
+
+def write_takeout_json(entries: Iterator[Dict[str, Any]], file_path: Path) -> int:
+    """
+    Streams entries to a JSON array file without holding them all in memory.
+
+    Args:
+        entries (Iterator[Dict[str, Any]]): Entries to write.
+        file_path (Path): Destination file.
+
+    Returns:
+        int: Number of entries written.
+    """
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('[')
+        for entry in entries:
+            file.write(',\n' if count else '\n')
+            file.write(json.dumps(entry, ensure_ascii=False))
+            count += 1
+        file.write('\n]')
+    return count
+
+def main(directory: Path, search_size: int = 10_000, watch_size: int = 10_000, seed: int = 0) -> Dict[str, Path]:
+    """
+    Writes a synthetic MyActivity.json and watch-history.json into a directory.
+
+    Args:
+        directory (Path): Destination directory, created if missing.
+        search_size (int): Number of search entries, 0 to skip the file.
+        watch_size (int): Number of watch entries, 0 to skip the file.
+        seed (int): Random seed.
+
+    Returns:
+        Dict[str, Path]: Paths of the written files keyed by source name.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = {}
+    if search_size:
+        written['search'] = directory / 'MyActivity.json'
+        write_takeout_json(generate_search_entries(search_size, seed), written['search'])
+    if watch_size:
+        written['watch'] = directory / 'watch-history.json'
+        write_takeout_json(generate_watch_entries(watch_size, seed), written['watch'])
+    return written
@@ -0,0 +1,63 @@
+from typing import Iterable, List, Optional
+
+import regex
+
+# Compiled once at import instead of on every call
+CONTROL_CHARACTERS = regex.compile(r'[\p{C}]')
+WHITESPACE_RUNS = regex.compile(r'\s+')
+
+def is_clean(input_string: str) -> bool:
+    """
+    Checks whether a string is already in normalized form without running any regex.
+
+    A string made only of printable ASCII characters contains no Unicode control characters, and its
+    only whitespace is the plain space, so it is clean if it has no leading, trailing or repeated spaces.
+
+    Args:
+    - input_string (str): The string to check.
+
+    Returns:
+    - bool: True if clean_string would return the string unchanged.
+    """
+    return (input_string.isascii()
+            and input_string.isprintable()
+            and '  ' not in input_string
+            and not input_string.startswith(' ')
+            and not input_string.endswith(' '))
+
+def clean_string(input_string: Optional[str]) -> Optional[str]:
+    """
+    Cleans a string by removing non-printable characters and other potential unwanted characters or patterns.
+
+    Args:
+    - input_string (str): The string to be cleaned.
+
+    Returns:
+    - str: The cleaned string.
+    """
+    if input_string is None:
+        return None
+
+    if is_clean(input_string):
+        return input_string
+
+    # Remove all non-printable characters (Unicode category C)
+    cleaned_string = CONTROL_CHARACTERS.sub('', input_string)
+
+    # Remove leading and trailing whitespace
+    cleaned_string = cleaned_string.strip()
+
+    # Replace multiple spaces with a single space
+    return WHITESPACE_RUNS.sub(' ', cleaned_string)
+
+def clean_strings(values: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """
+    Cleans a whole column of strings, skipping the regex passes for values that are already clean.
+
+    Args:
+    - values (Iterable[Optional[str]]): The strings to be cleaned. None values are kept as None.
+
+    Returns:
+    - List[Optional[str]]: The cleaned strings, in the same order.
+    """
+    return [value if value is None or is_clean(value) else clean_string(value) for value in values]
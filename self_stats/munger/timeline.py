@@ -0,0 +1,287 @@
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+from self_stats.munger.input_output import create_output_directories, read_csv_columns, save_to_csv
+
+# Sources merged into the timeline, in the order their tags are numbered; on equal times the earlier source comes first
+TIMELINE_SOURCES = ('search', 'watch')
+# Processed data column holding the text of an action of each source
+TEXT_COLUMNS = {'search': 'Query_Text', 'watch': 'Video_Title'}
+# Action count column of each source in the session and rollup tables
+COUNT_COLUMNS = ['Searches', 'Views']
+
+# Longest pause, in seconds, between two actions of one session: the interrupt time of the imputer
+SESSION_GAP = 20 * 60
+
+TIMELINE_COLUMNS = ['Date', 'Source', 'Source_Row', 'Text', 'Session']
+SESSION_COLUMNS = ['Session', 'Session_Start', 'Session_End', 'Session_Minutes', 'Actions'] + COUNT_COLUMNS + ['Search_Then_Watch']
+DAILY_COLUMNS = ['Date_Only', 'Actions'] + COUNT_COLUMNS + ['Sessions', 'Active_Minutes', 'First_Action', 'Last_Action']
+HOURLY_COLUMNS = ['Hour', 'Actions'] + COUNT_COLUMNS
+
+def get_timeline_paths(directory: Path) -> Dict[str, Path]:
+    """
+    Builds the paths of the timeline outputs, next to those of the sources (see munger_main.get_output_paths).
+    """
+    outer_path = directory / 'output'
+    agg_dir = outer_path / 'aggregated_data'
+    return {
+        'outer': outer_path,
+        'full_data': outer_path / 'full_data',
+        'aggregated': agg_dir,
+        'timeline': outer_path / 'full_data' / 'TIMELINE.csv',
+        'sessions': agg_dir / 'TIMELINE_sessions.csv',
+        'daily': agg_dir / 'TIMELINE_daily.csv',
+        'hourly': agg_dir / 'TIMELINE_hourly.csv',
+    }
+
+def merge_positions(left: np.ndarray, right: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns where the items of two ascending arrays go in their merge. Equal items of left come first.
+
+    An item of the shorter array goes to its index plus the number of items of the longer array placed before
+    it, found by a binary search of the longer array. The items of the longer array fill the remaining
+    positions in order.
+    """
+    size = len(left) + len(right)
+    if len(left) <= len(right):
+        placed = np.arange(len(left)) + np.searchsorted(right, left, side='left')
+    else:
+        placed = np.arange(len(right)) + np.searchsorted(left, right, side='right')
+    rest = np.ones(size, dtype=bool)
+    rest[placed] = False
+    rest = np.flatnonzero(rest)
+    return (placed, rest) if len(left) <= len(right) else (rest, placed)
+
+def merge_sorted(runs: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merges any number of ascending runs into one ascending array without sorting their union.
+
+    The runs are merged into the result one after the other: the positions of both sides are found with
+    merge_positions and every column is scattered into place, so each merge costs one binary search per item
+    of its shorter side and linear passes. Equal keys keep the order of their runs, then their order within a run.
+
+    Args:
+        runs (Sequence[np.ndarray]): Arrays of one comparable dtype, each sorted in ascending order.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The merged keys, the index of the run each came from and its
+        index within that run.
+    """
+    if not runs:
+        return np.array([]), np.array([], dtype=np.int8), np.array([], dtype=np.int64)
+    keys = np.asarray(runs[0])
+    tags = np.zeros(len(keys), dtype=np.int8)
+    rows = np.arange(len(keys), dtype=np.int64)
+    for tag, run in enumerate(runs[1:], start=1):
+        run = np.asarray(run)
+        merged_positions, run_positions = merge_positions(keys, run)
+        size = len(keys) + len(run)
+        merged_keys = np.empty(size, dtype=np.result_type(keys, run))
+        merged_keys[merged_positions], merged_keys[run_positions] = keys, run
+        merged_tags, merged_rows = np.full(size, tag, dtype=np.int8), np.empty(size, dtype=np.int64)
+        merged_tags[merged_positions] = tags
+        merged_rows[merged_positions], merged_rows[run_positions] = rows, np.arange(len(run))
+        keys, tags, rows = merged_keys, merged_tags, merged_rows
+    return keys, tags, rows
+
+def ascending_run(dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turns the newest first Date column of a source into an ascending run of datetime64[s].
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The ascending times and the row of the source each came from. A column that
+        is not sorted (which the pipeline does not produce) is sorted on its own, never together with other sources.
+    """
+    times = np.asarray(dates).astype('datetime64[s]')[::-1]
+    rows = np.arange(len(times) - 1, -1, -1, dtype=np.int64)
+    if np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind='stable')
+        times, rows = times[order], rows[order]
+    return times, rows
+
+def format_times(values: np.ndarray, unit: str = 's') -> np.ndarray:
+    return np.char.replace(np.datetime_as_string(values, unit=unit), 'T', ' ')
+
+class Timeline:
+    """
+    The actions of every source in one chronological, source-tagged table: the time of each action, the index of
+    its source in TIMELINE_SOURCES, its row in the processed data of that source, and its text.
+    """
+
+    def __init__(self, times: np.ndarray, sources: np.ndarray, rows: np.ndarray, texts: np.ndarray) -> None:
+        self.times = np.asarray(times, dtype='datetime64[s]')
+        self.sources = np.asarray(sources, dtype=np.int8)
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.texts = np.asarray(texts, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def build(cls, histories: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> 'Timeline':
+        """
+        Merges the processed data of several sources.
+
+        Args:
+            histories (Dict[str, Tuple[np.ndarray, np.ndarray]]): The Date and text column of each source present,
+                keyed by name from TIMELINE_SOURCES, newest first as in the processed data.
+
+        Returns:
+            Timeline: The merged timeline.
+
+        Raises:
+            ValueError: If a source is not one of TIMELINE_SOURCES.
+        """
+        unknown = set(histories) - set(TIMELINE_SOURCES)
+        if unknown:
+            raise ValueError(f"Cannot merge {sorted(unknown)} into the timeline. Sources are {list(TIMELINE_SOURCES)}.")
+        present = [source for source in TIMELINE_SOURCES if source in histories]
+        if not present:
+            return cls(np.array([], dtype='datetime64[s]'), [], [], [])
+        runs = [ascending_run(histories[source][0]) for source in present]
+        times, tags, run_rows = merge_sorted([times for times, _ in runs])
+
+        tags = tags.astype(np.int64)
+        rows = np.empty(len(times), dtype=np.int64)
+        texts = np.empty(len(times), dtype=object)
+        for tag, (source, (_, source_rows)) in enumerate(zip(present, runs)):
+            taken = tags == tag
+            rows[taken] = source_rows[run_rows[taken]]
+            texts[taken] = np.asarray(histories[source][1], dtype=object)[rows[taken]]
+        source_tags = np.array([TIMELINE_SOURCES.index(source) for source in present], dtype=np.int8)
+        return cls(times.astype('datetime64[s]'), source_tags[tags], rows, texts)
+
+    def session_starts(self, gap: int = SESSION_GAP) -> np.ndarray:
+        """
+        Flags the actions that open a session: the first one, and any that follows a pause longer than gap
+        seconds, whichever sources the actions on both sides of the pause come from.
+        """
+        return np.r_[True, np.diff(self.times).astype(np.int64) > gap][:len(self)]
+
+    def source_counts(self, starts: np.ndarray) -> np.ndarray:
+        """
+        Counts the actions of each source in the groups of consecutive actions opening at starts.
+
+        Returns:
+            np.ndarray: A len(starts) × len(TIMELINE_SOURCES) array of counts.
+        """
+        one_hot = (self.sources[:, None] == np.arange(len(TIMELINE_SOURCES))).astype(np.int64)
+        return np.add.reduceat(one_hot, starts, axis=0)
+
+    def sessions(self, gap: int = SESSION_GAP) -> Tuple[np.ndarray, ...]:
+        """
+        Builds the cross-source session windows, oldest first.
+
+        Returns:
+            Tuple[np.ndarray, ...]: The columns named by SESSION_COLUMNS. Search_Then_Watch counts the searches
+            directly followed by a video view within the session.
+        """
+        if not len(self):
+            return (np.array([], dtype=np.int64),) + tuple(np.array([], dtype=object) for _ in SESSION_COLUMNS[1:])
+        is_start = self.session_starts(gap)
+        starts = np.flatnonzero(is_start)
+        ends = np.r_[starts[1:], len(self)] - 1
+        minutes = np.round((self.times[ends] - self.times[starts]).astype(np.int64) / 60, 2)
+
+        search, watch = TIMELINE_SOURCES.index('search'), TIMELINE_SOURCES.index('watch')
+        search_then_watch = np.r_[False, (self.sources[:-1] == search) & (self.sources[1:] == watch)] & ~is_start
+        return (np.arange(1, len(starts) + 1), format_times(self.times[starts]), format_times(self.times[ends]), minutes,
+                ends - starts + 1, *self.source_counts(starts).T, np.add.reduceat(search_then_watch.astype(np.int64), starts))
+
+    def rollup(self, unit: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Groups the actions by calendar period. Actions are in time order, so every period is one contiguous slice.
+
+        Args:
+            unit (str): numpy datetime unit of the periods, e.g. 'D' or 'h'.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: The periods with any activity, the index of the first action
+            of each, and the actions of each source in each (see source_counts).
+        """
+        periods = self.times.astype(f'datetime64[{unit}]')
+        starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])[:len(self)]
+        counts = self.source_counts(starts) if len(self) else np.zeros((0, len(TIMELINE_SOURCES)), dtype=np.int64)
+        return periods[starts], starts, counts
+
+    def daily(self, gap: int = SESSION_GAP) -> Tuple[np.ndarray, ...]:
+        """
+        Builds the combined daily rollup, oldest day first. Sessions and their minutes count towards the day they
+        start on.
+
+        Returns:
+            Tuple[np.ndarray, ...]: The columns named by DAILY_COLUMNS.
+        """
+        if not len(self):
+            return tuple(np.array([], dtype=object) for _ in DAILY_COLUMNS)
+        days, starts, counts = self.rollup('D')
+        ends = np.r_[starts[1:], len(self)] - 1
+        session_starts = np.flatnonzero(self.session_starts(gap))
+        session_ends = np.r_[session_starts[1:], len(self)] - 1
+        minutes = (self.times[session_ends] - self.times[session_starts]).astype(np.int64) / 60
+        session_days = np.searchsorted(starts, session_starts, side='right') - 1
+        return (np.datetime_as_string(days, unit='D'), counts.sum(axis=1), *counts.T,
+                np.bincount(session_days, minlength=len(days)),
+                np.round(np.bincount(session_days, weights=minutes, minlength=len(days)), 2),
+                format_times(self.times[starts]), format_times(self.times[ends]))
+
+    def hourly(self) -> Tuple[np.ndarray, ...]:
+        """
+        Builds the combined hourly rollup, oldest hour first, leaving out hours without activity.
+
+        Returns:
+            Tuple[np.ndarray, ...]: The columns named by HOURLY_COLUMNS.
+        """
+        hours, _, counts = self.rollup('h')
+        return (format_times(hours, unit='m'), counts.sum(axis=1), *counts.T)
+
+    def table(self, gap: int = SESSION_GAP) -> Tuple[np.ndarray, ...]:
+        """
+        Formats the timeline as the columns named by TIMELINE_COLUMNS, newest first as in the processed data.
+        """
+        sessions = np.cumsum(self.session_starts(gap))
+        names = np.array(TIMELINE_SOURCES, dtype=object)
+        return (format_times(self.times[::-1]), names[self.sources[::-1]], self.rows[::-1], self.texts[::-1], sessions[::-1])
+
+def load_history(processed_path: Path, source: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads the Date and text columns of the processed data CSV of a source.
+    """
+    header, columns = read_csv_columns(processed_path)
+    dates = columns[header.index('Date')].astype('datetime64[s]')
+    return dates, columns[header.index(TEXT_COLUMNS[source])]
+
+def main(directory: Path, sources: Sequence[str] = TIMELINE_SOURCES, gap: int = SESSION_GAP) -> Optional[Timeline]:
+    """
+    Builds the unified timeline of a processed directory from the processed data of its sources, and saves it
+    with its sessions and daily and hourly rollups.
+
+    Args:
+        directory (Path): Directory processed by munger_main for each source.
+        sources (Sequence[str]): Sources to merge when their processed data exists.
+        gap (int): Longest pause, in seconds, between two actions of one session.
+
+    Returns:
+        Optional[Timeline]: The timeline, or None if fewer than two sources have processed data.
+    """
+    # Imported here since munger_main imports every stage
+    from self_stats.munger.munger_main import get_output_paths
+
+    processed = {source: get_output_paths(directory, source)['processed'] for source in sources}
+    present = [source for source, path in processed.items() if path.exists()]
+    if len(present) < 2:
+        print(f"Unified timeline skipped: it needs the processed data of two sources, found {present or 'none'}.\n")
+        return None
+
+    print(f"Merging {' and '.join(present)} history into a unified timeline...")
+    timeline = Timeline.build({source: load_history(processed[source], source) for source in present})
+    paths = get_timeline_paths(directory)
+    create_output_directories([paths['outer'], paths['full_data'], paths['aggregated']])
+    save_to_csv(timeline.table(gap), paths['timeline'], TIMELINE_COLUMNS)
+    save_to_csv(timeline.sessions(gap), paths['sessions'], SESSION_COLUMNS)
+    save_to_csv(timeline.daily(gap), paths['daily'], DAILY_COLUMNS)
+    save_to_csv(timeline.hourly(), paths['hourly'], HOURLY_COLUMNS)
+    print(f"Unified timeline of {len(timeline)} actions saved to {paths['timeline']}, "
+          f"sessions and rollups to {paths['aggregated']}.\n")
+    return timeline
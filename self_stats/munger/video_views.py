@@ -0,0 +1,229 @@
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+# Watch URLs carry an 11 character video ID after one of these, e.g. https://www.youtube.com/watch?v=dQw4w9WgXcQ,
+# https://youtu.be/dQw4w9WgXcQ or https://www.youtube.com/shorts/dQw4w9WgXcQ for Shorts
+VIDEO_ID_PREFIXES = (b'?v=', b'&v=', b'youtu.be/', b'/shorts/', b'/embed/', b'/live/')
+SHORTS_PREFIX = b'/shorts/'
+VIDEO_ID_LENGTH = 11
+VIDEO_ID_CHARACTERS = np.zeros(256, dtype=bool)
+VIDEO_ID_CHARACTERS[np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-', dtype=np.uint8)] = True
+
+# Upper bounds, in seconds, of the gaps between two views of a video counted in each column
+GAP_BIN_EDGES = np.array([3600, 86400, 7 * 86400, 30 * 86400, 365 * 86400], dtype=np.int64)
+GAP_COLUMNS = ['Gaps_Under_1_Hour', 'Gaps_Under_1_Day', 'Gaps_Under_1_Week', 'Gaps_Under_30_Days', 'Gaps_Under_1_Year', 'Gaps_Over_1_Year']
+
+REPEAT_VIEW_COLUMNS = ['Video_ID', 'Shorts_URL', 'Video_Title', 'Channel_Title', 'View_Count', 'First_Seen', 'Last_Seen'] + GAP_COLUMNS
+
+def find_literal(buffer: np.ndarray, literal: bytes) -> np.ndarray:
+    """
+    Returns every position of a byte string in a uint8 buffer, narrowing the candidates one byte at a time.
+    """
+    positions = np.flatnonzero(buffer[:len(buffer) - len(literal) + 1] == literal[0])
+    for offset, byte in enumerate(literal[1:], start=1):
+        positions = positions[buffer[positions + offset] == byte]
+    return positions
+
+def extract_video_ids(urls: Sequence[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Extracts the video ID of a whole column of watch URLs at once.
+
+    The URLs are joined into one newline-separated byte buffer that is scanned with array operations for the
+    VIDEO_ID_PREFIXES followed by exactly 11 ID characters; no URL is parsed on its own. The first ID of each URL
+    is kept.
+
+    Args:
+        urls (Sequence[Optional[str]]): Video URL of each entry, None where there is none.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The video ID of each entry as 11 byte strings (empty where the URL has
+        none) and whether the URL is a /shorts/ link.
+    """
+    count = len(urls)
+    video_ids = np.zeros(count, dtype=f'S{VIDEO_ID_LENGTH}')
+    shorts = np.zeros(count, dtype=bool)
+    if count == 0:
+        return video_ids, shorts
+
+    buffer = np.frombuffer('\n'.join(url if isinstance(url, str) else '' for url in urls).encode('utf-8'), dtype=np.uint8)
+    # Padding lets the 11 characters after a prefix and the one after them be read without bounds checks
+    buffer = np.concatenate((buffer, np.zeros(VIDEO_ID_LENGTH + 1, dtype=np.uint8)))
+    line_starts = np.r_[0, np.flatnonzero(buffer == ord('\n')) + 1]
+
+    starts, is_shorts = [], []
+    for prefix in VIDEO_ID_PREFIXES:
+        positions = find_literal(buffer, prefix) + len(prefix)
+        starts.append(positions)
+        is_shorts.append(np.full(len(positions), prefix == SHORTS_PREFIX))
+    starts, is_shorts = np.concatenate(starts), np.concatenate(is_shorts)
+
+    characters = buffer[starts[:, None] + np.arange(VIDEO_ID_LENGTH + 1)]
+    valid = VIDEO_ID_CHARACTERS[characters[:, :-1]].all(axis=1) & ~VIDEO_ID_CHARACTERS[characters[:, -1]]
+    order = np.argsort(starts[valid], kind='stable')
+    characters, starts, is_shorts = characters[valid][order], starts[valid][order], is_shorts[valid][order]
+
+    rows, first = np.unique(np.searchsorted(line_starts, starts, side='right') - 1, return_index=True)
+    video_ids[rows] = np.ascontiguousarray(characters[first, :-1]).view(f'S{VIDEO_ID_LENGTH}').ravel()
+    shorts[rows] = is_shorts[first]
+    return video_ids, shorts
+
+def encode_video_ids(video_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dictionary-encodes video IDs, so that views can be grouped by integer code rather than by string.
+
+    Args:
+        video_ids (np.ndarray): Video IDs as returned by extract_video_ids, or strings; empty where there is none.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The sorted distinct IDs and the code of each entry, its position among
+        them, or -1 where there is no ID.
+    """
+    video_ids = np.asarray(video_ids)
+    valid = video_ids != video_ids.dtype.type()
+    codes = np.full(len(video_ids), -1, dtype=np.int64)
+    vocabulary, codes[valid] = np.unique(video_ids[valid], return_inverse=True)
+    return vocabulary.astype(str), codes
+
+def gap_histogram(groups: np.ndarray, gaps: np.ndarray, group_count: int) -> np.ndarray:
+    """
+    Counts the gaps of each group falling in each bin of GAP_BIN_EDGES.
+
+    Returns:
+        np.ndarray: A group_count × len(GAP_COLUMNS) array of counts.
+    """
+    bins = np.searchsorted(GAP_BIN_EDGES, gaps, side='right')
+    counts = np.bincount(groups * len(GAP_COLUMNS) + bins, minlength=group_count * len(GAP_COLUMNS))
+    return counts.reshape(group_count, len(GAP_COLUMNS))
+
+class RepeatViews:
+    """
+    Per video view counts, first and last view and a histogram of the time between consecutive views.
+
+    Views are grouped with one sort of their integer video codes (see encode_video_ids) and times; the title and
+    channel kept are those of the latest view.
+    """
+
+    def __init__(self, video_ids: np.ndarray, shorts: np.ndarray, titles: np.ndarray, channels: np.ndarray,
+                 counts: np.ndarray, first_seen: np.ndarray, last_seen: np.ndarray, gaps: np.ndarray) -> None:
+        self.video_ids = np.asarray(video_ids, dtype=str)
+        self.shorts = np.asarray(shorts, dtype=bool)
+        self.titles = np.asarray(titles, dtype=object)
+        self.channels = np.asarray(channels, dtype=object)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.first_seen = np.asarray(first_seen, dtype='datetime64[s]')
+        self.last_seen = np.asarray(last_seen, dtype='datetime64[s]')
+        self.gaps = np.asarray(gaps, dtype=np.int64).reshape(-1, len(GAP_COLUMNS))
+
+    def __len__(self) -> int:
+        return len(self.video_ids)
+
+    @classmethod
+    def empty(cls) -> 'RepeatViews':
+        return cls(np.array([], dtype=str), np.array([], dtype=bool), np.array([], dtype=object), np.array([], dtype=object),
+                   np.array([], dtype=np.int64), np.array([], dtype='datetime64[s]'), np.array([], dtype='datetime64[s]'),
+                   np.zeros((0, len(GAP_COLUMNS)), dtype=np.int64))
+
+    @classmethod
+    def build(cls, dates: np.ndarray, urls: np.ndarray, titles: np.ndarray, channels: np.ndarray) -> 'RepeatViews':
+        """
+        Builds the index from watch history rows; rows whose URL has no video ID are left out.
+
+        Args:
+            dates (np.ndarray): Datetime of each view.
+            urls (np.ndarray): Video URL of each view.
+            titles (np.ndarray): Video title of each view.
+            channels (np.ndarray): Channel of each view.
+
+        Returns:
+            RepeatViews: The index.
+        """
+        video_ids, shorts = extract_video_ids(urls)
+        vocabulary, codes = encode_video_ids(video_ids)
+        valid = codes >= 0
+        times = np.asarray(dates)[valid].astype('datetime64[s]')
+        # Every view is a group of one view, without gaps
+        return cls.group(vocabulary, codes[valid], shorts[valid], np.asarray(titles)[valid], np.asarray(channels)[valid],
+                         np.ones(len(times), dtype=np.int64), times, times)
+
+    @classmethod
+    def merge(cls, parts: Sequence['RepeatViews']) -> 'RepeatViews':
+        """
+        Combines the indexes of parts of the watch history covering disjoint time ranges, e.g. consecutive chunks.
+        The gap between the last view of a video in one part and its first view in the next is counted as well.
+        """
+        if not parts:
+            return cls.empty()
+        video_ids, shorts, titles, channels, counts, first_seen, last_seen = (
+            np.concatenate(columns) for columns in zip(*[part.columns() for part in parts]))
+        vocabulary, codes = np.unique(video_ids, return_inverse=True)
+        return cls.group(vocabulary, codes, shorts, titles, channels, counts, first_seen, last_seen,
+                         np.concatenate([part.gaps for part in parts]))
+
+    @classmethod
+    def group(cls, vocabulary: np.ndarray, codes: np.ndarray, shorts: np.ndarray, titles: np.ndarray, channels: np.ndarray,
+              counts: np.ndarray, first_seen: np.ndarray, last_seen: np.ndarray, gaps: Optional[np.ndarray] = None) -> 'RepeatViews':
+        """
+        Groups views, or the per video summaries of disjoint parts of the history, by their integer video code.
+        The gaps counted are those within each part (none for single views) plus those between consecutive parts.
+        """
+        if not len(codes):
+            return cls.empty()
+        order = np.lexsort((first_seen, codes))
+        codes, first_seen, last_seen = codes[order], first_seen[order], last_seen[order]
+        is_start = np.r_[True, codes[1:] != codes[:-1]]
+        starts = np.flatnonzero(is_start)
+        ends = np.r_[starts[1:], len(codes)] - 1
+
+        follows = np.flatnonzero(~is_start)
+        between = (first_seen[follows] - last_seen[follows - 1]).astype(np.int64)
+        histogram = gap_histogram(np.cumsum(is_start)[follows] - 1, np.maximum(between, 0), len(starts))
+        if gaps is not None:
+            histogram += np.add.reduceat(gaps[order], starts)
+
+        return cls(
+            vocabulary[codes[starts]],
+            np.logical_or.reduceat(shorts[order], starts),
+            titles[order[ends]],
+            channels[order[ends]],
+            np.add.reduceat(counts[order], starts),
+            first_seen[starts],
+            np.maximum.reduceat(last_seen, starts),
+            histogram,
+        )
+
+    def columns(self) -> Tuple[np.ndarray, ...]:
+        return self.video_ids, self.shorts, self.titles, self.channels, self.counts, self.first_seen, self.last_seen
+
+    def arrays(self) -> Tuple[np.ndarray, ...]:
+        """
+        Returns the arrays of the index as a tuple, as stored by the stage cache.
+        """
+        return self.columns() + (self.gaps,)
+
+    def table(self) -> Tuple[np.ndarray, ...]:
+        """
+        Formats the index as the columns named by REPEAT_VIEW_COLUMNS, most viewed videos first.
+        """
+        order = np.lexsort((self.video_ids, -self.last_seen.astype(np.int64), -self.counts))
+
+        def timestamps(values: np.ndarray) -> np.ndarray:
+            return np.char.replace(np.datetime_as_string(values[order], unit='s'), 'T', ' ')
+
+        return (self.video_ids[order], self.shorts[order], self.titles[order], self.channels[order], self.counts[order],
+                timestamps(self.first_seen), timestamps(self.last_seen), *self.gaps[order].T)
+
+def main(arr_data: Tuple[np.ndarray, ...], mappings: List[str]) -> Tuple[np.ndarray, ...]:
+    """
+    Builds the repeat view index of the watch history.
+
+    Args:
+        arr_data (Tuple[np.ndarray, ...]): Input data tuple, each ndarray representing a column.
+        mappings (List[str]): List indicating what each column represents.
+
+    Returns:
+        Tuple[np.ndarray, ...]: The arrays of the index, see RepeatViews.arrays; empty if the data has no video URLs.
+    """
+    if 'Video_URL' not in mappings:
+        return RepeatViews.empty().arrays()
+    return RepeatViews.build(arr_data[mappings.index('Date')], arr_data[mappings.index('Video_URL')],
+                             arr_data[mappings.index('Video_Title')], arr_data[mappings.index('Channel_Title')]).arrays()
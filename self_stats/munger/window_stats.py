@@ -0,0 +1,481 @@
+import numpy as np
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from self_stats.munger.input_output import save_to_csv, truncate_csv
+from self_stats.munger.keyword_trends import period_ordinals, period_starts
+
+# Rolling window lengths, in days
+WINDOWS = (7, 30)
+# Calendar periods the daily series are resampled to
+CALENDAR_PERIODS = ('week', 'month')
+# Value of a day without entries for each daily series of aggregate_data.main: no entries is a count of 0, but
+# leaves the short-form ratio undefined
+SERIES_FILLS = {'Record_Count': 0.0, 'Short_Form_Ratio': np.nan}
+
+WEEKDAY_NAMES = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'], dtype=object)
+# Prefix sums kept by DailySeries and saved along with its values
+PREFIX_NAMES = ('sums', 'squares', 'counts', 'weekday_sums', 'weekday_squares', 'weekday_counts')
+
+def weekdays(days: np.ndarray) -> np.ndarray:
+    """
+    Returns the weekday of datetime64[D] days, 0 for Monday.
+    """
+    # 1970-01-01 was a Thursday
+    return (days.astype('datetime64[D]').astype(np.int64) + 3) % 7
+
+def window_sums(prefix: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """
+    Sums the rows starts[i]:stops[i] of the array whose prefix sums are given, one difference per range.
+    """
+    return prefix[stops] - prefix[starts]
+
+def moments(totals: np.ndarray, squares: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the mean and sample standard deviation of groups of values from their sums, sums of squares and
+    counts; NaN for groups without values, and for the deviation of groups of a single value.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, totals / counts, np.nan)
+        variances = np.where(counts > 1, (squares - totals * means) / (counts - 1), np.nan)
+    # Cancellation can leave a tiny negative variance for constant values
+    return means, np.sqrt(np.maximum(variances, 0))
+
+class DailySeries:
+    """
+    One or more daily series over a continuous calendar, with prefix sums of their values, squared values and
+    number of days with a value. The sum over any range of days is then the difference of two prefix sums, so
+    every rolling window, period and baseline takes constant time per output row however long it is. The weekday
+    prefix sums run over every 7th day instead, i.e. over the earlier days of the same weekday.
+
+    Days missing from the input take the fill value of their series (see SERIES_FILLS), NaN for no value.
+
+    A series loaded from a file keeps its prefix sums, and tracks how many of its first days are unchanged since
+    then (written) along with the size and number of rows of the tables written from it (tables), so that only
+    the rows of the days changed since are computed and written again, see write_tables.
+    """
+
+    def __init__(self, names: Sequence[str], fills: Sequence[float], start: np.datetime64, values: np.ndarray,
+                 prefixes: Optional[Sequence[np.ndarray]] = None, tables: Optional[Dict[str, Tuple[int, int]]] = None) -> None:
+        self.names = list(names)
+        self.fills = np.asarray(fills, dtype=float)
+        self.start = np.datetime64(start, 'D')
+        self.values = np.asarray(values, dtype=float).reshape(-1, len(self.names))
+        if prefixes is None:
+            initial = np.zeros((3, 1, len(self.names)))
+            prefixes = self.prefix_sums(self.values, initial) + self.prefix_sums(self.values, np.tile(initial, (1, 7, 1)))
+            self.written = 0
+        else:
+            self.written = len(self.values)
+        self.sums, self.squares, self.counts, self.weekday_sums, self.weekday_squares, self.weekday_counts = prefixes
+        self.tables = dict(tables or {})
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def days(self) -> np.ndarray:
+        return self.start + np.arange(len(self))
+
+    @classmethod
+    def empty(cls, names: Sequence[str]) -> 'DailySeries':
+        return cls(names, [SERIES_FILLS.get(name, np.nan) for name in names], np.datetime64('NaT', 'D'), np.zeros((0, len(names))))
+
+    @classmethod
+    def build(cls, names: Sequence[str], dates: np.ndarray, values: np.ndarray) -> 'DailySeries':
+        """
+        Builds the series from a table of days, e.g. the Time_Series table of aggregate_data.main.
+
+        Args:
+            names (Sequence[str]): Name of each series, keys of SERIES_FILLS for the default fill values.
+            dates (np.ndarray): Days or 'YYYY-MM-DD' strings, ascending and without duplicates.
+            values (np.ndarray): A len(dates) × len(names) array of values.
+
+        Returns:
+            DailySeries: The series from the first to the last day given.
+        """
+        series = cls.empty(names)
+        series.update(dates, values)
+        return series
+
+    @staticmethod
+    def prefix_sums(values: np.ndarray, initial: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns the running sums of the values, their squares and the number of values present, each row adding
+        the value of its day to the row lag rows before it.
+
+        Args:
+            values (np.ndarray): A days × series array.
+            initial (np.ndarray): A 3 × lag × series array of the totals before the first day: a lag of 1 sums
+                every day, a lag of 7 the days of each weekday.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Three (lag + days) × series arrays, the initial rows first.
+        """
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0)
+        lag, width = initial.shape[1:]
+        padding = -len(values) % lag
+        prefixes = []
+        for start, column in zip(initial, (filled, filled * filled, present.astype(float))):
+            # Each column of the reshaped rows holds every lag-th day, so a cumulative sum down them adds each day
+            # to the one lag days before it
+            rows = np.vstack((start, column, np.zeros((padding, width))))
+            prefixes.append(np.cumsum(rows.reshape(-1, lag, width), axis=0).reshape(-1, width)[:len(rows) - padding])
+        return tuple(prefixes)
+
+    def dense(self, days: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Spreads the values of the given days over every day from the first to the last, filling the days between.
+        """
+        offsets = (days - days[0]).astype(np.int64)
+        dense = np.tile(self.fills, (offsets[-1] + 1, 1))
+        dense[offsets] = values
+        return dense
+
+    def write(self, offset: int, values: np.ndarray) -> None:
+        """
+        Replaces the days from offset on with the given dense values, computing the prefix sums of those days only.
+        """
+        if offset > len(self):
+            values, offset = np.vstack((np.tile(self.fills, (offset - len(self), 1)), values)), len(self)
+        daily = self.prefix_sums(values, np.array([self.sums[offset:offset + 1], self.squares[offset:offset + 1],
+                                                   self.counts[offset:offset + 1]]))
+        weekly = self.prefix_sums(values, np.array([self.weekday_sums[offset:offset + 7], self.weekday_squares[offset:offset + 7],
+                                                    self.weekday_counts[offset:offset + 7]]))
+        self.values = np.vstack((self.values[:offset], values))
+        self.sums, self.squares, self.counts, self.weekday_sums, self.weekday_squares, self.weekday_counts = (
+            np.vstack((getattr(self, name)[:offset], prefix)) for name, prefix in zip(PREFIX_NAMES, daily + weekly))
+        # A series cut short changes the period of its new last day even when none of its days changed
+        self.written = min(self.written, offset, max(len(self) - 1, 0))
+
+    def update(self, dates: np.ndarray, values: np.ndarray) -> None:
+        """
+        Adds new days, or replaces the days from the first one given on; the series then ends on the last day
+        given, and days left out in between take the fill value. Prefix sums are only computed for the days
+        written, so appending the days of a new export costs time proportional to their number, not to the length
+        of the history.
+
+        Args:
+            dates (np.ndarray): Days or 'YYYY-MM-DD' strings, ascending and without duplicates.
+            values (np.ndarray): A len(dates) × len(names) array of values.
+
+        Raises:
+            ValueError: If a day comes before the start of the series, which needs a new series.
+        """
+        days = np.asarray(dates).astype('datetime64[D]')
+        if not len(days):
+            return
+        values = np.asarray(values, dtype=float).reshape(len(days), len(self.names))
+        if np.isnat(self.start):
+            self.start = days[0]
+        if days[0] < self.start:
+            raise ValueError(f"Cannot add {days[0]} before the start of the series on {self.start}; build a new series.")
+        self.write(int((days[0] - self.start).astype(np.int64)), self.dense(days, values))
+
+    def sync(self, dates: np.ndarray, values: np.ndarray) -> 'DailySeries':
+        """
+        Brings the series in line with a complete, up to date table of days, rewriting only the days from the
+        first one that changed. Returns a new series instead if the table starts on another day.
+        """
+        days = np.asarray(dates).astype('datetime64[D]')
+        values = np.asarray(values, dtype=float).reshape(len(days), len(self.names))
+        if not len(self) or not len(days) or days[0] != self.start:
+            return self.build(self.names, days, values)
+        dense = self.dense(days, values)
+        overlap = min(len(dense), len(self))
+        current, given = self.values[:overlap], dense[:overlap]
+        changed = np.flatnonzero(~((current == given) | (np.isnan(current) & np.isnan(given))).all(axis=1))
+        first = changed[0] if len(changed) else overlap
+        if first < len(dense) or len(dense) != len(self):
+            self.write(first, dense[first:])
+        return self
+
+    def rolling(self, window: int, first: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes the mean and sample standard deviation of every series over the window days ending on each day,
+        from the first day given on.
+
+        Each statistic is the difference of two prefix sums, so the cost does not depend on the window length.
+        Days whose window would start before the series, or holds no value, get NaN.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Two (len(self) - first) × len(names) arrays.
+        """
+        stops = np.arange(first + 1, len(self) + 1)
+        starts = np.maximum(stops - window, 0)
+        means, deviations = moments(window_sums(self.sums, starts, stops), window_sums(self.squares, starts, stops),
+                                    window_sums(self.counts, starts, stops))
+        means[stops < window] = deviations[stops < window] = np.nan
+        return means, deviations
+
+    def change(self, window: int, first: int = 0) -> np.ndarray:
+        """
+        Computes the relative change of the sum of every series over the window days ending on each day from the
+        first one given, against the window days before them, e.g. week over week for a window of 7. NaN where the
+        earlier sum is 0 or the windows do not fit in the series.
+        """
+        stops = np.arange(first + 1, len(self) + 1)
+        current = window_sums(self.sums, np.maximum(stops - window, 0), stops)
+        previous = window_sums(self.sums, np.maximum(stops - 2 * window, 0), np.maximum(stops - window, 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = np.where(previous != 0, current / previous - 1, np.nan)
+        change[stops < 2 * window] = np.nan
+        return change
+
+    def weekday_baselines(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Computes the mean and sample standard deviation of every series per weekday, over the whole series.
+
+        The weekday prefix sums of the last 7 days hold the totals of their weekdays, so this takes constant time.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: The number of days of each weekday, Monday first, and two
+            7 × len(names) arrays of means and deviations.
+        """
+        # The last 7 days, the first ones before the start of a series shorter than a week
+        last = np.arange(len(self) - 7, len(self))
+        weekday = weekdays(self.start + last)
+        days = np.zeros(7, dtype=np.int64)
+        days[weekday] = np.where(last >= 0, last // 7 + 1, 0)
+        totals = np.zeros((3, 7, len(self.names)))
+        for total, prefix in zip(totals, (self.weekday_sums, self.weekday_squares, self.weekday_counts)):
+            total[weekday] = prefix[-7:]
+        means, deviations = moments(*totals)
+        return days, means, deviations
+
+    def weekday_scores(self, first: int = 0) -> np.ndarray:
+        """
+        Returns how many standard deviations each day from the first one given is from the baseline of the earlier
+        days of its weekday, NaN where undefined. Only earlier days count, so later days leave the score unchanged.
+        """
+        means, deviations = moments(self.weekday_sums[first:len(self)], self.weekday_squares[first:len(self)],
+                                    self.weekday_counts[first:len(self)])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (self.values[first:] - means) / deviations
+        return np.where(np.isfinite(scores), scores, np.nan)
+
+    def resample(self, period: str, first: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Aggregates the days of every calendar period from the one holding the first day given, the first and last
+        of which may be partial.
+
+        Args:
+            period (str): 'week' (starting on Monday) or 'month', see keyword_trends.period_ordinals.
+            first (int): Offset of the first day whose period is included.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The first day of each period, the
+            number of days of the series in it, and three periods × len(names) arrays of totals, means and sample
+            standard deviations.
+        """
+        if first >= len(self):
+            empty = np.zeros((0, len(self.names)))
+            return np.array([], dtype='datetime64[D]'), np.array([], dtype=np.int64), empty, empty, empty
+        ordinals = period_ordinals(self.start + np.arange(first, len(self)), period)
+        # The calendar is continuous, so each period is one slice
+        boundaries = np.flatnonzero(np.r_[True, ordinals[1:] != ordinals[:-1]])
+        starts = first + boundaries
+        starts[0] = max(int((period_starts(ordinals[:1], period)[0] - self.start).astype(np.int64)), 0)
+        stops = np.r_[starts[1:], len(self)]
+        totals = window_sums(self.sums, starts, stops)
+        means, deviations = moments(totals, window_sums(self.squares, starts, stops), window_sums(self.counts, starts, stops))
+        return period_starts(ordinals[boundaries], period), stops - starts, totals, means, deviations
+
+    def period_count(self, period: str) -> int:
+        """
+        Returns the number of calendar periods the series spans.
+        """
+        if not len(self):
+            return 0
+        ordinals = period_ordinals(self.start + np.array([0, len(self) - 1]), period)
+        return int(ordinals[1] - ordinals[0]) + 1
+
+    def save(self, path: Path) -> None:
+        """
+        Saves the series as a .npz file of plain arrays, with its prefix sums, for a later run to update, see sync.
+        """
+        np.savez(path, names=np.array(self.names, dtype=str), fills=self.fills, start=np.array([self.start]), values=self.values,
+                 table_names=np.array(list(self.tables), dtype=str),
+                 table_sizes=np.array(list(self.tables.values()), dtype=np.int64).reshape(-1, 2),
+                 **{name: getattr(self, name) for name in PREFIX_NAMES})
+        self.written = len(self)
+
+    @classmethod
+    def load(cls, path: Path) -> 'DailySeries':
+        """
+        Loads a saved series without recomputing its prefix sums.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            # Series saved without their prefix sums have them computed again
+            prefixes = [arrays[name] for name in PREFIX_NAMES] if set(PREFIX_NAMES) <= set(arrays.files) else None
+            tables = dict(zip(arrays['table_names'].tolist(), map(tuple, arrays['table_sizes'].tolist()))) if prefixes else {}
+            return cls(arrays['names'].tolist(), arrays['fills'], arrays['start'][0], arrays['values'], prefixes, tables)
+
+def rolling_columns(names: Sequence[str], windows: Sequence[int] = WINDOWS) -> List[str]:
+    """
+    Names the columns of rolling_table.
+    """
+    columns = ['Date', 'Day_of_the_Week']
+    for name in names:
+        columns.append(name)
+        columns.extend(f'{name}_{statistic}_{window}_Days' for window in windows for statistic in ('Mean', 'Std'))
+        if SERIES_FILLS.get(name) == 0:
+            columns.append(f'{name}_Week_over_Week_Change')
+        columns.append(f'{name}_Weekday_Z_Score')
+    return columns
+
+def rolling_table(series: DailySeries, windows: Sequence[int] = WINDOWS, first: int = 0) -> Tuple[np.ndarray, ...]:
+    """
+    Builds the table of every day of the series from the first one given, including those without entries, with
+    rolling means and deviations, week over week changes of the counts and scores against the weekday baselines.
+    Each row only depends on the days up to its own.
+    """
+    rolling = [series.rolling(window, first) for window in windows]
+    change = series.change(7, first)
+    scores = series.weekday_scores(first)
+    days = series.start + np.arange(first, len(series))
+    output = [np.datetime_as_string(days, unit='D'), WEEKDAY_NAMES[weekdays(days)]]
+    for index, name in enumerate(series.names):
+        values = series.values[first:, index]
+        output.append(values.astype(np.int64) if SERIES_FILLS.get(name) == 0 else np.round(values, 4))
+        for means, deviations in rolling:
+            output.extend((np.round(means[:, index], 4), np.round(deviations[:, index], 4)))
+        if SERIES_FILLS.get(name) == 0:
+            output.append(np.round(change[:, index], 4))
+        output.append(np.round(scores[:, index], 4))
+    return tuple(output)
+
+def weekday_columns(names: Sequence[str]) -> List[str]:
+    """
+    Names the columns of weekday_table.
+    """
+    return ['Day_of_the_Week', 'Days'] + [f'{name}_{statistic}' for name in names for statistic in ('Mean', 'Std')]
+
+def weekday_table(series: DailySeries) -> Tuple[np.ndarray, ...]:
+    """
+    Builds the table of the baseline of every series on each weekday, Monday first.
+    """
+    days, means, deviations = series.weekday_baselines()
+    output = [WEEKDAY_NAMES, days]
+    for index in range(len(series.names)):
+        output.extend((np.round(means[:, index], 4), np.round(deviations[:, index], 4)))
+    return tuple(output)
+
+def calendar_columns(names: Sequence[str]) -> List[str]:
+    """
+    Names the columns of calendar_table.
+    """
+    columns = ['Period_Type', 'Period_Start', 'Days']
+    for name in names:
+        if SERIES_FILLS.get(name) == 0:
+            columns.append(f'{name}_Total')
+        columns.extend((f'{name}_Mean', f'{name}_Std'))
+    return columns
+
+def calendar_table(series: DailySeries, periods: Sequence[str] = CALENDAR_PERIODS, first: int = 0) -> Tuple[np.ndarray, ...]:
+    """
+    Builds the table of the series resampled to every calendar period, ordered by the first day of the period
+    and then by period type. Totals are given for the series whose days without entries count as 0.
+
+    Given the first day of a series to include, only the rows of periods starting on or after the start of the
+    earliest period holding that day are built: every row before them only depends on earlier days.
+    """
+    if 0 < first < len(series):
+        day = series.start + first
+        boundary = min(period_starts(period_ordinals(np.array([day]), period), period)[0] for period in periods)
+        if boundary > series.start:
+            # The first period of each type starting on or after the boundary
+            first_days = {period: (period_starts(period_ordinals(np.array([boundary - 1]), period) + 1, period)[0]
+                                   - series.start).astype(np.int64) for period in periods}
+        else:
+            first_days = dict.fromkeys(periods, 0)
+    else:
+        first_days = dict.fromkeys(periods, first)
+
+    blocks = []
+    for period in periods:
+        starts, days, totals, means, deviations = series.resample(period, int(first_days[period]))
+        block = [np.full(len(starts), period, dtype=object), starts, days]
+        for index, name in enumerate(series.names):
+            if SERIES_FILLS.get(name) == 0:
+                block.append(totals[:, index].astype(np.int64))
+            block.extend((np.round(means[:, index], 4), np.round(deviations[:, index], 4)))
+        blocks.append(block)
+    columns = [np.concatenate(column) for column in zip(*blocks)]
+    # Blocks come in the order of periods, which the stable sort keeps for periods starting on the same day
+    order = np.argsort(columns[1], kind='stable')
+    columns[1] = np.datetime_as_string(columns[1], unit='D')
+    return tuple(column[order] for column in columns)
+
+def calendar_length(series: DailySeries, periods: Sequence[str] = CALENDAR_PERIODS) -> int:
+    """
+    Returns the number of rows of calendar_table.
+    """
+    return sum(series.period_count(period) for period in periods)
+
+def write_table(series: DailySeries, path: Path, columns: List[str], table: Callable[[int], Tuple[np.ndarray, ...]],
+                length: int) -> None:
+    """
+    Writes a table of the series, given as a function building its rows from a first day on, of length rows.
+
+    When the file is the one written from the series when it was saved, only the rows from the first day changed
+    since are built: the rows after them are removed from the end of the file and the new ones appended.
+    Otherwise the whole table is written. The size of the file and its number of rows are then kept with the
+    series.
+    """
+    size, rows = series.tables.get(path.name, (-1, 0))
+    reuse = series.written > 0 and path.exists() and path.stat().st_size == size
+    tail = table(series.written if reuse else 0)
+    kept = length - len(tail[0])
+    if reuse and kept <= rows:
+        truncate_csv(path, rows - kept)
+        save_to_csv(tail, path, columns, append=True)
+    else:
+        save_to_csv(tail if not reuse else table(0), path, columns)
+    series.tables[path.name] = (path.stat().st_size, length)
+
+def write_tables(series: DailySeries, rolling_path: Path, weekday_path: Path, calendar_path: Path) -> None:
+    """
+    Writes the rolling, weekday baseline and calendar tables of the series, only building and writing the rows
+    of the days changed since it was saved where the files from then are still in place (see write_table). The
+    weekday baselines take their 7 rows in constant time from the weekday prefix sums.
+    """
+    write_table(series, rolling_path, rolling_columns(series.names), lambda first: rolling_table(series, first=first), len(series))
+    save_to_csv(weekday_table(series), weekday_path, weekday_columns(series.names))
+    write_table(series, calendar_path, calendar_columns(series.names), lambda first: calendar_table(series, first=first),
+                calendar_length(series))
+
+def main(aggregated_data: Tuple[np.ndarray, ...], state_path: Optional[Path] = None,
+         table_paths: Optional[Tuple[Path, Path, Path]] = None) -> DailySeries:
+    """
+    Builds the daily series of the Time_Series table, updating the one saved by an earlier run when there is one,
+    and writes its tables.
+
+    Args:
+        aggregated_data (Tuple[np.ndarray, ...]): The output of aggregate_data.main: date, record count, weekday,
+            most active hour and, for watch history, the short-form ratio.
+        state_path (Optional[Path]): Where the series is kept between runs; only the days from the first one
+            that changed since are rewritten.
+        table_paths (Optional[Tuple[Path, Path, Path]]): Where to write the rolling, weekday baseline and calendar
+            tables, see write_tables.
+
+    Returns:
+        DailySeries: The Record_Count series, and the Short_Form_Ratio series for watch history.
+    """
+    names = ['Record_Count', 'Short_Form_Ratio'][:len(aggregated_data) - 3]
+    dates = np.asarray(aggregated_data[0]).astype('datetime64[D]')
+    values = np.column_stack([np.asarray(aggregated_data[1], dtype=float)] +
+                             [np.asarray(column, dtype=float) for column in aggregated_data[4:]]).reshape(len(dates), len(names))
+
+    series: Optional[DailySeries] = None
+    if state_path is not None and state_path.exists():
+        series = DailySeries.load(state_path)
+        if series.names != names:
+            series = None
+    series = series.sync(dates, values) if series is not None else DailySeries.build(names, dates, values)
+    if table_paths is not None:
+        write_tables(series, *table_paths)
+    if state_path is not None:
+        series.save(state_path)
+    return series
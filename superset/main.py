@@ -1,87 +1,51 @@
-import pandas as pd
-import sqlite3
-import requests
-from flask import Flask
 from superset.app import create_app
-import json
-from superset_items import DashboardItems
+from superset_items import DashboardItems, WATCH_DASHBOARD_SPEC
+from provision import API_URL, SupersetClient, create_session, load_dashboard_tables, provision_compiled_dashboard
 
-API_URL = "http://localhost:8088/api/v1"
 DB_PATH = "sqlite:////your/path/here/example.db"
-app = create_app()
-
-
-with app.app_context():
-    from superset.models.core import Database
-    from superset import db
-    
-    # Query to check if the database already exists
-    existing_db = db.session.query(Database).filter_by(database_name="SQLite Example").first()
-    if not existing_db:
-        # Create and add the SQLite database to Superset only if it does not exist
-        database = Database(
-            database_name="SQLite Example",
-            sqlalchemy_uri=DB_PATH
-        )
-        db.session.add(database)
-        db.session.commit()
-    else:
-        print("Database already exists. Skipping creation.")
-
-    # Load CSV data into a DataFrame
-    data = pd.read_csv('./dash_ready_watch_data.csv')
-
-    # Connect to SQLite database (create it if it doesn't exist) 
-    conn = sqlite3.connect('/Users/ivanpedroza/Documents/Dashboard/example.db')
-    data.to_sql('test_table', con=conn, if_exists='replace', index=False)
-    conn.close()  
-
-    
-
-    # Get an auth token and headers
-    auth_response = requests.post(f"{API_URL}/security/login", json={
-        "password": "admin",
-        "provider": "db",
-        "refresh": True,
-        "username": "admin"
-    })
-    response = auth_response.json()
-
-    
-    # Extract the access token and CSRF token
-    auth_token = response['access_token']
-    csrf_token = response['refresh_token']  # Adjust this if the CSRF token is sent under a different key
-
-    # Headers for the subsequent requests
-    headers = {
-        "Authorization": f"Bearer {auth_token}",
-        "Content-Type": "application/json",
-        "X-CSRFToken": csrf_token  # Include CSRF token in the request headers
-    }
-
+SQLITE_FILE = DB_PATH.replace("sqlite:///", "", 1)
+# Folder of processed munger outputs (<your takeout directory>/output/full_data)
+DATA_DIR = './output/full_data'
+
+def register_database(app) -> None:
+    """
+    Adds the SQLite database to Superset unless it is already registered.
+    """
+    with app.app_context():
+        from superset.models.core import Database
+        from superset import db
+
+        # Query to check if the database already exists
+        existing_db = db.session.query(Database).filter_by(database_name="SQLite Example").first()
+        if not existing_db:
+            # Create and add the SQLite database to Superset only if it does not exist
+            database = Database(
+                database_name="SQLite Example",
+                sqlalchemy_uri=DB_PATH
+            )
+            db.session.add(database)
+            db.session.commit()
+        else:
+            print("Database already exists. Skipping creation.")
+
+def main() -> None:
+    register_database(create_app())
+
+    # Compile the whole dashboard (summary tables, datasets, charts) in one pass
+    compiled = DashboardItems.compile_dashboard(WATCH_DASHBOARD_SPEC)
+
+    # Load the raw tables in one transaction each, then pre-aggregate the small tables the charts query
+    counts = load_dashboard_tables(SQLITE_FILE, WATCH_DASHBOARD_SPEC, compiled, DATA_DIR)
+    for table_name, rows in counts.items():
+        print(f"{table_name}: {rows} rows")
+
+    # Every API call below goes through the same pooled session
+    client = SupersetClient(API_URL, create_session())
+    client.login("admin", "admin")
 
     # --------------------------------------------------------- start posting to dashboard -----------------------------------------------------------
-    # Create the dataset by pulling it from the database
-    create_dataset = requests.post(f"{API_URL}/dataset/", headers=headers, json=DashboardItems.create_dataset())
-    
-    # Create the dashboard
-    dash_response = requests.post(f"{API_URL}/dashboard/", headers=headers, json=DashboardItems.create_dashboard())
-    dashboard_id = dash_response.json()['id']
-
-
-    # Create a sample chart
-    create_chart_response = requests.post(
-        f"{API_URL}/chart/",
-        headers=headers,
-        json=DashboardItems.create_chart()
-    )
-
-
-    # Update the dashboard with new chart
-    update_dashboard_response = requests.put(
-        f"{API_URL}/dashboard/{dashboard_id}",
-        headers=headers,
-        json=DashboardItems.update_dashboard("{}")
-    )
+    created = provision_compiled_dashboard(client, WATCH_DASHBOARD_SPEC, compiled, DashboardItems.position_json)
+    print(created)
 
-    print(update_dashboard_response.json())
+if __name__ == "__main__":
+    main()
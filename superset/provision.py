@@ -0,0 +1,257 @@
+import sqlite3
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = "http://localhost:8088/api/v1"
+
+# Columns indexed after loading when present, since the dashboards filter and group by them
+DEFAULT_INDEX_COLUMNS = ('Date', 'Channel Title', 'Channel_Title')
+
+SQLITE_TYPES = {'i': 'INTEGER', 'u': 'INTEGER', 'b': 'INTEGER', 'f': 'REAL'}
+
+def quote_identifier(name: str) -> str:
+    """
+    Quotes a table or column name for SQLite.
+    """
+    return '"' + str(name).replace('"', '""') + '"'
+
+def chunk_rows(chunk: pd.DataFrame) -> List[tuple]:
+    """
+    Converts a DataFrame chunk to a list of row tuples with NaN replaced by NULL.
+    """
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+def load_table(db_path: Path, table_name: str, csv_path: Path, chunk_size: int = 50_000,
+               index_columns: Optional[Iterable[str]] = None) -> int:
+    """
+    Loads a CSV file into a SQLite table, replacing any existing table with that name.
+
+    Rows are read in chunks and written with executemany inside a single transaction, begun explicitly
+    before the DROP TABLE since sqlite3 does not open one before DDL statements, so a failed load leaves
+    the previous table untouched. Indexes are created once all rows are in, which is much cheaper than
+    maintaining them during the insert.
+
+    Args:
+        db_path (Path): SQLite database file, created if missing.
+        table_name (str): Name of the table to (re)create.
+        csv_path (Path): CSV file to load.
+        chunk_size (int): Number of rows read and inserted per batch.
+        index_columns (Optional[Iterable[str]]): Columns to index. Defaults to the DEFAULT_INDEX_COLUMNS
+            present in the file.
+
+    Returns:
+        int: Number of rows loaded.
+    """
+    table = quote_identifier(table_name)
+    rows_loaded = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+            insert_sql = None
+            columns: List[str] = []
+            for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+                if insert_sql is None:
+                    columns = list(chunk.columns)
+                    column_sql = ', '.join(f"{quote_identifier(column)} {SQLITE_TYPES.get(chunk[column].dtype.kind, 'TEXT')}" for column in columns)
+                    conn.execute(f"CREATE TABLE {table} ({column_sql})")
+                    insert_sql = f"INSERT INTO {table} VALUES ({', '.join('?' for _ in columns)})"
+                conn.executemany(insert_sql, chunk_rows(chunk))
+                rows_loaded += len(chunk)
+
+            if index_columns is None:
+                index_columns = [column for column in DEFAULT_INDEX_COLUMNS if column in columns]
+            for column in index_columns:
+                index_name = quote_identifier(f"ix_{table_name}_{column}".replace(' ', '_'))
+                conn.execute(f"CREATE INDEX {index_name} ON {table} ({quote_identifier(column)})")
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return rows_loaded
+
+def build_summary_tables(db_path: Path, summary_sql: Dict[str, str], group_by: Dict[str, Sequence[str]]) -> Dict[str, int]:
+    """
+    Pre-aggregates the summary tables of a dashboard from the raw tables already in the database.
+
+    All tables are rebuilt in one explicit transaction, as in load_table, and indexed on their group keys.
+    If any of them fails, every summary table is left as it was.
+
+    Args:
+        db_path (Path): SQLite database file.
+        summary_sql (Dict[str, str]): CREATE TABLE ... AS SELECT statements keyed by table name,
+            as compiled by DashboardItems.compile_dashboard.
+        group_by (Dict[str, Sequence[str]]): Group key columns of each summary table.
+
+    Returns:
+        Dict[str, int]: Number of rows of each summary table.
+    """
+    counts = {}
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("BEGIN")
+            for name, sql in summary_sql.items():
+                table = quote_identifier(name)
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(sql)
+                keys = ', '.join(quote_identifier(column) for column in group_by[name])
+                conn.execute(f"CREATE INDEX {quote_identifier(f'ix_{name}')} ON {table} ({keys})")
+                counts[name] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return counts
+
+def load_dashboard_tables(db_path: Path, spec: Dict[str, Any], compiled: Dict[str, Any], data_dir: Path,
+                          chunk_size: int = 50_000) -> Dict[str, int]:
+    """
+    Loads the raw tables of a dashboard spec from the munger outputs and pre-aggregates its summary tables.
+
+    Args:
+        db_path (Path): SQLite database file.
+        spec (Dict[str, Any]): Dashboard spec, e.g. WATCH_DASHBOARD_SPEC.
+        compiled (Dict[str, Any]): The spec compiled by DashboardItems.compile_dashboard.
+        data_dir (Path): Directory holding the CSV files named in spec["raw_tables"] (output/full_data).
+        chunk_size (int): Number of rows inserted per batch.
+
+    Returns:
+        Dict[str, int]: Number of rows of every raw and summary table.
+    """
+    counts = {name: load_table(db_path, name, Path(data_dir) / file_name, chunk_size)
+              for name, file_name in spec["raw_tables"].items()}
+    group_by = {name: table["group_by"] for name, table in spec["summary_tables"].items()}
+    counts.update(build_summary_tables(db_path, compiled["summary_sql"], group_by))
+    return counts
+
+def create_session(retries: int = 3, backoff_factor: float = 0.5, pool_maxsize: int = 10) -> requests.Session:
+    """
+    Creates a requests session that keeps connections open and retries failed calls.
+
+    Connection errors are retried for every method. Responses with a 429 or 5xx status are only retried
+    for idempotent methods (GET, PUT, DELETE...), so a POST that reached the server is never sent twice.
+
+    Args:
+        retries (int): Maximum number of retries per request.
+        backoff_factor (float): Exponential backoff factor between retries, in seconds.
+        pool_maxsize (int): Number of connections kept open per host.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_maxsize)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class SupersetClient:
+    """
+    Minimal client for the Superset REST API that sends every call through one pooled session.
+    """
+
+    def __init__(self, api_url: str = API_URL, session: Optional[requests.Session] = None, timeout: float = 30) -> None:
+        self.api_url = api_url.rstrip('/')
+        self.session = session or create_session()
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Sends a JSON request and returns the decoded response.
+
+        Raises:
+            requests.HTTPError: If the API answers with an error status.
+        """
+        response = self.session.request(method, f"{self.api_url}/{path.lstrip('/')}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json() if response.content else {}
+
+    def login(self, username: str, password: str) -> None:
+        """
+        Logs in and stores the access and CSRF tokens on the session for all later calls.
+        """
+        response = self.request('POST', 'security/login', {
+            "password": password,
+            "provider": "db",
+            "refresh": True,
+            "username": username
+        })
+        self.session.headers.update({
+            "Authorization": f"Bearer {response['access_token']}",
+            "X-CSRFToken": response['refresh_token']  # Adjust this if the CSRF token is sent under a different key
+        })
+
+    def create_dataset(self, payload: Dict[str, Any]) -> int:
+        return self.request('POST', 'dataset/', payload)['id']
+
+    def create_dashboard(self, payload: Dict[str, Any]) -> int:
+        return self.request('POST', 'dashboard/', payload)['id']
+
+    def create_chart(self, payload: Dict[str, Any]) -> int:
+        return self.request('POST', 'chart/', payload)['id']
+
+    def update_dashboard(self, dashboard_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self.request('PUT', f'dashboard/{dashboard_id}', payload)
+
+def provision_dashboard(client: SupersetClient, dataset: Dict[str, Any], dashboard: Dict[str, Any],
+                        charts: Sequence[Dict[str, Any]], dashboard_update: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Creates a dataset, a dashboard and any number of charts attached to them in one run.
+
+    Each chart payload has its datasource and dashboard ids filled in with the ids of the newly created
+    dataset and dashboard before it is posted.
+
+    Args:
+        client (SupersetClient): A logged in client.
+        dataset (Dict[str, Any]): Dataset payload, e.g. DashboardItems.create_dataset().
+        dashboard (Dict[str, Any]): Dashboard payload, e.g. DashboardItems.create_dashboard().
+        charts (Sequence[Dict[str, Any]]): Chart payloads, e.g. from DashboardItems.create_chart().
+        dashboard_update (Optional[Dict[str, Any]]): Payload sent once all charts exist, e.g. DashboardItems.update_dashboard().
+
+    Returns:
+        Dict[str, Any]: The ids of the created dataset, dashboard and charts.
+    """
+    dataset_id = client.create_dataset(dataset)
+    dashboard_id = client.create_dashboard(dashboard)
+    chart_ids = []
+    for chart in charts:
+        chart = dict(chart, datasource_id=dataset_id, dashboards=[dashboard_id])
+        chart_ids.append(client.create_chart(chart))
+    if dashboard_update is not None:
+        client.update_dashboard(dashboard_id, dashboard_update)
+    return {'dataset_id': dataset_id, 'dashboard_id': dashboard_id, 'chart_ids': chart_ids}
+
+def provision_compiled_dashboard(client: SupersetClient, spec: Dict[str, Any], compiled: Dict[str, Any],
+                                 position_json: Callable[[Dict[str, Any], List[int]], str]) -> Dict[str, Any]:
+    """
+    Creates every dataset and chart of a compiled dashboard spec, then lays the charts out on the dashboard.
+
+    Args:
+        client (SupersetClient): A logged in client.
+        spec (Dict[str, Any]): Dashboard spec.
+        compiled (Dict[str, Any]): The spec compiled by DashboardItems.compile_dashboard.
+        position_json (Callable[[Dict[str, Any], List[int]], str]): Builds the layout from the spec and chart ids, i.e. DashboardItems.position_json.
+
+    Returns:
+        Dict[str, Any]: The ids of the created datasets (by table name), dashboard and charts.
+    """
+    dataset_ids = {name: client.create_dataset(payload) for name, payload in compiled["datasets"].items()}
+    dashboard_id = client.create_dashboard(compiled["dashboard"])
+    chart_ids = []
+    for table_name, chart in compiled["charts"]:
+        chart = dict(chart, datasource_id=dataset_ids[table_name], dashboards=[dashboard_id])
+        chart_ids.append(client.create_chart(chart))
+    client.update_dashboard(dashboard_id, {
+        "dashboard_title": spec["title"],
+        "slug": spec["slug"],
+        "position_json": position_json(spec, chart_ids),
+    })
+    return {'dataset_ids': dataset_ids, 'dashboard_id': dashboard_id, 'chart_ids': chart_ids}
@@ -1,47 +1,128 @@
 import json
 
+# Declarative description of the watch history dashboard. Raw tables are loaded from the munger
+# outputs; each summary table is pre-aggregated from them at load time so that the charts query
+# a few hundred summary rows instead of the full history.
+WATCH_DASHBOARD_SPEC = {
+    "title": "Watch History",
+    "slug": "watch-history",
+    "raw_tables": {
+        "watch_history": "WATCH_processed.csv",
+        "watch_keywords": "WATCH_keywords.csv",
+    },
+    "summary_tables": {
+        "watch_daily_rollup": {
+            "source": "watch_history",
+            "group_by": ["Date_Only"],
+            "columns": {
+                "Record_Count": "COUNT(*)",
+                "Short_Form_Count": "SUM(Short_Form_Video = 'Short-Form')",
+                "Channel_Count": "COUNT(DISTINCT Channel_Title)",
+            },
+        },
+        "watch_hour_of_day": {
+            "source": "watch_history",
+            "group_by": ["Day_of_the_Week", "Hour_of_the_Day"],
+            "columns": {"Record_Count": "COUNT(*)"},
+        },
+        "watch_channels": {
+            "source": "watch_history",
+            "group_by": ["Channel_Title"],
+            "columns": {
+                "Record_Count": "COUNT(*)",
+                "First_Watched": "MIN(Date)",
+                "Last_Watched": "MAX(Date)",
+            },
+            "where": "Channel_Title IS NOT NULL",
+        },
+        "watch_keywords_summary": {
+            "source": "watch_keywords",
+            "group_by": ["Keywords"],
+            "columns": {
+                "Occurrences": "COUNT(*)",
+                "Active_Days": "COUNT(DISTINCT substr(Date, 1, 10))",
+            },
+            "where": "Keywords IS NOT NULL",
+            "having": "COUNT(*) > 1",
+        },
+    },
+    "charts": [
+        {"name": "Videos per Day", "table": "watch_daily_rollup", "viz_type": "echarts_timeseries_line",
+         "x_axis": "Date_Only", "metrics": [("SUM", "Record_Count"), ("SUM", "Short_Form_Count")], "width": 12},
+        {"name": "Activity by Hour of the Day", "table": "watch_hour_of_day", "viz_type": "echarts_timeseries_bar",
+         "x_axis": "Hour_of_the_Day", "metrics": [("SUM", "Record_Count")], "width": 6},
+        {"name": "Activity by Day of the Week", "table": "watch_hour_of_day", "viz_type": "pie",
+         "groupby": ["Day_of_the_Week"], "metrics": [("SUM", "Record_Count")], "width": 6},
+        {"name": "Top Channels", "table": "watch_channels", "viz_type": "table",
+         "groupby": ["Channel_Title"], "metrics": [("SUM", "Record_Count")], "row_limit": 25, "width": 6},
+        {"name": "Top Keywords", "table": "watch_keywords_summary", "viz_type": "word_cloud",
+         "series": "Keywords", "metrics": [("SUM", "Occurrences")], "row_limit": 100, "width": 6},
+    ],
+}
+
+# Number of columns of the Superset dashboard grid and default chart height in grid units
+GRID_WIDTH = 12
+CHART_HEIGHT = 50
+
 
 class DashboardItems:
 
-    #TODO: Update the this function to take parameters you want modified in the chart
     @staticmethod
-    def create_chart():
+    def create_chart(slice_name="string", viz_type="table", params=None, datasource_id=1,
+                     datasource_name="main.test_table", dashboards=None,
+                     description="This chart displays video data from YouTube."):
         """
         Generates a superset chart.
+
+        Args:
+            slice_name (str): Title of the chart.
+            viz_type (str): Superset visualization type, e.g. 'table' or 'echarts_timeseries_line'.
+            params (dict): Visualization form data. Defaults to a table of the raw watch history columns.
+            datasource_id (int): Id of the dataset the chart reads from.
+            datasource_name (str): Name of the dataset the chart reads from.
+            dashboards (list): Ids of the dashboards the chart is added to.
+            description (str): Chart description.
         
         Returns:
             json: A json body containing the configuration settings for a chart.
                   This configuration includes details like cache timeouts, datasource info,
                   description, external URLs, ownership, and visualization settings.
         """
+        if params is None:
+            params = {"viz_type": "table", "url_params": {}, "granularity_sqla": None, "time_grain_sqla": None, "time_range": "No filter", "groupby": [], "metrics": [], "all_columns": ["Video URL", "Video Title", "Channel Title", "Date"], "percent_metrics": [], "row_limit": 1000, "include_time": False, "order_desc": True}
+        params = dict({"datasource": datasource_name, "viz_type": viz_type}, **params)
+
         return{
             "cache_timeout": 0,
             "certification_details": "",
             "certified_by": "",
-            "dashboards": [1],
-            "datasource_id": 1,
-            "datasource_name": "main.test_table",
+            "dashboards": [1] if dashboards is None else list(dashboards),
+            "datasource_id": datasource_id,
+            "datasource_name": datasource_name,
             "datasource_type": "table",
-            "description": "This chart displays video data from YouTube.",
+            "description": description,
             "external_url": "string",
             "is_managed_externally": True,
             "owners": [1],
-            "params": "{\"datasource\": \"main.test_table\", \"viz_type\": \"table\", \"url_params\": {}, \"granularity_sqla\": null, \"time_grain_sqla\": null, \"time_range\": \"No filter\", \"groupby\": [], \"metrics\": [], \"all_columns\": [\"Video URL\", \"Video Title\", \"Channel Title\", \"Date\"], \"percent_metrics\": [], \"row_limit\": 1000, \"include_time\": false, \"order_desc\": true}",
+            "params": json.dumps(params),
             "query_context": "{}",
             "query_context_generation": False,
-            "slice_name": "string",
-            "viz_type": "table"
+            "slice_name": slice_name,
+            "viz_type": viz_type
         }
 
 
     
 
     
-    #TODO: Update this function to take parameters you want modified when creating a dashboard
     @staticmethod
-    def create_dashboard():
+    def create_dashboard(dashboard_title="My New Dashboard", slug="my-new-dashboard"):
         """
         Generates the configuration for a new dashboard.
+
+        Args:
+            dashboard_title (str): Title of the dashboard.
+            slug (str): URL slug of the dashboard.
         
         Returns:
             json: A json body containing the settings for creating a new dashboard.
@@ -50,9 +131,9 @@ class DashboardItems:
         """
 
         return {
-        "dashboard_title": "My New Dashboard",
+        "dashboard_title": dashboard_title,
         "published": True,
-        "slug": "my-new-dashboard",
+        "slug": slug,
         "position_json": "{}",
         "css": "",
         "json_metadata": "",
@@ -60,15 +141,16 @@ class DashboardItems:
     }
 
     
-    #TODO: "Update the dashboard layout to include the new chart in the layout you want"
-    #TODO: "Update function args to pass the items you want to update"
     @staticmethod
-    def update_dashboard(json):
+    def update_dashboard(json, position_json="", dashboard_title="My New Dashboard", slug="my-new-dashboard"):
         """
         Updates the configuration of an existing dashboard, including any new objects.
         
         Args:
             json (str): JSON string that includes the details of the objects to be added to the dashboard.
+            position_json (str): Dashboard layout, as built by position_json().
+            dashboard_title (str): Title of the dashboard.
+            slug (str): URL slug of the dashboard.
         
         Returns:
             json: A json body with the updated settings for the dashboard.
@@ -80,27 +162,32 @@ class DashboardItems:
             "certification_details": "",
             "certified_by": "",
             "css": "",
-            "dashboard_title": "My New Dashboard",
-            "external_url": "http://localhost:8088/superset/dashboard/my-new-dashboard",
+            "dashboard_title": dashboard_title,
+            "external_url": f"http://localhost:8088/superset/dashboard/{slug}",
             "is_managed_externally": True,
             "json_metadata": json,
             "owners": [
                 1
             ],
-            "position_json": "",
+            "position_json": position_json,
             "published": False,
             "roles": [
 
             ],
-            "slug": "my-new-dashboard"     
+            "slug": slug
     }
 
 
-    #TODO: Update this function to customize the dataset you want to use
     @staticmethod
-    def create_dataset():
+    def create_dataset(table_name="yeeer", schema="main.test_table", sql="SELECT * FROM main.test_table", database=1):
         """
         Generates the configuration for a new dataset.
+
+        Args:
+            table_name (str): Name of the dataset, or of the physical table when sql is None.
+            schema (str): Database schema.
+            sql (str): Query of a virtual dataset, None for a physical table.
+            database (int): Id of the Superset database.
         
         Returns:
             dict: A dictionary containing the settings for creating a new dataset.
@@ -109,14 +196,135 @@ class DashboardItems:
         """
         return{
             "always_filter_main_dttm": False,
-            "database": 1,
+            "database": database,
             "external_url": "",
             "is_managed_externally": True,
             "normalize_columns": False,
             "owners": [
                 1
             ],
-            "schema": "main.test_table",
-            "sql": "SELECT * FROM main.test_table",
-            "table_name": "yeeer"
+            "schema": schema,
+            "sql": sql,
+            "table_name": table_name
+        }
+
+
+    @staticmethod
+    def summary_table_sql(name, table):
+        """
+        Builds the statement that pre-aggregates one summary table of a dashboard spec.
+
+        Args:
+            name (str): Name of the summary table.
+            table (dict): Its spec: source table, group_by columns, aggregate columns and optional where/having clauses.
+
+        Returns:
+            str: A CREATE TABLE ... AS SELECT statement.
+        """
+        def quote(identifier):
+            return '"' + identifier.replace('"', '""') + '"'
+
+        keys = ", ".join(quote(column) for column in table["group_by"])
+        aggregates = ", ".join(f"{expression} AS {quote(column)}" for column, expression in table["columns"].items())
+        sql = f"CREATE TABLE {quote(name)} AS SELECT {keys}, {aggregates} FROM {quote(table['source'])}"
+        if table.get("where"):
+            sql += f" WHERE {table['where']}"
+        sql += f" GROUP BY {keys}"
+        if table.get("having"):
+            sql += f" HAVING {table['having']}"
+        return sql + f" ORDER BY {keys}"
+
+    @staticmethod
+    def chart_params(chart):
+        """
+        Translates a chart of a dashboard spec into Superset form data.
+
+        Args:
+            chart (dict): Chart spec with viz_type, metrics as (aggregate, column) pairs and the
+                          x_axis, groupby, series and row_limit options the visualization needs.
+
+        Returns:
+            dict: The chart's form data.
+        """
+        metrics = [{
+            "expressionType": "SIMPLE",
+            "column": {"column_name": column},
+            "aggregate": aggregate,
+            "label": f"{aggregate}({column})"
+        } for aggregate, column in chart["metrics"]]
+        params = {"url_params": {}, "time_range": "No filter", "metrics": metrics, "row_limit": chart.get("row_limit", 10000)}
+        if "x_axis" in chart:
+            params.update({"x_axis": chart["x_axis"], "time_grain_sqla": None, "groupby": chart.get("groupby", [])})
+        elif "series" in chart:
+            params.update({"series": chart["series"], "metric": metrics[0]})
+        else:
+            params.update({"groupby": chart.get("groupby", []), "metric": metrics[0], "order_desc": True})
+        if chart["viz_type"] == "table":
+            params.update({"query_mode": "aggregate", "include_time": False, "order_desc": True})
+        return params
+
+    @staticmethod
+    def position_json(spec, chart_ids):
+        """
+        Lays the charts of a dashboard spec out on the dashboard grid, filling rows from left to right.
+
+        Args:
+            spec (dict): Dashboard spec.
+            chart_ids (list): Superset ids of the created charts, in the order of spec["charts"].
+
+        Returns:
+            str: The dashboard's position JSON.
+        """
+        layout = {
+            "DASHBOARD_VERSION_KEY": "v2",
+            "ROOT_ID": {"type": "ROOT", "id": "ROOT_ID", "children": ["GRID_ID"]},
+            "GRID_ID": {"type": "GRID", "id": "GRID_ID", "children": [], "parents": ["ROOT_ID"]},
+            "HEADER_ID": {"type": "HEADER", "id": "HEADER_ID", "meta": {"text": spec["title"]}},
+        }
+        row_id, row_width = None, GRID_WIDTH
+        for chart, chart_id in zip(spec["charts"], chart_ids):
+            width = min(chart.get("width", GRID_WIDTH // 2), GRID_WIDTH)
+            if row_width + width > GRID_WIDTH:
+                row_id, row_width = f"ROW-{len(layout['GRID_ID']['children']) + 1}", 0
+                layout["GRID_ID"]["children"].append(row_id)
+                layout[row_id] = {"type": "ROW", "id": row_id, "children": [], "parents": ["ROOT_ID", "GRID_ID"],
+                                  "meta": {"background": "BACKGROUND_TRANSPARENT"}}
+            chart_key = f"CHART-{chart_id}"
+            layout[row_id]["children"].append(chart_key)
+            layout[chart_key] = {"type": "CHART", "id": chart_key, "children": [], "parents": ["ROOT_ID", "GRID_ID", row_id],
+                                 "meta": {"width": width, "height": chart.get("height", CHART_HEIGHT),
+                                          "chartId": chart_id, "sliceName": chart["name"]}}
+            row_width += width
+        return json.dumps(layout)
+
+    @staticmethod
+    def compile_dashboard(spec, database=1):
+        """
+        Compiles a dashboard spec into every statement and payload needed to provision it.
+
+        Args:
+            spec (dict): Dashboard spec, e.g. WATCH_DASHBOARD_SPEC.
+            database (int): Id of the Superset database holding the tables.
+
+        Returns:
+            dict: The summary table statements, one dataset payload per summary table, the dashboard
+                  payload, and (table name, payload) pairs for every chart. The dataset and dashboard
+                  ids of the chart payloads are filled in at provisioning time, after which
+                  position_json() lays them out.
+        """
+        summary_tables = spec["summary_tables"]
+        for chart in spec["charts"]:
+            if chart["table"] not in summary_tables:
+                raise ValueError(f"Chart '{chart['name']}' reads from unknown summary table '{chart['table']}'.")
+        return {
+            "summary_sql": {name: DashboardItems.summary_table_sql(name, table) for name, table in summary_tables.items()},
+            "datasets": {name: DashboardItems.create_dataset(table_name=name, schema="main", sql=None, database=database)
+                         for name in summary_tables},
+            "dashboard": DashboardItems.create_dashboard(spec["title"], spec["slug"]),
+            "charts": [(chart["table"], DashboardItems.create_chart(
+                slice_name=chart["name"],
+                viz_type=chart["viz_type"],
+                params=DashboardItems.chart_params(chart),
+                datasource_name=f"main.{chart['table']}",
+                description=chart.get("description", ""))) for chart in spec["charts"]],
         }
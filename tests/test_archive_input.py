@@ -0,0 +1,109 @@
+import io
+import json
+import multiprocessing
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from self_stats.cli import EXIT_OK, main as cli_main
+from self_stats.munger.input_output import (_open_tars, find_input_file, get_file_presence_flags, iter_json_array, open_tar, read_json_file,
+                                            split_archive_path)
+from self_stats.munger.run_sources import get_source_jobs
+from self_stats.munger.stage_cache import fingerprint_file
+from self_stats.munger.synthetic_data import main as generate_takeout
+
+SEARCH_MEMBER = 'Takeout/My Activity/Search/MyActivity.json'
+WATCH_MEMBER = 'Takeout/YouTube and YouTube Music/history/watch-history.json'
+
+def pack_takeout(extracted: Path, directory: Path) -> None:
+    """
+    Packs synthetic Takeout files as a split export: search history in a .zip, watch history in a .tgz.
+    """
+    directory.mkdir()
+    with zipfile.ZipFile(directory / 'takeout-001.zip', 'w', zipfile.ZIP_DEFLATED) as zipped:
+        zipped.write(extracted / 'MyActivity.json', SEARCH_MEMBER)
+    with tarfile.open(directory / 'takeout-002.tgz', 'w:gz') as tar:
+        tar.add(extracted / 'watch-history.json', WATCH_MEMBER)
+
+class TestArchiveInput(unittest.TestCase):
+    def test_locates_and_streams_archive_members(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            extracted = Path(tmp) / 'extracted'
+            generate_takeout(extracted, search_size=50, watch_size=50, seed=1)
+            archives = Path(tmp) / 'archives'
+            pack_takeout(extracted, archives)
+
+            self.assertEqual(get_file_presence_flags(archives), {'watch_history_present': True, 'my_activity_present': True})
+            search_path = find_input_file(archives, 'MyActivity.json')
+            watch_path = find_input_file(archives, 'watch-history.json')
+            self.assertEqual(split_archive_path(search_path), (archives / 'takeout-001.zip', SEARCH_MEMBER))
+            self.assertEqual(split_archive_path(watch_path), (archives / 'takeout-002.tgz', WATCH_MEMBER))
+            self.assertIsNone(split_archive_path(extracted / 'MyActivity.json'))
+            self.assertIsNone(find_input_file(Path(tmp), 'MyActivity.json'))
+
+            for path, name in ((search_path, 'MyActivity.json'), (watch_path, 'watch-history.json')):
+                expected = json.loads((extracted / name).read_text(encoding='utf-8'))
+                self.assertEqual(read_json_file(path), expected)
+                self.assertEqual(list(iter_json_array(path, buffer_size=100)), expected)
+            self.assertEqual(fingerprint_file(watch_path), fingerprint_file(watch_path))
+            self.assertNotEqual(fingerprint_file(search_path), fingerprint_file(watch_path))
+
+            # The .tgz is listed and read through one open archive, and fingerprinted from its own stat
+            tgz = archives / 'takeout-002.tgz'
+            self.assertIs(open_tar(tgz), open_tar(tgz))
+            _open_tars.clear()
+            self.assertEqual(read_json_file(watch_path), json.loads((extracted / 'watch-history.json').read_text(encoding='utf-8')))
+            fingerprint = fingerprint_file(watch_path)
+            os.utime(tgz, ns=(0, 0))
+            self.assertNotEqual(fingerprint_file(watch_path), fingerprint)
+
+            # An extracted file takes precedence over the archives
+            (archives / 'MyActivity.json').write_text('[]')
+            self.assertEqual(find_input_file(archives, 'MyActivity.json'), archives / 'MyActivity.json')
+            self.assertEqual([job[2] for job in get_source_jobs(archives, get_file_presence_flags(archives))],
+                             [archives / 'MyActivity.json', watch_path])
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'needs forked worker processes')
+    def test_forked_workers_read_one_tgz(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            extracted = Path(tmp) / 'extracted'
+            generate_takeout(extracted, search_size=5000, watch_size=5000, seed=3)
+            archives = Path(tmp) / 'archives'
+            archives.mkdir()
+            with tarfile.open(archives / 'takeout-001.tgz', 'w:gz') as tar:
+                tar.add(extracted / 'MyActivity.json', SEARCH_MEMBER)
+                tar.add(extracted / 'watch-history.json', WATCH_MEMBER)
+            # The parent lists the archive, keeping it open, before the workers are forked
+            paths = [find_input_file(archives, name) for name in ('MyActivity.json', 'watch-history.json')]
+            self.assertEqual(get_file_presence_flags(archives), {'watch_history_present': True, 'my_activity_present': True})
+
+            context = multiprocessing.get_context('fork')
+            for _ in range(3):
+                with ProcessPoolExecutor(max_workers=2, mp_context=context) as executor:
+                    read = list(executor.map(read_json_file, paths))
+                for entries, name in zip(read, ('MyActivity.json', 'watch-history.json')):
+                    self.assertEqual(entries, json.loads((extracted / name).read_text(encoding='utf-8')))
+            # The parent's own archive was left where it was
+            self.assertEqual(read_json_file(paths[1]), read[1])
+
+    def test_processes_archives_like_extracted_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            extracted = Path(tmp) / 'extracted'
+            generate_takeout(extracted, search_size=300, watch_size=300, seed=5)
+            archives = Path(tmp) / 'archives'
+            pack_takeout(extracted, archives)
+
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(extracted), str(archives), '-q', '--no-keywords', '--no-cache']), EXIT_OK)
+            for name in ('SEARCH_processed.csv', 'WATCH_processed.csv', 'WATCH_metadata.csv'):
+                self.assertEqual((archives / 'output' / 'full_data' / name).read_bytes(),
+                                 (extracted / 'output' / 'full_data' / name).read_bytes(), name)
+            self.assertEqual(sorted(path.name for path in archives.iterdir()), ['output', 'takeout-001.zip', 'takeout-002.tgz'])
+
+if __name__ == '__main__':
+    unittest.main()
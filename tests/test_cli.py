@@ -0,0 +1,74 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from self_stats.cli import CACHED_STAGES, EXIT_FAILED, EXIT_OK, EXIT_USAGE, OPTIONAL_STAGES, build_parser, expand_directories, main
+from self_stats.munger import munger_main
+from self_stats.munger.synthetic_data import main as generate_takeout
+
+def run_cli(argv):
+    with redirect_stdout(io.StringIO()) as out, redirect_stderr(io.StringIO()):
+        code = main(argv)
+    return code, out.getvalue()
+
+class TestCli(unittest.TestCase):
+    def test_expand_directories(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('acct_b', 'acct_a'):
+                (Path(tmp) / name).mkdir()
+            (Path(tmp) / 'acct_file').touch()
+            directories, errors = expand_directories([f'{tmp}/acct_*', f'{tmp}/acct_a', f'{tmp}/missing'])
+            self.assertEqual([directory.name for directory in directories], ['acct_a', 'acct_b'])
+            self.assertEqual(len(errors), 1)
+
+    def test_process_then_aggregate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            account = Path(tmp) / 'account'
+            generate_takeout(account, search_size=300, watch_size=300, seed=5)
+            code, out = run_cli(['process', str(account), '-q', '--no-keywords', '--skip-stage', 'segment_activity'])
+            self.assertEqual(code, EXIT_OK)
+            self.assertIn('2 job(s): 2 succeeded, 0 failed.', out)
+            self.assertTrue((account / 'output' / 'full_data' / 'SEARCH_processed.csv').exists())
+            self.assertFalse((account / 'output' / 'full_data' / 'SEARCH_segments.csv').exists())
+
+            aggregated = account / 'output' / 'aggregated_data' / 'WATCH.xlsx'
+            aggregated.unlink()
+            timeline = account / 'output' / 'full_data' / 'TIMELINE.csv'
+            timeline.unlink()
+            code, _ = run_cli(['aggregate', str(account), '-q'])
+            self.assertEqual(code, EXIT_OK)
+            self.assertTrue(aggregated.exists())
+            # Only the process command builds the unified timeline
+            self.assertFalse(timeline.exists())
+
+    def test_exit_codes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(run_cli(['process', str(Path(tmp) / 'missing'), '-q'])[0], EXIT_USAGE)
+            self.assertEqual(run_cli(['process', tmp, '-q'])[0], EXIT_USAGE)
+            account = Path(tmp) / 'account'
+            generate_takeout(account, search_size=0, watch_size=300, seed=5)
+            code, out = run_cli(['process', str(account), tmp, '-q', '--no-keywords'])
+            self.assertEqual(code, EXIT_FAILED)
+            self.assertIn('1 succeeded, 1 failed', out)
+
+    def test_processing_options_before_and_after_command(self):
+        parser = build_parser()
+        for argv in (['--no-keywords', '--chunk-size', '10', 'process', 'DIR'], ['process', 'DIR', '--no-keywords', '--chunk-size', '10']):
+            args = parser.parse_args(argv)
+            self.assertEqual((args.keywords, args.chunk_size, args.cache), (False, 10, True), argv)
+        args = parser.parse_args(['--chunk-size', '10', 'process', 'DIR', '--chunk-size', '20'])
+        self.assertEqual(args.chunk_size, 20)
+        for argv, instrument in ((['--instrument', 'aggregate', 'DIR'], True), (['aggregate', 'DIR', '--instrument'], True),
+                                 (['aggregate', 'DIR'], False)):
+            self.assertEqual(parser.parse_args(argv).instrument, instrument, argv)
+        self.assertEqual(parser.parse_args(['--approximate-counts', '0.01', 'aggregate', 'DIR']).approximate_counts, 0.01)
+
+    def test_stage_names_match_munger(self):
+        # The CLI keeps its own copies so that --help does not import the processing stack
+        self.assertEqual(OPTIONAL_STAGES, munger_main.OPTIONAL_STAGES)
+        self.assertEqual(CACHED_STAGES, tuple(munger_main.STAGE_VERSIONS))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from self_stats.munger.column_builders import WATCH_SCHEMA, CategoryColumn, ColumnBuilder, ColumnTable, FloatColumn, StringColumn, WatchRecord
+from self_stats.munger.parse_and_process import (extract_search_columns, extract_search_information, extract_search_records,
+                                                 extract_watch_columns, extract_watch_information, extract_watch_records)
+from self_stats.munger.process_dates import clean_dates_main, convert_to_arrays, localize_timestamps, parse_timestamps
+
+ENTRIES = [
+    {'title': 'Searched for  python', 'time': '2024-03-31T00:59:59.900Z',
+     'locationInfos': [{'url': 'https://www.google.com/maps/@?api=1&map_action=map&center=48.85,2.35&zoom=12'}]},
+    {'title': 'Searched for numpy', 'time': '2024-03-31T01:00:00Z', 'subtitles': [{'name': 'Numpy TV'}],
+     'titleUrl': 'https://www.youtube.com/watch?v=00000000001'},
+    {'title': 'Searched for broken date', 'time': 'yesterday'},
+    {'title': 'Searched for offset', 'time': '2024-03-31T03:30:00+02:00', 'subtitles': [{'name': 'Numpy TV'}]},
+    {'time': '2024-04-01T12:00:00.123456Z', 'titleUrl': 'https://www.youtube.com/watch?v=00000000001'},
+]
+
+class TestColumnBuilders(unittest.TestCase):
+    def test_builders(self):
+        floats = FloatColumn(4)
+        floats.fill([1.5, None], start=1)
+        np.testing.assert_array_equal(floats.finish(), [np.nan, 1.5, np.nan, np.nan])
+
+        strings = StringColumn(3)
+        strings.fill(['a', None, 'b'])
+        self.assertEqual(strings.finish().tolist(), ['a', None, 'b'])
+
+        categories = CategoryColumn(5)
+        categories.fill(['x', 'y', None])
+        categories.fill([''.join(['y']), ''.join(['x'])], start=3)
+        self.assertEqual(categories.finish().tolist(), ['x', 'y', None, 'y', 'x'])
+        self.assertIs(categories.finish()[0], categories.finish()[4])
+
+        with self.assertRaises(TypeError):
+            ColumnBuilder(1)
+        with self.assertRaises(ValueError):
+            ColumnTable(WATCH_SCHEMA, 0).finish(['Date', 'Latitude'])
+
+        # Entries are read a batch at a time into the rows they belong to
+        batches = []
+        def fields(entries):
+            batches.append(len(entries))
+            return {'Video_Title': [entry['title'] for entry in entries]}
+        table = ColumnTable(WATCH_SCHEMA, 5)
+        table.fill_entries([{'title': str(i)} for i in range(5)], fields, batch_size=2)
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertEqual(table.finish(['Video_Title'])[0].tolist(), ['0', '1', '2', '3', '4'])
+
+    def test_parse_timestamps(self):
+        times = parse_timestamps([entry['time'] for entry in ENTRIES] + [None, ''])
+        self.assertEqual(times.dtype, np.dtype('datetime64[us]'))
+        self.assertEqual(times.astype(str).tolist(), ['2024-03-31T00:59:59.900000', '2024-03-31T01:00:00.000000', 'NaT',
+                                                       '2024-03-31T01:30:00.000000', '2024-04-01T12:00:00.123456', 'NaT', 'NaT'])
+
+    def test_localize_timestamps(self):
+        # Paris moves from UTC+1 to UTC+2 at 01:00 UTC on 2024-03-31
+        paris = ZoneInfo('Europe/Paris')
+        utc_times = np.datetime64('2024-03-30T22:00:00') + np.arange(0, 6 * 3600, 1799).astype('timedelta64[s]')
+        expected = [time.replace(tzinfo=timezone.utc).astimezone(paris).replace(tzinfo=None)
+                    for time in utc_times.astype(object)]
+        self.assertEqual(localize_timestamps(utc_times, paris).tolist(), expected)
+        self.assertEqual(localize_timestamps(np.array(['2024-06-01T10:00:00.999'], dtype='datetime64[ms]'), paris).tolist(),
+                         [datetime(2024, 6, 1, 12, 0, 0)])
+        self.assertEqual(len(localize_timestamps(np.array([], dtype='datetime64[s]'))), 0)
+
+    def test_columns_match_dict_path(self):
+        for columns_extractor, dict_extractor, mappings in (
+                (extract_search_columns, extract_search_information, ['Date', 'Query_Text', 'Latitude', 'Longitude']),
+                (extract_watch_columns, extract_watch_information, ['Date', 'Video_Title', 'Channel_Title', 'Video_URL'])):
+            columns = columns_extractor(ENTRIES, mappings)
+            expected = convert_to_arrays(dict_extractor(ENTRIES), mappings)
+            self.assertEqual(columns[0].dtype.kind, 'M')
+            for column, expected_column in zip(columns[1:], expected[1:]):
+                self.assertEqual(column.dtype, expected_column.dtype)
+                np.testing.assert_array_equal(column, expected_column)
+
+            cleaned, expected_cleaned = clean_dates_main(columns, mappings), clean_dates_main(expected, mappings)
+            self.assertEqual(len(cleaned[0]), 4)
+            self.assertEqual(cleaned[0].tolist(), expected_cleaned[0].tolist())
+            for column, expected_column in zip(cleaned[1:], expected_cleaned[1:]):
+                np.testing.assert_array_equal(column, expected_column)
+
+    def test_records_match_dict_path(self):
+        for records, dicts in ((extract_search_records(ENTRIES), extract_search_information(ENTRIES)),
+                               (extract_watch_records(ENTRIES), extract_watch_information(ENTRIES))):
+            self.assertEqual(len(records), len(dicts))
+            for record, entry in zip(records, dicts):
+                self.assertEqual(list(record._fields), list(entry))
+                np.testing.assert_equal(list(record), list(entry.values()))
+        record = extract_watch_records(ENTRIES)[1]
+        self.assertEqual((record.Channel_Title, record.Video_URL), ('Numpy TV', 'https://www.youtube.com/watch?v=00000000001'))
+        self.assertEqual(WatchRecord._fields, tuple(WATCH_SCHEMA))
+        self.assertFalse(hasattr(record, '__dict__'))
+
+if __name__ == '__main__':
+    unittest.main()
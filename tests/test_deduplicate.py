@@ -0,0 +1,134 @@
+import io
+import json
+import shutil
+import tempfile
+import unittest
+import zipfile
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import numpy as np
+
+from self_stats.cli import EXIT_OK, main as cli_main
+from self_stats.munger.deduplicate import HashIndex, entry_hashes, merge_entry_streams
+from self_stats.munger.input_output import find_input_files, split_archive_path
+from self_stats.munger.parse_and_process import main as parse_and_process
+from self_stats.munger.synthetic_data import main as generate_takeout
+
+SEARCH_MEMBER = 'Takeout/My Activity/Search/MyActivity.json'
+WATCH_MEMBER = 'Takeout/YouTube and YouTube Music/history/watch-history.json'
+
+def entry(time: str, title: str = 'Watched a', url: str = 'https://www.youtube.com/watch?v=a') -> dict:
+    return {'time': time, 'title': title, 'titleUrl': url}
+
+class TestDeduplicate(unittest.TestCase):
+    def test_hash_index(self):
+        entries = [entry('2024-01-02T00:00:00Z'), entry('2024-01-01T00:00:00Z'), entry('2024-01-02T00:00:00Z'),
+                   entry('2024-01-02T00:00:00Z', url='https://www.youtube.com/watch?v=b')]
+        hashes = entry_hashes(entries)
+        self.assertEqual(hashes.dtype, np.uint64)
+        self.assertEqual(len(set(hashes.tolist())), 3)
+
+        index = HashIndex()
+        self.assertEqual(index.add(hashes).tolist(), [True, True, False, True])
+        self.assertEqual(index.add(hashes[:2]).tolist(), [False, False])
+        self.assertEqual((len(index), index.dropped), (3, 3))
+        self.assertTrue(np.all(np.diff(index.hashes.astype(np.float64)) > 0))
+
+        batches = list(HashIndex().deduplicate([entries[:2], entries[2:], entries]))
+        self.assertEqual(batches, [entries[:2], entries[3:], []])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'index.npz'
+            self.assertIsNone(HashIndex.load(path))
+            HashIndex(index.hashes, ['a'], {'version': 1}).save(path)
+            loaded = HashIndex.load(path)
+            self.assertEqual(loaded.contains(hashes).tolist(), [True] * 4)
+            self.assertEqual((loaded.inputs, loaded.meta), (['a'], {'version': 1}))
+            self.assertEqual(loaded.add(entry_hashes([entry('2024-01-03T00:00:00Z')])).tolist(), [True])
+            self.assertEqual(sorted(path.name for path in Path(tmp).iterdir()), ['index.npz'])
+
+        # Batches are kept as a few sorted runs instead of being inserted one by one
+        many = HashIndex()
+        rng = np.random.default_rng(0)
+        values = rng.integers(0, 2 ** 63, 5000, dtype=np.uint64)
+        # Overlapping batches: each repeats the second half of the one before
+        added = sum(many.add(values[start:start + 100]).sum() for start in range(0, len(values), 50))
+        self.assertEqual((added, len(many), many.dropped), (5000, 5000, 4950))
+        self.assertLessEqual(len(many.runs), int(np.log2(len(values))) + 1)
+        np.testing.assert_array_equal(many.hashes, np.unique(values))
+        self.assertTrue(many.contains(values).all())
+
+    def test_merge_entry_streams(self):
+        first = [entry('2024-01-05T00:00:00Z'), entry('2024-01-03T00:00:00Z'), entry('2024-01-01T00:00:00Z')]
+        second = [entry('2024-01-04T00:00:00.500Z'), entry('2024-01-03T00:00:00Z'), {'title': 'no time'}]
+        merged = list(merge_entry_streams([first, second]))
+        self.assertEqual([item.get('time') for item in merged],
+                         ['2024-01-05T00:00:00Z', '2024-01-04T00:00:00.500Z', '2024-01-03T00:00:00Z',
+                          '2024-01-03T00:00:00Z', '2024-01-01T00:00:00Z', None])
+        self.assertIs(next(merge_entry_streams([first])), first[0])
+
+    def test_overlapping_exports_match_single_export(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            full = Path(tmp) / 'full'
+            generate_takeout(full, search_size=300, watch_size=300, seed=5)
+            overlapping = Path(tmp) / 'overlapping'
+            overlapping.mkdir()
+            # Two exports of the same account: an older one and a newer one sharing 100 entries
+            for name, member in (('MyActivity.json', SEARCH_MEMBER), ('watch-history.json', WATCH_MEMBER)):
+                entries = json.loads((full / name).read_text(encoding='utf-8'))
+                for archive, part in (('takeout-001.zip', entries[100:]), ('takeout-002.zip', entries[:200])):
+                    with zipfile.ZipFile(overlapping / archive, 'a') as zipped:
+                        zipped.writestr(member, json.dumps(part))
+            chunked = Path(tmp) / 'chunked'
+            shutil.copytree(overlapping, chunked)
+
+            input_files = find_input_files(overlapping, 'watch-history.json')
+            self.assertEqual([split_archive_path(path)[0].name for path in input_files], ['takeout-001.zip', 'takeout-002.zip'])
+            with redirect_stdout(io.StringIO()) as output:
+                parse_and_process(overlapping, input_files, ['Date', 'Video_Title', 'Channel_Title', 'Video_URL'])
+            self.assertIn('Dropped 100 duplicate entries.', output.getvalue())
+
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(full), str(overlapping), '-q', '--no-keywords', '--no-cache']), EXIT_OK)
+                self.assertEqual(cli_main(['process', str(chunked), '-q', '--no-keywords', '--out-of-core', '--chunk-size', '37']), EXIT_OK)
+
+            for directory in (overlapping, chunked):
+                for name in ('SEARCH_raw.csv', 'SEARCH_processed.csv', 'WATCH_processed.csv', 'WATCH_metadata.csv'):
+                    self.assertEqual((directory / 'output' / 'full_data' / name).read_bytes(),
+                                     (full / 'output' / 'full_data' / name).read_bytes(), name)
+            self.assertEqual(len(HashIndex.load(overlapping / 'output' / 'full_data' / 'WATCH_dedup_index.npz')), 300)
+
+    def test_incremental_ingest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            full = Path(tmp) / 'full'
+            generate_takeout(full, search_size=1000, watch_size=1000, seed=5)
+            incremental = Path(tmp) / 'incremental'
+            incremental.mkdir()
+            for name, member in (('MyActivity.json', SEARCH_MEMBER), ('watch-history.json', WATCH_MEMBER)):
+                entries = json.loads((full / name).read_text(encoding='utf-8'))
+                for archive, part in (('takeout-001.zip', entries[300:]), ('takeout-002.zip', entries[:400])):
+                    with zipfile.ZipFile(Path(tmp) / archive, 'a') as zipped:
+                        zipped.writestr(member, json.dumps(part))
+
+            shutil.copy(Path(tmp) / 'takeout-001.zip', incremental)
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(full), str(incremental), '-q', '--no-keywords']), EXIT_OK)
+            index_path = incremental / 'output' / 'full_data' / 'WATCH_dedup_index.npz'
+            self.assertEqual(len(HashIndex.load(index_path)), 700)
+
+            # A newer export overlapping the first: only its entries are read, hashed and merged into the output
+            shutil.copy(Path(tmp) / 'takeout-002.zip', incremental)
+            with redirect_stdout(io.StringIO()) as output:
+                self.assertEqual(cli_main(['process', str(incremental), '--no-keywords']), EXIT_OK)
+            self.assertIn('Skipping 1 input file(s) ingested by an earlier run.', output.getvalue())
+            self.assertIn('Dropped 100 duplicate entries.', output.getvalue())
+            index = HashIndex.load(index_path)
+            self.assertEqual((len(index), len(index.inputs)), (1000, 2))
+
+            for name in ('SEARCH_raw.csv', 'SEARCH_processed.csv', 'WATCH_processed.csv', 'WATCH_metadata.csv'):
+                self.assertEqual((incremental / 'output' / 'full_data' / name).read_bytes(),
+                                 (full / 'output' / 'full_data' / name).read_bytes(), name)
+
+if __name__ == '__main__':
+    unittest.main()
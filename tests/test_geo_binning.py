@@ -0,0 +1,37 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from self_stats.munger.geo_binning import bin_coordinates, cell_centers, encode_cells, encode_geohash, main
+
+class TestGeoBinning(unittest.TestCase):
+    def test_matches_reference_geohashes(self):
+        hashes = encode_geohash([57.64911, 40.7128, -33.8688], [10.40744, -74.0060, 151.2093], 11)
+        self.assertEqual(hashes.tolist(), ['u4pruydqqvj', 'dr5regw3ppy', 'r3gx2f77bn4'])
+
+    def test_cells_are_hierarchical(self):
+        rng = np.random.default_rng(0)
+        latitudes, longitudes = rng.uniform(-90, 90, 500), rng.uniform(-180, 180, 500)
+        fine = encode_cells(latitudes, longitudes, 7)
+        coarse = encode_cells(latitudes, longitudes, 5)
+        self.assertTrue(np.array_equal(fine >> np.uint64(10), coarse))
+        center_latitudes, center_longitudes = cell_centers(fine, 7)
+        self.assertTrue(np.array_equal(encode_cells(center_latitudes, center_longitudes, 7), fine))
+
+    def test_counts_per_cell_per_day(self):
+        dates = np.array([datetime(2024, 1, 1, 5), datetime(2024, 1, 1, 9), datetime(2024, 1, 2), datetime(2024, 1, 2)], dtype=object)
+        latitudes = np.array([40.71, 40.7101, np.nan, 51.5])
+        longitudes = np.array([-74.0, -74.0, 1.0, -0.12])
+        day, precision, geohash, count, _, _ = bin_coordinates(dates, latitudes, longitudes, (3, 5))
+        self.assertEqual(list(zip(day, precision, geohash, count)), [
+            ('2024-01-01', 3, 'dr5', 2), ('2024-01-02', 3, 'gcp', 1),
+            ('2024-01-01', 5, 'dr5rs', 2), ('2024-01-02', 5, 'gcpuv', 1),
+        ])
+
+    def test_sources_without_coordinates(self):
+        columns = main((np.array([datetime(2024, 1, 1)], dtype=object),), ['Date'])
+        self.assertTrue(all(len(column) == 0 for column in columns))
+
+if __name__ == '__main__':
+    unittest.main()
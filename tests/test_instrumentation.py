@@ -0,0 +1,42 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from self_stats.munger.instrumentation import RunReport, count_rows
+
+class TestRunReport(unittest.TestCase):
+    def test_records_each_stage(self):
+        report = RunReport('search', trace_memory=True)
+        with report.stage('allocate', rows_in=10) as stage:
+            data = (np.ones(200_000), np.zeros(200_000))
+            stage['rows_out'] = count_rows(data)
+        with report.stage('noop'):
+            pass
+        report.close()
+
+        self.assertEqual([record['stage'] for record in report.stages], ['allocate', 'noop'])
+        allocate = report.stages[0]
+        self.assertEqual(allocate['rows_in'], 10)
+        self.assertEqual(allocate['rows_out'], 200_000)
+        self.assertGreater(allocate['traced_peak_mb'], 2.0)
+        self.assertGreaterEqual(allocate['wall_s'], 0)
+
+    def test_cprofile_hook_and_json_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            report = RunReport('watch', profiler='cprofile', profile_dir=Path(tmp))
+            with report.stage('sum'):
+                sum(range(1000))
+            report.save_json(Path(tmp) / 'report.json')
+            saved = json.loads((Path(tmp) / 'report.json').read_text())
+            self.assertEqual(saved['stages'][0]['stage'], 'sum')
+            self.assertTrue(Path(saved['stages'][0]['profile']).exists())
+
+    def test_unknown_profiler(self):
+        with self.assertRaises(ValueError):
+            RunReport('search', profiler='magic')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from self_stats.munger.inverted_index import InvertedIndex, decode_varints, encode_varints
+
+TITLES = [
+    ['python', 'pandas'],
+    ['guitar'],
+    [],
+    ['python', 'guitar', 'python'],
+    ['recipe', 'pandas'],
+    ['python'],
+]
+DATES = np.array([datetime(2024, 3, 1, 12) - timedelta(days=2 * row) for row in range(len(TITLES))], dtype=object)
+
+def keyword_pairs(titles: list) -> tuple:
+    rows = np.array([row for row, tokens in enumerate(titles) for _ in tokens], dtype=np.int64)
+    tokens = np.array([token for tokens in titles for token in tokens], dtype=object)
+    return rows, tokens
+
+class TestInvertedIndex(unittest.TestCase):
+    def test_varints(self):
+        values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2**40, 2**63 + 5, 7], dtype=np.uint64)
+        encoded, lengths = encode_varints(values)
+        self.assertEqual(lengths.tolist(), [1, 1, 1, 2, 2, 2, 3, 6, 10, 1])
+        self.assertEqual(encoded[:5].tolist(), [0, 1, 127, 0x80, 1])
+        self.assertEqual(decode_varints(encoded).tolist(), values.tolist())
+        self.assertEqual(decode_varints(encode_varints(np.array([3, 1, 4]))[0]).tolist(), [3, 1, 4])
+        self.assertEqual(len(decode_varints(np.array([], dtype=np.uint8))), 0)
+
+    def test_search(self):
+        index = InvertedIndex.build(*keyword_pairs(TITLES), DATES)
+        self.assertEqual(index.tokens.tolist(), ['guitar', 'pandas', 'python', 'recipe'])
+        self.assertEqual(index.document_counts.tolist(), [2, 2, 3, 1])
+        self.assertEqual(index.postings_of('Python').tolist(), [0, 3, 5])
+        self.assertEqual(index.search('python').tolist(), [0, 3, 5])
+        self.assertEqual(index.search('python pandas').tolist(), [0])
+        self.assertEqual(index.search(['python', 'guitar', 'missing'], mode='or').tolist(), [0, 1, 3, 5])
+        self.assertEqual(index.search('python missing').tolist(), [])
+        self.assertEqual(index.search([]).tolist(), [])
+        self.assertEqual(index.search('python', start='2024-02-21').tolist(), [0, 3])
+        self.assertEqual(index.search('python', end=date(2024, 2, 24)).tolist(), [3, 5])
+        self.assertEqual(index.search('python', end=datetime(2024, 2, 24)).tolist(), [5])
+        self.assertEqual(index.dates_of(index.search('recipe')).tolist(), [datetime(2024, 2, 22, 12)])
+        with self.assertRaises(ValueError):
+            index.search('python', mode='not')
+
+    def test_persist_and_merge(self):
+        index = InvertedIndex.build(*keyword_pairs(TITLES), DATES)
+        with tempfile.TemporaryDirectory() as tmp:
+            index.save(Path(tmp) / 'index.npz')
+            loaded = InvertedIndex.load(Path(tmp) / 'index.npz')
+        for column, expected in zip(loaded.arrays(), index.arrays()):
+            np.testing.assert_array_equal(column, expected)
+
+        # Chunks of rows indexed separately, with row ids counted from the start of the data
+        parts = []
+        for start, stop in ((0, 2), (2, 3), (3, 6)):
+            rows, tokens = keyword_pairs(TITLES[start:stop])
+            parts.append(InvertedIndex.build(rows + start, tokens, DATES[start:stop]))
+        merged = InvertedIndex.merge(parts)
+        for column, expected in zip(merged.arrays(), index.arrays()):
+            np.testing.assert_array_equal(column, expected)
+        self.assertEqual(len(InvertedIndex.merge([])), 0)
+
+if __name__ == '__main__':
+    unittest.main()
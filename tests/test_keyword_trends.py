@@ -0,0 +1,97 @@
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from self_stats.munger.keyword_trends import KeywordMatrix, keyword_tables, period_ordinals, period_starts
+
+def pairs(counts_per_day: dict) -> tuple:
+    """
+    Expands {'2024-01-01': {'token': count}} into (date, token) columns.
+    """
+    dates, tokens = [], []
+    for day, counts in counts_per_day.items():
+        for token, count in counts.items():
+            dates += [datetime.fromisoformat(day + 'T12:30:00')] * count
+            tokens += [token] * count
+    order = np.random.default_rng(0).permutation(len(tokens))
+    return np.array(dates, dtype=object)[order], np.array(tokens, dtype=object)[order]
+
+COUNTS = {
+    '2024-01-01': {'python': 3, 'guitar': 1},
+    '2024-01-02': {'python': 1, 'recipe': 2},
+    '2024-01-08': {'guitar': 5, 'python': 1},
+    '2024-02-05': {'recipe': 4},
+}
+
+class TestKeywordTrends(unittest.TestCase):
+    def test_matrix(self):
+        matrix = KeywordMatrix.from_pairs(*pairs(COUNTS))
+        self.assertEqual(matrix.shape, (4, 3))
+        self.assertEqual(matrix.tokens.tolist(), ['guitar', 'python', 'recipe'])
+        self.assertEqual(matrix.indptr.tolist(), [0, 2, 4, 6, 7])
+        self.assertEqual(matrix.indices.tolist(), [0, 1, 1, 2, 0, 1, 2])
+        self.assertEqual(matrix.counts.tolist(), [1, 3, 1, 2, 5, 1, 4])
+        self.assertEqual(matrix.totals().tolist(), [6, 5, 6])
+
+        dates, tokens = pairs(COUNTS)
+        merged = KeywordMatrix.merge([KeywordMatrix.from_pairs(dates[:5], tokens[:5]), KeywordMatrix.empty(),
+                                      KeywordMatrix.from_pairs(dates[5:], tokens[5:])])
+        for column, expected in zip(merged.columns(), matrix.columns()):
+            self.assertEqual(column.tolist(), expected.tolist())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            matrix.save(Path(tmp) / 'matrix.npz')
+            loaded = KeywordMatrix.load(Path(tmp) / 'matrix.npz')
+        for column, expected in zip(loaded.columns(), matrix.columns()):
+            self.assertEqual(column.tolist(), expected.tolist())
+
+    def test_periods(self):
+        days = np.array(['2024-01-01', '2024-01-07', '2024-01-08', '2024-02-29'], dtype='datetime64[D]')
+        self.assertEqual(np.diff(period_ordinals(days, 'week')).tolist(), [0, 1, 7])
+        self.assertEqual(period_starts(period_ordinals(days, 'week'), 'week').astype(str).tolist(),
+                         ['2024-01-01', '2024-01-01', '2024-01-08', '2024-02-26'])
+        self.assertEqual(period_starts(period_ordinals(days, 'month'), 'month').astype(str).tolist(),
+                         ['2024-01-01', '2024-01-01', '2024-01-01', '2024-02-01'])
+
+    def test_top_k(self):
+        matrix = KeywordMatrix.from_pairs(*pairs(COUNTS))
+        period, start, rank, keyword, count, weight = matrix.top_k('week', k=2)
+        self.assertEqual([str(value) for value in start], ['2024-01-01', '2024-01-01', '2024-01-08', '2024-01-08', '2024-02-05'])
+        self.assertEqual(rank.tolist(), [1, 2, 1, 2, 1])
+        self.assertEqual(keyword.tolist(), ['python', 'recipe', 'guitar', 'python', 'recipe'])
+        self.assertEqual(count.tolist(), [4, 2, 5, 1, 4])
+
+        # A keyword found every day ranks below an equally frequent keyword particular to the day
+        matrix = KeywordMatrix.from_pairs(*pairs({'2024-01-01': {'common': 1, 'rare': 1}, '2024-01-02': {'common': 1},
+                                                  '2024-01-03': {'common': 2}}))
+        self.assertEqual(matrix.top_k('day', k=2)[3][:2].tolist(), ['common', 'rare'])
+        _, _, _, keyword, _, weight = matrix.top_k('day', k=2, by='tfidf')
+        self.assertEqual(keyword[:2].tolist(), ['rare', 'common'])
+        self.assertGreater(weight[0], weight[1])
+        with self.assertRaises(ValueError):
+            matrix.top_k('year')
+
+    def test_trends(self):
+        matrix = KeywordMatrix.from_pairs(*pairs(COUNTS))
+        period, start, direction, rank, keyword, count, previous, change = matrix.trends('week', k=5)
+        rows = list(zip([str(value) for value in start], direction, keyword, count.tolist(), previous.tolist()))
+        self.assertEqual(rows, [
+            ('2024-01-08', 'rising', 'guitar', 5, 1),
+            ('2024-01-08', 'falling', 'recipe', 0, 2),
+            ('2024-01-08', 'falling', 'python', 1, 4),
+            ('2024-01-15', 'falling', 'guitar', 0, 5),
+            ('2024-01-15', 'falling', 'python', 0, 1),
+            ('2024-02-05', 'rising', 'recipe', 4, 0),
+        ])
+        np.testing.assert_allclose(change[:3], [np.log2(6 / 2), np.log2(1 / 3), np.log2(2 / 5)], atol=1e-6)
+
+        top, trends = keyword_tables(matrix, k=1)
+        self.assertEqual(sorted(set(top[0])), ['day', 'month', 'week'])
+        self.assertEqual(sorted(set(trends[0])), ['month', 'week'])
+        self.assertEqual(keyword_tables(KeywordMatrix.empty())[1][0].tolist(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import json
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+def imported_heavy_modules(code):
+    snippet = code + "\nimport sys, json\nprint(json.dumps([m for m in ('pandas', 'spacy', 'ruptures', 'tldextract') if m in sys.modules]))"
+    completed = subprocess.run([sys.executable, '-c', snippet], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+class TestLazyImports(unittest.TestCase):
+    def test_entry_point_is_light(self):
+        self.assertEqual(imported_heavy_modules('import self_stats.__main__'), [])
+
+    def test_file_detection_is_light(self):
+        code = 'from self_stats.munger.input_output import get_file_presence_flags\nget_file_presence_flags(".")'
+        self.assertEqual(imported_heavy_modules(code), [])
+
+    def test_processing_without_keywords_skips_nlp(self):
+        imported = imported_heavy_modules('import self_stats.munger.munger_main')
+        self.assertNotIn('spacy', imported)
+        self.assertNotIn('tldextract', imported)
+        self.assertNotIn('ruptures', imported)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from self_stats.cli import EXIT_OK, main as cli_main
+from self_stats.munger.impute_time_data import main as imputer
+from self_stats.munger.input_output import iter_json_array
+from self_stats.munger.out_of_core import ColumnSpill, StreamingImputer
+from self_stats.munger.synthetic_data import main as generate_takeout
+
+class TestOutOfCore(unittest.TestCase):
+    def test_iter_json_array(self):
+        entries = [{'title': 'Watched a "b"', 'time': '2024-01-01T00:00:00Z', 'n': 12345.678}, [], 'é', 10 ** 20]
+        document = json.dumps(entries, indent=2)
+        for buffer_size in (1, 3, 64, 2**20):
+            self.assertEqual(list(iter_json_array(io.StringIO(document), buffer_size)), entries)
+        self.assertEqual(list(iter_json_array(io.StringIO(' [ ] '))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('[{"a": 1}, {"b"'), 4))
+
+    def test_column_spill_round_trip(self):
+        dates = np.array([datetime(2024, 1, 1) + timedelta(minutes=i) for i in range(10)], dtype=object)
+        texts = np.array(['a', None, 'ünï', '', 'x,y', None, 'b', 'c', 'd', 'e'], dtype=object)
+        numbers = np.arange(10, dtype=float)
+        numbers[3] = np.nan
+        with tempfile.TemporaryDirectory() as tmp:
+            spill = ColumnSpill(Path(tmp) / 'spill')
+            for start, stop in ((0, 4), (4, 5), (5, 10)):
+                spill.append({'Date': dates[start:stop], 'Text': texts[start:stop], 'Number': numbers[start:stop]})
+            self.assertEqual(len(spill), 10)
+            chunks = list(spill.iter_chunks(3))
+            self.assertEqual([len(chunk[0]) for chunk in chunks], [3, 3, 3, 1])
+            read_dates, read_texts, read_numbers = (np.concatenate(columns) for columns in zip(*chunks))
+        self.assertEqual(read_dates.tolist(), dates.tolist())
+        self.assertEqual(read_texts.tolist(), texts.tolist())
+        np.testing.assert_array_equal(read_numbers, numbers)
+
+    def test_streaming_imputer_matches_imputer(self):
+        rng = np.random.default_rng(3)
+        gaps = rng.choice([1, 3, 30], size=200, p=[0.5, 0.3, 0.2])
+        timestamps = np.array([datetime(2024, 6, 1) - timedelta(minutes=int(total)) for total in np.cumsum(gaps)], dtype=object)
+        titles = np.array([f'video {i}' for i in range(200)], dtype=object)
+        mappings = ['Date', 'Video_Title']
+        expected, expected_metadata = imputer((timestamps, titles), mappings)
+
+        for chunk_size in (1, 2, 7, 500):
+            streaming = StreamingImputer(video=True)
+            emitted = [streaming.update((timestamps[i:i + chunk_size], titles[i:i + chunk_size]))
+                       for i in range(0, 200, chunk_size)]
+            emitted = [result for result in emitted + [streaming.finish()] if result is not None]
+            imputed = tuple(np.concatenate(columns) for columns in zip(*(result[0] for result in emitted)))
+            metadata = tuple(np.concatenate(columns) for columns in zip(*(result[1] for result in emitted)))
+            for column, expected_column in zip(imputed, expected):
+                self.assertEqual(column.tolist(), expected_column.tolist())
+            for column, expected_column in zip(metadata, expected_metadata):
+                np.testing.assert_array_equal(column, expected_column)
+
+    def test_matches_in_memory_pipeline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            in_memory = Path(tmp) / 'in_memory'
+            generate_takeout(in_memory, search_size=300, watch_size=300, seed=5)
+            chunked = Path(tmp) / 'chunked'
+            shutil.copytree(in_memory, chunked)
+
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(in_memory), '-q', '--no-keywords', '--no-cache']), EXIT_OK)
+                self.assertEqual(cli_main(['process', str(chunked), '-q', '--no-keywords', '--out-of-core', '--chunk-size', '37']), EXIT_OK)
+
+            for name in ('SEARCH_raw.csv', 'SEARCH_processed.csv', 'SEARCH_metadata.csv', 'SEARCH_segments.csv',
+                         'WATCH_raw.csv', 'WATCH_processed.csv', 'WATCH_metadata.csv', 'WATCH_segments.csv'):
+                self.assertEqual((chunked / 'output' / 'full_data' / name).read_bytes(),
+                                 (in_memory / 'output' / 'full_data' / name).read_bytes(), name)
+            self.assertEqual((chunked / 'output' / 'aggregated_data' / 'SEARCH_geo_cells.csv').read_bytes(),
+                             (in_memory / 'output' / 'aggregated_data' / 'SEARCH_geo_cells.csv').read_bytes())
+            # The workbooks are streamed a chunk of rows at a time, with the long columns read back from the spills
+            for name in ('SEARCH.xlsx', 'SEARCH_collated.xlsx', 'WATCH.xlsx', 'WATCH_collated.xlsx'):
+                expected = pd.read_excel(in_memory / 'output' / 'aggregated_data' / name, sheet_name=None)
+                actual = pd.read_excel(chunked / 'output' / 'aggregated_data' / name, sheet_name=None)
+                self.assertEqual(list(actual), list(expected))
+                for sheet in expected:
+                    pd.testing.assert_frame_equal(actual[sheet], expected[sheet], obj=f'{name} {sheet}')
+            self.assertFalse((chunked / 'output' / 'spill').exists())
+
+if __name__ == '__main__':
+    unittest.main()
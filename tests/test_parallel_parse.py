@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+
+from self_stats.munger.parse_and_process import extract_search_columns, extract_watch_columns
+from self_stats.munger.parallel_parse import parse_entries_parallel, split_into_chunks, pack_column, unpack_column
+
+def make_search_entries(count):
+    entries = []
+    for i in range(count):
+        entry = {'title': f'Searched for  item {i}​', 'time': f'2024-01-01T00:00:{i % 60:02d}.000Z'}
+        if i % 20 == 0:
+            entry['locationInfos'] = [{'url': f'https://www.google.com/maps/@?api=1&center={i}.5,-{i}.25'}]
+        entries.append(entry)
+    return entries
+
+def make_watch_entries(count):
+    entries = []
+    for i in range(count):
+        entry = {'title': f'Watched video {i}', 'time': '2024-01-01T00:00:00.000Z', 'titleUrl': f'https://www.youtube.com/watch?v={i:011d}'}
+        if i % 4:
+            entry['subtitles'] = [{'name': f'Channel {i % 5}'}]
+        entries.append(entry)
+    return entries
+
+class TestParallelParse(unittest.TestCase):
+    def assert_columns_equal(self, expected, result):
+        self.assertEqual(len(expected), len(result))
+        for expected_column, column in zip(expected, result):
+            self.assertEqual(expected_column.dtype, column.dtype)
+            if column.dtype == object:
+                self.assertEqual(expected_column.tolist(), column.tolist())
+            else:
+                np.testing.assert_array_equal(expected_column, column)
+
+    def test_split_into_chunks(self):
+        self.assertEqual(split_into_chunks(10, 4), [(0, 4), (4, 8), (8, 10)])
+        self.assertEqual(split_into_chunks(0, 4), [])
+
+    def test_pack_roundtrip(self):
+        column = np.array(['a', None, '', 'b c'], dtype=object)
+        self.assertEqual(unpack_column(pack_column(column)).tolist(), column.tolist())
+
+    def test_search_matches_serial(self):
+        entries = make_search_entries(53)
+        mappings = ['Date', 'Query_Text', 'Latitude', 'Longitude']
+        expected = extract_search_columns(entries, mappings)
+        result = parse_entries_parallel(entries, extract_search_columns, mappings, workers=3, chunk_size=7)
+        self.assert_columns_equal(expected, result)
+
+    def test_watch_matches_serial(self):
+        entries = make_watch_entries(41)
+        mappings = ['Date', 'Video_Title', 'Channel_Title', 'Video_URL']
+        expected = extract_watch_columns(entries, mappings)
+        result = parse_entries_parallel(entries, extract_watch_columns, mappings, workers=2, chunk_size=4)
+        self.assert_columns_equal(expected, result)
+        self.assertIsNone(result[2][0])
+
+if __name__ == '__main__':
+    unittest.main()
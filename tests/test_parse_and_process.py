@@ -0,0 +1,38 @@
+import random
+import unittest
+
+import numpy as np
+
+from self_stats.munger.parse_and_process import extract_coordinate_columns, extract_coordinates, extract_search_information
+
+def reference(urls):
+    pairs = [extract_coordinates(url) if url else (None, None) for url in urls]
+    return (np.array([np.nan if lat is None else lat for lat, _ in pairs]),
+            np.array([np.nan if long is None else long for _, long in pairs]))
+
+class TestCoordinateColumns(unittest.TestCase):
+    def test_matches_general_parser(self):
+        rng = random.Random(0)
+        urls = [f'https://www.google.com/maps/@?api=1&map_action=map&center={rng.uniform(-90, 90):.6f},{rng.uniform(-180, 180):.6f}&zoom=12'
+                if rng.random() < 0.5 else None for _ in range(500)]
+        urls += ['https://x/?center=1e1,2', 'https://x/?zoom=1&center=-3.5,+7.25', 'https://x/?center=40.1%2C-3.2',
+                 'https://x/?a=1&center=1,2&center=3,4', 'https://x/?xcenter=5,6', '', 'https://x/?a=1']
+        latitudes, longitudes = extract_coordinate_columns(urls)
+        expected_latitudes, expected_longitudes = reference(urls)
+        self.assertEqual(latitudes.dtype, np.float64)
+        np.testing.assert_array_equal(latitudes, expected_latitudes)
+        np.testing.assert_array_equal(longitudes, expected_longitudes)
+
+    def test_search_entries_get_float_columns(self):
+        entries = [
+            {'title': 'Searched for a', 'time': '2024-01-01T00:00:00Z',
+             'locationInfos': [{'url': 'https://www.google.com/maps/@?api=1&map_action=map&center=40.5,-73.25&zoom=12'}]},
+            {'title': 'Searched for b', 'time': '2024-01-01T00:01:00Z'},
+        ]
+        extracted = extract_search_information(entries)
+        self.assertEqual((extracted[0]['Latitude'], extracted[0]['Longitude']), (40.5, -73.25))
+        self.assertTrue(np.isnan(extracted[1]['Latitude']))
+        self.assertEqual(extract_coordinate_columns([])[0].shape, (0,))
+
+if __name__ == '__main__':
+    unittest.main()
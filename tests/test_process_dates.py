@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+
+from self_stats.munger import process_dates
+from self_stats.munger.process_dates import calculate_daily_counts, detect_changepoint, trim_date, fit_detector, clear_detector_cache
+
+class TestChangepointTrimming(unittest.TestCase):
+    def setUp(self):
+        # 60 sparse days (one entry every other day) followed by 60 busy days (ten entries per day)
+        start = datetime(2020, 1, 1, 12)
+        sparse = [start + timedelta(days=d) for d in range(0, 60, 2)]
+        busy = [start + timedelta(days=60 + d, minutes=m) for d in range(60) for m in range(10)]
+        self.dates = np.array(sorted(sparse + busy, reverse=True), dtype=object)
+        self.texts = np.array([f'entry {i}' for i in range(len(self.dates))], dtype=object)
+        clear_detector_cache()
+
+    def test_calculate_daily_counts(self):
+        dates = np.array(['2021-01-03', '2021-01-01', '2021-01-03', '2021-01-03'], dtype='datetime64[D]')
+        dates_sorted, counts = calculate_daily_counts(dates)
+        np.testing.assert_array_equal(dates_sorted, np.array(['2021-01-01', '2021-01-03'], dtype='datetime64[D]'))
+        np.testing.assert_array_equal(counts.ravel(), [1, 3])
+        self.assertEqual(counts.shape, (2, 1))
+
+    def test_calculate_daily_counts_with_outlier_date(self):
+        dates = np.array(['1971-01-01', '2021-01-01', '2021-01-01'], dtype='datetime64[D]')
+        dates_sorted, counts = calculate_daily_counts(dates)
+        np.testing.assert_array_equal(dates_sorted, np.array(['1971-01-01', '2021-01-01'], dtype='datetime64[D]'))
+        np.testing.assert_array_equal(counts.ravel(), [1, 2])
+
+    def test_detectors_find_the_busy_period(self):
+        dates_sorted, counts = calculate_daily_counts(self.dates.astype('datetime64[D]'))
+        for method in ['binseg', 'pelt', 'bottomup', 'window']:
+            changepoint = detect_changepoint(dates_sorted, counts, threshold=1, method=method)
+            self.assertIsNotNone(changepoint, method)
+            self.assertGreaterEqual(changepoint, np.datetime64('2020-02-20'), method)
+            self.assertLessEqual(changepoint, np.datetime64('2020-03-10'), method)
+
+    def test_fitted_detector_is_cached(self):
+        _, counts = calculate_daily_counts(self.dates.astype('datetime64[D]'))
+        self.assertIs(fit_detector(counts, 'pelt'), fit_detector(counts.copy(), 'pelt'))
+
+    def test_detector_cache_is_bounded(self):
+        _, counts = calculate_daily_counts(self.dates.astype('datetime64[D]'))
+        detectors = [fit_detector(counts + extra, 'pelt') for extra in range(process_dates.DETECTOR_CACHE_SIZE)]
+        # Using the first detector again makes the second one the least recently used
+        self.assertIs(fit_detector(counts, 'pelt'), detectors[0])
+        fit_detector(counts + process_dates.DETECTOR_CACHE_SIZE, 'pelt')
+        self.assertEqual(len(process_dates._fitted_detectors), process_dates.DETECTOR_CACHE_SIZE)
+        self.assertIs(fit_detector(counts, 'pelt'), detectors[0])
+        self.assertIsNot(fit_detector(counts + 1, 'pelt'), detectors[1])
+
+    def test_unknown_method_raises(self):
+        _, counts = calculate_daily_counts(self.dates.astype('datetime64[D]'))
+        with self.assertRaises(ValueError):
+            fit_detector(counts, 'magic')
+
+    def test_trim_date_drops_sparse_history(self):
+        trimmed_dates, trimmed_texts = trim_date((self.dates, self.texts), ['Date', 'Query_Text'], threshold=1, method='pelt')
+        self.assertEqual(len(trimmed_dates), len(trimmed_texts))
+        self.assertLess(len(trimmed_dates), len(self.dates))
+        self.assertTrue(all(date >= datetime(2020, 2, 20) for date in trimmed_dates))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from self_stats.munger.input_output import get_file_presence_flags, read_csv_columns
+from self_stats.munger.run_sources import SOURCE_FILES, get_source_jobs, run_jobs, run_sources
+from self_stats.munger.synthetic_data import main as generate_takeout
+
+OPTIONS = {'keywords': False, 'cache': False}
+
+class TestRunSources(unittest.TestCase):
+    def test_parallel_sources(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            generate_takeout(directory, search_size=300, watch_size=300, seed=3)
+            jobs = get_source_jobs(directory, get_file_presence_flags(directory))
+            self.assertEqual([job[0] for job in jobs], ['search', 'watch'])
+
+            with redirect_stdout(io.StringIO()) as out:
+                self.assertEqual(run_sources(jobs, parallel=True, **OPTIONS), {'search': True, 'watch': True})
+            # Each log is printed as one block: the other source never shows up inside it
+            blocks = out.getvalue().split('================  ')[1:]
+            self.assertEqual(sorted(block.split()[0] for block in blocks), ['search', 'watch'])
+            for block in blocks:
+                source = block.split()[0]
+                other = 'watch' if source == 'search' else 'search'
+                self.assertIn(f'Processing {source} history', block)
+                self.assertNotIn(f'Processing {other} history', block)
+                self.assertNotIn(f'Completed {other} history', block)
+
+            # Every output file belongs to one source and holds that source's columns
+            full_data = directory / 'output' / 'full_data'
+            for source, (_, mappings) in SOURCE_FILES.items():
+                header, columns = read_csv_columns(full_data / f'{source.upper()}_raw.csv')
+                self.assertEqual(header, mappings)
+                self.assertGreater(len(columns[0]), 0)
+            prefixes = {path.name.split('_')[0] for path in full_data.iterdir()}
+            self.assertEqual(prefixes, {'SEARCH', 'WATCH'})
+
+    def test_pool_captures_logs_per_job(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directories = [Path(tmp) / name for name in ('a', 'b')]
+            for seed, directory in zip((3, 7), directories):
+                generate_takeout(directory, search_size=300, watch_size=0, seed=seed)
+            jobs = [job for directory in directories for job in get_source_jobs(directory, get_file_presence_flags(directory))]
+            results = run_jobs(jobs, workers=2, quiet=True, **OPTIONS)
+            self.assertEqual(sorted(result['directory'] for result in results), [str(directory) for directory in directories])
+            for result in results:
+                self.assertTrue(result['success'], result['output'])
+                self.assertEqual(result['output'].count('Processing search history'), 1)
+                self.assertIn(result['directory'], result['output'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+
+from self_stats.munger.segment_activity import main as segment_activity
+from self_stats.munger.segment_activity import SEGMENT_CACHE_SIZE, _segment_cache, build_segments_table, segment_daily_counts, clear_segment_cache
+
+class TestSegmentActivity(unittest.TestCase):
+    def setUp(self):
+        # Three regimes: 40 days at 2/day, 40 days at 15/day, 40 days at 5/day
+        start = datetime(2022, 1, 1, 9)
+        rates = [2] * 40 + [15] * 40 + [5] * 40
+        dates = [start + timedelta(days=day, minutes=m) for day, rate in enumerate(rates) for m in range(rate)]
+        self.dates = np.array(dates[::-1], dtype=object)
+        clear_segment_cache()
+
+    def test_finds_all_regimes(self):
+        start_dates, end_dates, days, mean_rates = segment_activity((self.dates,), ['Date'])
+        self.assertEqual(len(start_dates), 3)
+        self.assertEqual(start_dates[0], '2022-01-01')
+        self.assertEqual(end_dates[-1], '2022-04-30')
+        self.assertEqual(days.sum(), 120)
+        np.testing.assert_allclose(mean_rates, [2, 15, 5], atol=1.5)
+
+    def test_results_are_cached(self):
+        counts = np.array([1] * 30 + [9] * 30).reshape(-1, 1)
+        first = segment_daily_counts(counts)
+        first.append(-1)
+        self.assertEqual(segment_daily_counts(counts.copy()), [30, 60])
+
+    def test_cache_is_bounded(self):
+        counts = np.array([1] * 30 + [9] * 30).reshape(-1, 1)
+        for extra in range(SEGMENT_CACHE_SIZE + 2):
+            self.assertEqual(segment_daily_counts(counts + extra), [30, 60])
+        self.assertEqual(len(_segment_cache), SEGMENT_CACHE_SIZE)
+
+    def test_build_segments_table(self):
+        dates = np.arange(np.datetime64('2023-05-01'), np.datetime64('2023-05-05'))
+        counts = np.array([1, 3, 0, 4]).reshape(-1, 1)
+        start_dates, end_dates, days, mean_rates = build_segments_table(dates, counts, [2, 4])
+        np.testing.assert_array_equal(start_dates, ['2023-05-01', '2023-05-03'])
+        np.testing.assert_array_equal(end_dates, ['2023-05-02', '2023-05-04'])
+        np.testing.assert_array_equal(days, [2, 2])
+        np.testing.assert_array_equal(mean_rates, [2.0, 2.0])
+
+if __name__ == '__main__':
+    unittest.main()
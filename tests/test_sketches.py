@@ -0,0 +1,170 @@
+import io
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+from self_stats.cli import EXIT_OK, main as cli_main
+from self_stats.munger.aggregate_data import remove_unique_entries
+from self_stats.munger.sketches import CountMinSketch, HeavyHitters, SpaceSaving, load_sketches, save_sketches
+from self_stats.munger.synthetic_data import main as generate_takeout
+
+def zipf_stream(size: int, seed: int) -> np.ndarray:
+    ranks = np.random.default_rng(seed).zipf(1.3, size=size)
+    return np.array([f'value {rank}' for rank in ranks], dtype=object)
+
+class TestSketches(unittest.TestCase):
+    def test_count_min_sketch(self):
+        stream = zipf_stream(20_000, seed=1)
+        exact = Counter(stream.tolist())
+        sketch = CountMinSketch(epsilon=0.01, delta=0.01)
+        self.assertEqual(sketch.table.shape, (5, 272))
+        for start in range(0, len(stream), 3000):
+            sketch.update(stream[start:start + 3000])
+        self.assertEqual(sketch.total, len(stream))
+
+        values = np.array(list(exact), dtype=object)
+        estimates = sketch.estimate(values)
+        counts = np.array([exact[value] for value in values])
+        self.assertTrue(np.all(estimates >= counts))
+        self.assertLessEqual(np.mean(estimates - counts > sketch.error_bound), 0.01)
+        self.assertEqual(sketch.estimate(np.array([None, 'never seen'], dtype=object))[0], 0)
+
+        with patch('self_stats.munger.sketches.CHUNK_SIZE', 1000):
+            np.testing.assert_array_equal(sketch.estimate(values), estimates)
+
+        first, second = CountMinSketch(0.01), CountMinSketch(0.01)
+        first.update(stream[:7000])
+        second.update(stream[7000:])
+        first.merge(second)
+        np.testing.assert_array_equal(first.table, sketch.table)
+        with self.assertRaises(ValueError):
+            first.merge(CountMinSketch(0.1))
+
+    def test_space_saving(self):
+        stream = zipf_stream(20_000, seed=2)
+        expected = [value for value, _ in Counter(stream.tolist()).most_common(5)]
+        summary = SpaceSaving(capacity=100)
+        for start in range(0, len(stream), 1000):
+            summary.update(stream[start:start + 1000])
+        self.assertEqual(len(summary.counts), 100)
+        self.assertEqual([value for value, _, _ in summary.top(5)], expected)
+        exact = Counter(stream.tolist())
+        for value, count, error in summary.top():
+            self.assertLessEqual(count - error, exact[value])
+            self.assertGreaterEqual(count, exact[value])
+            self.assertLessEqual(error, len(stream) / 100)
+
+        # Values are counted one occurrence at a time, so the summary does not depend on how the stream is split
+        whole = SpaceSaving(capacity=100)
+        whole.update(stream)
+        self.assertEqual((whole.counts, whole.errors), (summary.counts, summary.errors))
+        weighted = SpaceSaving(capacity=100)
+        weighted.update(np.array(['a', None, 'b', 'a'], dtype=object), np.array([3, 5, 1, 2]))
+        self.assertEqual((weighted.top(), weighted.total), ([('a', 5, 0), ('b', 1, 0)], 6))
+
+        first, second = SpaceSaving(100), SpaceSaving(100)
+        first.update(stream[:12_000])
+        second.update(stream[12_000:])
+        first.merge(second)
+        self.assertEqual(first.total, len(stream))
+        self.assertEqual([value for value, _, _ in first.top(5)], expected)
+
+    def test_heavy_hitters_round_trip(self):
+        stream = zipf_stream(5000, seed=3)
+        heavy_hitters = HeavyHitters(epsilon=0.01)
+        heavy_hitters.update(stream)
+        with tempfile.TemporaryDirectory() as tmp:
+            save_sketches(Path(tmp) / 'sketches.npz', {'keywords': heavy_hitters})
+            loaded = load_sketches(Path(tmp) / 'sketches.npz')['keywords']
+        for column, expected in zip(loaded.top(10), heavy_hitters.top(10)):
+            np.testing.assert_array_equal(column, expected)
+
+        loaded.update(stream)
+        values, estimates, guaranteed = loaded.top(3)
+        exact = Counter(stream.tolist())
+        self.assertEqual(values.tolist(), [value for value, _ in exact.most_common(3)])
+        self.assertTrue(np.all(guaranteed <= 2 * np.array([exact[value] for value in values])))
+        self.assertTrue(np.all(estimates >= 2 * np.array([exact[value] for value in values])))
+
+    def test_remove_unique_entries_with_sketch(self):
+        keywords = np.array(['a', 'b', 'a', None, 'c', 'a', 'b', 'b', 'd'], dtype=object)
+        dates = np.arange(len(keywords))
+        exact = remove_unique_entries((dates, keywords))
+        approximate = remove_unique_entries((dates, keywords), CountMinSketch())
+        for column, expected in zip(approximate, exact):
+            self.assertEqual(column.tolist(), expected.tolist())
+
+        # A later run merges the sketch of an earlier one and only counts the rows dated after it
+        saved = HeavyHitters(epsilon=0.01)
+        remove_unique_entries((dates[:6], keywords[:6]), saved)
+        saved.through = np.datetime64(5, 's')
+        incremental = HeavyHitters(epsilon=0.01)
+        for column, expected in zip(remove_unique_entries((dates, keywords), incremental, saved), exact):
+            self.assertEqual(column.tolist(), expected.tolist())
+        self.assertEqual((saved.total, incremental.total), (5, 8))
+        # Rows the earlier run counted are gone, so every row is counted again
+        recounted = HeavyHitters(epsilon=0.01)
+        remove_unique_entries((dates[1:], keywords[1:]), recounted, saved)
+        self.assertEqual(recounted.total, 7)
+
+    def test_approximate_counts_out_of_core(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            in_memory = Path(tmp) / 'in_memory'
+            generate_takeout(in_memory, search_size=300, watch_size=300, seed=5)
+            chunked = Path(tmp) / 'chunked'
+            shutil.copytree(in_memory, chunked)
+
+            options = ['-q', '--no-keywords', '--no-cache', '--approximate-counts', '0.001']
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(in_memory)] + options), EXIT_OK)
+                self.assertEqual(cli_main(['process', str(chunked), '--out-of-core', '--chunk-size', '37'] + options), EXIT_OK)
+
+            aggregated = Path('output') / 'aggregated_data'
+            self.assertEqual((chunked / aggregated / 'WATCH_heavy_hitters.csv').read_text(),
+                             (in_memory / aggregated / 'WATCH_heavy_hitters.csv').read_text())
+            sketches = load_sketches(in_memory / aggregated / 'WATCH_sketches.npz')
+            self.assertEqual(sorted(sketches), ['channels', 'keywords'])
+            self.assertTrue(0 < sketches['channels'].sketch.total <= 300)
+
+            # Later runs over the same rows merge the saved sketches without counting any row twice
+            heavy_hitters = (in_memory / aggregated / 'WATCH_heavy_hitters.csv').read_text()
+            merge = HeavyHitters.merge
+            with redirect_stdout(io.StringIO()), patch.object(HeavyHitters, 'merge', autospec=True, side_effect=merge) as merged:
+                self.assertEqual(cli_main(['aggregate', str(in_memory), '-q', '--approximate-counts', '0.001']), EXIT_OK)
+                self.assertEqual(merged.call_count, 4)
+                with patch.object(HeavyHitters, 'clear') as cleared:
+                    self.assertEqual(cli_main(['process', str(chunked), '--out-of-core', '--chunk-size', '37'] + options), EXIT_OK)
+            self.assertEqual((merged.call_count, cleared.call_count), (5, 0))
+            for directory in (in_memory, chunked):
+                self.assertEqual((directory / aggregated / 'WATCH_heavy_hitters.csv').read_text(), heavy_hitters)
+                merged = load_sketches(directory / aggregated / 'WATCH_sketches.npz')
+                self.assertEqual(merged['channels'].sketch.total, sketches['channels'].sketch.total)
+                self.assertIsNotNone(merged['channels'].through)
+
+    def test_missing_heavy_hitters_are_rebuilt(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            generate_takeout(directory, search_size=300, watch_size=300, seed=5)
+            options = ['process', str(directory), '--no-keywords', '--sources', 'watch', '--approximate-counts', '0.001']
+            aggregated = directory / 'output' / 'aggregated_data'
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(options + ['-q']), EXIT_OK)
+            for name in ('WATCH_heavy_hitters.csv', 'WATCH_sketches.npz'):
+                (aggregated / name).unlink()
+                with redirect_stdout(io.StringIO()) as output:
+                    self.assertEqual(cli_main(options), EXIT_OK)
+                self.assertNotIn('WATCH.xlsx is up to date', output.getvalue())
+                self.assertTrue((aggregated / 'WATCH_heavy_hitters.csv').exists())
+                self.assertTrue((aggregated / 'WATCH_sketches.npz').exists())
+            with redirect_stdout(io.StringIO()) as output:
+                self.assertEqual(cli_main(options), EXIT_OK)
+            self.assertIn('WATCH.xlsx is up to date', output.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
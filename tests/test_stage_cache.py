@@ -0,0 +1,101 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from self_stats.cli import EXIT_OK, main as cli_main
+from self_stats.munger.input_output import read_csv_columns
+from self_stats.munger.stage_cache import StageCache, fingerprint_file, load_artifact, save_artifact
+from self_stats.munger.synthetic_data import main as generate_takeout
+
+def sample_output():
+    data = (
+        np.array([datetime(2024, 1, 2, 3, 4, 5, 6), None], dtype=object),
+        np.array(['café search', None], dtype=object),
+        np.array([1.5, np.nan]),
+        np.array(['Monday', 'Tuesday']),
+        np.array([date(2024, 1, 2), date(2024, 1, 3)], dtype=object),
+        np.array([timedelta(seconds=180), None], dtype=object),
+        np.array([['a'], 3], dtype=object),
+    )
+    return data, (None, ['x', 'y'])
+
+class TestArtifacts(unittest.TestCase):
+    def test_round_trip_keeps_types(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'stage.npz'
+            save_artifact(path, 'k1', sample_output())
+            data, extra = load_artifact(path, 'k1')
+            expected, expected_extra = sample_output()
+            for column, expected_column in zip(data, expected):
+                self.assertEqual(column.dtype, expected_column.dtype)
+                self.assertEqual([type(value) for value in column], [type(value) for value in expected_column])
+            self.assertEqual(data[0].tolist(), expected[0].tolist())
+            self.assertEqual(data[1].tolist(), expected[1].tolist())
+            self.assertTrue(np.isnan(data[2][1]))
+            self.assertEqual(data[5].tolist(), expected[5].tolist())
+            self.assertEqual(extra, expected_extra)
+            self.assertIsNone(load_artifact(path, 'other key'))
+
+    def test_fingerprint_follows_content(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'input.json'
+            path.write_text('[1]')
+            first = fingerprint_file(path)
+            path.write_text('[2]')
+            self.assertNotEqual(first, fingerprint_file(path))
+
+class TestStageCache(unittest.TestCase):
+    def run_pipeline(self, cache_dir, source='a', rerun=()):
+        calls = []
+        cache = StageCache(cache_dir, 'TEST', rerun=rerun)
+
+        def stage(name, value):
+            calls.append(name)
+            return (np.array([value]),)
+
+        first = cache.run('first', 1, lambda: stage('first', 1), params={'input': source})
+        cache.run('second', 1, lambda: stage('second', first[0][0] + 1), inputs=['first'])
+        cache.save_manifest()
+        return calls, cache
+
+    def test_skips_unchanged_stages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(self.run_pipeline(Path(tmp))[0], ['first', 'second'])
+            calls, cache = self.run_pipeline(Path(tmp))
+            self.assertEqual(calls, [])
+            self.assertEqual(cache.hits, {'first': True, 'second': True})
+            self.assertEqual(self.run_pipeline(Path(tmp), source='b')[0], ['first', 'second'])
+
+    def test_rerun_uses_cached_upstream(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.run_pipeline(Path(tmp))
+            self.assertEqual(self.run_pipeline(Path(tmp), rerun=['second'])[0], ['second'])
+            self.assertEqual(self.run_pipeline(Path(tmp), rerun=['first'])[0], ['first', 'second'])
+            latest = StageCache(Path(tmp), 'TEST', enabled=False).load_latest('second')
+            self.assertEqual(latest[0].tolist(), [2])
+
+    def test_uncached_run_invalidates_outputs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            full_data = directory / 'output' / 'full_data'
+
+            def process(search_size, *options):
+                generate_takeout(directory, search_size=search_size, watch_size=0, seed=3)
+                with redirect_stdout(io.StringIO()):
+                    self.assertEqual(cli_main(['process', str(directory), '-q', '--sources', 'search', '--no-keywords',
+                                               '--skip-stage', 'timeline', *options]), EXIT_OK)
+                return [len(read_csv_columns(full_data / f'SEARCH_{name}.csv')[1][0]) for name in ('raw', 'processed')]
+
+            cached = process(400)
+            smaller = process(300, '--no-cache')
+            self.assertLess(smaller[1], cached[1])
+            # The artifacts of the first run are reused, but the CSVs on disk came from the uncached run
+            self.assertEqual(process(400), cached)
+
+if __name__ == '__main__':
+    unittest.main()
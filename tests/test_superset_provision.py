@@ -0,0 +1,154 @@
+import json
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+# The provisioning scripts live in a plain directory (named like the Apache Superset package), not in self_stats
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'superset'))
+
+from provision import SupersetClient, build_summary_tables, create_session, load_dashboard_tables, load_table, provision_compiled_dashboard, provision_dashboard
+from superset_items import WATCH_DASHBOARD_SPEC, DashboardItems
+
+class StubSupersetHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def respond(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_call(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length)) if length else None
+        server = self.server
+        server.calls.append((self.command, self.path, payload, self.headers.get('Authorization'), self.client_address[1]))
+        if self.command == 'PUT' and server.failures_left:
+            server.failures_left -= 1
+            return self.respond(503, {'message': 'busy'})
+        if self.path.endswith('/security/login'):
+            return self.respond(200, {'access_token': 'token', 'refresh_token': 'csrf'})
+        server.next_id += 1
+        self.respond(201 if self.command == 'POST' else 200, {'id': server.next_id})
+
+    do_POST = handle_call
+    do_PUT = handle_call
+
+class TestProvision(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubSupersetHandler)
+        self.server.calls = []
+        self.server.next_id = 0
+        self.server.failures_left = 1
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_url = f'http://127.0.0.1:{self.server.server_address[1]}/api/v1'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_provisions_many_charts_over_one_connection(self):
+        client = SupersetClient(self.api_url, create_session(backoff_factor=0))
+        client.login('admin', 'admin')
+        charts = [DashboardItems.create_chart(slice_name=f'Chart {i}') for i in range(5)]
+        created = provision_dashboard(client, DashboardItems.create_dataset(), DashboardItems.create_dashboard(),
+                                      charts, DashboardItems.update_dashboard('{}'))
+
+        self.assertEqual(len(created['chart_ids']), 5)
+        chart_calls = [call for call in self.server.calls if call[1].endswith('/chart/')]
+        self.assertTrue(all(call[2]['datasource_id'] == created['dataset_id'] for call in chart_calls))
+        self.assertTrue(all(call[2]['dashboards'] == [created['dashboard_id']] for call in chart_calls))
+        self.assertTrue(all(call[3] == 'Bearer token' for call in self.server.calls[1:]))
+        # The failed PUT was retried, and every call reused the same client connection
+        self.assertEqual([call[0] for call in self.server.calls].count('PUT'), 2)
+        self.assertEqual(len({call[4] for call in self.server.calls}), 1)
+
+    def test_load_table_in_one_transaction_with_indexes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = Path(tmp) / 'watch.csv'
+            csv_path.write_text('Date,Video Title,Channel Title,Views\n'
+                                '2024-01-01,a,x,1\n2024-01-02,"b, c",,2\n2024-01-03,d,y,\n')
+            db_path = Path(tmp) / 'example.db'
+            self.assertEqual(load_table(db_path, 'test_table', csv_path, chunk_size=2), 3)
+            self.assertEqual(load_table(db_path, 'test_table', csv_path, chunk_size=2), 3)
+
+            conn = sqlite3.connect(db_path)
+            rows = conn.execute('SELECT * FROM test_table ORDER BY Date').fetchall()
+            indexes = {row[1] for row in conn.execute("PRAGMA index_list('test_table')")}
+            conn.close()
+            self.assertEqual(rows[1], ('2024-01-02', 'b, c', None, 2.0))
+            self.assertIsNone(rows[2][3])
+            self.assertEqual(indexes, {'ix_test_table_Date', 'ix_test_table_Channel_Title'})
+
+            # The second chunk fails to load: the table loaded before is kept as it was
+            chunks = [[('2024-02-01', 'e', 'x', 1.0)], OSError('disk full')]
+            with patch('provision.chunk_rows', side_effect=chunks), self.assertRaises(OSError):
+                load_table(db_path, 'test_table', csv_path, chunk_size=2)
+            conn = sqlite3.connect(db_path)
+            self.assertEqual(conn.execute('SELECT * FROM test_table ORDER BY Date').fetchall(), rows)
+            self.assertEqual({row[1] for row in conn.execute("PRAGMA index_list('test_table')")}, indexes)
+            conn.close()
+
+            summary_sql = {'first_summary': 'CREATE TABLE "first_summary" AS SELECT Date, COUNT(*) AS n FROM test_table GROUP BY Date',
+                           'second_summary': 'CREATE TABLE "second_summary" AS SELECT missing FROM test_table'}
+            group_by = {'first_summary': ['Date'], 'second_summary': ['missing']}
+            self.assertEqual(build_summary_tables(db_path, dict(list(summary_sql.items())[:1]), group_by), {'first_summary': 3})
+            conn = sqlite3.connect(db_path)
+            conn.execute('DELETE FROM test_table')
+            conn.commit()
+            conn.close()
+            with self.assertRaises(sqlite3.OperationalError):
+                build_summary_tables(db_path, summary_sql, group_by)
+            conn = sqlite3.connect(db_path)
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM first_summary').fetchone()[0], 3)
+            conn.close()
+
+    def test_dashboard_spec_is_pre_aggregated_and_laid_out(self):
+        compiled = DashboardItems.compile_dashboard(WATCH_DASHBOARD_SPEC)
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = Path(tmp)
+            (data_dir / 'WATCH_processed.csv').write_text(
+                'Date,Video_Title,Channel_Title,Video_URL,Day_of_the_Week,Hour_of_the_Day,Date_Only,Video_Duration,Short_Form_Video\n'
+                '2024-01-02 10:00:00,a,x,u1,Tuesday,10,2024-01-02,,Short-Form\n'
+                '2024-01-02 10:30:00,b,x,u2,Tuesday,10,2024-01-02,,Long-Form\n'
+                '2024-01-03 08:00:00,c,,u3,Wednesday,8,2024-01-03,,Undetermined\n')
+            (data_dir / 'WATCH_keywords.csv').write_text('Date,Keywords\n2024-01-02 10:00:00,cats\n2024-01-03 08:00:00,cats\n2024-01-03 08:00:00,dogs\n')
+            counts = load_dashboard_tables(data_dir / 'example.db', WATCH_DASHBOARD_SPEC, compiled, data_dir)
+
+            conn = sqlite3.connect(data_dir / 'example.db')
+            daily = conn.execute('SELECT * FROM watch_daily_rollup').fetchall()
+            keywords = conn.execute('SELECT * FROM watch_keywords_summary').fetchall()
+            conn.close()
+        self.assertEqual(counts['watch_history'], 3)
+        self.assertEqual(counts['watch_channels'], 1)
+        self.assertEqual(daily, [('2024-01-02', 2, 1, 1), ('2024-01-03', 1, 0, 0)])
+        self.assertEqual(keywords, [('cats', 2, 2)])
+
+        client = SupersetClient(self.api_url, create_session(backoff_factor=0))
+        created = provision_compiled_dashboard(client, WATCH_DASHBOARD_SPEC, compiled, DashboardItems.position_json)
+        self.assertEqual(set(created['dataset_ids']), set(WATCH_DASHBOARD_SPEC['summary_tables']))
+        self.assertEqual(len(created['chart_ids']), len(WATCH_DASHBOARD_SPEC['charts']))
+
+        position = json.loads(self.server.calls[-1][2]['position_json'])
+        charts = [item for item in position.values() if isinstance(item, dict) and item.get('type') == 'CHART']
+        self.assertEqual(sorted(chart['meta']['chartId'] for chart in charts), sorted(created['chart_ids']))
+        for row_id in position['GRID_ID']['children']:
+            self.assertLessEqual(sum(position[chart]['meta']['width'] for chart in position[row_id]['children']), 12)
+
+    def test_spec_rejects_unknown_tables(self):
+        spec = dict(WATCH_DASHBOARD_SPEC, charts=[{'name': 'Broken', 'table': 'missing', 'viz_type': 'table', 'metrics': []}])
+        with self.assertRaises(ValueError):
+            DashboardItems.compile_dashboard(spec)
+
+if __name__ == '__main__':
+    unittest.main()
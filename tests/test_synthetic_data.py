@@ -0,0 +1,31 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from self_stats.munger.synthetic_data import main as generate_takeout
+from self_stats.munger.synthetic_data import generate_search_entries, generate_watch_entries
+
+class TestSyntheticData(unittest.TestCase):
+    def test_seeded_output_is_reproducible(self):
+        self.assertEqual(list(generate_search_entries(200, seed=3)), list(generate_search_entries(200, seed=3)))
+        self.assertNotEqual(list(generate_watch_entries(200, seed=3)), list(generate_watch_entries(200, seed=4)))
+
+    def test_entries_are_newest_first_with_repetition(self):
+        entries = list(generate_watch_entries(2000, seed=1))
+        times = [entry['time'] for entry in entries]
+        self.assertEqual(times, sorted(times, reverse=True))
+        titles = [entry['title'] for entry in entries]
+        self.assertLess(len(set(titles)), len(titles) // 2)
+
+    def test_writes_valid_takeout_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            written = generate_takeout(Path(tmp), search_size=150, watch_size=0, seed=2)
+            self.assertEqual(list(written), ['search'])
+            entries = json.loads(written['search'].read_text())
+            self.assertEqual(len(entries), 150)
+            self.assertTrue(all(entry['time'].endswith('Z') for entry in entries))
+            self.assertTrue(any('locationInfos' in entry for entry in entries))
+
+if __name__ == '__main__':
+    unittest.main()
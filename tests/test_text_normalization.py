@@ -0,0 +1,49 @@
+import unittest
+import regex
+
+from self_stats.munger.text_normalization import clean_string, clean_strings, is_clean
+
+def reference_clean_string(input_string):
+    # The original two-pass implementation, used as the behavioural reference
+    if input_string is None:
+        return None
+    cleaned_string = regex.sub(r'[\p{C}]', '', input_string)
+    cleaned_string = cleaned_string.strip()
+    return regex.sub(r'\s+', ' ', cleaned_string)
+
+class TestTextNormalization(unittest.TestCase):
+    def setUp(self):
+        self.samples = [
+            'Searched for python numpy',
+            '',
+            ' leading space',
+            'trailing space ',
+            'double  space',
+            'tab\tseparated',
+            'new\nline',
+            'zero​width',
+            'Watched Café   au lait ',
+            ' non breaking ',
+            'emoji \U0001F600 title',
+            '\x00null\x07bell',
+        ]
+
+    def test_matches_reference(self):
+        for sample in self.samples:
+            self.assertEqual(clean_string(sample), reference_clean_string(sample), repr(sample))
+
+    def test_batch_matches_reference(self):
+        values = self.samples + [None]
+        self.assertEqual(clean_strings(values), [reference_clean_string(value) for value in values])
+
+    def test_fast_path_detection(self):
+        self.assertTrue(is_clean('Searched for python numpy'))
+        self.assertFalse(is_clean('double  space'))
+        self.assertFalse(is_clean('zero​width'))
+        self.assertFalse(is_clean('tab\tseparated'))
+
+    def test_none_is_preserved(self):
+        self.assertIsNone(clean_string(None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from self_stats.cli import EXIT_OK, main as cli_main
+from self_stats.munger.input_output import read_csv_columns
+from self_stats.munger.synthetic_data import main as generate_takeout
+from self_stats.munger.timeline import Timeline, merge_sorted
+
+START = datetime(2024, 5, 1, 12)
+
+def history(minutes_ago, prefix):
+    dates = np.array([START - timedelta(minutes=minutes) for minutes in minutes_ago], dtype=object)
+    return dates, np.array([f'{prefix} {row}' for row in range(len(dates))], dtype=object)
+
+# Newest first, as in the processed data
+SEARCHES = history([0, 5, 1440], 'Searched for')
+VIEWS = history([-1, 5, 50], 'Watched')
+
+class TestTimeline(unittest.TestCase):
+    def test_merge_sorted(self):
+        runs = [np.array([1, 3, 5]), np.array([1, 2, 6]), np.array([0, 3]), np.array([], dtype=np.int64), np.array([7])]
+        keys, tags, rows = merge_sorted(runs)
+        self.assertEqual(keys.tolist(), [0, 1, 1, 2, 3, 3, 5, 6, 7])
+        # Ties keep the order of the runs
+        self.assertEqual(tags.tolist(), [2, 0, 1, 1, 0, 2, 0, 1, 4])
+        self.assertEqual(rows.tolist(), [0, 0, 0, 1, 1, 1, 2, 2, 0])
+        self.assertEqual([runs[tag][row] for tag, row in zip(tags, rows)], keys.tolist())
+        self.assertEqual(len(merge_sorted([])[0]), 0)
+
+    def test_build(self):
+        timeline = Timeline.build({'watch': VIEWS, 'search': SEARCHES})
+        dates, sources, rows, texts, sessions = timeline.table()
+        self.assertEqual(dates.tolist(), ['2024-05-01 12:01:00', '2024-05-01 12:00:00', '2024-05-01 11:55:00',
+                                          '2024-05-01 11:55:00', '2024-05-01 11:10:00', '2024-04-30 12:00:00'])
+        self.assertEqual(sources.tolist(), ['watch', 'search', 'watch', 'search', 'watch', 'search'])
+        self.assertEqual(rows.tolist(), [0, 0, 1, 1, 2, 2])
+        self.assertEqual(texts.tolist(), ['Watched 0', 'Searched for 0', 'Watched 1', 'Searched for 1', 'Watched 2', 'Searched for 2'])
+        self.assertEqual(sessions.tolist(), [3, 3, 3, 3, 2, 1])
+        self.assertEqual(len(Timeline.build({})), 0)
+        with self.assertRaises(ValueError):
+            Timeline.build({'maps': SEARCHES})
+
+    def test_unsorted_source(self):
+        dates, texts = SEARCHES
+        shuffled = Timeline.build({'search': (dates[[2, 0, 1]], texts[[2, 0, 1]]), 'watch': VIEWS})
+        expected = Timeline.build({'search': SEARCHES, 'watch': VIEWS})
+        np.testing.assert_array_equal(shuffled.times, expected.times)
+        np.testing.assert_array_equal(shuffled.texts, expected.texts)
+
+    def test_sessions_and_rollups(self):
+        timeline = Timeline.build({'search': SEARCHES, 'watch': VIEWS})
+        sessions = [column.tolist() for column in timeline.sessions()]
+        self.assertEqual(sessions, [[1, 2, 3], ['2024-04-30 12:00:00', '2024-05-01 11:10:00', '2024-05-01 11:55:00'],
+                                    ['2024-04-30 12:00:00', '2024-05-01 11:10:00', '2024-05-01 12:01:00'],
+                                    [0.0, 0.0, 6.0], [1, 1, 4], [1, 0, 2], [0, 1, 2], [0, 0, 2]])
+        # A shorter gap splits the last session between its two pairs of actions
+        self.assertEqual(timeline.sessions(gap=60)[4].tolist(), [1, 1, 2, 2])
+
+        days, actions, searches, views, session_count, minutes, first, last = timeline.daily()
+        self.assertEqual(days.tolist(), ['2024-04-30', '2024-05-01'])
+        self.assertEqual((actions.tolist(), searches.tolist(), views.tolist()), ([1, 5], [1, 2], [0, 3]))
+        self.assertEqual((session_count.tolist(), minutes.tolist()), ([1, 2], [0.0, 6.0]))
+        self.assertEqual((first[1], last[1]), ('2024-05-01 11:10:00', '2024-05-01 12:01:00'))
+
+        hours, actions, searches, views = timeline.hourly()
+        self.assertEqual(hours.tolist(), ['2024-04-30 12:00', '2024-05-01 11:00', '2024-05-01 12:00'])
+        self.assertEqual(actions.tolist(), [1, 3, 2])
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            generate_takeout(directory, search_size=300, watch_size=400, seed=3)
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(directory), '-q', '--no-keywords', '--no-cache']), EXIT_OK)
+
+            header, columns = read_csv_columns(directory / 'output' / 'full_data' / 'TIMELINE.csv')
+            self.assertEqual(header, ['Date', 'Source', 'Source_Row', 'Text', 'Session'])
+            dates = columns[0].astype('datetime64[s]')
+            self.assertTrue(np.all(dates[1:] <= dates[:-1]))
+            for source in ('search', 'watch'):
+                _, processed = read_csv_columns(directory / 'output' / 'full_data' / f'{source.upper()}_processed.csv')
+                taken = columns[1] == source
+                self.assertEqual(taken.sum(), len(processed[0]))
+                rows = columns[2][taken].astype(int)
+                self.assertEqual(processed[0][rows].tolist(), columns[0][taken].tolist())
+                self.assertEqual(processed[1][rows].tolist(), columns[3][taken].tolist())
+
+            _, daily = read_csv_columns(directory / 'output' / 'aggregated_data' / 'TIMELINE_daily.csv')
+            self.assertEqual(daily[1].astype(int).sum(), len(dates))
+            _, sessions = read_csv_columns(directory / 'output' / 'aggregated_data' / 'TIMELINE_sessions.csv')
+            self.assertEqual(sessions[4].astype(int).sum(), len(dates))
+
+    def test_cli_skip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            generate_takeout(directory, search_size=300, watch_size=300, seed=3)
+            options = ['-q', '--no-keywords', '--no-cache']
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(directory), '--skip-stage', 'timeline'] + options), EXIT_OK)
+                self.assertFalse((directory / 'output' / 'full_data' / 'TIMELINE.csv').exists())
+                self.assertEqual(cli_main(['process', str(directory), '--sources', 'search'] + options), EXIT_OK)
+                self.assertFalse((directory / 'output' / 'full_data' / 'TIMELINE.csv').exists())
+                # The aggregate command leaves the timeline to the process command
+                self.assertEqual(cli_main(['aggregate', str(directory), '-q']), EXIT_OK)
+                self.assertFalse((directory / 'output' / 'aggregated_data' / 'TIMELINE_hourly.csv').exists())
+                self.assertEqual(cli_main(['process', str(directory)] + options), EXIT_OK)
+            self.assertTrue((directory / 'output' / 'aggregated_data' / 'TIMELINE_hourly.csv').exists())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from self_stats.cli import EXIT_OK, main as cli_main
+from self_stats.munger.input_output import read_csv_columns
+from self_stats.munger.synthetic_data import main as generate_takeout
+from self_stats.munger.video_views import GAP_COLUMNS, RepeatViews, encode_video_ids, extract_video_ids
+
+URLS = np.array([
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://youtu.be/9bZkp7q19f0?t=42',
+    None,
+    'https://www.youtube.com/shorts/dQw4w9WgXcQ',
+    'https://www.youtube.com/watch?list=PL123&v=kJQP7kiw5Fk&t=10s',
+    'https://www.youtube.com/post/Ugkx1234567',
+    'https://www.youtube.com/watch?v=tooLongIdXYZ1',
+    'https://music.youtube.com/watch?v=9bZkp7q19f0',
+], dtype=object)
+
+# Newest first, as in the exports: 0 h, -2 h, -1 day, -3 days, -40 days, ...
+HOURS_AGO = [0, 2, 24, 72, 960, 961, 962, 2000]
+DATES = np.array([datetime(2024, 5, 1, 12) - timedelta(hours=hours) for hours in HOURS_AGO], dtype=object)
+TITLES = np.array([f'Watched video {row}' for row in range(len(URLS))], dtype=object)
+CHANNELS = np.array([f'Channel {row}' for row in range(len(URLS))], dtype=object)
+
+class TestVideoViews(unittest.TestCase):
+    def test_extract_video_ids(self):
+        video_ids, shorts = extract_video_ids(URLS)
+        self.assertEqual(video_ids.tolist(), [b'dQw4w9WgXcQ', b'9bZkp7q19f0', b'', b'dQw4w9WgXcQ', b'kJQP7kiw5Fk', b'', b'', b'9bZkp7q19f0'])
+        self.assertEqual(np.flatnonzero(shorts).tolist(), [3])
+        self.assertEqual(len(extract_video_ids([])[0]), 0)
+
+        vocabulary, codes = encode_video_ids(video_ids)
+        self.assertEqual(vocabulary.tolist(), ['9bZkp7q19f0', 'dQw4w9WgXcQ', 'kJQP7kiw5Fk'])
+        self.assertEqual(codes.tolist(), [1, 0, -1, 1, 2, -1, -1, 0])
+
+    def test_repeat_views(self):
+        repeat_views = RepeatViews.build(DATES, URLS, TITLES, CHANNELS)
+        video_ids, shorts, titles, channels, counts, first_seen, last_seen, *gaps = repeat_views.table()
+        self.assertEqual(video_ids.tolist(), ['dQw4w9WgXcQ', '9bZkp7q19f0', 'kJQP7kiw5Fk'])
+        self.assertEqual(shorts.tolist(), [True, False, False])
+        self.assertEqual(counts.tolist(), [2, 2, 1])
+        # The title and channel are those of the latest view
+        self.assertEqual(titles.tolist(), ['Watched video 0', 'Watched video 1', 'Watched video 4'])
+        self.assertEqual(first_seen.tolist(), ['2024-04-28 12:00:00', '2024-02-08 04:00:00', '2024-03-22 12:00:00'])
+        self.assertEqual(last_seen.tolist(), ['2024-05-01 12:00:00', '2024-05-01 10:00:00', '2024-03-22 12:00:00'])
+        histogram = np.column_stack(gaps)
+        self.assertEqual(histogram.shape, (3, len(GAP_COLUMNS)))
+        self.assertEqual(histogram.tolist(), [[0, 0, 1, 0, 0, 0], [0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0]])
+
+    def test_merge(self):
+        whole = RepeatViews.build(DATES, URLS, TITLES, CHANNELS)
+        parts = [RepeatViews.build(DATES[start:stop], URLS[start:stop], TITLES[start:stop], CHANNELS[start:stop])
+                 for start, stop in ((0, 2), (2, 3), (3, 7), (7, 8))]
+        merged = RepeatViews.merge(parts + [RepeatViews.empty()])
+        for column, expected in zip(merged.arrays(), whole.arrays()):
+            np.testing.assert_array_equal(column, expected)
+        self.assertEqual(len(RepeatViews.merge([])), 0)
+
+    def test_out_of_core(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            in_memory = Path(tmp) / 'in_memory'
+            generate_takeout(in_memory, search_size=300, watch_size=400, seed=7)
+            chunked = Path(tmp) / 'chunked'
+            shutil.copytree(in_memory, chunked)
+
+            options = ['-q', '--no-keywords', '--no-cache']
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(in_memory)] + options), EXIT_OK)
+                self.assertEqual(cli_main(['process', str(chunked), '--out-of-core', '--chunk-size', '29'] + options), EXIT_OK)
+
+            repeat_views = Path('output') / 'aggregated_data' / 'WATCH_repeat_views.csv'
+            self.assertEqual((chunked / repeat_views).read_text(), (in_memory / repeat_views).read_text())
+            _, columns = read_csv_columns(in_memory / repeat_views)
+            self.assertIn('True', columns[1].tolist())
+            self.assertFalse((in_memory / 'output' / 'aggregated_data' / 'SEARCH_repeat_views.csv').exists())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from self_stats.cli import EXIT_OK, main as cli_main
+from self_stats.munger.input_output import read_csv_columns
+from self_stats.munger.synthetic_data import main as generate_takeout
+from self_stats.munger.window_stats import (DailySeries, calendar_columns, calendar_length, calendar_table, main as window_stats,
+                                            rolling_columns, rolling_table, weekday_columns, weekday_table)
+
+NAMES = ['Record_Count', 'Short_Form_Ratio']
+
+def daily_table(seed=0):
+    """
+    Three months of days, a fifth of them without entries, with counts and ratios as aggregate_data.main gives them.
+    """
+    rng = np.random.default_rng(seed)
+    calendar = np.arange(np.datetime64('2024-01-01'), np.datetime64('2024-04-01'))
+    active = rng.random(len(calendar)) < 0.8
+    active[[0, -1]] = True
+    counts = rng.integers(1, 50, len(calendar)).astype(float)
+    ratios = rng.random(len(calendar))
+    ratios[rng.random(len(calendar)) < 0.2] = np.nan
+    frame = pd.DataFrame({'Record_Count': np.where(active, counts, 0), 'Short_Form_Ratio': np.where(active, ratios, np.nan)},
+                         index=pd.DatetimeIndex(calendar))
+    return calendar[active], np.column_stack((counts, ratios))[active], frame
+
+class TestWindowStats(unittest.TestCase):
+    def test_statistics_match_pandas(self):
+        days, values, frame = daily_table()
+        series = DailySeries.build(NAMES, days, values)
+        self.assertEqual(len(series), len(frame))
+
+        for window in (7, 30):
+            means, deviations = series.rolling(window)
+            self.assertTrue(np.isnan(means[:window - 1]).all())
+            np.testing.assert_allclose(means[window - 1:], frame.rolling(window, min_periods=1).mean().values[window - 1:])
+            np.testing.assert_allclose(deviations[window - 1:], frame.rolling(window, min_periods=2).std().values[window - 1:])
+
+        weekly = frame['Record_Count'].rolling(7).sum()
+        np.testing.assert_allclose(series.change(7)[13:, 0], (weekly / weekly.shift(7) - 1).values[13:])
+
+        starts, days_in_period, totals, means, deviations = series.resample('month')
+        self.assertEqual(starts.astype(str).tolist(), ['2024-01-01', '2024-02-01', '2024-03-01'])
+        self.assertEqual(days_in_period.tolist(), [31, 29, 31])
+        monthly = frame.resample('MS')
+        np.testing.assert_allclose(totals[:, 0], monthly.sum()['Record_Count'].values)
+        np.testing.assert_allclose(means, monthly.mean().values)
+        np.testing.assert_allclose(deviations, monthly.std().values)
+        starts, _, totals, _, _ = series.resample('week')
+        self.assertTrue((starts.astype('datetime64[D]').astype(np.int64) % 7 == 4).all())
+        np.testing.assert_allclose(totals[:, 0], frame['Record_Count'].resample('W-SUN').sum().values)
+
+        counts, means, deviations = series.weekday_baselines()
+        by_weekday = frame.groupby(frame.index.dayofweek)
+        self.assertEqual(counts.tolist(), by_weekday.size().tolist())
+        np.testing.assert_allclose(means, by_weekday.mean().values)
+        np.testing.assert_allclose(deviations, by_weekday.std().values)
+
+        # Scores are against the earlier days of the same weekday
+        earlier = by_weekday.shift()
+        earlier = earlier.groupby(frame.index.dayofweek).expanding()
+        baseline_means = earlier.mean().droplevel(0).sort_index()
+        baseline_deviations = earlier.std().droplevel(0).sort_index()
+        scores = ((frame - baseline_means) / baseline_deviations).values
+        np.testing.assert_allclose(series.weekday_scores(), np.where(np.isfinite(scores), scores, np.nan))
+        np.testing.assert_allclose(series.weekday_scores(40), series.weekday_scores()[40:])
+        np.testing.assert_allclose(series.rolling(30, 40)[1], series.rolling(30)[1][40:])
+        np.testing.assert_allclose(series.change(7, 10), series.change(7)[10:])
+
+    def test_incremental_updates(self):
+        days, values, _ = daily_table()
+        whole = DailySeries.build(NAMES, days, values)
+
+        series = DailySeries.build(NAMES, days[:40], values[:40])
+        # The last day of the earlier table is updated along with the new days
+        series.update(days[39:], values[39:])
+        np.testing.assert_array_equal(series.values, whole.values)
+        np.testing.assert_array_equal(series.counts, whole.counts)
+        # Prefix sums restarted from a stored total only differ from a full rebuild by rounding
+        np.testing.assert_allclose(series.sums, whole.sums)
+        with self.assertRaises(ValueError):
+            series.update(days[:1] - 1, values[:1])
+
+        changed = values.copy()
+        changed[50, 0] += 1
+        synced = DailySeries.build(NAMES, days[:60], values[:60]).sync(days, changed)
+        np.testing.assert_allclose(synced.sums, DailySeries.build(NAMES, days, changed).sums)
+        shorter = synced.sync(days[:30], changed[:30])
+        self.assertEqual(len(shorter), (days[29] - days[0]).astype(int) + 1)
+        np.testing.assert_allclose(shorter.squares, DailySeries.build(NAMES, days[:30], changed[:30]).squares)
+
+    def test_main_keeps_state(self):
+        days, values, _ = daily_table()
+        table = (np.datetime_as_string(days, unit='D'), values[:, 0].astype(np.int64), None, None, values[:, 1])
+        with tempfile.TemporaryDirectory() as tmp:
+            state = Path(tmp) / 'WATCH_daily_series.npz'
+            first = window_stats(tuple(column[:45] if column is not None else None for column in table), state)
+            self.assertEqual(first.names, NAMES)
+            loaded = DailySeries.load(state)
+            np.testing.assert_array_equal(loaded.values, first.values)
+            self.assertEqual(loaded.start, np.datetime64('2024-01-01'))
+
+            second = window_stats(table, state)
+            np.testing.assert_allclose(second.sums, DailySeries.build(NAMES, days, values).sums)
+            # The prefix sums are saved, not computed again on loading
+            loaded = DailySeries.load(state)
+            self.assertEqual(loaded.written, len(loaded))
+            np.testing.assert_array_equal(loaded.weekday_squares, second.weekday_squares)
+            # Search history has no ratio column, so the saved watch series is not reused
+            self.assertEqual(window_stats(table[:4], state).names, ['Record_Count'])
+
+    def test_incremental_tables(self):
+        days, values, _ = daily_table()
+        table = (np.datetime_as_string(days, unit='D'), values[:, 0].astype(np.int64), None, None, values[:, 1])
+        changed = values.copy()
+        changed[20, 0] += 1
+        updates = [tuple(column[:45] if column is not None else None for column in table), table,
+                   (table[0], changed[:, 0].astype(np.int64), None, None, changed[:, 1])]
+        with tempfile.TemporaryDirectory() as tmp:
+            state = Path(tmp) / 'WATCH_daily_series.npz'
+            paths = tuple(Path(tmp) / name for name in ('rolling.csv', 'weekday.csv', 'calendar.csv'))
+            fresh = tuple(Path(tmp) / f'fresh_{path.name}' for path in paths)
+            for update in updates:
+                window_stats(update, state, paths)
+                window_stats(update, None, fresh)
+                for path, expected in zip(paths, fresh):
+                    self.assertEqual(path.read_bytes(), expected.read_bytes(), path.name)
+
+            # Rows before the first changed day are left in place: a row edited in the file stays as it is
+            edited = paths[0].read_bytes().replace(b'2024-01-02', b'2024-01-0X', 1)
+            paths[0].write_bytes(edited)
+            window_stats(table, state, paths)
+            self.assertIn(b'2024-01-0X,', paths[0].read_bytes())
+            # A file that is not the one written last time is written again in full
+            paths[0].write_bytes(edited + b'extra\r\n')
+            window_stats(updates[2], state, paths)
+            self.assertEqual(paths[0].read_bytes(), fresh[0].read_bytes())
+
+    def test_tables(self):
+        days, values, _ = daily_table()
+        for series in (DailySeries.build(NAMES, days, values), DailySeries.build(NAMES[:1], days, values[:, :1]),
+                       DailySeries.empty(NAMES)):
+            for table, columns in ((rolling_table(series), rolling_columns(series.names)),
+                                   (weekday_table(series), weekday_columns(series.names)),
+                                   (calendar_table(series), calendar_columns(series.names))):
+                self.assertEqual(len(table), len(columns))
+                self.assertEqual(len({len(column) for column in table}), 1)
+        series = DailySeries.build(NAMES, days, values)
+        calendar = calendar_table(series)
+        self.assertEqual(len(calendar[0]), calendar_length(series))
+        self.assertTrue(np.all(calendar[1][1:] >= calendar[1][:-1]))
+        self.assertIn('Record_Count_Week_over_Week_Change', rolling_columns(NAMES))
+        self.assertNotIn('Short_Form_Ratio_Total', calendar_columns(NAMES))
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            generate_takeout(directory, search_size=300, watch_size=300, seed=3)
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(cli_main(['process', str(directory), '-q', '--no-keywords', '--skip-stage', 'timeline']), EXIT_OK)
+            aggregated = directory / 'output' / 'aggregated_data'
+            header, columns = read_csv_columns(aggregated / 'WATCH_rolling_stats.csv')
+            self.assertEqual(header, rolling_columns(NAMES))
+            days = columns[0].astype('datetime64[D]')
+            self.assertTrue((np.diff(days).astype(int) == 1).all())
+            _, calendar = read_csv_columns(aggregated / 'SEARCH_calendar_stats.csv')
+            _, rolling = read_csv_columns(aggregated / 'SEARCH_rolling_stats.csv')
+            weeks = calendar[0] == 'week'
+            self.assertEqual(calendar[3][weeks].astype(int).sum(), rolling[2].astype(int).sum())
+            self.assertTrue((aggregated / 'SEARCH_daily_series.npz').exists())
+
+if __name__ == '__main__':
+    unittest.main()